@@ -0,0 +1,27 @@
+import pytest
+
+from fram.generelle_hjelpemoduler.excel import ARK_MELLOMLAGER_MILJOVARIABEL
+from fram.generelle_hjelpemoduler.forutsetninger import FORUTSETNINGER_MILJOVARIABEL, forutsetninger
+from fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing import RA_MELLOMLAGER_MILJOVARIABEL
+from fram.virkninger.ventetid.mellomlagring import MELLOMLAGER_MILJOVARIABEL as VENTETID_MELLOMLAGER_MILJOVARIABEL
+
+MELLOMLAGRE = {
+    RA_MELLOMLAGER_MILJOVARIABEL: "ra",
+    ARK_MELLOMLAGER_MILJOVARIABEL: "ark",
+    FORUTSETNINGER_MILJOVARIABEL: "forutsetninger",
+    VENTETID_MELLOMLAGER_MILJOVARIABEL: "ventetid",
+}
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tomme_mellomlagre(tmp_path_factory):
+    """Legger alle mellomlagrene i en midlertidig katalog, slik at testene verken skriver til ~/.cache/fram eller
+    består på grunn av det som ligger der fra før. Gjelder også underprosessene testene starter"""
+    katalog = tmp_path_factory.mktemp("mellomlager")
+    with pytest.MonkeyPatch.context() as m:
+        for miljovariabel, navn in MELLOMLAGRE.items():
+            m.setenv(miljovariabel, str(katalog / navn))
+        # Et register som er hentet fra ~/.cache/fram før testene startet, skal ikke gjenbrukes
+        forutsetninger.cache_clear()
+        yield katalog
+    forutsetninger.cache_clear()
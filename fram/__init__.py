@@ -2,16 +2,41 @@
 Denne modulen inneholder hele SØA-modellen med tilhørende støttefunksjoner. Det eneste brukeren trenger å forholde seg
 til i normal bruk er klassene `FRAM` og `KalkPriser`, dokumentert på denne siden. De som vil videre kan lese om
 drivstoffberegninger, RA-innlesing, ytterligere om kalkulasjonspriser eller andre støttefunksjoner.
+
+Klassene importeres først når de brukes, slik at for eksempel kommandolinjeverktøyet i
+:mod:`~fram.generelle_hjelpemoduler.main_script` starter uten å laste inn hele modellen.
 """
+import importlib
+
 from fram.generelle_hjelpemoduler.version import __version__
-from .modell import FRAM
-from .virkninger.drivstoff.virkning import Drivstoff
-from .virkninger.investering.virkning import Investeringskostnader
-from .virkninger.kontantstrommer.virkning import Kontantstrommer
-from .virkninger.risiko.virkning import Risiko
-from .virkninger.sedimenter.virkning import Sedimenter
-from .virkninger.tid.virkning import Tidsbruk
-from .virkninger.utslipp_til_luft.virkning import Utslipp_til_luft
-from .virkninger.vedlikehold.virkning import Vedlikeholdskostnader
-from .virkninger.ventetid.virkning import Ventetid
-from .generelle_hjelpemoduler import main_script
+
+# Hvor hvert navn i pakken hentes fra, første gang det brukes
+_LATE_IMPORTER = {
+    "FRAM": "fram.modell",
+    "Drivstoff": "fram.virkninger.drivstoff.virkning",
+    "Investeringskostnader": "fram.virkninger.investering.virkning",
+    "Kontantstrommer": "fram.virkninger.kontantstrommer.virkning",
+    "Risiko": "fram.virkninger.risiko.virkning",
+    "Sedimenter": "fram.virkninger.sedimenter.virkning",
+    "Tidsbruk": "fram.virkninger.tid.virkning",
+    "Utslipp_til_luft": "fram.virkninger.utslipp_til_luft.virkning",
+    "Vedlikeholdskostnader": "fram.virkninger.vedlikehold.virkning",
+    "Ventetid": "fram.virkninger.ventetid.virkning",
+    "main_script": "fram.generelle_hjelpemoduler.main_script",
+}
+
+__all__ = ["__version__", *_LATE_IMPORTER]
+
+
+def __getattr__(navn: str):
+    if navn not in _LATE_IMPORTER:
+        raise AttributeError(f"module {__name__!r} has no attribute {navn!r}")
+    modul = importlib.import_module(_LATE_IMPORTER[navn])
+    verdi = modul if modul.__name__.endswith(f".{navn}") else getattr(modul, navn)
+    # Legges i pakken, slik at __getattr__ bare kalles første gang
+    globals()[navn] = verdi
+    return verdi
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
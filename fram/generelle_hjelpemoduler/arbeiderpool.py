@@ -0,0 +1,112 @@
+"""
+Felles prosesspool for FRAM
+
+Poolen startes første gang den trengs, og gjenbrukes av alle senere jobber i samme Python-prosess. For ventetiden er det
+referanse- og tiltaksbanen, alle ventetidssituasjonene og alle følsomhetsanalysene, se
+:mod:`~fram.virkninger.ventetid.excel`. Antall arbeidere angis med `num_workers`, eller med miljøvariabelen
+`FRAM_VENTETID_ARBEIDERE`, og er ellers antall kjerner minus én. Ber man om et annet antall arbeidere enn poolen har,
+startes den på nytt.
+
+Innlesingen av IWRAP- og AISyRISK-risikoanalyser fordeler også filene på denne poolen, se
+:meth:`~fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing.Risikoanalyser.get_risikoanalyser` og
+:meth:`~fram.virkninger.risiko.hjelpemoduler.aisyrisk.les_og_konverter_aisyrisk`.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import cpu_count
+from typing import Callable, List, Optional, Sequence
+
+ARBEIDERE_MILJOVARIABEL = "FRAM_VENTETID_ARBEIDERE"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_num_workers: Optional[int] = None
+
+
+def standard_antall_arbeidere() -> int:
+    """Antall arbeidere fra miljøvariabelen `FRAM_VENTETID_ARBEIDERE`, ellers antall kjerner minus én"""
+    antall = os.environ.get(ARBEIDERE_MILJOVARIABEL)
+    if antall:
+        return max(1, int(antall))
+    return max(1, cpu_count() - 1)
+
+
+def hent_arbeiderpool(num_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Den felles prosesspoolen, med `num_workers` arbeidere. Startes hvis den ikke allerede kjører"""
+    global _pool, _num_workers
+    if num_workers is None:
+        num_workers = standard_antall_arbeidere()
+    if _pool is not None and _num_workers != num_workers:
+        avslutt_arbeiderpool()
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=num_workers)
+        _num_workers = num_workers
+    return _pool
+
+
+def avslutt_arbeiderpool():
+    """Avslutter den felles prosesspoolen. Neste simulering starter en ny"""
+    global _pool, _num_workers
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+    _pool = None
+    _num_workers = None
+
+
+def kjor_parallelt(
+    funksjon: Callable,
+    oppgaver: Sequence,
+    beskrivelser: Sequence[str],
+    num_workers: Optional[int] = None,
+    logger: Callable = print,
+) -> List:
+    """Kjører `funksjon` på hver oppgave i den felles prosesspoolen, og returnerer svarene i samme rekkefølge
+
+    Med én arbeider eller bare én oppgave kjøres alt i denne prosessen. Kan ikke poolen startes, logges det, og alt
+    kjøres i denne prosessen. Feiler en oppgave, kastes en RuntimeError som sier hvilken oppgave som feilet, med den
+    opprinnelige feilen som årsak. Stopper en arbeiderprosess uventet, avsluttes poolen, slik at neste kall starter en
+    ny.
+
+    Args:
+        funksjon: Funksjonen som skal kjøres. Må kunne pickles, det vil si være definert på toppnivå i en modul
+        oppgaver: Argumentet til funksjonen for hver oppgave. Bør være små, siden de sendes til arbeiderprosessene
+        beskrivelser: En beskrivelse av hver oppgave, som benyttes i feilmeldinger
+        num_workers: Antall arbeidere. Defaulter til :meth:`standard_antall_arbeidere`
+        logger: Hvor det logges hvis poolen ikke kan startes
+    """
+    if num_workers is None:
+        num_workers = standard_antall_arbeidere()
+
+    pool = None
+    if num_workers > 1 and len(oppgaver) > 1:
+        try:
+            pool = hent_arbeiderpool(num_workers)
+        except (OSError, NotImplementedError) as e:
+            logger(
+                f"Klarte ikke starte {num_workers} arbeiderprosesser ({e}). Kjører i én prosess"
+            )
+
+    if pool is None:
+        svar = []
+        for oppgave, beskrivelse in zip(oppgaver, beskrivelser):
+            try:
+                svar.append(funksjon(oppgave))
+            except Exception as e:
+                raise RuntimeError(f"{beskrivelse} feilet: {e}") from e
+        return svar
+
+    futures = [pool.submit(funksjon, oppgave) for oppgave in oppgaver]
+    svar = []
+    for future, beskrivelse in zip(futures, beskrivelser):
+        try:
+            svar.append(future.result())
+        except BrokenProcessPool as e:
+            avslutt_arbeiderpool()
+            raise RuntimeError(
+                f"En arbeiderprosess stoppet uventet under {beskrivelse}. Prosesspoolen startes på nytt ved neste simulering"
+            ) from e
+        except Exception as e:
+            for ventende in futures:
+                ventende.cancel()
+            raise RuntimeError(f"{beskrivelse} feilet: {e}") from e
+    return svar
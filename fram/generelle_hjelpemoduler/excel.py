@@ -1,18 +1,26 @@
 import functools
+import hashlib
 import io
+import zipfile
 from datetime import datetime
 from itertools import product
 from pathlib import Path
 import re
-from typing import Union, Tuple, Callable, List
+import weakref
+from typing import Union, Tuple, Callable, List, Optional
+from xml.etree import ElementTree
 
+import numpy as np
 import openpyxl
 import pandas as pd
 from PIL import Image
 from openpyxl import load_workbook, Workbook
 from openpyxl.styles import PatternFill, Font
 from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from openpyxl.utils import column_index_from_string
 from pandas import DataFrame, ExcelWriter, ExcelFile
+from pandas.io.parsers import TextParser
 
 from fram.generelle_hjelpemoduler.konstanter import (
     SKIPSTYPER,
@@ -20,14 +28,322 @@ from fram.generelle_hjelpemoduler.konstanter import (
     TRAFIKK_COLS,
     FRAM_DIRECTORY,
 )
+from fram.generelle_hjelpemoduler.mellomlagring import (
+    MAKS_ALDER_DAGER,
+    Mellomlager,
+    mellomlagerkatalog,
+)
+
+ARK_MELLOMLAGER_MILJOVARIABEL = "FRAM_ARK_MELLOMLAGER"
+ARK_MELLOMLAGER_MAKS_STORRELSE_BYTES = 200_000_000
+# Økes når konverteringen av celleverdier endres, slik at gamle rutenett ikke lenger treffes
+ARK_MELLOMLAGER_VERSJON = 1
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_XLSX_PAKKE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+# Delene av Excel-filen som er felles for alle arkene, og som verdiene i et ark avhenger av
+_XLSX_FELLES_DELER = ["xl/sharedStrings.xml", "xl/styles.xml"]
+
+
+def _utsnitt(rutenett: List[list], antall_rader: Optional[int]) -> List[list]:
+    """De første `antall_rader` radene i rutenettet, kopiert, trimmet og fylt ut slik `pd.read_excel` ville lest dem"""
+    rader = rutenett[:antall_rader]
+    lengder = [len(rad) for rad in rader]
+    for i, rad in enumerate(rader):
+        while lengder[i] and rad[lengder[i] - 1] == "":
+            lengder[i] -= 1
+    med_data = [i for i, lengde in enumerate(lengder) if lengde]
+    if not med_data:
+        return []
+    rader = rader[: med_data[-1] + 1]
+    bredde = max(lengder)
+    return [list(rad[:bredde]) + [""] * (bredde - len(rad)) for rad in rader]
+
+
+def _celleverdi(celle):
+    """Verdien i en openpyxl-celle, konvertert som i `pd.read_excel`"""
+    if celle.value is None:
+        return ""
+    if celle.data_type == TYPE_ERROR:
+        return np.nan
+    if celle.data_type == TYPE_NUMERIC and int(celle.value) == celle.value:
+        return int(celle.value)
+    return celle.value
+
+
+def _kolonneindekser(usecols):
+    """`usecols` som kolonneindekser. Excel-kolonner som "A:H" eller "A,C:E" gjøres om til heltall"""
+    if not isinstance(usecols, str):
+        return usecols
+    indekser = []
+    for del_ in usecols.split(","):
+        fra, _, til = del_.strip().partition(":")
+        fra = column_index_from_string(fra.strip()) - 1
+        til = column_index_from_string(til.strip()) - 1 if til else fra
+        indekser.extend(range(fra, til + 1))
+    return indekser
+
+
+def _arknokler(filbane: Path) -> Optional[dict]:
+    """Hash av innholdet i hvert ark i Excel-filen, per arknavn, uten at arkene leses
+
+    En xlsx-fil er et zip-arkiv med én XML-del per ark. Hashen bygger på CRC-en og størrelsen til arkets del og til de
+    delene som er felles for alle arkene (tekstene og tallformatene), slik de står i innholdsfortegnelsen til arkivet.
+    Endres et tall i ett ark, endres bare hashen til det arket. Endres en tekst, endres de felles tekstene, og alle
+    arkene får ny hash. Returnerer None hvis filen ikke kan leses slik, for eksempel fordi den ikke er en xlsx-fil.
+    """
+    try:
+        with zipfile.ZipFile(filbane) as arkiv:
+            deler = {info.filename: info for info in arkiv.infolist()}
+            bok = ElementTree.fromstring(arkiv.read("xl/workbook.xml"))
+            relasjoner = ElementTree.fromstring(arkiv.read("xl/_rels/workbook.xml.rels"))
+    except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+        return None
+
+    malfiler = {
+        rel.get("Id"): rel.get("Target") for rel in relasjoner.iter(f"{_XLSX_PAKKE_REL_NS}Relationship")
+    }
+    egenskaper = bok.find(f"{_XLSX_NS}workbookPr")
+    dato1904 = egenskaper is not None and egenskaper.get("date1904") in ("1", "true")
+    felles = [(del_, deler[del_].CRC, deler[del_].file_size) for del_ in _XLSX_FELLES_DELER if del_ in deler]
+
+    nokler = {}
+    for ark in bok.iter(f"{_XLSX_NS}sheet"):
+        mal = malfiler.get(ark.get(f"{_XLSX_REL_NS}id"), "")
+        del_ = mal.lstrip("/") if mal.startswith("/") else f"xl/{mal}"
+        if del_ not in deler:
+            return None
+        innhold = [
+            ARK_MELLOMLAGER_VERSJON,
+            openpyxl.__version__,
+            ark.get("name"),
+            dato1904,
+            (del_, deler[del_].CRC, deler[del_].file_size),
+            *felles,
+        ]
+        nokler[ark.get("name")] = hashlib.sha256(
+            "\x1f".join(str(d) for d in innhold).encode("utf-8")
+        ).hexdigest()
+    return nokler
+
+
+class ArkMellomlager(Mellomlager):
+    """Mellomlager for rutenettene til innleste Excel-ark, med én fil per ark, se :class:`Arbeidsbok`
+
+    Nøkkelen er en hash av innholdet i arket, se :meth:`_arknokler`, slik at et ark som er endret, leses på nytt, mens
+    de øvrige arkene i boken hentes fra mellomlageret. Rutenettene lagres som pickle, som tar vare på de blandede
+    celleverdiene (tekst, tall, datoer og NaN) uten konvertering. Se :class:`~fram.generelle_hjelpemoduler.mellomlagring.Mellomlager`
+    for skriving og opprydding.
+
+    Args:
+        katalog: Hvor filene skal ligge. Defaulter til katalogen i miljøvariabelen `FRAM_ARK_MELLOMLAGER`, eller
+            `~/.cache/fram/ark`
+        maks_storrelse_bytes: Samlet størrelse mellomlageret ryddes ned til
+        maks_alder_dager: Filer som ikke er brukt på så mange dager, slettes ved opprydding
+    """
+
+    def __init__(
+        self,
+        katalog: Optional[Union[str, Path]] = None,
+        maks_storrelse_bytes: int = ARK_MELLOMLAGER_MAKS_STORRELSE_BYTES,
+        maks_alder_dager: float = MAKS_ALDER_DAGER,
+    ):
+        if katalog is None:
+            katalog = mellomlagerkatalog(ARK_MELLOMLAGER_MILJOVARIABEL, "ark")
+        super().__init__(katalog, maks_storrelse_bytes, maks_alder_dager)
+
+
+class Arbeidsbok:
+    """En Excel-bok der hvert ark tolkes høyst én gang
+
+    Første gang et ark leses, med :meth:`les`, :meth:`les_excel`, :meth:`_fra_excel` eller :meth:`rutenett`, tolkes hele
+    arket med openpyxl til et rutenett av verdier. Senere innlesinger av det samme arket, med andre `skiprows`,
+    `usecols` eller `nrows`, hentes ut av rutenettet i minnet, og gir det samme som `pd.read_excel` direkte fra filen.
+    FRAM lager én slik bok for inputfilen til strekningen, se :meth:`arbeidsbok`.
+
+    Med et `mellomlager` legges rutenettet til hvert ark også på disk, med innholdet i arket som nøkkel. Neste gang
+    boken åpnes, for eksempel i en ny kjøring av FRAM, hentes arkene som ikke er endret, fra mellomlageret, uten at
+    filen åpnes med openpyxl. Se :class:`ArkMellomlager`.
+
+    Args:
+        filbane: Filbanen til Excel-boken
+        mellomlager: Mellomlageret for rutenettene. Defaulter til None, som ikke mellomlagrer på disk
+    """
+
+    def __init__(self, filbane: Union[Path, str], mellomlager: Optional[ArkMellomlager] = None):
+        self.filbane = Path(filbane)
+        self.mellomlager = mellomlager
+        self._wb = None
+        self._rutenett = {}
+        self._nokler = None
+        self._ryddet = False
+
+    def __fspath__(self):
+        return str(self.filbane)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        # Den åpne boken kan ikke pickles, men rutenettene som alt er lest, tas med
+        return {**self.__dict__, "_wb": None}
+
+    def _bok(self):
+        if self._wb is None:
+            self._wb = load_workbook(self.filbane, read_only=True, data_only=True, keep_links=False)
+        return self._wb
+
+    def close(self):
+        """Lukker filen. Ark som alt er lest, kan fortsatt leses, og nye ark åpner filen på nytt"""
+        if self._wb is not None:
+            self._wb.close()
+            self._wb = None
+
+    def _innholdsnokler(self) -> dict:
+        """Nøklene til arkene i mellomlageret, per arknavn, se :meth:`_arknokler`. Tom hvis filen ikke kan leses slik"""
+        if self._nokler is None:
+            self._nokler = _arknokler(self.filbane) or {}
+        return self._nokler
+
+    @property
+    def sheet_names(self) -> List[str]:
+        if self.mellomlager is not None and self._innholdsnokler():
+            return list(self._innholdsnokler())
+        return self._bok().sheetnames
+
+    def rutenett(self, ark: str) -> List[list]:
+        """Alle verdiene i arket, som en liste med like lange rader, konvertert som i `pd.read_excel`
+
+        Tomme celler blir "", feilverdier NaN og heltallige tall heltall. Tomme rader nederst er kuttet. Rutenettet
+        deles av alle innlesingene av arket, og skal ikke endres.
+        """
+        if ark not in self._rutenett:
+            nokkel = None
+            if self.mellomlager is not None:
+                nokkel = self._innholdsnokler().get(ark)
+            rutenett = None if nokkel is None else self.mellomlager.hent(nokkel)
+            if rutenett is None:
+                rutenett = self._tolk(ark)
+                if nokkel is not None:
+                    self.mellomlager.lagre(nokkel, rutenett)
+                    if not self._ryddet:
+                        self.mellomlager.rydd()
+                        self._ryddet = True
+            self._rutenett[ark] = rutenett
+        return self._rutenett[ark]
+
+    def _tolk(self, ark: str) -> List[list]:
+        """Tolker hele arket med openpyxl, se :meth:`rutenett`"""
+        if ark not in self.sheet_names:
+            raise ValueError(f"Worksheet named '{ark}' not found")
+        arket = self._bok()[ark]
+        arket.reset_dimensions()
+        rader = [[_celleverdi(celle) for celle in rad] for rad in arket.rows]
+        return _utsnitt(rader, None)
+
+    def les(
+        self,
+        ark: str,
+        skiprows: int = 0,
+        usecols=None,
+        nrows: Optional[int] = None,
+        index_col=None,
+        names: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """Tabellen i arket, som `pd.read_excel(filbane, sheet_name=ark, ...)` med de samme argumentene ville gitt"""
+        return tabell_fra_rutenett(
+            self.rutenett(ark),
+            skiprows=skiprows,
+            usecols=usecols,
+            nrows=nrows,
+            index_col=index_col,
+            names=names,
+        )
+
+
+# Arbeidsbøkene som er i bruk, slik at alle som leser fra samme fil, deler én bok
+_ARBEIDSBØKER = weakref.WeakValueDictionary()
+
+
+def arbeidsbok(
+    filbane: Union[Arbeidsbok, Path, str], cache_dir: Optional[Union[str, Path]] = None
+) -> Arbeidsbok:
+    """Arbeidsboken for filen, delt med alle andre som leser fra den samme filen mens boken er i bruk
+
+    Boken knyttes til filens innhold via endringstidspunkt og størrelse, slik at en fil som er endret, leses på nytt.
+    Arkene mellomlagres på disk i `cache_dir`, som defaulter til miljøvariabelen `FRAM_ARK_MELLOMLAGER`, eller
+    `~/.cache/fram/ark`, se :class:`ArkMellomlager`.
+    """
+    if isinstance(filbane, Arbeidsbok):
+        return filbane
+    filbane = Path(filbane).resolve()
+    mellomlager = ArkMellomlager(cache_dir)
+    status = filbane.stat()
+    nokkel = (str(filbane), status.st_mtime_ns, status.st_size, str(mellomlager.katalog))
+    bok = _ARBEIDSBØKER.get(nokkel)
+    if bok is None:
+        bok = Arbeidsbok(filbane, mellomlager=mellomlager)
+        _ARBEIDSBØKER[nokkel] = bok
+    return bok
+
+
+def les_excel(filbane: Union[Arbeidsbok, ExcelFile, Path, str], ark: str, **kwargs) -> pd.DataFrame:
+    """Leser arket `ark` som `pd.read_excel`. Er `filbane` en :class:`Arbeidsbok`, hentes tabellen fra rutenettet i boken"""
+    if isinstance(filbane, Arbeidsbok):
+        return filbane.les(ark, **kwargs)
+    return pd.read_excel(filbane, sheet_name=ark, **kwargs)
+
+
+def les_arkrutenett(filbane: Union[Arbeidsbok, Path, str], ark: str) -> List[list]:
+    """Alle verdiene i et Excel-ark, som en liste med rader, lest i én omgang
+
+    Se :meth:`Arbeidsbok.rutenett`. Tabeller hentes ut av rutenettet med :meth:`tabell_fra_rutenett`, uten at filen må
+    åpnes og arket tolkes på nytt for hver tabell. Er `filbane` en :class:`Arbeidsbok`, hentes rutenettet fra den.
+    """
+    if isinstance(filbane, Arbeidsbok):
+        return filbane.rutenett(ark)
+    with Arbeidsbok(filbane) as bok:
+        return bok.rutenett(ark)
+
+
+def tabell_fra_rutenett(
+    rutenett: List[list],
+    skiprows: int = 0,
+    usecols=None,
+    nrows: Optional[int] = None,
+    index_col=None,
+    names: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Tabellen i `rutenett` med overskrifter i rad `skiprows`, som `pd.read_excel` med de samme argumentene ville gitt
+
+    Benytter pandas' egen tolker, slik at kolonnenavn og datatyper blir de samme som ved å lese direkte fra filen.
+    """
+    # Som i pd.read_excel leses bare radene som trengs, og de kopieres, siden tolkeren kan endre dem
+    rader = _utsnitt(rutenett, None if nrows is None else skiprows + 1 + nrows)
+    if not rader:
+        return pd.DataFrame()
+    return TextParser(
+        rader,
+        header=0,
+        names=names,
+        index_col=index_col,
+        skiprows=skiprows,
+        usecols=_kolonneindekser(usecols),
+        nrows=nrows,
+        skip_blank_lines=False,
+    ).read(nrows=nrows)
 
 
 def les_inn_tankested(
-    filbane: Union[pd.ExcelFile, Path, str], logger: Callable = print
+    filbane: Union[Arbeidsbok, pd.ExcelFile, Path, str], logger: Callable = print
 ) -> Tuple[str, str]:
 
-    definisjon_df = pd.read_excel(
-        filbane, sheet_name="Definisjoner", usecols=[1], skiprows=3, nrows=2
+    definisjon_df = les_excel(
+        filbane, "Definisjoner", usecols=[1], skiprows=3, nrows=2
     )
 
     tankested = definisjon_df.iloc[0].values[0].lower()
@@ -45,8 +361,7 @@ def les_inn_bruttoliste_pakker_skip_lengder(filbane):
     """Leser inn en bruttoliste med alle mulige kombinasjoner av ruter, skipstyper og lengdegrupper til bruk i trafikkberegningene"""
     godkjent_rutekolonne = re.compile("Rute\d+")
     wide_rute_df = (
-        pd
-        .read_excel(filbane, sheet_name="Ruteoversikt")
+        les_excel(filbane, "Ruteoversikt")
         .loc[:, lambda df: [col for col in df.columns if col in ["Strekning", "Tiltaksomraade", "Analyseomraade", "Tiltakspakke"] or godkjent_rutekolonne.match(col)]]
         .dropna(how="all")
         .astype({
@@ -107,7 +422,7 @@ def _parse_strekning(strekning: Union[str, Path]):
         raise KeyError(f"'strekning' må være en 'xlsx'-fil, ikke {strekning.suffix}")
     return strekning
 
-def _fra_excel(filbane: Union[ExcelFile, Path, str], ark: str, **kwargs):
+def _fra_excel(filbane: Union[Arbeidsbok, ExcelFile, Path, str], ark: str, **kwargs):
     """
     Hjelpemetode for å lese inn et spesifikt ark i en excelbok. Alle ark som
     leses inn må ha kolonner trafikk_cols (Strekning, Tiltaksomrrade, Tiltakspakke
@@ -121,7 +436,7 @@ def _fra_excel(filbane: Union[ExcelFile, Path, str], ark: str, **kwargs):
         En dataframe med innlest data fra et bestemt ark i en bestemt excelbok som
     har indeks lik trafikk_cols.
     """
-    df = pd.read_excel(filbane, sheet_name=ark, **kwargs)
+    df = les_excel(filbane, ark, **kwargs)
     # håndterer duplikater, bør erstattes dersom mangle_dupe_cols implementeres
     for i in range(1, 10):
         df.columns = df.columns.map(
@@ -286,26 +601,36 @@ def _skriv_log_excel_forside(filepath, log, start_row=11, start_col=1):
         pass
 
 
+def _verdi_i_celle(rutenett: List[list], celle: str):
+    """Verdien i cellen, for eksempel 'B8', i rutenettet fra :meth:`les_arkrutenett`. Tomme celler er None"""
+    rad, kolonne = openpyxl.utils.cell.coordinate_to_tuple(celle)
+    try:
+        verdi = rutenett[rad - 1][kolonne - 1]
+    except IndexError:
+        return None
+    return None if verdi == "" else verdi
+
+
 def les_inn_ventetidssituasjoner_fra_excel(
-    filbane: Union[Path, str], tiltakspakke: int
+    filbane: Union[Arbeidsbok, Path, str], tiltakspakke: int
 ):
     ventetid_ref = []
     ventetid_tiltak = []
-    wb = load_workbook(filbane, data_only=True)
-    sheetnames = wb.sheetnames
-    for sheet in sheetnames:
+    filbane = arbeidsbok(filbane)
+    for sheet in filbane.sheet_names:
+        if "ventetid" not in sheet:
+            continue
+        rutenett = les_arkrutenett(filbane, sheet)
         if (
-            ("ventetid" in sheet)
-            & ("ref" in sheet)
-            & (str(wb[sheet]["B8"].value) == str(tiltakspakke))
+            ("ref" in sheet)
+            & (str(_verdi_i_celle(rutenett, "B8")) == str(tiltakspakke))
         ):  # Navnet på input-sheet for referansebanen må inneholde "ventetid" og "ref"
-            ventetid_ref.append([sheet, wb[sheet]["B10"].value])
+            ventetid_ref.append([sheet, _verdi_i_celle(rutenett, "B10")])
         elif (
-            ("ventetid" in sheet)
-            & ("tiltak" in sheet)
-            & (str(wb[sheet]["B8"].value) == str(tiltakspakke))
+            ("tiltak" in sheet)
+            & (str(_verdi_i_celle(rutenett, "B8")) == str(tiltakspakke))
         ):  # Navnet på input-sheet for tiltaksbanen må inneholde "ventetid" og "tiltak"
-            ventetid_tiltak.append([sheet, wb[sheet]["B10"].value])
+            ventetid_tiltak.append([sheet, _verdi_i_celle(rutenett, "B10")])
     ventetid_ref = pd.DataFrame(ventetid_ref, columns=["ark_ref", "Rute"])
     ventetid_tiltak = pd.DataFrame(ventetid_tiltak, columns=["ark_tiltak", "Rute"])
 
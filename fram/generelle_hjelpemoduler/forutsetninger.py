@@ -0,0 +1,211 @@
+"""
+Forutsetningene i Forutsetninger_FRAM.xlsx, tolket én gang
+
+:class:`Forutsetninger` er et register med verdiene i arket "Forutsetninger", og tabellene i de arkene som leses med
+:meth:`~fram.generelle_hjelpemoduler.hjelpefunksjoner.forut`, med datatypene i FORUTSETNINGSTYPER. Registeret bygges fra
+Excel-boken første gang det trengs, og lagres som ett øyeblikksbilde i mellomlageret, med en hash av boken som nøkkel.
+Neste gang FRAM importeres, hentes hele registeret fra én fil, uten at boken åpnes. Endres boken, bygges registeret på
+nytt.
+
+Mellomlageret ligger i katalogen angitt med miljøvariabelen `FRAM_FORUTSETNINGER_MELLOMLAGER`, eller under
+`~/.cache/fram/forutsetninger` hvis den ikke er satt. Se :mod:`~fram.generelle_hjelpemoduler.mellomlagring`.
+"""
+import functools
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import pandas as pd
+
+from fram.generelle_hjelpemoduler.excel import arbeidsbok, les_excel
+from fram.generelle_hjelpemoduler.konstanter import FRAM_DIRECTORY
+from fram.generelle_hjelpemoduler.mellomlagring import Mellomlager, mellomlagerkatalog
+
+FORUTSETNINGSFIL = FRAM_DIRECTORY / "Forutsetninger_FRAM.xlsx"
+FORUTSETNINGER_MILJOVARIABEL = "FRAM_FORUTSETNINGER_MELLOMLAGER"
+FORUTSETNINGER_MAKS_STORRELSE_BYTES = 50_000_000
+# Økes når innholdet i registeret endres, slik at gamle øyeblikksbilder ikke lenger treffes
+FORUTSETNINGER_VERSJON = 2
+# Tabellene FRAM leser med forut, som arknavn og antall kolonner etter kolonne A. Disse bygges inn i øyeblikksbildet,
+# mens andre tabeller leses fra boken første gang de etterspørres
+FORUTSETNINGSTABELLER = [
+    ("Forutsetninger", 5),
+    ("BNP per innbygger", 5),
+    ("kalkpriser_helse", 2),
+    ("blokkoeffisient", 4),
+    ("Virkningsgrad", 4),
+    ("Drivstoffeffektivisering", 10),
+    ("Drivstoffpriser", 7),
+    ("Drivstoffmiks", 13),
+    ("Utslippluft", 3),
+    ("aisyrisk_skipstypekonvertering", 5),
+    ("aisyrisk_lengdekonvertering", 4),
+    ("kalkpris_materiell_koll", 6),
+    ("kalkpris_materiell_grunn", 6),
+    ("kalkpris_materiell_kontakt", 6),
+    ("kalkpris_vedlikehold", 5),
+    ("kalkpris_oppgradering", 9),
+    ("Forurensede sedimenter", 4),
+    ("Befolkning kommune", 2),
+]
+TALL = "float64"
+HELTALL = "int64"
+# Tekst, eller en blanding av tekst og tall
+TEKST = "object"
+# Datatypen til hver navngitte kolonne i tabellene i FORUTSETNINGSTABELLER. Tabellene gjøres om til disse datatypene
+# når registeret bygges, slik at en bok med manglende kolonner eller tekst der det skal være tall gir feil med en gang,
+# og ikke midt i en beregning
+FORUTSETNINGSTYPER: Dict[str, Dict[Any, str]] = {
+    "Forutsetninger": {"Variabel": TEKST, "Verdi": TALL, "Kilde": TEKST, "Forklaring": TEKST},
+    "BNP per innbygger": {"aar": HELTALL, "realpris": TALL},
+    "kalkpriser_helse": {"Variabel": TEKST, "Input": HELTALL, "Kroneverdi": HELTALL},
+    "blokkoeffisient": {"Skipstype": TEKST, "Gammel_skipstype": TEKST, "Lengdegruppe": TEKST, "skrogform": TALL},
+    "Virkningsgrad": {"Drivstofftype": TEKST, "Alder": TEKST, "kW": TEKST, "Virkningsgrad": TALL},
+    "Drivstoffeffektivisering": {
+        "Variabel": TEKST, "Skipstype": TEKST, "0-30": TALL, "30-70": TALL, "70-100": TALL, "100-150": TALL,
+        "150-200": TALL, "200-250": TALL, "250-300": TALL, "300-": TALL,
+    },
+    "Drivstoffpriser": {
+        "Skipstype": TEKST, "Lengdegruppe": TEKST, "gammel lengdegruppe": TEKST, "Sted": TEKST, "Drivstofftype": TEKST,
+        2018: TALL, 2050: TALL, "Kroneverdi": HELTALL,
+    },
+    "Drivstoffmiks": {
+        "Skipstype": TEKST, "Drivstofftype kategori 1": TEKST, "Drivstofftype kategori 2": TEKST, "År": HELTALL,
+        "Modus": TEKST, "Område": TEKST, "0-30 m": TALL, "30-70 m": TALL, "70-100 m": TALL, "100-150 m": TALL,
+        "150-200 m": TALL, "200-250 m": TALL, "250-300 m": TALL, "300 m -": TALL,
+    },
+    "Utslippluft": {"Type": TEKST, "År": TALL, "Drivstofftype": TEKST, "kg/enhet": TALL},
+    "aisyrisk_skipstypekonvertering": {
+        "risk_norwegian_main_vessel_category_id": HELTALL, "risk_norwegian_main_vessel_category_name": TEKST,
+        "Skipstype": TEKST, "count": HELTALL, "Total_per_aisyrisk_gruppe": HELTALL, "Vekt": TALL,
+    },
+    "aisyrisk_lengdekonvertering": {
+        "gt_gruppe_id": HELTALL, "Lengdegruppe": TEKST, "count": HELTALL, "Total_per_aisyrisk_gruppe": HELTALL,
+        "Vekt": TALL,
+    },
+    "kalkpris_materiell_koll": {
+        "Skipstype": TEKST, "Lengdegruppe": TEKST, "Gammel_lendegruppe": TEKST, "Gammel_skipstype": TEKST,
+        "Reparasjonskostnader": TALL, "tid_u_drift": HELTALL, "Kroneverdi repkostnader": HELTALL,
+    },
+    "kalkpris_materiell_grunn": {
+        "Skipstype": TEKST, "Lengdegruppe": TEKST, "Gammel_lendegruppe": TEKST, "Gammel_skipstype": TEKST,
+        "Reparasjonskostnader": TALL, "tid_u_drift": HELTALL, "Kroneverdi repkostnader": HELTALL,
+    },
+    "kalkpris_materiell_kontakt": {
+        "Skipstype": TEKST, "Lengdegruppe": TEKST, "Gammel_lendegruppe": TEKST, "Gammel_skipstype": TEKST,
+        "Reparasjonskostnader": TALL, "tid_u_drift": HELTALL, "Kroneverdi repkostnader": HELTALL,
+    },
+    "kalkpris_vedlikehold": {
+        "Objektklasse": TEKST, "Objekttype": TEKST, "Materiell": TALL, "Arbeid": TALL, "Total": TALL,
+        "Antall objekt": TALL,
+    },
+    "kalkpris_oppgradering": {
+        "Objektklasse": TEKST, "Objekttype": TEKST, "Objektkomponent": TEKST, "Sammensatt": TEKST, "Materiell": TALL,
+        "Arbeid": TALL, "Total": TALL, "Kroneverdi": HELTALL, "TG0->TG2": HELTALL, "TG1->TG2": HELTALL,
+    },
+    "Forurensede sedimenter": {
+        "tilstand_før": TEKST, "tilstand_etter": TEKST, "Areal (1000 m2)": TEKST, "verdsettingsfaktor_navn": TEKST,
+        "verdsettingsfaktor_tall": HELTALL,
+    },
+    "Befolkning kommune": {"komm_nr": HELTALL, "komm_navn": TEKST, "personer_2019": HELTALL},
+}
+
+
+def _med_datatyper(tabell: pd.DataFrame, ark: str) -> pd.DataFrame:
+    """Tabellen med datatypene i FORUTSETNINGSTYPER. Gir ValueError hvis en kolonne mangler eller ikke kan gjøres om"""
+    datatyper = FORUTSETNINGSTYPER.get(ark, {})
+    mangler = [kolonne for kolonne in datatyper if kolonne not in tabell.columns]
+    if mangler:
+        raise ValueError(f"Arket {ark} i forutsetningsboken mangler kolonnene {mangler}")
+    try:
+        return tabell.astype(datatyper)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Arket {ark} i forutsetningsboken har en kolonne med feil datatype: {e}") from e
+
+
+def _filnokkel(filbane: Path) -> str:
+    """Hash av innholdet i filen, sammen med versjonen av registeret og av pandas, som tabellene pickles med"""
+    hasher = hashlib.sha256(f"{FORUTSETNINGER_VERSJON}\x1f{pd.__version__}\x1f".encode("utf-8"))
+    with open(filbane, "rb") as f:
+        for blokk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(blokk)
+    return hasher.hexdigest()
+
+
+class Forutsetninger:
+    """Register med forutsetningene i en forutsetningsbok, se :meth:`forutsetninger`
+
+    Tabellene har datatypene i FORUTSETNINGSTYPER, og verdiene er tall.
+
+    Args:
+        filbane: Forutsetningsboken registeret er bygget fra
+        verdier: Verdien til hver variabel i arket "Forutsetninger"
+        tabeller: Tabellene som er lest, per arknavn og antall kolonner, som :meth:`tabell` gir kopier av
+    """
+
+    def __init__(
+        self,
+        filbane: Union[str, Path],
+        verdier: Dict[str, float],
+        tabeller: Dict[Tuple[str, int], pd.DataFrame],
+    ):
+        self.filbane = Path(filbane)
+        self.verdier = verdier
+        self._tabeller = tabeller
+
+    @classmethod
+    def fra_excel(cls, filbane: Union[str, Path] = FORUTSETNINGSFIL) -> "Forutsetninger":
+        """Bygger registeret ved å lese verdiene og alle tabellene i FORUTSETNINGSTABELLER fra boken"""
+        bok = arbeidsbok(filbane)
+        tabeller = {
+            (ark, antall_kolonner): les_excel(bok, ark, usecols=list(range(antall_kolonner + 1))).pipe(
+                _med_datatyper, ark
+            )
+            for ark, antall_kolonner in FORUTSETNINGSTABELLER
+        }
+        forutsetninger = tabeller[("Forutsetninger", 5)]
+        verdier = {
+            variabel: float(verdi) for variabel, verdi in zip(forutsetninger["Variabel"], forutsetninger["Verdi"])
+        }
+        return cls(filbane, verdier, tabeller)
+
+    def verdi(self, variabel: str) -> float:
+        """Verdien til `variabel` i arket "Forutsetninger". Gir KeyError hvis den ikke finnes"""
+        if variabel not in self.verdier:
+            raise KeyError(f"Finner ikke {variabel} under forutsetninger")
+        return self.verdier[variabel]
+
+    def tabell(self, ark: str, antall_kolonner: int = 5) -> pd.DataFrame:
+        """Tabellen i arket med kolonne A og `antall_kolonner` kolonner til, som en kopi som kan endres fritt"""
+        nokkel = (ark, antall_kolonner)
+        if nokkel not in self._tabeller:
+            self._tabeller[nokkel] = les_excel(
+                arbeidsbok(self.filbane), ark, usecols=list(range(antall_kolonner + 1))
+            ).pipe(_med_datatyper, ark)
+        return self._tabeller[nokkel].copy()
+
+
+@functools.lru_cache(maxsize=3)
+def forutsetninger(
+    filbane: Union[str, Path] = FORUTSETNINGSFIL, cache_dir: Optional[Union[str, Path]] = None
+) -> Forutsetninger:
+    """Registeret for forutsetningsboken, fra øyeblikksbildet i mellomlageret hvis boken ikke er endret siden sist
+
+    Bygges og lagres ellers på nytt med :meth:`Forutsetninger.fra_excel`. Registeret deles av alle i prosessen.
+
+    Args:
+        filbane: Forutsetningsboken. Defaulter til Forutsetninger_FRAM.xlsx i FRAM
+        cache_dir: Katalogen for mellomlageret. Defaulter til miljøvariabelen `FRAM_FORUTSETNINGER_MELLOMLAGER`, eller
+            `~/.cache/fram/forutsetninger`
+    """
+    if cache_dir is None:
+        cache_dir = mellomlagerkatalog(FORUTSETNINGER_MILJOVARIABEL, "forutsetninger")
+    mellomlager = Mellomlager(cache_dir, FORUTSETNINGER_MAKS_STORRELSE_BYTES)
+    nokkel = _filnokkel(Path(filbane))
+    registeret = mellomlager.hent(nokkel)
+    if registeret is None:
+        registeret = Forutsetninger.fra_excel(filbane)
+        mellomlager.lagre(nokkel, registeret)
+        mellomlager.rydd()
+    registeret.filbane = Path(filbane)
+    return registeret
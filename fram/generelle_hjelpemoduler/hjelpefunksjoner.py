@@ -1,5 +1,6 @@
 import functools
-from typing import Union, Any, List
+import sys
+from typing import Union, Any, Callable, Dict, List
 
 import numpy as np
 import pandas as pd
@@ -8,6 +9,8 @@ from openpyxl import workbook, worksheet
 from openpyxl.utils.dataframe import dataframe_to_rows
 from pandas import DataFrame
 
+from fram.generelle_hjelpemoduler.excel import Arbeidsbok, arbeidsbok
+from fram.generelle_hjelpemoduler.forutsetninger import forutsetninger
 from fram.generelle_hjelpemoduler.konstanter import (
     VERDSATT_COLS,
     ALLE,
@@ -191,9 +194,9 @@ def get_lengdegruppe(lengde):
 
 
 @functools.lru_cache(maxsize=3)
-def forutsetninger_soa():
-    """Hjelpemetode for å cache en Excel-fil vi leser mange ganger"""
-    return pd.ExcelFile(FRAM_DIRECTORY / "Forutsetninger_FRAM.xlsx")
+def forutsetninger_soa() -> Arbeidsbok:
+    """Hjelpemetode for å cache en Excel-fil vi leser mange ganger. Arkene mellomlagres også på disk, se :class:`~fram.generelle_hjelpemoduler.excel.Arbeidsbok`"""
+    return arbeidsbok(FRAM_DIRECTORY / "Forutsetninger_FRAM.xlsx")
 
 
 def forut(sheet: str, antall_kolonner: int = 5):
@@ -209,13 +212,11 @@ def forut(sheet: str, antall_kolonner: int = 5):
 
     Returns:
         DataFrame: Returnerer en dataframe med informasjon fra forutsetningsboken.
+
+    Tabellen hentes fra registeret over forutsetninger, som bare tolker boken én gang, se
+    :mod:`~fram.generelle_hjelpemoduler.forutsetninger`.
     """
-    inputdata = pd.read_excel(
-        forutsetninger_soa(),
-        sheet_name=sheet,
-        usecols=list(range(antall_kolonner + 1)),
-    )
-    return inputdata
+    return forutsetninger().tabell(sheet, antall_kolonner)
 
 
 def get_forut_verdi(variabel: str) -> float:
@@ -236,13 +237,33 @@ def get_forut_verdi(variabel: str) -> float:
         Verdi for spesifisert variabel.
     """
 
-    FORUTSETNINGER = dict(
-        zip(forut("Forutsetninger")["Variabel"], forut("Forutsetninger")["Verdi"])
-    )
+    return forutsetninger().verdi(variabel)
+
+
+def lat_referansedata(
+    modulnavn: str, referansedata: Dict[str, Callable[[], Any]]
+) -> Callable[[str], Any]:
+    """
+    Lager en `__getattr__` for modulen `modulnavn`, slik at referansedata fra forutsetningsboken leses først når de brukes,
+    og ikke når modulen importeres. Verdien settes på modulen første gang den hentes, slik at senere oppslag gir det
+    samme objektet uten å gå via `__getattr__`, som en vanlig konstant.
+
+    Args:
+        modulnavn: Navnet på modulen, typisk `__name__`
+        referansedata: Funksjon som henter verdien, per navn i modulen
+
+    Returns:
+        Funksjon som settes som `__getattr__` i modulen
+    """
+
+    def __getattr__(navn: str):
+        if navn not in referansedata:
+            raise AttributeError(f"module {modulnavn!r} has no attribute {navn!r}")
+        verdi = referansedata[navn]()
+        setattr(sys.modules[modulnavn], navn, verdi)
+        return verdi
 
-    if variabel not in FORUTSETNINGER.keys():
-        raise KeyError(f"Finner ikke {variabel} under forutsetninger")
-    return FORUTSETNINGER[variabel]
+    return __getattr__
 
 
 def _multiply_df_with_col(df, column):
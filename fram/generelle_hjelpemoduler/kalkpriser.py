@@ -4,17 +4,30 @@ from typing import Optional
 import numpy as np
 import pandas as pd
 
-from fram.generelle_hjelpemoduler.hjelpefunksjoner import forut, get_forut_verdi
+from fram.generelle_hjelpemoduler.hjelpefunksjoner import forut, get_forut_verdi, lat_referansedata
 
-KRONEAAR = int(get_forut_verdi("Kroneår"))
-REALPRISVEKST = get_forut_verdi("Realprisvekst")
-PERSONSKADER = forut("kalkpriser_helse", 2)
+# KRONEAAR, REALPRISVEKST og PERSONSKADER leses fra forutsetningsboken først når de brukes
+__getattr__ = lat_referansedata(
+    __name__,
+    {
+        "KRONEAAR": lambda: int(get_forut_verdi("Kroneår")),
+        "REALPRISVEKST": lambda: get_forut_verdi("Realprisvekst"),
+        "PERSONSKADER": lambda: forut("kalkpriser_helse", 2),
+    },
+)
 
 
 def get_vekstfaktor(
-    aar: int, kroneaar: int = KRONEAAR, realprisvekst: int = REALPRISVEKST,
+    aar: int, kroneaar: Optional[int] = None, realprisvekst: Optional[float] = None,
 ):
-    """Hjelpemetode for å regne ut vekstfaktoren som behøves for å realprisjustere til et gitt fremtidsår"""
+    """Hjelpemetode for å regne ut vekstfaktoren som behøves for å realprisjustere til et gitt fremtidsår
+
+    Kroneår og realprisvekst hentes fra forutsetningsboken hvis de ikke er angitt.
+    """
+    if kroneaar is None:
+        kroneaar = int(get_forut_verdi("Kroneår"))
+    if realprisvekst is None:
+        realprisvekst = get_forut_verdi("Realprisvekst")
     if aar <= kroneaar:
         return 0
     elif aar <= 2060:
@@ -24,7 +37,7 @@ def get_vekstfaktor(
 
 
 def realprisjustering_kalk(
-    belop: float, utgangsaar: int, tilaar: int = KRONEAAR,
+    belop: float, utgangsaar: int, tilaar: Optional[int] = None,
 ):
     """
     Realprisjusterer 'belop' fra 'utgangsaar' til 'tilaar'
@@ -40,6 +53,8 @@ def realprisjustering_kalk(
     En float med realprisjustert belop.
     """
 
+    if tilaar is None:
+        tilaar = int(get_forut_verdi("Kroneår"))
     REALPRIS = dict(
         zip(forut("BNP per innbygger")["aar"], forut("BNP per innbygger")["realpris"])
     )
@@ -73,7 +88,7 @@ def prisjustering(belop: float, utgangsaar: int, tilaar: Optional[int] = None):
     """
 
     if tilaar is None:
-        tilaar = KRONEAAR
+        tilaar = int(get_forut_verdi("Kroneår"))
     if not isinstance(utgangsaar, int):
         raise ValueError("utgangsaar må være et integer")
     if not utgangsaar <= tilaar:
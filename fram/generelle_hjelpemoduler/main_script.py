@@ -19,7 +19,7 @@ def main(
     ),
     les_RA_paa_nytt: bool = typer.Option(
         False,
-        help="Hvorvidt du vil tvinge at den skal lese RA på nytt selv om den finner en ferdiginnlest ra json-fil",
+        help="Hvorvidt du vil tvinge at den skal lese alle RA på nytt selv om de finnes i mellomlageret",
     ),
     trafikkgrunnlagsaar: int = typer.Option(
         2019, help="Hvilket år du har trafikkgrunnlag i"
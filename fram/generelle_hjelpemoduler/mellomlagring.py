@@ -0,0 +1,117 @@
+"""
+Felles mellomlager på disk, med én fil per nøkkel
+
+Filene skrives først til en midlertidig fil og flyttes deretter på plass, slik at flere prosesser kan skrive til
+mellomlageret samtidig uten å ødelegge for hverandre. Hver gang en fil hentes, markeres den som brukt. Filer som ikke er
+brukt på `maks_alder_dager` dager slettes ved opprydding, og blir mellomlageret større enn `maks_storrelse_bytes`,
+slettes de som har stått lengst ubrukt.
+
+Benyttes av mellomlageret for ventetidssimuleringer, se
+:class:`~fram.virkninger.ventetid.mellomlagring.VentetidMellomlager`, og av mellomlageret for innleste Excel-ark, se
+:class:`~fram.generelle_hjelpemoduler.excel.ArkMellomlager`.
+"""
+import os
+import pickle
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional, Union
+
+MAKS_ALDER_DAGER = 90
+
+
+def mellomlagerkatalog(miljovariabel: str, navn: str) -> Path:
+    """Katalogen fra miljøvariabelen `miljovariabel`, ellers `~/.cache/fram/<navn>`"""
+    katalog = os.environ.get(miljovariabel)
+    if katalog:
+        return Path(katalog)
+    return Path.home() / ".cache" / "fram" / navn
+
+
+class Mellomlager:
+    """Mellomlager med én pickle-fil per nøkkel, i undermapper etter de to første tegnene i nøkkelen
+
+    Objektet holder bare på katalogen og grensene, og kan derfor sendes til andre prosesser. Antall treff og antall
+    nøkler som ikke fantes, telles i `antall_treff` og `antall_bom`.
+
+    Args:
+        katalog: Hvor filene skal ligge
+        maks_storrelse_bytes: Samlet størrelse mellomlageret ryddes ned til
+        maks_alder_dager: Filer som ikke er brukt på så mange dager, slettes ved opprydding
+    """
+
+    def __init__(
+        self,
+        katalog: Union[str, Path],
+        maks_storrelse_bytes: int,
+        maks_alder_dager: float = MAKS_ALDER_DAGER,
+    ):
+        self.katalog = Path(katalog)
+        self.maks_storrelse_bytes = maks_storrelse_bytes
+        self.maks_alder_dager = maks_alder_dager
+        self.antall_treff = 0
+        self.antall_bom = 0
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.katalog})"
+
+    def _fil(self, nokkel: str) -> Path:
+        return self.katalog / nokkel[:2] / f"{nokkel}.pkl"
+
+    def hent(self, nokkel: str) -> Optional[Any]:
+        """Henter det som er mellomlagret under nøkkelen, eller None hvis det ikke finnes eller ikke kan leses"""
+        fil = self._fil(nokkel)
+        try:
+            with open(fil, "rb") as f:
+                verdi = pickle.load(f)
+            # Markerer filen som brukt, slik at den ikke ryddes bort
+            os.utime(fil)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            self.antall_bom += 1
+            return None
+        self.antall_treff += 1
+        return verdi
+
+    def lagre(self, nokkel: str, verdi: Any):
+        """Skriver verdien til en midlertidig fil, og flytter den på plass når den er ferdig skrevet"""
+        fil = self._fil(nokkel)
+        fil.parent.mkdir(parents=True, exist_ok=True)
+        fd, midlertidig = tempfile.mkstemp(dir=fil.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(verdi, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(midlertidig, fil)
+        except BaseException:
+            Path(midlertidig).unlink(missing_ok=True)
+            raise
+
+    def rydd(self) -> int:
+        """Sletter filer som er for gamle, og deretter de eldste til mellomlageret er under maksimal størrelse
+
+        Returnerer antall slettede filer. Filer som en annen prosess sletter eller skriver samtidig, hoppes over.
+        """
+        if not self.katalog.exists():
+            return 0
+        grense = time.time() - self.maks_alder_dager * 24 * 60 * 60
+        filer = []
+        for fil in self.katalog.glob("*/*"):
+            try:
+                status = fil.stat()
+            except OSError:
+                continue
+            # Midlertidige filer er under skriving, med mindre de er gamle
+            if fil.suffix == ".pkl" or status.st_mtime < grense:
+                filer.append((status.st_mtime, status.st_size, fil))
+
+        slettet = 0
+        total_storrelse = sum(storrelse for _, storrelse, _ in filer)
+        for brukt, storrelse, fil in sorted(filer):
+            if brukt >= grense and total_storrelse <= self.maks_storrelse_bytes:
+                break
+            try:
+                fil.unlink()
+            except OSError:
+                continue
+            total_storrelse -= storrelse
+            slettet += 1
+        return slettet
@@ -1,7 +1,15 @@
 import pandas as pd
 import pytest
+from openpyxl import Workbook
 
-from fram.generelle_hjelpemoduler.excel import les_inn_bruttoliste_pakker_skip_lengder
+from fram.generelle_hjelpemoduler import excel
+from fram.generelle_hjelpemoduler.excel import (
+    Arbeidsbok,
+    ArkMellomlager,
+    arbeidsbok,
+    les_excel,
+    les_inn_bruttoliste_pakker_skip_lengder,
+)
 from tests.felles import inputmappe as eksempel_inputmappe, testinputfiler
 
 strekningsfiler = [fil for fil in eksempel_inputmappe.glob("*.xlsx") if not 'fram 3_5' in fil.name]
@@ -22,3 +30,68 @@ def test_ruteinnlesing(fil):
     rutedf = les_inn_bruttoliste_pakker_skip_lengder(fil)
     fasit = pd.read_pickle(fasitfil(navn))
     pd.testing.assert_frame_equal(rutedf, fasit)
+
+
+@pytest.mark.parametrize(
+    "ark, kwargs",
+    [
+        ("Ruteoversikt", {}),
+        ("Definisjoner", dict(usecols=[1], skiprows=3, nrows=2)),
+        ("Trafikkgrunnlag", dict(usecols="A:C,E", nrows=3)),
+        ("Trafikkgrunnlag", dict(index_col=0, skiprows=1)),
+        ("Ruteoversikt", dict(usecols=[0, 1], names=["a", "b"])),
+    ],
+)
+def test_arbeidsbok_gir_det_samme_som_filen(ark, kwargs):
+    fil = strekningsfiler[0]
+    bok = arbeidsbok(fil)
+    # Første innlesing tolker arket, andre hentes fra minnet
+    for _ in range(2):
+        pd.testing.assert_frame_equal(
+            les_excel(bok, ark, **kwargs), pd.read_excel(fil, sheet_name=ark, **kwargs)
+        )
+    assert list(bok._rutenett) == [ark]
+    # Alle som leser fra filen, deler boken mens den er i bruk
+    assert arbeidsbok(str(fil)) is bok
+
+
+def _lag_bok(fil, tall):
+    wb = Workbook()
+    for ark, faktor in [("Første", 1), ("Andre", tall)]:
+        arket = wb.create_sheet(ark)
+        arket.append(["Skipstype", "Verdi"])
+        for i in range(3):
+            arket.append([f"Skip {i}", i * faktor])
+    del wb["Sheet"]
+    wb.save(fil)
+
+
+def test_arbeidsbok_mellomlagrer_uendrede_ark_paa_disk(tmp_path, monkeypatch):
+    fil = tmp_path / "bok.xlsx"
+    _lag_bok(fil, tall=2)
+    mellomlager = ArkMellomlager(tmp_path / "ark")
+    for ark in ["Første", "Andre"]:
+        pd.testing.assert_frame_equal(
+            Arbeidsbok(fil, mellomlager).les(ark), pd.read_excel(fil, sheet_name=ark)
+        )
+
+    # Neste gang hentes arkene fra mellomlageret, uten at filen åpnes med openpyxl
+    def ikke_apne(*args, **kwargs):
+        raise AssertionError("Filen skulle ikke vært åpnet")
+
+    with monkeypatch.context() as m:
+        m.setattr(excel, "load_workbook", ikke_apne)
+        mellomlager = ArkMellomlager(tmp_path / "ark")
+        bok = Arbeidsbok(fil, mellomlager)
+        assert bok.sheet_names == ["Første", "Andre"]
+        for ark in ["Første", "Andre"]:
+            pd.testing.assert_frame_equal(bok.les(ark), pd.read_excel(fil, sheet_name=ark))
+        assert (mellomlager.antall_treff, mellomlager.antall_bom) == (2, 0)
+
+    # Endres tallene i ett ark, leses bare det arket på nytt
+    _lag_bok(fil, tall=3)
+    mellomlager = ArkMellomlager(tmp_path / "ark")
+    bok = Arbeidsbok(fil, mellomlager)
+    for ark in ["Første", "Andre"]:
+        pd.testing.assert_frame_equal(bok.les(ark), pd.read_excel(fil, sheet_name=ark))
+    assert (mellomlager.antall_treff, mellomlager.antall_bom) == (1, 1)
@@ -0,0 +1,84 @@
+import shutil
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from fram.generelle_hjelpemoduler.forutsetninger import (
+    FORUTSETNINGSFIL,
+    FORUTSETNINGSTABELLER,
+    FORUTSETNINGSTYPER,
+    Forutsetninger,
+    forutsetninger,
+)
+from fram.generelle_hjelpemoduler.hjelpefunksjoner import forut, get_forut_verdi
+
+
+@pytest.mark.parametrize("ark, antall_kolonner", FORUTSETNINGSTABELLER)
+def test_forut_gir_det_samme_som_boken(ark, antall_kolonner):
+    pd.testing.assert_frame_equal(
+        forut(ark, antall_kolonner),
+        pd.read_excel(
+            FORUTSETNINGSFIL, sheet_name=ark, usecols=list(range(antall_kolonner + 1))
+        ),
+    )
+
+
+def test_forut_verdi_og_kopier():
+    forutsetningsark = pd.read_excel(
+        FORUTSETNINGSFIL, sheet_name="Forutsetninger", usecols=list(range(6))
+    ).set_index("Variabel")
+    assert get_forut_verdi("Kroneår") == forutsetningsark.loc["Kroneår", "Verdi"]
+    with pytest.raises(KeyError):
+        get_forut_verdi("Finnes ikke")
+
+    # Tabellene er kopier, slik at endringer ikke når andre som leser den samme tabellen
+    tabell = forut("Forutsetninger")
+    tabell.loc[:, "Verdi"] = 0
+    assert get_forut_verdi("Kroneår") != 0
+    assert (forut("Forutsetninger")["Verdi"] != 0).any()
+
+
+def test_registeret_hentes_fra_mellomlageret_til_boken_endres(tmp_path, monkeypatch):
+    bok = tmp_path / "Forutsetninger.xlsx"
+    shutil.copy(FORUTSETNINGSFIL, bok)
+    forste = forutsetninger(bok, cache_dir=tmp_path / "mellomlager")
+    assert len(list((tmp_path / "mellomlager").glob("*/*.pkl"))) == 1
+
+    # Et nytt register for den samme boken hentes fra mellomlageret, uten at boken leses
+    def ikke_les(*args, **kwargs):
+        raise AssertionError("Boken skulle ikke vært lest")
+
+    forutsetninger.cache_clear()
+    with monkeypatch.context() as m:
+        m.setattr(Forutsetninger, "fra_excel", ikke_les)
+        andre = forutsetninger(bok, cache_dir=tmp_path / "mellomlager")
+    assert andre is not forste
+    assert andre.verdi("Kroneår") == forste.verdi("Kroneår")
+
+    # Endres boken, bygges registeret på nytt. Formlene erstattes med verdiene, siden openpyxl ikke lagrer dem
+    wb = load_workbook(bok, data_only=True)
+    wb["Forutsetninger"]["A1"].value = wb["Forutsetninger"]["A1"].value
+    wb.save(bok)
+    forutsetninger.cache_clear()
+    forutsetninger(bok, cache_dir=tmp_path / "mellomlager")
+    assert len(list((tmp_path / "mellomlager").glob("*/*.pkl"))) == 2
+    forutsetninger.cache_clear()
+
+
+def test_tabellene_har_de_angitte_datatypene(tmp_path):
+    registeret = Forutsetninger.fra_excel()
+    for ark, antall_kolonner in FORUTSETNINGSTABELLER:
+        tabell = registeret.tabell(ark, antall_kolonner)
+        for kolonne, datatype in FORUTSETNINGSTYPER[ark].items():
+            assert tabell[kolonne].dtype == datatype, (ark, kolonne)
+    assert all(isinstance(verdi, float) for verdi in registeret.verdier.values())
+
+    # Tekst der det skal være tall gir feil når registeret bygges. Formlene erstattes med verdiene, som over
+    bok = tmp_path / "Forutsetninger.xlsx"
+    shutil.copy(FORUTSETNINGSFIL, bok)
+    wb = load_workbook(bok, data_only=True)
+    wb["kalkpriser_helse"]["B2"].value = "mange"
+    wb.save(bok)
+    with pytest.raises(ValueError, match="kalkpriser_helse"):
+        Forutsetninger.fra_excel(bok)
@@ -0,0 +1,82 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PAKKEROT = Path(__file__).parent.parent.parent
+# Kommandolinjeverktøyet skal starte uten å laste inn modellen. Før importene ble gjort late, tok det over ett sekund
+IMPORTTID_BUDSJETT_SEKUNDER = 0.5
+
+
+def _importer(kode: str) -> str:
+    """Kjører koden i en ny Python-prosess, slik at ingenting er importert fra før, og returnerer det som skrives ut"""
+    resultat = subprocess.run(
+        [sys.executable, "-c", kode], cwd=PAKKEROT, capture_output=True, text=True, check=True
+    )
+    return resultat.stdout.strip()
+
+
+def test_kommandolinjen_importerer_ikke_modellen():
+    lastet = _importer(
+        "import sys\n"
+        "import fram.generelle_hjelpemoduler.main_script\n"
+        "print(sorted(m for m in ['fram.modell', 'fram.virkninger', 'pandas', 'pandera', 'openpyxl', 'numba'] "
+        "if m in sys.modules))"
+    )
+    assert lastet == "[]"
+
+
+def test_kommandolinjen_starter_innenfor_budsjettet():
+    # Beste av tre, for å ikke feile på en tilfeldig treg kjøring
+    tider = [
+        float(
+            _importer(
+                "import time\n"
+                "start = time.perf_counter()\n"
+                "import fram.generelle_hjelpemoduler.main_script\n"
+                "print(time.perf_counter() - start)"
+            )
+        )
+        for _ in range(3)
+    ]
+    assert min(tider) < IMPORTTID_BUDSJETT_SEKUNDER
+
+
+def test_modellen_leser_ikke_referansedata_ved_import():
+    lastet = _importer(
+        "import sys\n"
+        "import fram.modell\n"
+        "from fram.generelle_hjelpemoduler.forutsetninger import forutsetninger\n"
+        "print(forutsetninger.cache_info().currsize, 'numba' in sys.modules)"
+    )
+    assert lastet == "0 False"
+
+
+@pytest.mark.parametrize(
+    "navn", ["FRAM", "Drivstoff", "Risiko", "Ventetid", "main_script", "__version__"]
+)
+def test_navnene_i_pakken_er_tilgjengelige(navn):
+    import fram
+
+    assert navn in dir(fram)
+    assert getattr(fram, navn) is not None
+
+
+def test_referansedata_kan_fortsatt_importeres():
+    from fram.generelle_hjelpemoduler.kalkpriser import KRONEAAR
+    from fram.generelle_hjelpemoduler.hjelpefunksjoner import get_forut_verdi
+
+    assert KRONEAAR == int(get_forut_verdi("Kroneår"))
+    with pytest.raises(AttributeError):
+        from fram.generelle_hjelpemoduler import kalkpriser
+
+        kalkpriser.FINNES_IKKE
+
+
+def test_referansedata_leses_bare_en_gang():
+    from fram.virkninger.risiko.hjelpemoduler import aisyrisk
+
+    forste = aisyrisk.SKIPSTYPE_OVERSETTER
+    assert aisyrisk.SKIPSTYPE_OVERSETTER is forste
+    assert "SKIPSTYPE_OVERSETTER" in vars(aisyrisk)
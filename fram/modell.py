@@ -19,6 +19,7 @@ from fram.generelle_hjelpemoduler.excel import (
     _fra_excel,
     _fyll_ut_fra_alle,
     _lag_excel_forside,
+    les_excel,
 )
 from fram.generelle_hjelpemoduler.hjelpefunksjoner import (
     lag_kontantstrom,
@@ -51,7 +52,7 @@ from fram.virkninger.investering.hjelpemoduler import legg_til_utslipp_hvis_mang
 from fram.virkninger.investering.virkning import Investeringskostnader
 from fram.virkninger.kontantstrommer.virkning import Kontantstrommer
 from fram.virkninger.risiko.hjelpemoduler import iwrap_fremskrivinger
-from fram.virkninger.risiko.hjelpemoduler.aisyrisk import konverter_aisyrisk_lengdegrupper, fordel_og_fremskriv_ra
+from fram.virkninger.risiko.hjelpemoduler.aisyrisk import les_og_konverter_aisyrisk, fordel_og_fremskriv_ruter
 from fram.virkninger.risiko.hjelpemoduler.fellesoppsett_kalkpriser import les_inn_kalkpriser_utslipp
 from fram.virkninger.risiko.hjelpemoduler.generelle import les_inn_hvilke_ra_som_brukes_fra_fram_input
 from fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing import Risikoanalyser
@@ -93,6 +94,7 @@ class FRAM:
         aisyrisk_input=False,
         les_RA_paa_nytt: bool = False,
         folsomhetsanalyser: Optional[Union[bool, Iterable]] = False,
+        input_cache_dir: Optional[Union[str, Path]] = None,
     ):
         """
         Setter opp den samfunnsøkonomiske analysen for den angitte strekningen. Foretar datavalidering og
@@ -155,12 +157,17 @@ class FRAM:
                 pathlib.Path som peker til hvor RA-filene fra IWRAP ligger. Defaulter til banen der Excel-input ligger,
                 og mappen risikoanalyser ved siden av Excel-filen
             - les_RA_paa_nytt:
-                Hvorvidt IWRAP-RA skal tvangsleses fra underliggende excel-filer, default er False
+                Hvorvidt IWRAP-RA skal tvangsleses fra underliggende excel-filer, og AISyRISK-RA fra csv-filene, default er
+                False
             - folsomhetsanalyser:
                 Hvorvidt følsomhetsanalyser skal kjøres. Kan også være en liste med egendefinerte faktorer som skal ganges
                 inn i input for hver virkning, eller en dict med analysenavn som nøkler og en dict med variabelnavn som
                 nøkler og faktorer som verdier som verdier.
                 Standard hvis True oppgis med hhv. 0.8 og 1.2 for alle variabler.
+            - input_cache_dir:
+                Katalogen der hvert innleste ark i inputfilen mellomlagres, slik at ark som ikke er endret, ikke må
+                tolkes på nytt ved neste kjøring. Defaulter til miljøvariabelen `FRAM_ARK_MELLOMLAGER`, eller
+                `~/.cache/fram/ark`. Se :class:`~fram.generelle_hjelpemoduler.excel.ArkMellomlager`
 
         """
         # Versjonen av FRAM du er på. Oppdateres ved oppdateringer
@@ -207,7 +214,8 @@ class FRAM:
         input_filbane = hjelpemoduler_excel._parse_strekning(strekning)
 
         # Lagrer filbanen og strekningsnavnet på self
-        self.input_filbane = pd.ExcelFile(input_filbane)
+        # Hvert ark i inputfilen tolkes høyst én gang, og mellomlagres på disk, se Arbeidsbok
+        self.input_filbane = hjelpemoduler_excel.arbeidsbok(input_filbane, cache_dir=input_cache_dir)
         self.strekning = input_filbane.stem
         self.tiltakspakke = tiltakspakke
         self.tiltaksomraade = None
@@ -655,7 +663,7 @@ class FRAM:
         # Leser inn grunnprognosene
         trafikk_logger("Leser inn prognosene")
         grunnprognoser = (
-            pd.read_excel(self.input_filbane, sheet_name="Grunnprognoser")
+            les_excel(self.input_filbane, "Grunnprognoser")
             .assign(
                 Lengdegruppe=lambda x: x.Lengdegruppe.str.replace(" ", "").replace(
                     "Manglerlengde", "Mangler lengde"
@@ -696,7 +704,7 @@ class FRAM:
         )
         # Fyller på med spesifikke prognoser dersom angitt
         spesifikke_prognoser = (
-            pd.read_excel(self.input_filbane, sheet_name="Prognoser justert")
+            les_excel(self.input_filbane, "Prognoser justert")
             .set_index(TRAFIKK_COLS)
             .pipe(lambda x: x + 1)
             .dropna(axis=1, how="all")
@@ -776,7 +784,21 @@ class FRAM:
 
         self.tiltaksomraade = self.trafikk_tiltak.reset_index().Tiltaksomraade.unique()[0]
 
-    def beregn_ventetid(self, num_periods_to_simulate: int = 100_000, seed: int = 1):
+    def beregn_ventetid(
+        self,
+        num_periods_to_simulate: int = 100_000,
+        seed: int = 1,
+        kernel: str = "numpy",
+        relative_precision: Optional[float] = None,
+        absolute_precision: float = 0.0,
+        common_random_numbers: bool = False,
+        antithetic: bool = False,
+        chunk_periods: Optional[float] = None,
+        num_workers: Optional[int] = None,
+        metode: str = "simulering",
+        cache_dir: Optional[Union[str, Path]] = None,
+        persentiler: bool = False,
+    ):
         # Ventetidssituasjon - Lager en dataframe med input-ark-par til ventetidsberegninger
         """
         Funksjon for å beregne ventetid og verdsette endringen i ventetid.
@@ -796,8 +818,42 @@ class FRAM:
         Beregner verdsatt endring i ventetid.
 
         Args:
-            num_periods_to_simulate: Antall trekninger. Defaulter til 100 000.
+            num_periods_to_simulate: Antall trekninger. Defaulter til 100 000. Ved adaptiv simuleringslengde er dette det
+                maksimale antallet trekninger.
             seed: Seed til psedutilfeldig tallgenerator for å sikre gjenskapbare simuleringer. Defaulter til 1.
+            kernel: Hvilken kø-kjerne som skal benyttes i simuleringen. "numpy" (default), "numba" (krever at numba er
+                installert) eller "auto". Alle gir identiske svar, se :meth:`~fram.virkninger.ventetid.computation.get_queue_kernel`
+            relative_precision: Angis denne, simuleres hvert år og hver periode i batcher, inntil gjennomsnittlig
+                ventetid per skipstype er beregnet med denne relative presisjonen (for eksempel 0.05 for +/- 5 %
+                med 95 % konfidens), eller `num_periods_to_simulate` er nådd. Perioder med lav trafikk blir da
+                raskt ferdige. Defaulter til None, som gir fast simuleringslengde.
+            absolute_precision: Skipstyper der konfidensintervallet for ventetiden er smalere enn dette (i
+                tidsenheten i ventetidsarket), regnes som presist nok beregnet. Hindrer at skipstyper som nesten
+                aldri venter, holder simuleringen gående. Benyttes bare sammen med `relative_precision`. Defaulter til 0.
+            common_random_numbers: Hvorvidt referanse- og tiltaksbanen skal simuleres med felles tilfeldige tall. Da
+                får hver skipstype de samme tilfeldige anløpstidene i begge baner, slik at endringen i ventetid har
+                langt mindre simuleringsstøy, og færre perioder trengs. Oppnådd variansreduksjon logges. Defaulter til False.
+            antithetic: Hvorvidt simuleringene i tillegg skal kjøres som antitetiske par. Dobler antall simulerte
+                perioder. Defaulter til False.
+            chunk_periods: Angis denne, trekkes anløp og simuleres køen bit for bit, med så mange perioder av gangen.
+                Minnebruken blir da uavhengig av `num_periods_to_simulate`, slik at svært lange simuleringer er
+                mulige. Defaulter til None, som simulerer alt på én gang.
+            num_workers: Antall arbeiderprosesser som simulerer parallelt. Prosesspoolen startes én gang, og deles av
+                alle ventetidssituasjoner og følsomhetsanalyser. Defaulter til None, som gir miljøvariabelen
+                `FRAM_VENTETID_ARBEIDERE`, eller antall kjerner minus én.
+            metode: "simulering" (default) simulerer køen. "interpolert" simulerer bare noen ankerår per periode, spredt
+                over belastningen på flaskehalsene, og interpolerer de øvrige årene. Feilen måles i noen kontrollår og
+                logges, se :mod:`~fram.virkninger.ventetid.interpolering`. "analytisk" beregner ventetiden med
+                lukkede formler for køer (Allen–Cunneen), på mikrosekunder i stedet for minutter. Gir bare
+                størrelsesordenen på ventetiden, og er ment for tidlig siling av mange tiltakspakker. Den analytiske
+                tilnærmingen kan ikke kombineres med adaptiv simuleringslengde, felles tilfeldige tall, antitetiske
+                par eller simulering bit for bit. Se :mod:`~fram.virkninger.ventetid.queue_approximation`.
+            cache_dir: Katalogen der hvert simulerte år og hver periode mellomlagres. Defaulter til None, som gir
+                miljøvariabelen `FRAM_VENTETID_MELLOMLAGER`, eller `~/.cache/fram/ventetid`. Se
+                :class:`~fram.virkninger.ventetid.mellomlagring.VentetidMellomlager`.
+            persentiler: Hvorvidt fordelingen av ventetid og kølengde skal følges i simuleringene, slik at persentilene
+                ligger på hver ventetidssituasjon. Defaulter til False. Se
+                :class:`~fram.virkninger.ventetid.ventetidssituasjon.Ventetidssituasjon`.
 
 
         """
@@ -891,6 +947,16 @@ class FRAM:
                 simuleringsinput_ref=simuleringsinput_ref,
                 simuleringsinput_tiltak=simuleringsinput_tiltak,
                 seed=seed,
+                kernel=kernel,
+                relative_precision=relative_precision,
+                absolute_precision=absolute_precision,
+                common_random_numbers=common_random_numbers,
+                antithetic=antithetic,
+                chunk_periods=chunk_periods,
+                num_workers=num_workers,
+                metode=metode,
+                cache_dir=cache_dir,
+                persentiler=persentiler,
                 metadatakolonner=ventetid_input.loc[
                     index,
                     [
@@ -927,9 +993,9 @@ class FRAM:
         sediment_logger = self._virkningslogger("Forurensede sedimenter")
         sediment_logger("Leser inn fra Excel")
         try:
-            sedimenter = pd.read_excel(
+            sedimenter = les_excel(
                 self.input_filbane,
-                sheet_name="Forurensede sedimenter",
+                "Forurensede sedimenter",
                 usecols=list(range(8)),
             )
             sedimenter = sedimenter.query("Tiltakspakke == @self.tiltakspakke")
@@ -973,8 +1039,8 @@ class FRAM:
             "Leser inn eventuelle manuelt innlagte kontantstrømmer fra Excel-arket"
         )
         try:
-            ytterlige_kontantstrommer = pd.read_excel(
-                self.input_filbane, sheet_name="Kontantstrømmer", index_col=0
+            ytterlige_kontantstrommer = les_excel(
+                self.input_filbane, "Kontantstrømmer", index_col=0
             ).query("Tiltakspakke == @self.tiltakspakke")
             aars_cols = [
                 col for col in ytterlige_kontantstrommer.columns if str(col).isnumeric()
@@ -1033,7 +1099,7 @@ class FRAM:
             return
 
         inv_kost = (
-            pd.read_excel(
+            les_excel(
                 self.input_filbane, "Investeringskostnader", skiprows=1, usecols="A:H"
             )
             .dropna(how="all")
@@ -1117,9 +1183,9 @@ class FRAM:
             "Leser inn oversikt over merkeinstallasjoner til vedlikeholdskostnadene"
         )
         if (
-            "tiltakspunktnavn" in pd.read_excel(
+            "tiltakspunktnavn" in les_excel(
                 self.input_filbane,
-                sheet_name=f"Tiltakspakke {self.tiltakspakke}",
+                f"Tiltakspakke {self.tiltakspakke}",
                 usecols=[26,27],
             )
 
@@ -1129,9 +1195,9 @@ class FRAM:
             )
             return
 
-        merker = pd.read_excel(
+        merker = les_excel(
             self.input_filbane,
-            sheet_name=f"Tiltakspakke {self.tiltakspakke}",
+            f"Tiltakspakke {self.tiltakspakke}",
             skiprows=1,
             usecols=list(range(27, 32)),
         ).loc[lambda x: ~x.Objekttype.isin([np.nan, "Ikke merke"])]
@@ -1536,8 +1602,10 @@ class FRAM:
         """
         Funksjon som beregner og verdsetter endring i risikovirkninger knyttet til helse, materielle skader og oljeutslipp.
         Funksjonen leser inn risikoanalyser fra angitt filbane (self.ra_dir). Disse er i utgangspunktet oppgitt i excel, og
-        vil ta lang til å kjøre. Dersom risikoanalysene ikke er lest inn i tidligere kjøringer, mellomlagres en .json-fil
-        med alle hendelser.
+        vil ta lang til å kjøre. Hver RA-fil mellomlagres når den er lest inn, slik at senere kjøringer bare leser filer som
+        er nye eller endret, se :class:`~fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing.RAMellomlager`. Det samme
+        gjelder AISyRISK-filene, som mellomlagres ferdig konvertert, se
+        :meth:`~fram.virkninger.risiko.hjelpemoduler.aisyrisk.les_og_konverter_aisyrisk`.
 
         Når risikoanalysene er lest inn fra ra_dir sammenlignes jobnames med de som er spesifisert som relevante i excel input.
 
@@ -1631,74 +1699,47 @@ class FRAM:
             metaframe_index = pd.concat((self.ra_ref,self.ra_tiltak), axis=0).Risikoanalyse.dropna().unique()
 
             risiko_logger("Leser inn alle RA-filene")
-            samlet_ra_fil = []
-
-            for risikoanalyse in metaframe_index:
-                try:
-                    ra_fil = pd.read_csv(self.ra_dir / (risikoanalyse + '.csv'),
-                                         sep=';')  # Prøv å lese med semikolon-separator
-                except:
-                    ra_fil = pd.read_csv(self.ra_dir / (risikoanalyse + '.csv'),
-                                         sep=',')  # Hvis ikke, prøv kolon-separator
-                ra_fil = ra_fil.assign(risikoanalysenavn=risikoanalyse)
-                samlet_ra_fil.append(ra_fil)
-            samlet_ra_fil = pd.concat(samlet_ra_fil, axis=0, ignore_index=True)
+            # Konverterer hver risikoanalyse til Kystverkets skipstyper og lengdegrupper én gang, selv om flere ruter
+            # benytter den. Filer som ikke er endret siden forrige kjøring, hentes ferdig konvertert fra mellomlageret
+            konverterte_ra = les_og_konverter_aisyrisk(
+                {risikoanalyse: self.ra_dir / (risikoanalyse + '.csv') for risikoanalyse in metaframe_index},
+                les_paa_nytt=self.les_RA_paa_nytt,
+                logger=risiko_logger,
+            )
 
             risiko_logger("Fremskriver hendelser")
 
-            hendelser_ref = []
-            hendelser_tilt = []
-
-            for i in range(0, len(self.ra_ref)):
-                rute = self.ra_ref.copy().reset_index().at[i, 'Rute']
-                analyseomraade = self.ra_ref.copy().reset_index().at[i, 'Analyseomraade']
-
-                # Henter ut hvilke RAer som skal brukes
-                relevant_ra_ref = samlet_ra_fil.loc[samlet_ra_fil.risikoanalysenavn == self.ra_ref.at[i, "Risikoanalyse"]]
-                relevant_ra_tilt = samlet_ra_fil.loc[
-                    samlet_ra_fil.risikoanalysenavn == self.ra_tiltak.at[i, "Risikoanalyse"]]
-
-                # Konverterer aisyrisk risikogruppene til korrekte skip
-                aisy_ra_skipstyper_ref = konverter_aisyrisk_lengdegrupper(relevant_ra_ref)
-                aisy_ra_skipstyper_tilt = konverter_aisyrisk_lengdegrupper(relevant_ra_tilt)
-
-                hendelser_ref_short = fordel_og_fremskriv_ra(
-                    aisy_ra_skipstyper_ref,
-                    strekning=self.strekning,
-                    tiltakspakke=self.tiltakspakke,
-                    tiltaksomraade=self.tiltaksomraade,
-                    beregningsaar=self.beregningsaar,
-                    risiko_logger=risiko_logger,
-                    trafikk=self.trafikk_referanse,
-                    rute=rute,
-                    analyseomraade=analyseomraade,
-                    risikoanalysenavn=self.ra_ref.at[i, 'Risikoanalyse'],
-                    risikoanalyseaar=self.ra_ref.at[i, 'ra_aar'],
-                    tiltak_eller_ref="referansebanen"
-                )
-
-                # Her forutsetter vi at RA-ene er kjørt på tiltakstrafikkgrunnlaget. Det kan endres i en fremtidig kjøring.
-                hendelser_tilt_short = fordel_og_fremskriv_ra(
-                    aisy_ra_skipstyper_tilt,
-                    strekning=self.strekning,
-                    tiltakspakke=self.tiltakspakke,
-                    tiltaksomraade=self.tiltaksomraade,
-                    beregningsaar=self.beregningsaar,
-                    risiko_logger=risiko_logger,
-                    trafikk=self.trafikk_tiltak,
-                    rute=rute,
-                    analyseomraade=analyseomraade,
-                    risikoanalysenavn=self.ra_tiltak.at[i, 'Risikoanalyse'],
-                    risikoanalyseaar=self.ra_tiltak.at[i, 'ra_aar'],
-                    tiltak_eller_ref="tiltaksbanen"
-                )
-
-                hendelser_ref.append(hendelser_ref_short)
-
-                hendelser_tilt.append(hendelser_tilt_short)
+            # Rutene og analyseområdene hentes fra referansebanen, også for tiltaksbanen
+            ruter_ref = self.ra_ref.reset_index(drop=True)
+            ruter_tilt = ruter_ref[["Rute", "Analyseomraade"]].assign(
+                Risikoanalyse=self.ra_tiltak.loc[ruter_ref.index, "Risikoanalyse"].values,
+                ra_aar=self.ra_tiltak.loc[ruter_ref.index, "ra_aar"].values,
+            )
+            felles_argumenter = dict(
+                strekning=self.strekning,
+                tiltakspakke=self.tiltakspakke,
+                tiltaksomraade=self.tiltaksomraade,
+                beregningsaar=self.beregningsaar,
+                risiko_logger=risiko_logger,
+            )
+            hendelser_ref = fordel_og_fremskriv_ruter(
+                ruter_ref,
+                konverterte_ra,
+                trafikk=self.trafikk_referanse,
+                tiltak_eller_ref="referansebanen",
+                **felles_argumenter,
+            )
+            # Her forutsetter vi at RA-ene er kjørt på tiltakstrafikkgrunnlaget. Det kan endres i en fremtidig kjøring.
+            hendelser_tilt = fordel_og_fremskriv_ruter(
+                ruter_tilt,
+                konverterte_ra,
+                trafikk=self.trafikk_tiltak,
+                tiltak_eller_ref="tiltaksbanen",
+                **felles_argumenter,
+            )
 
-            self.hendelser_ref = pd.concat(hendelser_ref, axis=0).fillna(0)  # Må fillna 0 i cruise-versjonen, ikke i 3.4
-            self.hendelser_tiltak = pd.concat(hendelser_tilt, axis=0).fillna(0)  # Må fillna 0 i cruise-versjonen, ikke i 3.4
+            self.hendelser_ref = hendelser_ref.fillna(0)  # Må fillna 0 i cruise-versjonen, ikke i 3.4
+            self.hendelser_tiltak = hendelser_tilt.fillna(0)  # Må fillna 0 i cruise-versjonen, ikke i 3.4
 
             HendelseSchema.validate(self.hendelser_ref)
             HendelseSchema.validate(self.hendelser_tiltak)
@@ -1723,15 +1764,15 @@ class FRAM:
          kalkpris_oljeopprensking_tiltak) = les_inn_kalkpriser_utslipp(
             kroneaar=self.kroneaar,
             beregningsaar=self.beregningsaar,
-            excel_inputfil=str(Path(self.input_filbane)),
+            excel_inputfil=self.input_filbane,
             tiltakspakke=self.tiltakspakke,
             analyseomraader=self.analyseomraader,
             logger=risiko_logger
         )
 
         sarbarhet = (
-            pd.read_excel(
-                self.input_filbane, sheet_name="Sarbarhet", usecols=list(range(6))
+            les_excel(
+                self.input_filbane, "Sarbarhet", usecols=list(range(6))
             )
             .dropna(how="all")
             .astype({"Tiltaksomraade": np.int64, "Tiltakspakke": np.int64})
@@ -1879,7 +1920,7 @@ class FRAM:
             filbane = Path(folder)
         elif isinstance(self.input_filbane, (str, Path)):
             filbane = Path(self.input_filbane).parent
-        elif isinstance(self.input_filbane, pd.ExcelFile):
+        elif isinstance(self.input_filbane, (pd.ExcelFile, hjelpemoduler_excel.Arbeidsbok)):
             filbane = Path(self.input_filbane.__fspath__()).parent
         else:
             self._infologger("Noe er galt. Skriver ingen output.")
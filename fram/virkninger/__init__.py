@@ -1,9 +1,31 @@
-from .drivstoff.virkning import Drivstoff
-from .investering.virkning import Investeringskostnader
-from .kontantstrommer.virkning import Kontantstrommer
-from .risiko.virkning import Risiko
-from .sedimenter.virkning import Sedimenter
-from .tid.virkning import Tidsbruk
-from .utslipp_til_luft.virkning import Utslipp_til_luft
-from .vedlikehold.virkning import Vedlikeholdskostnader
-from .ventetid.virkning import Ventetid
+"""
+Virkningene i FRAM. Klassene importeres først når de brukes, slik at det å importere en enkelt virkning ikke laster
+inn alle de andre.
+"""
+import importlib
+
+_LATE_IMPORTER = {
+    "Drivstoff": ".drivstoff.virkning",
+    "Investeringskostnader": ".investering.virkning",
+    "Kontantstrommer": ".kontantstrommer.virkning",
+    "Risiko": ".risiko.virkning",
+    "Sedimenter": ".sedimenter.virkning",
+    "Tidsbruk": ".tid.virkning",
+    "Utslipp_til_luft": ".utslipp_til_luft.virkning",
+    "Vedlikeholdskostnader": ".vedlikehold.virkning",
+    "Ventetid": ".ventetid.virkning",
+}
+
+__all__ = list(_LATE_IMPORTER)
+
+
+def __getattr__(navn: str):
+    if navn not in _LATE_IMPORTER:
+        raise AttributeError(f"module {__name__!r} has no attribute {navn!r}")
+    verdi = getattr(importlib.import_module(_LATE_IMPORTER[navn], __name__), navn)
+    globals()[navn] = verdi
+    return verdi
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
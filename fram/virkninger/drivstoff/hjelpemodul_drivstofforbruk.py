@@ -13,6 +13,7 @@ from fram.generelle_hjelpemoduler.hjelpefunksjoner import (
     interpoler_linear_vekstfaktor,
     interpoler_produkt_vekstfaktor,
     forut,
+    lat_referansedata,
 )
 from fram.generelle_hjelpemoduler.kalkpriser import prisjustering
 from fram.generelle_hjelpemoduler.konstanter import FRAM_DIRECTORY
@@ -20,9 +21,15 @@ from fram.virkninger.drivstoff.schemas import DrivstoffPerTimeSchema, Drivstoffa
 from fram.virkninger.felles_hjelpemoduler.schemas import verbose_schema_error
 from fram.virkninger.risiko.hjelpemoduler.generelle import _dropp_overste_kolonnenavnnivaa
 
-FORUTSETNINGER = forut("Forutsetninger")
-SKROGFORM = forut("blokkoeffisient", 4)
-KONSUM = forut("Virkningsgrad", 4)
+# FORUTSETNINGER, SKROGFORM og KONSUM leses fra forutsetningsboken først når de brukes
+__getattr__ = lat_referansedata(
+    __name__,
+    {
+        "FORUTSETNINGER": lambda: forut("Forutsetninger"),
+        "SKROGFORM": lambda: forut("blokkoeffisient", 4),
+        "KONSUM": lambda: forut("Virkningsgrad", 4),
+    },
+)
 
 
 KONVERTERER_NYE_TIL_FRAM_DRIVSTOFFTYPER = {
@@ -386,7 +393,7 @@ def get_korreksjonsfaktor(bolgegeo=None):
         else:
             return None
 
-    skipsinfo = SKROGFORM.assign(
+    skipsinfo = forut("blokkoeffisient", 4).assign(
         korreksjonsfaktor=lambda x: x.skrogform.map(get_nearest).map(
             vektet_korreksjonsfaktor
         )
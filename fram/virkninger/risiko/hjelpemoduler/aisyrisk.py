@@ -1,14 +1,20 @@
+import hashlib
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
 import numpy as np
 import pandas as pd
 from pandera.typing import DataFrame
-from typing import Callable, List
 
+from fram.generelle_hjelpemoduler.arbeiderpool import kjor_parallelt
 from fram.generelle_hjelpemoduler.hjelpefunksjoner import (
-    forut, _multiply_df_with_col, _divide_df_with_col, _legg_til_kolonne,
+    forut, _multiply_df_with_col, _divide_df_with_col, _legg_til_kolonne, lat_referansedata,
 )
 from fram.generelle_hjelpemoduler.konstanter import FOLSOMHET_COLS, FOLSOMHET_KOLONNE
 from fram.generelle_hjelpemoduler.schemas import TrafikkGrunnlagSchema
 from fram.virkninger.felles_hjelpemoduler.schemas import verbose_schema_error
+from fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing import RAMellomlager
 from fram.virkninger.risiko.schemas import AISyRISKKonvertertSchema
 
 STRIKING_COLUMNS = ['Freq_coll_head', 'Freq_coll_over',
@@ -20,17 +26,40 @@ KOLONNEOVERSETTERE = {
     "Ship_types": "risk_norwegian_main_vessel_category_name",
     "Ship_size_ID": "gt_gruppe_id"
 }
-SKIPSTYPE_OVERSETTER = (
-    forut("aisyrisk_skipstypekonvertering")
-    .loc[lambda df: df.Vekt.notna()]
-    .reset_index(drop=True)
-)
-SKIPSLENGDE_OVERSETTER = (
-    forut("aisyrisk_lengdekonvertering", 4)
-    .loc[lambda df: df.Vekt.notna()]
-    .reset_index(drop=True)
+# Kolonnene i AISyRISK-filene som konverter_aisyrisk_lengdegrupper bruker. Filene har enten ID-ene eller navnene på
+# skipstypene og størrelsene
+AISYRISK_TEKSTKOLONNER = ["Ship_types", "Ship_sizes", "Analyseomraade"]
+AISYRISK_TALLKOLONNER = ["Sailed_time_hours"] + STRIKING_COLUMNS + GRUNNSTØTING_COLUMNS
+AISYRISK_KOLONNER = ["Ship_type_ID", "Ship_size_ID"] + AISYRISK_TEKSTKOLONNER + AISYRISK_TALLKOLONNER
+# Økes når innlesingen eller konverteringen av AISyRISK-filene endres, slik at gamle konverteringer ikke lenger treffes
+AISYRISK_MELLOMLAGER_VERSJON = 1
+
+
+def _skipstype_oversetter() -> pd.DataFrame:
+    """Konverteringen fra AISyRISKs skipstyper til Kystverkets, fra forutsetningsboken"""
+    return (
+        forut("aisyrisk_skipstypekonvertering")
+        .loc[lambda df: df.Vekt.notna()]
+        .reset_index(drop=True)
+    )
+
+
+def _skipslengde_oversetter() -> pd.DataFrame:
+    """Konverteringen fra AISyRISKs bruttotonnasjegrupper til Kystverkets lengdegrupper, fra forutsetningsboken"""
+    return (
+        forut("aisyrisk_lengdekonvertering", 4)
+        .loc[lambda df: df.Vekt.notna()]
+        .reset_index(drop=True)
+    )
+
+
+# SKIPSTYPE_OVERSETTER og SKIPSLENGDE_OVERSETTER leses fra forutsetningsboken først når de brukes
+__getattr__ = lat_referansedata(
+    __name__,
+    {"SKIPSTYPE_OVERSETTER": _skipstype_oversetter, "SKIPSLENGDE_OVERSETTER": _skipslengde_oversetter},
 )
 
+
 def konverter_aisyrisk_lengdegrupper(aisy_ra, kast_ut_andre_skipstyper=True, kast_ut_mangler_lengde=True, returner_alle_kolonner=False) -> DataFrame[AISyRISKKonvertertSchema]:
     """
     Leser inn aisyrisk-output, og kobler så denne med skipstypekonverterer, og konverterer deretter vekt-og lengdegrupper.
@@ -66,7 +95,7 @@ def konverter_aisyrisk_lengdegrupper(aisy_ra, kast_ut_andre_skipstyper=True, kas
     aisy_ra_grouped_merged = (
         aisy_ra_grouped
             .merge(
-                SKIPSTYPE_OVERSETTER[[KOLONNEOVERSETTERE[mergecol_skipstype], 'Skipstype', 'Vekt']],
+                _skipstype_oversetter()[[KOLONNEOVERSETTERE[mergecol_skipstype], 'Skipstype', 'Vekt']],
                 left_on=mergecol_skipstype,
                 right_on=KOLONNEOVERSETTERE[mergecol_skipstype],
                 how="inner"
@@ -78,7 +107,7 @@ def konverter_aisyrisk_lengdegrupper(aisy_ra, kast_ut_andre_skipstyper=True, kas
         .reset_index()
         .drop(["Vekt"], axis=1)
         .merge(
-            SKIPSLENGDE_OVERSETTER[[KOLONNEOVERSETTERE["Ship_size_ID"], 'Lengdegruppe', 'Vekt']],
+            _skipslengde_oversetter()[[KOLONNEOVERSETTERE["Ship_size_ID"], 'Lengdegruppe', 'Vekt']],
             left_on="Ship_size_ID",
             right_on=KOLONNEOVERSETTERE["Ship_size_ID"],
             how="inner"
@@ -103,6 +132,119 @@ def konverter_aisyrisk_lengdegrupper(aisy_ra, kast_ut_andre_skipstyper=True, kas
     return aisy_ra_grouped_merged
 
 
+def _skilletegn(filbane: Path) -> str:
+    """Semikolon eller komma, ut fra hvilket av dem som forekommer flest ganger i overskriftslinjen"""
+    with open(filbane, encoding="utf-8-sig", errors="replace") as f:
+        overskrift = f.readline()
+    return ";" if overskrift.count(";") >= overskrift.count(",") else ","
+
+
+def les_aisyrisk_csv(filbane: Union[str, Path]) -> pd.DataFrame:
+    """
+    Leser én AISyRISK-kjøring i csv-format, med bare kolonnene i AISYRISK_KOLONNER.
+
+    Skilletegnet finnes fra overskriftslinjen, slik at filen bare leses én gang. Frekvensene og seilingstiden leses som
+    float64, og navnene på skipstyper, størrelser og analyseområder som tekst.
+
+    Args:
+        filbane: Bane til csv-filen
+
+    Returns:
+        Risikoanalysen slik :meth:`konverter_aisyrisk_lengdegrupper` tar den inn
+    """
+    filbane = Path(filbane)
+    return pd.read_csv(
+        filbane,
+        sep=_skilletegn(filbane),
+        usecols=lambda kolonne: kolonne in AISYRISK_KOLONNER,
+        dtype={
+            **{kolonne: str for kolonne in AISYRISK_TEKSTKOLONNER},
+            **{kolonne: "float64" for kolonne in AISYRISK_TALLKOLONNER},
+        },
+    )
+
+
+def _konverteringsnokkel(filbane: Path, oversetternokkel: str) -> str:
+    """Nøkkelen til den konverterte AISyRISK-filen, av innholdet i filen og konverteringstabellene"""
+    deler = [AISYRISK_MELLOMLAGER_VERSJON, "aisyrisk", RAMellomlager.filnokkel(filbane), oversetternokkel]
+    return hashlib.sha256("\x1f".join(str(del_) for del_ in deler).encode("utf-8")).hexdigest()
+
+
+def _oversetternokkel() -> str:
+    """Hash av konverteringstabellene i forutsetningsboken, slik at konverteringene gjøres på nytt når de endres"""
+    hasher = hashlib.sha256()
+    for tabell in (_skipstype_oversetter(), _skipslengde_oversetter()):
+        hasher.update(pd.util.hash_pandas_object(tabell, index=False).values.tobytes())
+    return hasher.hexdigest()
+
+
+def _les_og_konverter_aisyrisk_fil(filbane: Path) -> Tuple[DataFrame[AISyRISKKonvertertSchema], float]:
+    """Leser og konverterer én AISyRISK-fil. Er definert på toppnivå, slik at den kan kjøres i prosesspoolen
+
+    Returns:
+        Den konverterte risikoanalysen, og hvor mange sekunder innlesingen og konverteringen tok
+    """
+    start = time.perf_counter()
+    konvertert = konverter_aisyrisk_lengdegrupper(les_aisyrisk_csv(filbane))
+    return konvertert, time.perf_counter() - start
+
+
+def les_og_konverter_aisyrisk(
+    filbaner: Dict[str, Path],
+    mellomlager: Optional[RAMellomlager] = None,
+    les_paa_nytt: bool = False,
+    num_workers: Optional[int] = None,
+    logger: Callable = print,
+) -> Dict[str, DataFrame[AISyRISKKonvertertSchema]]:
+    """
+    Leser AISyRISK-filene med :meth:`les_aisyrisk_csv` og konverterer dem med :meth:`konverter_aisyrisk_lengdegrupper`.
+
+    De konverterte risikoanalysene mellomlagres sammen med de innleste IWRAP-filene, se
+    :class:`~fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing.RAMellomlager`, med en hash av innholdet i filen og
+    av konverteringstabellene som nøkkel. Filer som ikke er endret hentes derfor fra mellomlageret, mens de andre
+    fordeles på prosesspoolen.
+
+    Args:
+        filbaner: Bane til csv-filen, per risikoanalysenavn
+        mellomlager: Mellomlageret. Defaulter til et RAMellomlager i standardkatalogen
+        les_paa_nytt: Hvorvidt alle filene skal leses på nytt, selv om de finnes i mellomlageret
+        num_workers: Antall arbeiderprosesser. Defaulter til antall kjerner minus én, se
+            :mod:`~fram.generelle_hjelpemoduler.arbeiderpool`
+        logger: Hvor det logges
+
+    Returns:
+        Den konverterte risikoanalysen per risikoanalysenavn
+    """
+    if mellomlager is None:
+        mellomlager = RAMellomlager()
+    oversetternokkel = _oversetternokkel()
+    nokler = {navn: _konverteringsnokkel(Path(filbane), oversetternokkel) for navn, filbane in filbaner.items()}
+
+    konverterte = {}
+    for navn, nokkel in nokler.items():
+        konvertert = None if les_paa_nytt else mellomlager.hent(nokkel)
+        if konvertert is not None:
+            konverterte[navn] = konvertert
+    mangler = [navn for navn in filbaner if navn not in konverterte]
+    logger(f"Henter {len(konverterte)} AISyRISK-filer fra mellomlageret, og leser {len(mangler)} fra csv")
+
+    lest = kjor_parallelt(
+        _les_og_konverter_aisyrisk_fil,
+        [Path(filbaner[navn]) for navn in mangler],
+        [f"Innlesingen av {filbaner[navn]}" for navn in mangler],
+        num_workers=num_workers,
+        logger=logger,
+    )
+    for navn, (konvertert, sekunder) in zip(mangler, lest):
+        logger(f"  {navn}: {len(konvertert)} rader på {sekunder:.2f} s")
+        mellomlager.lagre(nokler[navn], konvertert)
+        konverterte[navn] = konvertert
+    if mangler:
+        mellomlager.rydd()
+
+    return {navn: konverterte[navn] for navn in filbaner}
+
+
 @verbose_schema_error
 def fordel_og_fremskriv_ra(aisy_ra_konvertert: DataFrame[AISyRISKKonvertertSchema],
                            trafikk: DataFrame[TrafikkGrunnlagSchema],
@@ -116,7 +258,8 @@ def fordel_og_fremskriv_ra(aisy_ra_konvertert: DataFrame[AISyRISKKonvertertSchem
                            rute: str = 'A',
                            risikoanalysenavn: str = "Midlertidig placeholder",
                            risiko_logger: Callable = print,
-                           tiltak_eller_ref=''
+                           tiltak_eller_ref='',
+                           endringsfaktorer: Optional[DataFrame] = None,
                            ):
     """
     Tar input en aiysrisk konvertert til Kystverkets skips- og lengdegrupper.
@@ -142,6 +285,8 @@ def fordel_og_fremskriv_ra(aisy_ra_konvertert: DataFrame[AISyRISKKonvertertSchem
         risikoanalysenavn: Brukes for å identifisere kjøringen i videre analyser
         risiko_logger: Callable hvor informasjon fra virkninger logges til
         tiltak_eller_ref: Streng som angir om det er tiltak eller referansebane. Brukes til mer informativ logging
+        endringsfaktorer: Trafikkveksten fra `risikoanalyseaar`, fra :meth:`beregn_endringsfaktorer`. Beregnes fra
+            `trafikk` hvis den ikke er angitt. Kan angis for å slippe å beregne den på nytt for hvert analyseområde
 
     Returns:
 
@@ -161,15 +306,9 @@ def fordel_og_fremskriv_ra(aisy_ra_konvertert: DataFrame[AISyRISKKonvertertSchem
         .assign(Hendelsestype = lambda df: df.Hendelsestype.str.title())
 
     )
-    beregningsaar_pluss_ra_aar = beregningsaar if risikoanalyseaar in beregningsaar else beregningsaar + [risikoanalyseaar]
-    endringsfaktorer = (
-        trafikk
-        .groupby(["Skipstype", "Lengdegruppe", "Analyseomraade", FOLSOMHET_KOLONNE])[beregningsaar_pluss_ra_aar].sum()
-        .pipe(_divide_df_with_col, risikoanalyseaar)
-        .reset_index()
-        .astype({"Analyseomraade": str})
-        .loc[lambda df: df.Analyseomraade == analyseomraade]
-    )
+    if endringsfaktorer is None:
+        endringsfaktorer = beregn_endringsfaktorer(trafikk, risikoanalyseaar, beregningsaar)
+    endringsfaktorer = endringsfaktorer.loc[lambda df: df.Analyseomraade == analyseomraade]
 
     koblet = (
         relevant_ra # Må gjenta ra én gang for hver analyse for å sikre at det ikke blir kluss med antall rader i koblingen når noen har hendelser uten trafikk
@@ -284,8 +423,7 @@ def fordel_og_fremskriv_ra(aisy_ra_konvertert: DataFrame[AISyRISKKonvertertSchem
         hendelser = koblet.loc[lambda df: df._merge == "both"]
 
     fremskrivingsaar = [aar for aar in beregningsaar if aar != risikoanalyseaar]
-    for aar in fremskrivingsaar:
-        hendelser[aar] = hendelser[aar] * hendelser[risikoanalyseaar]
+    hendelser[fremskrivingsaar] = hendelser[fremskrivingsaar].multiply(hendelser[risikoanalyseaar], axis=0)
 
     return (
         hendelser
@@ -301,6 +439,83 @@ def fordel_og_fremskriv_ra(aisy_ra_konvertert: DataFrame[AISyRISKKonvertertSchem
     )
 
 
+def beregn_endringsfaktorer(
+    trafikk: DataFrame[TrafikkGrunnlagSchema], risikoanalyseaar: int, beregningsaar: List[int]
+) -> DataFrame:
+    """
+    Trafikken i hvert beregningsår, relativt til trafikken i året RA-en er kjørt for, per skipstype, lengdegruppe,
+    analyseområde og følsomhetsanalyse. Benyttes av :meth:`fordel_og_fremskriv_ra` til å fremskrive hendelsene.
+
+    Args:
+        trafikk: Trafikkgrunnlag som følger fastsatt schema
+        risikoanalyseaar: Året RA-en er kjørt for
+        beregningsaar: Liste med år det skal beregnes virkninger for
+
+    Returns:
+        DataFrame med én kolonne per beregningsår og for `risikoanalyseaar`, der Analyseomraade er tekst
+    """
+    beregningsaar_pluss_ra_aar = beregningsaar if risikoanalyseaar in beregningsaar else beregningsaar + [risikoanalyseaar]
+    return (
+        trafikk
+        .groupby(["Skipstype", "Lengdegruppe", "Analyseomraade", FOLSOMHET_KOLONNE])[beregningsaar_pluss_ra_aar].sum()
+        .pipe(_divide_df_with_col, risikoanalyseaar)
+        .reset_index()
+        .astype({"Analyseomraade": str})
+    )
+
+
+def fordel_og_fremskriv_ruter(
+    ruter: DataFrame,
+    konverterte_ra: Dict[str, DataFrame[AISyRISKKonvertertSchema]],
+    trafikk: DataFrame[TrafikkGrunnlagSchema],
+    beregningsaar: List[int],
+    **kwargs,
+) -> DataFrame:
+    """
+    Fordeler og fremskriver AISyRISK-hendelsene for alle rutene i en bane med :meth:`fordel_og_fremskriv_ra`.
+
+    Ruter med samme risikoanalyse, analyseområde og RA-år får de samme hendelsene. Disse beregnes derfor bare én gang, og
+    kopieres til hver rute. Trafikkveksten beregnes én gang per RA-år, se :meth:`beregn_endringsfaktorer`.
+
+    Args:
+        ruter: Én rad per rute, med kolonnene Rute, Analyseomraade, Risikoanalyse og ra_aar
+        konverterte_ra: Hver risikoanalyse konvertert med :meth:`konverter_aisyrisk_lengdegrupper`, per risikoanalysenavn
+        trafikk: Trafikkgrunnlag som følger fastsatt schema
+        beregningsaar: Liste med år det skal beregnes virkninger for
+        kwargs: Øvrige argumenter til :meth:`fordel_og_fremskriv_ra`, som strekning, tiltakspakke og risiko_logger
+
+    Returns:
+        Hendelsene for alle rutene, i samme rekkefølge som rutene
+    """
+    endringsfaktorer = {}
+    beregnet = {}
+    hendelser = []
+    for rute, analyseomraade, risikoanalysenavn, risikoanalyseaar in (
+        ruter[["Rute", "Analyseomraade", "Risikoanalyse", "ra_aar"]].itertuples(index=False)
+    ):
+        nokkel = (risikoanalysenavn, str(analyseomraade), risikoanalyseaar)
+        if nokkel in beregnet:
+            beregnet_rute, beregnede_hendelser = beregnet[nokkel]
+            hendelser.append(beregnede_hendelser.rename(index={beregnet_rute: rute}, level="Rute"))
+            continue
+        if risikoanalyseaar not in endringsfaktorer:
+            endringsfaktorer[risikoanalyseaar] = beregn_endringsfaktorer(trafikk, risikoanalyseaar, beregningsaar)
+        beregnede_hendelser = fordel_og_fremskriv_ra(
+            konverterte_ra[risikoanalysenavn],
+            trafikk=trafikk,
+            risikoanalyseaar=risikoanalyseaar,
+            beregningsaar=beregningsaar,
+            analyseomraade=analyseomraade,
+            rute=rute,
+            risikoanalysenavn=risikoanalysenavn,
+            endringsfaktorer=endringsfaktorer[risikoanalyseaar],
+            **kwargs,
+        )
+        beregnet[nokkel] = (rute, beregnede_hendelser)
+        hendelser.append(beregnede_hendelser)
+    return pd.concat(hendelser, axis=0)
+
+
 def _stable_folsomhetsanalyse(df: DataFrame, folsomheter: List, folsomhetsnavn: str):
     """
     Hjelpefunksjon for å sørge for at RA har én rad for hver følsomhetsanalyse.
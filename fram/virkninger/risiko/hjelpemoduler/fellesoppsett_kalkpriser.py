@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from typing import Union, List
 
@@ -6,7 +7,7 @@ import pandas as pd
 from pandera.typing import DataFrame
 import pandera as pa
 
-from fram.generelle_hjelpemoduler.excel import vask_kolonnenavn_for_exceltull
+from fram.generelle_hjelpemoduler.excel import Arbeidsbok, arbeidsbok, les_excel, vask_kolonnenavn_for_exceltull
 from fram.virkninger.felles_hjelpemoduler.schemas import verbose_schema_error
 from fram.virkninger.risiko.hjelpemoduler.generelle import ARKNAVN_KONSEKVENSER_UTSLIPP
 from fram.virkninger.risiko.hjelpemoduler.verdsetting import get_kalkpris_oljeutslipp, \
@@ -15,8 +16,8 @@ from fram.virkninger.risiko.schemas import KalkprisOljeutslippSchema, KalkprisOl
 from fram.virkninger.ventetid.hjelpemoduler import set_columns
 
 
-def hent_om_angitt_spesifikke_utslippskonsekvensark(inputfil: Union[Path, str, ExcelFile], tiltakspakke: int) -> dict:
-    input_df = pd.read_excel(inputfil, sheet_name=f"Tiltakspakke {tiltakspakke}", skiprows=1, index_col=None)
+def hent_om_angitt_spesifikke_utslippskonsekvensark(inputfil: Union[Path, str, ExcelFile, Arbeidsbok], tiltakspakke: int) -> dict:
+    input_df = les_excel(inputfil, f"Tiltakspakke {tiltakspakke}", skiprows=1, index_col=None)
 
     if len(input_df.axes[1])<45:
         return {}
@@ -36,7 +37,7 @@ def hent_om_angitt_spesifikke_utslippskonsekvensark(inputfil: Union[Path, str, E
 @pa.check_types(lazy=True)
 def les_inn_kalkpriser_utslipp(kroneaar: int,
                                beregningsaar: List[int],
-                               excel_inputfil: Union[Path, str],
+                               excel_inputfil: Union[Path, str, Arbeidsbok],
                                tiltakspakke: int,
                                analyseomraader: List[str],
                                logger: callable = print) -> (
@@ -56,11 +57,14 @@ def les_inn_kalkpriser_utslipp(kroneaar: int,
     Parameters:
         kroneaar: Kroneåret analysen skal gjøres i. Kalkpriser oppdateres til dette året
         beregningsaar: Liste over de årene du vil ha beregnet kalkpriser for
-        excel_inputfil: Filbane til input-filen den skal lete i
+        excel_inputfil: Filbane til input-filen den skal lete i, eller arbeidsboken for den
         tiltakspakke: Nummeret på tiltakspakken. Brukes for å finne rett inputark
         analyseomraader: Liste over analyseområder det skal lages kalkpriser for. Uten denne, kan den ikke fylle ut alle
         logger: Dersom du vil lede loggingen til noe annet enn print. Må være callable med tekst som input
     """
+    # Alle arkene leses fra den samme arbeidsboken. Utslippskonsekvensarkene angis som 'filbane:::arknavn', og
+    # filbanen slås opp til den samme boken igjen, se :meth:`~fram.generelle_hjelpemoduler.excel.arbeidsbok`
+    excel_inputfil = arbeidsbok(excel_inputfil)
     an_omr_til_ark = hent_om_angitt_spesifikke_utslippskonsekvensark(inputfil=excel_inputfil, tiltakspakke=tiltakspakke)
     kalkpriser_utslipp_ref = []
     kalkpriser_utslipp_tiltak = []
@@ -88,7 +92,7 @@ def les_inn_kalkpriser_utslipp(kroneaar: int,
         else:
             logger(f"Benytter brukerangitte utslippskonsekvenser for tiltaksomraade {omraade} i referansebanen, fra arket {spesifikke_ark['ref']}")
             # logger(spesifikke_ark["ref"])
-            bok_ark = excel_inputfil+":::"+spesifikke_ark["ref"]
+            bok_ark = os.fspath(excel_inputfil) + ":::" + spesifikke_ark["ref"]
             try:
                 kalkpris_utslipp_ref = get_kalkpris_oljeutslipp(
                 konsekvenser_utslipp_sheet_name=bok_ark,
@@ -116,7 +120,7 @@ def les_inn_kalkpriser_utslipp(kroneaar: int,
         else:
             logger(
                 f"Benytter brukerangitte utslippskonsekvenser for tiltaksomraade {omraade} i tiltaksbanen, fra arket {spesifikke_ark['ref']}")
-            bok_ark = excel_inputfil+":::"+spesifikke_ark["tiltak"]
+            bok_ark = os.fspath(excel_inputfil) + ":::" + spesifikke_ark["tiltak"]
             try:
                 kalkpris_utslipp_tiltak = get_kalkpris_oljeutslipp(
                 konsekvenser_utslipp_sheet_name=bok_ark,
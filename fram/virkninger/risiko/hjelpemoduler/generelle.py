@@ -10,7 +10,7 @@ import pandera as pa
 from pandera.typing import DataFrame
 from xlrd import XLRDError
 
-from fram.generelle_hjelpemoduler.excel import angi_kolonnenavn, vask_kolonnenavn_for_exceltull
+from fram.generelle_hjelpemoduler.excel import Arbeidsbok, angi_kolonnenavn, les_excel, vask_kolonnenavn_for_exceltull
 from fram.generelle_hjelpemoduler.hjelpefunksjoner import (
     _legg_til_kolonne,
     forutsetninger_soa,
@@ -86,11 +86,11 @@ def hent_ut_konsekvensinput(excel_filbane: Optional[Union[Path, str]] = None) ->
         sheet_name = sheet_names[konsekvensnavn]
 
         sannsynligheter.append(
-            pd.read_excel(forutsetninger_soa(),
-                          sheet_name=sheet_name,
-                          usecols="A:F",
-                          skiprows=5,
-                          nrows=3)
+            les_excel(forutsetninger_soa(),
+                      sheet_name,
+                      usecols="A:F",
+                      skiprows=5,
+                      nrows=3)
                 .iloc[:, [0, 4]]
                 .pipe(angi_kolonnenavn, ["Hendelsestype", f"Sannsynlighet {konsekvensnavn}"])
                 .assign(Hendelsestype=lambda df: df.Hendelsestype.map(
@@ -100,9 +100,9 @@ def hent_ut_konsekvensinput(excel_filbane: Optional[Union[Path, str]] = None) ->
 
         for navn, skiprows in rad_offset.items():
             ant_konsekvenser = (
-                pd.read_excel(
+                les_excel(
                     forutsetninger_soa(),
-                    sheet_name=sheet_name,
+                    sheet_name,
                     usecols=kolonner_innlesing,
                     skiprows=skiprows,
                     nrows=antall_rader_innlesing
@@ -687,9 +687,9 @@ def verdsett_opprenskingskostnader(
 
 def _les_konsekvensmatrise(skiprows: int, sheet_name: str) -> pd.DataFrame:
     """Leser inn konsekvensmatrisen"""
-    df = pd.read_excel(
+    df = les_excel(
         forutsetninger_soa(),
-        sheet_name=sheet_name,
+        sheet_name,
         usecols=list(range(10)),
         skiprows=skiprows,
         nrows=16,
@@ -763,11 +763,11 @@ def _beregn_helsekonsekvenser(
 
 
 def les_inn_hvilke_ra_som_brukes_fra_fram_input(
-    filbane: Union[Path, pd.ExcelFile], tiltakspakke: int, arknavn: str = "Risikoanalyser referansebanen"
+    filbane: Union[Path, pd.ExcelFile, Arbeidsbok], tiltakspakke: int, arknavn: str = "Risikoanalyser referansebanen"
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     try:
         ra_ref = (
-            pd.read_excel(filbane, sheet_name=arknavn)
+            les_excel(filbane, arknavn)
             .set_index(
                 [
                     "Strekning",
@@ -791,9 +791,9 @@ def les_inn_hvilke_ra_som_brukes_fra_fram_input(
 
         # Leser inn tiltaks-RAene og fyller manglende informasjon om trafikkgrunnlaget med 'referanse'
         ra_t = (
-            pd.read_excel(
+            les_excel(
                 filbane,
-                sheet_name=f"Tiltakspakke {tiltakspakke}",
+                f"Tiltakspakke {tiltakspakke}",
                 skiprows=1,
                 usecols=[21, 22, 23],
                 names=["Risiko ref", "Risiko tiltak", "RA_trafikkgrunnlag"],
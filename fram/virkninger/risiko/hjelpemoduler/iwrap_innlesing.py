@@ -1,37 +1,141 @@
 """Her ligger kode for innlesing av IWRAP-filer og for å omsette disse i faktiske hendelser basert på trafikk"""
+import hashlib
+import time
 from pathlib import Path
-from typing import Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 from pandas import ExcelFile
 
+from fram.generelle_hjelpemoduler.excel import Arbeidsbok, les_arkrutenett, tabell_fra_rutenett
 from fram.generelle_hjelpemoduler.konstanter import LENGDEGRUPPER_UTEN_MANGLER
+from fram.generelle_hjelpemoduler.mellomlagring import MAKS_ALDER_DAGER, Mellomlager, mellomlagerkatalog
 from fram.virkninger.risiko.hjelpemoduler import generelle as generelle_hjelpemoduler
+from fram.generelle_hjelpemoduler.arbeiderpool import kjor_parallelt
+
+RA_MELLOMLAGER_MILJOVARIABEL = "FRAM_RA_MELLOMLAGER"
+RA_MELLOMLAGER_MAKS_STORRELSE_BYTES = 500_000_000
+# Økes når innlesingen av RA-filene endres, slik at gamle innlesinger ikke lenger treffes
+RA_MELLOMLAGER_VERSJON = 1
+
+
+class RAMellomlager(Mellomlager):
+    """Mellomlager for innleste RA-filer, med én fil per RA-fil, se :meth:`Risikoanalyser.get_risikoanalyser`
+
+    Hver RA-fil lagres som listen med dataframes fra :meth:`les_RA_fil`, med en hash av innholdet i filen som nøkkel.
+    Dataframene lagres som pickle, slik at datatypene er de samme når de hentes. I tillegg lagres ett manifest per
+    RA-mappe, med størrelse, endringstidspunkt og innholdsnøkkel per fil, slik at filer som ikke er endret, ikke må leses
+    for å finne nøkkelen. Se :class:`~fram.generelle_hjelpemoduler.mellomlagring.Mellomlager` for skriving og opprydding.
+
+    Konverterte AISyRISK-filer lagres i det samme mellomlageret, se
+    :meth:`~fram.virkninger.risiko.hjelpemoduler.aisyrisk.les_og_konverter_aisyrisk`.
+
+    Args:
+        katalog: Hvor filene skal ligge. Defaulter til katalogen i miljøvariabelen `FRAM_RA_MELLOMLAGER`, eller
+            `~/.cache/fram/ra`
+        maks_storrelse_bytes: Samlet størrelse mellomlageret ryddes ned til
+        maks_alder_dager: Filer som ikke er brukt på så mange dager, slettes ved opprydding
+    """
+
+    def __init__(
+        self,
+        katalog: Optional[Union[str, Path]] = None,
+        maks_storrelse_bytes: int = RA_MELLOMLAGER_MAKS_STORRELSE_BYTES,
+        maks_alder_dager: float = MAKS_ALDER_DAGER,
+    ):
+        if katalog is None:
+            katalog = mellomlagerkatalog(RA_MELLOMLAGER_MILJOVARIABEL, "ra")
+        super().__init__(katalog, maks_storrelse_bytes, maks_alder_dager)
+
+    @staticmethod
+    def filnokkel(filbane: Path) -> str:
+        """Hash av innholdet i RA-filen, sammen med versjonen av innlesingen og av pandas, som dataframene pickles med"""
+        hasher = hashlib.sha256(f"{RA_MELLOMLAGER_VERSJON}\x1f{pd.__version__}\x1f".encode("utf-8"))
+        with open(filbane, "rb") as f:
+            for blokk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(blokk)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def manifestnokkel(mappe: Path) -> str:
+        """Nøkkelen til manifestet for RA-mappen"""
+        deler = [RA_MELLOMLAGER_VERSJON, "manifest", Path(mappe).resolve()]
+        return hashlib.sha256(
+            "\x1f".join(str(del_) for del_ in deler).encode("utf-8")
+        ).hexdigest()
+
+
+def les_RA_fil(filbane: Path) -> Tuple[List[pd.DataFrame], float]:
+    """Leser alle arkene med "Frekvens IWRAP" i navnet i én RA-fil
+
+    Hvert ark tolkes én gang, og `jobname`, `year` og hendelsene hentes ut av det samme rutenettet. Er definert på
+    toppnivå, slik at den kan kjøres i prosesspoolen, se :meth:`Risikoanalyser.get_risikoanalyser`.
+
+    Returns:
+        Én standardformatert dataframe per ark, med kolonnene jobname og aar lagt til, og hvor mange sekunder
+        innlesingen tok
+    """
+    start = time.perf_counter()
+    risikoanalyser = []
+    with Arbeidsbok(filbane) as bok:
+        for sheet in bok.sheet_names:
+            if "Frekvens IWRAP" in sheet:
+                rutenett = bok.rutenett(sheet)
+                jobname, year = rutenett[2][1], rutenett[3][1]
+                df = Risikoanalyser.parse_RA_output(bok, sheet).assign(
+                    jobname=jobname, aar=int(year)
+                )
+                risikoanalyser.append(df)
+    return risikoanalyser, time.perf_counter() - start
 
 
 class Risikoanalyser:
-    def __init__(self, ra_dir: Path, les_paa_nytt: bool = False, logger: callable = None):
+    def __init__(
+        self,
+        ra_dir: Path,
+        les_paa_nytt: bool = False,
+        logger: callable = None,
+        num_workers: Optional[int] = None,
+        cache_dir: Optional[Union[str, Path]] = None,
+    ):
         """Klasse for å lese inn og holde styr på risikoanalysene
 
         Risikoanalysene mottas i standardformaterte Excel-ark. Vi leser dem inn, og masserer dem slik at de passer
-            i videre SØA-beregninger. Denne klassen kan lese inn, enten fra råkjøringer eller fra mellomlagret fil
+            i videre SØA-beregninger. Denne klassen kan lese inn, enten fra råkjøringer eller fra mellomlageret. Bare
+            RA-filer som er nye eller endret siden sist, leses fra Excel, se :class:`RAMellomlager`
+
+        Radene til hver risikoanalyse indekseres etter (jobname, aar) når de er lest inn, slik at :meth:`__call__` og
+            :meth:`hent_ra_resultater` bare henter ut de risikoanalysene som etterspørres, og ikke hele biblioteket.
 
         Args:
             les_paa_nytt: Angir om du skal tvinge til å lese på nytt selv om den skulle finne mellomlagrede
             RA-innlesinger
             logger: En logger du eventuelt vil logge til. Praktisk når denne kalles fra SØA-klassen som allerede logger
+            num_workers: Antall arbeiderprosesser som leser RA-filer parallelt. Defaulter til antall kjerner minus én,
+                se :mod:`~fram.generelle_hjelpemoduler.arbeiderpool`
+            cache_dir: Katalogen for mellomlageret. Defaulter til miljøvariabelen `FRAM_RA_MELLOMLAGER`, eller
+                `~/.cache/fram/ra`
         """
         if logger is None:
             import logging as logger
         self.logger = logger
 
         self.les_paa_nytt = les_paa_nytt
+        self.num_workers = num_workers
+        self.mellomlager = RAMellomlager(cache_dir)
 
         self.ra_dir = ra_dir
         self.ra = self.get_risikoanalyser(
             mappe_til_ra=self.ra_dir, les_paa_nytt=les_paa_nytt
         )
+        # Radnumrene i self.ra til hver risikoanalyse, og hvilke år som finnes for hvert jobname
+        self._radnumre: Dict[Tuple[str, int], np.ndarray] = self.ra.groupby(
+            ["jobname", "aar"], sort=False
+        ).indices
+        self._aar_per_jobname: Dict[str, List[int]] = {}
+        for jobname, aar in self._radnumre:
+            self._aar_per_jobname.setdefault(jobname, []).append(aar)
 
     def __repr__(self):
         return f"Risikoanalyser(les_på_nytt={self.les_paa_nytt})"
@@ -40,8 +144,8 @@ class Risikoanalyser:
         """Henter inn risikoanalysene, enten noen eller alle
 
         Args:
-            risikoanalysenavn: En ra, eller en liste med raer du ønsker å hente ut. Default er None,
-                hvilket betyr at alle hentes.
+            risikoanalysenavn: En ra, eller en liste med raer du ønsker å hente ut, angitt med jobname. Alle årene til
+                hver ra hentes. Default er None, hvilket betyr at alle hentes.
         """
         if risikoanalysenavn is None:
             relevante_ra = self.ra
@@ -49,62 +153,98 @@ class Risikoanalyser:
             if isinstance(risikoanalysenavn, str):
                 risikoanalysenavn = [risikoanalysenavn]
             for navn in risikoanalysenavn:
-                if navn not in list(self.ra):
+                if navn not in self._aar_per_jobname:
                     raise KeyError(
                         f"Finner ikke {navn} blant risikoanalysene. Må du kanskje lese dem inn på nytt?"
                     )
-            relevante_ra = self.ra[risikoanalysenavn]
+            relevante_ra = self._hent_partisjoner(
+                [(navn, aar) for navn in risikoanalysenavn for aar in self._aar_per_jobname[navn]]
+            )
         return relevante_ra
 
+    def _hent_partisjoner(self, nokler) -> pd.DataFrame:
+        """Radene i self.ra til risikoanalysene med de angitte (jobname, aar), i samme rekkefølge som i self.ra
+
+        Nøkler som ikke finnes, hoppes over. Finnes ingen av dem, returneres en tom dataframe med kolonnene i self.ra.
+        """
+        radnumre = [self._radnumre[nokkel] for nokkel in dict.fromkeys(nokler) if nokkel in self._radnumre]
+        if not radnumre:
+            return self.ra.iloc[:0]
+        return self.ra.take(np.sort(np.concatenate(radnumre)))
+
     def get_risikoanalyser(self, mappe_til_ra, les_paa_nytt):
         """Leser inn alle risikoanalysene i 'mappe_til_ra' og returnerer en df
 
         Denne looper over alle filene i mappen, og alle arkene i hver fil, og leser dem inn. Henter ut `jobname`,
         `year` og hendelsene. Disse to parameterne vil unikt definere en RA.
 
+        RA-filer som er lest før, og ikke er endret, hentes fra mellomlageret, se :class:`RAMellomlager`. Nye og endrede
+        filer fordeles på prosesspoolen, og hvert ark tolkes bare én gang, se :meth:`les_RA_fil`. Filer som er slettet
+        fra mappen, kommer ikke med. Hvor lang tid hver fil tok, logges.
+
         Args:
             mappe_til_ra (pathlib.Path): Bane til der RA-filene ligger
-            les_paa_nytt (bool): Hvorvidt vi tvinger til å lese på nytt selv om det finnes mellomlagrede
+            les_paa_nytt (bool): Hvorvidt vi tvinger til å lese alle filene på nytt selv om de finnes i mellomlageret
 
         Returns:
             DataFrame: Standardformatert dataframe med alle de funnede ra, der kolonnene jobname og year er lagt til
         """
-        # Sjekker først om det finnes en forhåndsinnlest RA, det sparer tid
-        RA_FERDIGLEST = self.ra_dir / "innlest_ra.json"
-        if (not les_paa_nytt) and RA_FERDIGLEST.is_file():
-            self.logger.info("    Leser risikoanalyser fra mellomlagret json-fil")
-            risikoanalyser = pd.read_json(RA_FERDIGLEST).sort_index()
-            return risikoanalyser
-
+        start = time.perf_counter()
+        filer = sorted(mappe_til_ra.rglob("*.xlsx"))
+        manifestnokkel = RAMellomlager.manifestnokkel(mappe_til_ra)
+        manifest = {} if les_paa_nytt else (self.mellomlager.hent(manifestnokkel) or {})
+
+        # Finner innholdsnøkkelen til hver fil, og henter filene som ikke er endret fra mellomlageret
+        nytt_manifest: Dict[str, Tuple[int, int, str]] = {}
+        nokler: Dict[Path, str] = {}
+        innlest: Dict[Path, List[pd.DataFrame]] = {}
+        for fil in filer:
+            navn = fil.relative_to(mappe_til_ra).as_posix()
+            status = fil.stat()
+            oppforing = manifest.get(navn)
+            if oppforing is not None and tuple(oppforing[:2]) == (status.st_size, status.st_mtime_ns):
+                nokkel = oppforing[2]
+            else:
+                nokkel = RAMellomlager.filnokkel(fil)
+            nytt_manifest[navn] = (status.st_size, status.st_mtime_ns, nokkel)
+            nokler[fil] = nokkel
+            arkene = None if les_paa_nytt else self.mellomlager.hent(nokkel)
+            if arkene is not None:
+                innlest[fil] = arkene
+
+        mangler = [fil for fil in filer if fil not in innlest]
+        if les_paa_nytt:
+            self.logger.info("    Leser risikoanalyser på nytt fra underliggende excel-filer")
         self.logger.info(
-            "    Leser risikoanalyser på nytt fra underliggende excel-filer"
+            f"    Henter {len(innlest)} RA-filer fra mellomlageret, og leser {len(mangler)} fra excel"
         )
 
-        # Ellers looper den over alle RAene i mappen, og alle arkene med "Frekvens IWRAP" i navnet sitt, og leser dem inn
-
-        risikoanalyser = []
-        for file in mappe_til_ra.rglob("*.xlsx"):
-            wb = pd.ExcelFile(file)
-            sheetnames = wb.sheet_names
-            for sheet in sheetnames:
-                if "Frekvens IWRAP" in sheet:
-                    jobname, year = wb.parse(
-                        sheet, usecols=[1], skiprows=2, nrows=2, header=None
-                    )[1].values
-                    year = int(year)
-                    df = Risikoanalyser.parse_RA_output(wb, sheet).assign(
-                        jobname=jobname, aar=year
-                    )
-                    risikoanalyser.append(df)
+        # Leser de nye og endrede filene, og alle arkene med "Frekvens IWRAP" i navnet sitt
+        lest = kjor_parallelt(
+            les_RA_fil,
+            mangler,
+            [f"Innlesingen av {fil}" for fil in mangler],
+            num_workers=self.num_workers,
+            logger=self.logger.warning,
+        )
+        for fil, (arkene, sekunder) in zip(mangler, lest):
+            self.logger.info(f"      {fil.relative_to(mappe_til_ra)}: {len(arkene)} ark på {sekunder:.2f} s")
+            self.mellomlager.lagre(nokler[fil], arkene)
+            innlest[fil] = arkene
 
-        risikoanalyser = pd.concat(risikoanalyser, sort=False).reset_index(drop=True)
+        self.mellomlager.lagre(manifestnokkel, nytt_manifest)
+        self.mellomlager.rydd()
 
-        risikoanalyser.to_json(RA_FERDIGLEST)
+        risikoanalyser = [df for fil in filer for df in innlest[fil]]
+        self.logger.info(
+            f"    Fant {len(risikoanalyser)} risikoanalyser på {time.perf_counter() - start:.2f} s"
+        )
+        risikoanalyser = pd.concat(risikoanalyser, sort=False).reset_index(drop=True)
 
         return risikoanalyser
 
     @staticmethod
-    def parse_RA_output(excelfil: Union[str, Path, ExcelFile], arknavn: str):
+    def parse_RA_output(excelfil: Union[str, Path, ExcelFile, Arbeidsbok], arknavn: str):
         """Leser inn ett risikoanalyseark fra DNV GL, på avtalt format
 
         Henter ut antall grunnstøtinger og kontaktskader. For kollisjoner vil vi ha både striking og struck. Ettersom
@@ -118,7 +258,13 @@ class Risikoanalyser:
 
         Returns:
             DataFrame: Standardformatert dataframe med risikoanalysene for det angitte excelarket.
+
+        Arket tolkes én gang, og alle tabellene hentes ut av det samme rutenettet, se
+        :meth:`~fram.generelle_hjelpemoduler.excel.les_arkrutenett`.
         """
+        if isinstance(excelfil, ExcelFile):
+            excelfil = excelfil.io
+        rutenett = les_arkrutenett(excelfil, arknavn)
 
         hendelsesliste = {
             # "Struck": (26, 16, 8),
@@ -129,12 +275,8 @@ class Risikoanalyser:
         dfs = []
         for hendelse, (skiprows, nrows, usecols) in hendelsesliste.items():
             df = (
-                pd.read_excel(
-                    excelfil,
-                    sheet_name=arknavn,
-                    skiprows=skiprows,
-                    nrows=nrows,
-                    usecols=list(range(usecols)),
+                tabell_fra_rutenett(
+                    rutenett, skiprows=skiprows, nrows=nrows, usecols=list(range(usecols)),
                 )
                 .rename(columns={"Skipstype Kystverket": "Skipstype"})
                 .assign(Hendelsestype=hendelse)
@@ -146,12 +288,8 @@ class Risikoanalyser:
                     )
             dfs.append(df)
         # Leser inn den utvidede matrisen for å lage våre egne summer for striking og struck
-        utvidet_matrise = pd.read_excel(
-            excelfil,
-            sheet_name=arknavn,
-            skiprows=139,
-            nrows=145,
-            usecols=list(range(146)),
+        utvidet_matrise = tabell_fra_rutenett(
+            rutenett, skiprows=139, nrows=145, usecols=list(range(146)),
         ).fillna(method="ffill")
         utvidet_matrise.columns = (
             pd.Series(utvidet_matrise.columns)
@@ -200,13 +338,20 @@ class Risikoanalyser:
         return risikoanalyser
 
     def hent_ra_resultater(self, ra_navn):
-        """Henter risikoanalysene basert på de jobnamene som er angitt i SØA-inputen"""
+        """Henter risikoanalysene basert på de jobnamene som er angitt i SØA-inputen
+
+        Bare risikoanalysene med de etterspurte (jobname, aar) hentes ut av indeksen og kobles på, ikke hele biblioteket.
+        """
+        ra_navn = ra_navn.dropna()
+        etterspurte = self._hent_partisjoner(
+            zip(ra_navn["Risikoanalyse"], ra_navn["ra_aar"])
+        )
 
         # Kobler på
         koblet = (
-            ra_navn.dropna()
+            ra_navn
             .merge(
-                right=self(),
+                right=etterspurte,
                 left_on=["Risikoanalyse", "ra_aar"],
                 right_on=["jobname", "aar"],
                 how="left",
@@ -226,7 +371,7 @@ class Risikoanalyser:
         # Hvis den finner de gamle lengdegruppene i RAene, gir den en advarsel
         if "21-28" in koblet.Lengdegruppe.unique():
             self.logger.warning(
-                "RAene inneholder de gamle lengdegruppene. Dette er feil! \n Disser er antakelig lest inn fra mellomlagret json-fil. Slett denne og les inn på nytt fra Excel\n"
+                "RAene inneholder de gamle lengdegruppene. Dette er feil! \n Sjekk RA-filene, og les inn på nytt fra Excel med les_RA_paa_nytt\n"
             )
 
         return koblet
@@ -1,8 +1,9 @@
-from typing import List, Callable, Tuple
+from typing import List, Callable, Tuple, Union
 
 import pandas as pd
 from pandera.typing import DataFrame
 
+from fram.generelle_hjelpemoduler.excel import Arbeidsbok, les_excel
 from fram.virkninger.felles_hjelpemoduler.schemas import verbose_schema_error
 from fram.virkninger.risiko.hjelpemoduler.generelle import hent_ut_konsekvensinput, lag_konsekvensmatrise
 from fram.virkninger.risiko.schemas import KonsekvensmatriseSchema
@@ -10,7 +11,7 @@ from fram.virkninger.risiko.schemas import KonsekvensmatriseSchema
 
 @verbose_schema_error
 def les_inn_konsekvensmatriser(beregningsaar: List[int],
-                               excel_inputfil: pd.ExcelFile,
+                               excel_inputfil: Union[pd.ExcelFile, Arbeidsbok],
                                tiltakspakke: int,
                                logger: Callable = print) -> Tuple[
     DataFrame[KonsekvensmatriseSchema],
@@ -24,7 +25,7 @@ def les_inn_konsekvensmatriser(beregningsaar: List[int],
 
     Args:
         beregningsaar: Liste med heltall beregningsår
-        excel_inputfil: En åpnet pandas ExcelFile for strekningen som analyseres
+        excel_inputfil: En åpnet pandas ExcelFile eller Arbeidsbok for strekningen som analyseres
         tiltakspakke: Heltall som angir tiltakspakken som analyseres
         logger: En funksjon der vi kan logge, defaulter til print
 
@@ -41,7 +42,7 @@ def les_inn_konsekvensmatriser(beregningsaar: List[int],
         konsekvensmatrise_ref = standard_konsekvensmatrise
     else:
         logger("Leser inn input til konsekvensmatrise i referansebanen fra brukerangitt inputfil")
-        konsekvensinput_ref = pd.read_excel(excel_inputfil, sheet_name="Konsekvensinput referansebanen")
+        konsekvensinput_ref = les_excel(excel_inputfil, "Konsekvensinput referansebanen")
         konsekvensmatrise_ref = lag_konsekvensmatrise(konsekvensinput_ref, beregningsaar)
 
     if f"Konsekvensinput TP {tiltakspakke}" not in excel_inputfil.sheet_names:
@@ -50,7 +51,7 @@ def les_inn_konsekvensmatriser(beregningsaar: List[int],
         konsekvensmatrise_tiltak = standard_konsekvensmatrise
     else:
         logger(f"Leser inn input til konsekvensmatrise i tiltaksbanen fra brukerangitt inputfil")
-        konsekvensinput_tiltak = pd.read_excel(excel_inputfil, sheet_name=f"Konsekvensinput TP {tiltakspakke}")
+        konsekvensinput_tiltak = les_excel(excel_inputfil, f"Konsekvensinput TP {tiltakspakke}")
 
         konsekvensmatrise_tiltak = lag_konsekvensmatrise(konsekvensinput_tiltak, beregningsaar)
 
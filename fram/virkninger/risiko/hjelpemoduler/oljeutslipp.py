@@ -2,6 +2,7 @@
 import pandas as pd
 
 from fram.generelle_hjelpemoduler import kalkpriser
+from fram.generelle_hjelpemoduler.excel import les_excel
 from fram.generelle_hjelpemoduler.hjelpefunksjoner import forutsetninger_soa
 from fram.virkninger.risiko.hjelpemoduler.generelle import ARKNAVN_KONSEKVENSER_UTSLIPP
 from fram.virkninger.risiko.hjelpemoduler.utslipp_felles import _read_table_utslipp
@@ -143,9 +144,9 @@ def _kalkpriser_utslipp(var_name: str, kroneaar: int):
     og sårbarhet skal ha. Deretter kobler den disse verdiene til kalkulasjonspriser for 17 fylker.
     """
     # Henter inn sårbarhetsmatrisen med såbarhetsnivåer, drivstofftype og utfallskategori
-    sarbarhetsmatrise = pd.read_excel(
+    sarbarhetsmatrise = les_excel(
         forutsetninger_soa(),
-        sheet_name="kalkpris_utslipp",
+        "kalkpris_utslipp",
         usecols=list(range(6)),
         skiprows=3,
         nrows=20,
@@ -158,9 +159,9 @@ def _kalkpriser_utslipp(var_name: str, kroneaar: int):
     )
 
     # Henter inn kalkulasjonsprisene for ulike kategorier og fylker
-    df_kalkpriser = pd.read_excel(
+    df_kalkpriser = les_excel(
         forutsetninger_soa(),
-        sheet_name="kalkpris_utslipp",
+        "kalkpris_utslipp",
         usecols=list(range(5)),
         skiprows=28,
         nrows=18,
@@ -237,9 +238,9 @@ def _hent_kalkpriser(kroneaar: int, konsekvenser_utslipp_sheet_name: str):
 
 def _hent_sannsynligheter():
     "Hjelpefunksjon for å hente ut sannsynligheter for ulike alvorlighetskrader også kalt utslippskategorier."
-    sannsynligheter2018 = pd.read_excel(
+    sannsynligheter2018 = les_excel(
         forutsetninger_soa(),
-        sheet_name="konsekvenser_utslipp",
+        "konsekvenser_utslipp",
         usecols=list(range(4)),
         skiprows=7,
         nrows=4,
@@ -252,9 +253,9 @@ def _hent_sannsynligheter():
         value_name="Sannsynlighet2018",
     )
 
-    sannsynligheter2050 = pd.read_excel(
+    sannsynligheter2050 = les_excel(
         forutsetninger_soa(),
-        sheet_name="konsekvenser_utslipp",
+        "konsekvenser_utslipp",
         usecols=list(range(4)),
         skiprows=15,
         nrows=4,
@@ -3,6 +3,7 @@ from functools import lru_cache
 import pandas as pd
 
 from fram.generelle_hjelpemoduler import kalkpriser
+from fram.generelle_hjelpemoduler.excel import les_excel
 from fram.generelle_hjelpemoduler.hjelpefunksjoner import forutsetninger_soa
 
 
@@ -76,9 +77,9 @@ def lag_tabell_utslipp_opp(utslippstype, konsekvenser_utslipp_sheet_name: str, a
 
 @lru_cache()
 def hent_kalkpriser(utslippstype: str, kroneaar: int):
-    kalkpriser_opp = pd.read_excel(
+    kalkpriser_opp = les_excel(
         forutsetninger_soa(),
-        sheet_name="kalkpris_utslipp",
+        "kalkpris_utslipp",
         usecols=list(range(2)),
         skiprows=48,
         nrows=4,
@@ -1,9 +1,18 @@
 import pandas as pd
 
+from fram.generelle_hjelpemoduler.excel import arbeidsbok, les_excel
 from fram.generelle_hjelpemoduler.hjelpefunksjoner import forutsetninger_soa
 from fram.virkninger.risiko.hjelpemoduler.generelle import ARKNAVN_KONSEKVENSER_UTSLIPP
 
 
+def _excel_bok(konsekvenser_utslipp_sheet_name: str):
+    """Boken i en trippelkolonseparert string 'bok:::ark'. En filbane gir arbeidsboken for filen, som deles med FRAM"""
+    excel_bok = konsekvenser_utslipp_sheet_name.split(":::")[0]
+    if excel_bok == "forutsetninger":
+        return forutsetninger_soa()
+    return arbeidsbok(excel_bok)
+
+
 def _read_table_utslipp(
     skiprows: int, utslippstype: str, konsekvenser_utslipp_sheet_name: str
 ):
@@ -23,13 +32,12 @@ def _read_table_utslipp(
     else:
         raise KeyError(f"'utslippstype' må være en av 'Bunkers' eller 'Last'. Fikk {utslippstype}")
 
-    excel_bok, arknavn = konsekvenser_utslipp_sheet_name.split(":::")
-    if excel_bok == "forutsetninger":
-        excel_bok = forutsetninger_soa()
+    excel_bok = _excel_bok(konsekvenser_utslipp_sheet_name)
+    arknavn = konsekvenser_utslipp_sheet_name.split(":::")[1]
 
-    df = pd.read_excel(
+    df = les_excel(
         excel_bok,
-        sheet_name=arknavn,
+        arknavn,
         usecols=list(range(9)),
         skiprows=skiprows,
         nrows=nrows,
@@ -39,13 +47,12 @@ def _read_table_utslipp(
 
 def hent_sannsynligheter(konsekvenser_utslipp_sheet_name: str):
     "Hjelpefunksjon for å hente ut sannsynligheter for ulike alvorlighetskrader også kalt utslippskategorier."
-    excel_bok, arknavn = konsekvenser_utslipp_sheet_name.split(":::")
-    if excel_bok == "forutsetninger":
-        excel_bok = forutsetninger_soa()
+    excel_bok = _excel_bok(konsekvenser_utslipp_sheet_name)
+    arknavn = konsekvenser_utslipp_sheet_name.split(":::")[1]
 
-    sannsynligheter2018 = pd.read_excel(
+    sannsynligheter2018 = les_excel(
         excel_bok,
-        sheet_name=arknavn,
+        arknavn,
         usecols=list(range(4)),
         skiprows=7,
         nrows=4,
@@ -58,9 +65,9 @@ def hent_sannsynligheter(konsekvenser_utslipp_sheet_name: str):
         value_name="Sannsynlighet2018",
     )
 
-    sannsynligheter2050 = pd.read_excel(
+    sannsynligheter2050 = les_excel(
         excel_bok,
-        sheet_name=arknavn,
+        arknavn,
         usecols=list(range(4)),
         skiprows=15,
         nrows=4,
@@ -8,7 +8,7 @@ from pandera.typing import DataFrame
 
 import fram.generelle_hjelpemoduler.hjelpefunksjoner
 from fram.generelle_hjelpemoduler import kalkpriser
-from fram.generelle_hjelpemoduler.hjelpefunksjoner import interpoler_linear_vekstfaktor
+from fram.generelle_hjelpemoduler.hjelpefunksjoner import interpoler_linear_vekstfaktor, lat_referansedata
 from fram.virkninger.felles_hjelpemoduler.schemas import verbose_schema_error
 from fram.virkninger.risiko.hjelpemoduler import (
     oljeutslipp,
@@ -24,8 +24,9 @@ from fram.virkninger.risiko.schemas import (
 )
 from fram.virkninger.tid.schemas import KalkprisTidSchema
 
-PERSONSKADER = fram.generelle_hjelpemoduler.hjelpefunksjoner.forut(
-    "kalkpriser_helse", 2
+# PERSONSKADER leses fra forutsetningsboken først når den brukes
+__getattr__ = lat_referansedata(
+    __name__, {"PERSONSKADER": lambda: fram.generelle_hjelpemoduler.hjelpefunksjoner.forut("kalkpriser_helse", 2)}
 )
 MAPPE_FERDIGBEREGNET_OLJEUTSLIPP = (
     Path(__file__).parent.parent.parent.parent / "kalkpriser" / "oljeutslipp"
@@ -82,23 +83,24 @@ def _verdi_per_skade_mennesker(omfang: str, tilaar: int):
         raise ValueError("VSL er bare definert i 2024-kroner etter sommeren 2023.")
     if omfang not in ["Dødsfall", "Personskade"]:
         raise ValueError("omfang må være en av to kategorier: Dødsfall, Personskade")
+    personskader = fram.generelle_hjelpemoduler.hjelpefunksjoner.forut("kalkpriser_helse", 2)
     if omfang == "Dødsfall":
-        personskade = PERSONSKADER.loc[
-            PERSONSKADER["Variabel"] == omfang, "Input"
+        personskade = personskader.loc[
+            personskader["Variabel"] == omfang, "Input"
         ].values[0]
         kroneaar = int(
-            PERSONSKADER.loc[PERSONSKADER["Variabel"] == omfang, "Kroneverdi"].values[0]
+            personskader.loc[personskader["Variabel"] == omfang, "Kroneverdi"].values[0]
         )
         prisfaktor = kalkpriser.prisjustering(1, kroneaar, tilaar)
         realfaktor = kalkpriser.realprisjustering_kalk(1, kroneaar, tilaar)
         omfang_justert = personskade * prisfaktor * realfaktor
     else:
-        personskade = PERSONSKADER.loc[
-            PERSONSKADER["Variabel"] == "Gjennomsnitt rapportert personskade", "Input",
+        personskade = personskader.loc[
+            personskader["Variabel"] == "Gjennomsnitt rapportert personskade", "Input",
         ].values[0]
         kroneaar = int(
-            PERSONSKADER.loc[
-                PERSONSKADER["Variabel"] == "Gjennomsnitt rapportert personskade",
+            personskader.loc[
+                personskader["Variabel"] == "Gjennomsnitt rapportert personskade",
                 "Kroneverdi",
             ].values[0]
         )
@@ -9,7 +9,9 @@ For fremskrivingen:
 3. At dersom trafikken skaleres med en faktor K, endrer antall hendelser seg med en faktor K
 """
 import functools
+import shutil
 from pathlib import Path
+from unittest.mock import Mock
 
 import pandas as pd
 import numpy as np
@@ -17,7 +19,10 @@ import pytest
 
 from fram.generelle_hjelpemoduler.konstanter import FRAM_DIRECTORY, FOLSOMHET_KOLONNE
 from fram.virkninger.risiko.hjelpemoduler.aisyrisk import konverter_aisyrisk_lengdegrupper, STRIKING_COLUMNS, \
-    STRUCK_COLUMNS, GRUNNSTØTING_COLUMNS, fordel_og_fremskriv_ra, _stable_folsomhetsanalyse
+    STRUCK_COLUMNS, GRUNNSTØTING_COLUMNS, fordel_og_fremskriv_ra, _stable_folsomhetsanalyse, fordel_og_fremskriv_ruter, \
+    les_aisyrisk_csv, les_og_konverter_aisyrisk
+from fram.virkninger.risiko.hjelpemoduler import aisyrisk
+from fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing import RAMellomlager
 from fram.virkninger.risiko.hjelpemoduler.generelle import les_inn_hvilke_ra_som_brukes_fra_fram_input
 
 filnavn = ["Base_VTS.csv", "Base_VTS2.csv", "Base_VTS3.csv"]
@@ -31,9 +36,12 @@ utseilt_kolonner = ["Sailed_time_hours", "Sailed_distance_nm"]
 PATH_TO_FILE = Path(__file__).parent
 
 
+RA_DIR = FRAM_DIRECTORY / "eksempler" / "eksempel_analyser" / "RA"
+
+
 @functools.lru_cache
 def _les_inn_ra(filnavn):
-    return pd.read_csv(FRAM_DIRECTORY / "eksempler" / "eksempel_analyser" / "RA" / filnavn, sep=";")
+    return pd.read_csv(RA_DIR / filnavn, sep=";")
 
 
 def _legg_til_kolonne(df, kolonnenavn, verdi):
@@ -141,6 +149,86 @@ def test_fordel_og_fremskriv_ra_vekstfaktor_hendelser_lik_vekstfaktor_trafikk(ai
     assert np.isclose(fasit, beregnet_hendelser_ra_aar)
 
 
+def test_fordel_og_fremskriv_ruter_gir_det_samme_som_hver_rute_for_seg():
+    konverterte = {navn: konverter_aisyrisk_lengdegrupper(_les_inn_ra(navn)) for navn in filnavn[:2]}
+    ra_aar = 2019
+    trafikk = (
+        konverterte[filnavn[0]]
+        .reset_index()
+        [["Skipstype", "Lengdegruppe"]]
+        .assign(
+            Analyseomraade="1_1",
+            Rute="A",
+            Strekning="A",
+            Tiltaksomraade="B",
+            Tiltakspakke=11,
+            Analysenavn="Dummy"
+                )
+        .pipe(_legg_til_kolonne, ra_aar, 1)
+        .pipe(_legg_til_kolonne, ra_aar+1, 2)
+        .set_index(["Strekning", "Tiltaksomraade", "Tiltakspakke", "Analyseomraade", "Rute", "Analysenavn", "Skipstype", "Lengdegruppe"])
+    )
+    # Rute A og C deler risikoanalyse, og beregnes bare én gang
+    ruter = pd.DataFrame({
+        "Rute": ["A", "B", "C"],
+        "Analyseomraade": ["1_1"] * 3,
+        "Risikoanalyse": [filnavn[0], filnavn[1], filnavn[0]],
+        "ra_aar": [ra_aar] * 3,
+    })
+    beregnet = fordel_og_fremskriv_ruter(ruter, konverterte, trafikk=trafikk, beregningsaar=[ra_aar, ra_aar + 1], risiko_logger=print)
+    fasit = pd.concat([
+        fordel_og_fremskriv_ra(konverterte[rad.Risikoanalyse], trafikk=trafikk, beregningsaar=[ra_aar, ra_aar + 1],
+                               risikoanalyseaar=ra_aar, analyseomraade=rad.Analyseomraade, rute=rad.Rute,
+                               risikoanalysenavn=rad.Risikoanalyse, risiko_logger=print)
+        for rad in ruter.itertuples()
+    ], axis=0)
+    pd.testing.assert_frame_equal(beregnet, fasit)
+
+
+@pytest.mark.parametrize("skilletegn", [";", ","])
+def test_les_aisyrisk_csv_gir_samme_konvertering_som_read_csv(tmp_path, skilletegn):
+    filbane = tmp_path / "ra.csv"
+    _les_inn_ra(filnavn[0]).to_csv(filbane, sep=skilletegn, index=False)
+    innlest = les_aisyrisk_csv(filbane)
+    assert innlest[STRIKING_COLUMNS + GRUNNSTØTING_COLUMNS].dtypes.eq("float64").all()
+    pd.testing.assert_frame_equal(
+        konverter_aisyrisk_lengdegrupper(innlest), konverter_aisyrisk_lengdegrupper(_les_inn_ra(filnavn[0]))
+    )
+
+
+def test_bare_nye_og_endrede_aisyrisk_filer_leses(tmp_path, monkeypatch):
+    filbaner = {Path(navn).stem: tmp_path / navn for navn in filnavn[:2]}
+    for navn in filnavn[:2]:
+        shutil.copy(RA_DIR / navn, tmp_path / navn)
+    mellomlager = RAMellomlager(tmp_path / "mellomlager")
+    forste = les_og_konverter_aisyrisk(filbaner, mellomlager, num_workers=1, logger=Mock())
+
+    lest = []
+    les_og_konverter = aisyrisk._les_og_konverter_aisyrisk_fil
+
+    def tell_innlesinger(filbane):
+        lest.append(filbane.name)
+        return les_og_konverter(filbane)
+
+    monkeypatch.setattr(aisyrisk, "_les_og_konverter_aisyrisk_fil", tell_innlesinger)
+
+    # Ingenting er endret, så alt hentes fra mellomlageret
+    andre = les_og_konverter_aisyrisk(filbaner, mellomlager, num_workers=1, logger=Mock())
+    assert lest == []
+    assert list(andre) == list(filbaner)
+    for navn in filbaner:
+        pd.testing.assert_frame_equal(forste[navn], andre[navn])
+        pd.testing.assert_frame_equal(andre[navn], konverter_aisyrisk_lengdegrupper(_les_inn_ra(f"{navn}.csv")))
+
+    # En endret fil leses på nytt, og med les_paa_nytt leses alle
+    shutil.copy(RA_DIR / filnavn[2], filbaner["Base_VTS2"])
+    tredje = les_og_konverter_aisyrisk(filbaner, mellomlager, num_workers=1, logger=Mock())
+    assert lest == ["Base_VTS2.csv"]
+    pd.testing.assert_frame_equal(tredje["Base_VTS2"], konverter_aisyrisk_lengdegrupper(_les_inn_ra(filnavn[2])))
+    les_og_konverter_aisyrisk(filbaner, mellomlager, les_paa_nytt=True, num_workers=1, logger=Mock())
+    assert len(lest) == 3
+
+
 @pytest.mark.parametrize("aisyrisk_ra_navn, kolonne_beregnet, _from, _to", [
     (fil, kolonne, _from, _to) for kolonne in kolonnemappere.keys() for fil in filnavn for _from in [0, 1, 4] for _to in [-3, -4, -1]
 ])
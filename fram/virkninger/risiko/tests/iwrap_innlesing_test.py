@@ -1,11 +1,14 @@
+import shutil
 from unittest.mock import Mock
 
+import numpy as np
 import pandas as pd
 import pytest
 
-from fram.generelle_hjelpemoduler.konstanter import FRAM_DIRECTORY
+from fram.generelle_hjelpemoduler.konstanter import FRAM_DIRECTORY, LENGDEGRUPPER_UTEN_MANGLER
 from fram.virkninger.risiko.hjelpemoduler.generelle import les_inn_hvilke_ra_som_brukes_fra_fram_input
-from fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing import Risikoanalyser
+from fram.virkninger.risiko.hjelpemoduler import iwrap_innlesing
+from fram.virkninger.risiko.hjelpemoduler.iwrap_innlesing import Risikoanalyser, les_RA_fil
 
 RA_DIR = (
     FRAM_DIRECTORY / "eksempler" / "risikoanalyser"
@@ -79,3 +82,89 @@ def test_hent_ra_resultater_tiltak(ra_ref, risiko_ref, iwrap_reader_cached):
         _merge=lambda df: df._merge.astype(str)
     ).assign(Analysenavn="Test")
     pd.testing.assert_frame_equal(risiko_ref, risiko)
+
+
+def test_les_RA_fil_gir_det_samme_som_read_excel():
+    fil = RA_DIR / "Frekvenser_03Bustnes_2050.xlsx"
+    arkene, _ = les_RA_fil(fil)
+    iwrap_ark = [ark for ark in pd.ExcelFile(fil).sheet_names if "Frekvens IWRAP" in ark]
+    assert len(arkene) == len(iwrap_ark)
+    for ark, df in zip(iwrap_ark, arkene):
+        jobname, year = pd.read_excel(
+            fil, sheet_name=ark, usecols=[1], skiprows=2, nrows=2, header=None
+        )[1].values
+        assert (df.jobname == jobname).all() and (df.aar == int(year)).all()
+
+        grunnstoting = (
+            pd.read_excel(fil, sheet_name=ark, skiprows=77, nrows=16, usecols=list(range(9)))
+            .rename(columns={"Skipstype Kystverket": "Skipstype"})
+            .melt(id_vars="Skipstype", value_vars=LENGDEGRUPPER_UTEN_MANGLER, value_name="Hendelser")
+        )
+        innlest = df.loc[df.Hendelsestype == "Grunnstøting"]
+        np.testing.assert_allclose(innlest.Hendelser.values, grunnstoting.Hendelser.values)
+
+
+def test_parallell_innlesing_gir_det_samme(tmp_path):
+    for fil in ["Frekvenser_02Notholodden_2017.xlsx", "Frekvenser_02Notholodden_2050.xlsx"]:
+        shutil.copy(RA_DIR / fil, tmp_path / fil)
+    seriell = Risikoanalyser(ra_dir=tmp_path, logger=Mock(), les_paa_nytt=True, num_workers=1)
+    parallell = Risikoanalyser(ra_dir=tmp_path, logger=Mock(), les_paa_nytt=True, num_workers=2)
+    pd.testing.assert_frame_equal(seriell.ra, parallell.ra)
+    assert seriell.ra.groupby(["jobname", "aar"]).ngroups == 4
+
+
+def test_bare_nye_og_endrede_ra_filer_leses(tmp_path, monkeypatch):
+    ra_dir = tmp_path / "risikoanalyser"
+    ra_dir.mkdir()
+    for fil in ["Frekvenser_02Notholodden_2017.xlsx", "Frekvenser_02Notholodden_2050.xlsx"]:
+        shutil.copy(RA_DIR / fil, ra_dir / fil)
+    mellomlager = tmp_path / "mellomlager"
+    forste = Risikoanalyser(ra_dir=ra_dir, logger=Mock(), num_workers=1, cache_dir=mellomlager)
+
+    lest = []
+
+    def tell_innlesinger(filbane):
+        lest.append(filbane.name)
+        return les_RA_fil(filbane)
+
+    monkeypatch.setattr(iwrap_innlesing, "les_RA_fil", tell_innlesinger)
+
+    # Ingenting er endret, så alt hentes fra mellomlageret, med de samme datatypene
+    andre = Risikoanalyser(ra_dir=ra_dir, logger=Mock(), num_workers=1, cache_dir=mellomlager)
+    assert lest == []
+    pd.testing.assert_frame_equal(forste.ra, andre.ra)
+
+    # En ny fil leses, og en fil som er slettet, kommer ikke med
+    shutil.copy(RA_DIR / "Frekvenser_03Bustnes_2017.xlsx", ra_dir / "Frekvenser_03Bustnes_2017.xlsx")
+    (ra_dir / "Frekvenser_02Notholodden_2050.xlsx").unlink()
+    tredje = Risikoanalyser(ra_dir=ra_dir, logger=Mock(), num_workers=1, cache_dir=mellomlager)
+    assert lest == ["Frekvenser_03Bustnes_2017.xlsx"]
+    assert not tredje.ra.aar.eq(2050).any()
+    assert tredje.ra.groupby(["jobname", "aar"]).ngroups == 4
+
+    # Med les_paa_nytt leses alle filene
+    Risikoanalyser(ra_dir=ra_dir, logger=Mock(), les_paa_nytt=True, num_workers=1, cache_dir=mellomlager)
+    assert len(lest) == 3
+
+
+def test_henter_risikoanalyser_fra_indeksen(ra_ref, iwrap_reader_cached):
+    ra = iwrap_reader_cached("risiko_1_1_A0_2017")
+    pd.testing.assert_frame_equal(
+        ra, iwrap_reader_cached.ra.loc[lambda df: df.jobname == "risiko_1_1_A0_2017"]
+    )
+    with pytest.raises(KeyError):
+        iwrap_reader_cached(["risiko_1_1_A0_2017", "finnes_ikke"])
+
+    # Koblingen mot de etterspurte risikoanalysene gir det samme som koblingen mot hele biblioteket
+    hele_biblioteket = (
+        ra_ref.dropna()
+        .merge(
+            right=iwrap_reader_cached(),
+            left_on=["Risikoanalyse", "ra_aar"],
+            right_on=["jobname", "aar"],
+            how="left",
+            indicator=True,
+        )
+        .dropna()
+    )
+    pd.testing.assert_frame_equal(iwrap_reader_cached.hent_ra_resultater(ra_ref), hele_biblioteket)
@@ -25,23 +25,313 @@ Denne algoritmen gjøres litt enklere dersom det bare er en skipstype, bare en f
 ikke gis rabatt for å seile i samme retning. Grunnalgoritmen er likevel den samme.
 
 """
-from typing import List, Optional, Union
+import functools
+import importlib.util
+import zlib
+from typing import Callable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
-from fram.virkninger.ventetid.hjelpemoduler import (
-    max_or_nan,
-    robust_mean,
-    SKIP_LENGDE_SPLITTER,
+# numba er valgfritt, og benyttes bare til den kompilerte køkjernen. Det importeres først når kjernen kompileres, siden
+# selve importen tar lengre tid enn mange kjøringer bruker på køene
+NUMBA_INSTALLERT = importlib.util.find_spec("numba") is not None
+
+from fram.virkninger.ventetid.hjelpemoduler import confidence_halfwidth
+from fram.virkninger.ventetid.queue_statistics import (
+    bincount_means,
+    group_rates,
+    QueueDistributions,
+    QueueSummary,
+    summarize_queue,
 )
 
 SHIP_SEPARATOR = "--"
 MU_ZERO_REPLACEMENT = 1e-8
+ADAPTIVE_MIN_BATCHES = 4
+ADAPTIVE_MAX_BATCHES = 20
+
+
+def lindley_service_start_times(
+    arrival_times: np.ndarray, occupied_times: np.ndarray
+) -> np.ndarray:
+    """Regner ut når hvert skip får begynne gjennomseilingen i en kø med én flaskehals, uten å loope over skipene
+
+    Med én flaskehals er ventetiden gitt ved Lindley-rekursjonen `W_k = max(0, W_{k-1} + B_{k-1} - (a_k - a_{k-1}))`,
+    der `a` er anløpstidene og `B` er hvor lenge hvert skip holder flaskehalsen opptatt. Rekursjonen har den lukkede
+    løsningen `W_k = C_k - min(C_0, ..., C_k)`, der `C` er den kumulative summen av `B_{k-1} - (a_k - a_{k-1})` med
+    `C_0 = 0`. Den regnes ut med `np.cumsum` og `np.minimum.accumulate`, og gir de samme tidspunktene som løkken
+    `service_start_times[k] = max(busy_until, arrival_times[k])`, opp til avrundingsfeil. Skip som kommer til en ledig
+    flaskehals får ventetid nøyaktig lik null, slik at tellingen av venteepisoder ikke påvirkes av avrundingsfeil.
+
+    Args:
+        arrival_times: Sorterte anløpstider
+        occupied_times: Hvor lenge hvert skip holder flaskehalsen opptatt. Uten alpha-rabatt er dette seilingstiden
+
+    Returns:
+        Tidspunktene der hvert skip begynner gjennomseilingen, `service_start_times`
+    """
+    arrival_times = np.asarray(arrival_times, dtype=float)
+    occupied_times = np.asarray(occupied_times, dtype=float)
+    if len(arrival_times) == 0:
+        return arrival_times.copy()
+
+    increments = np.empty_like(arrival_times)
+    increments[0] = 0
+    increments[1:] = occupied_times[:-1] - np.diff(arrival_times)
+    cumulative = np.cumsum(increments)
+    wait_times = cumulative - np.minimum.accumulate(cumulative)
+    return arrival_times + wait_times
+
+
+QUEUE_KERNELS = ["numpy", "numba", "auto"]
+
+
+def _queue_kernel_numpy(
+    arrival_times: np.ndarray,
+    arrival_directions: np.ndarray,
+    ship_idxs: np.ndarray,
+    gross_service_times: np.ndarray,
+    alpha: np.ndarray,
+    bottleneck_busy_until: Optional[np.ndarray] = None,
+    last_ship_direction: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Referanseimplementasjonen av løkken over anløp i kø-algoritmen, punkt 8 i algoritmebeskrivelsen øverst i filen
+
+    Args:
+        arrival_times: Sorterte anløpstider
+        arrival_directions: Retningen til hvert anløp, kodet som 0 eller 1
+        ship_idxs: Hvilken rad i `gross_service_times` hvert anløp hører til
+        gross_service_times: Seilingstid med dimensjoner (num_ship, num_bottlenecks)
+        alpha: Rabatten for å seile i samme retning som forrige skip, én per flaskehals
+        bottleneck_busy_until: Når hver flaskehals blir ledig ved start. Oppdateres underveis, slik at køen kan
+            simuleres videre fra der den slapp. Defaulter til ledige flaskehalser
+        last_ship_direction: Retningen til siste skip gjennom hver flaskehals ved start. Oppdateres underveis som
+            `bottleneck_busy_until`. Defaulter til retning 0 for alle flaskehalser
+
+    Returns:
+        `bottleneck_chosen`, `service_start_times`, `service_times` og `completion_times`, alle med lengde lik antall anløp
+    """
+    num_arrivals = len(arrival_times)
+    implicit_num_bottlenecks = gross_service_times.shape[1]
+
+    # Setter opp alpha på en matriseform som er hensiktsmessig for simulering
+    applied_alpha = np.array(
+        [alpha, np.ones_like(alpha)]
+    ).T  # [[alpha0, 1], [alpha1, 1], [alpha2, 1]] etc
+    _alpha_row_idx = np.array(
+        list(range(len(alpha)))
+    )  # Bare en hjelpevektor for indeksering - har ingen betydning
+
+    # Tomme vektorer for å lagre når skipene får seile gjennom, når de er ferdige og hvilken flaskehals de brukte
+    service_start_times = np.empty_like(arrival_times)
+    service_times = np.empty_like(arrival_times)
+    completion_times = np.empty_like(arrival_times)  # d
+    bottleneck_chosen = np.empty(num_arrivals, dtype=np.int64)  # p
+    if bottleneck_busy_until is None:
+        bottleneck_busy_until = np.zeros(implicit_num_bottlenecks)  # b
+    if last_ship_direction is None:
+        last_ship_direction = np.zeros(
+            implicit_num_bottlenecks, dtype=np.int8
+        )  # Antar at alle flaskehalser har et skip i retning 0 ved start - liten simuleringsfeil som ikke har noe å si
+
+    # Første skipet seiler direkte gjennom uten ventetid
+    # Øvrige skip seiler gjennom så fort de kommer, eller når forrige er ferdig hvis det er senere i dig
+    for k in range(num_arrivals):
+        current_direction = arrival_directions[k]
+        current_ship_idx = ship_idxs[k]
+        current_service_times = gross_service_times[current_ship_idx, :]
+        alpha_correction = applied_alpha[
+            _alpha_row_idx, (last_ship_direction - current_direction)
+        ]  # Sjekker om du skal få en alfa-korreksjon.
+        # Dette avhenger av om forrige skip seilte samme retning som deg, da er (last_ship_direction - current_direction) = 0, og den henter den første kolonnen i matrisen applied_alpha
+
+        # Alpha-korreksjonen kommer bare inn i hvor lenge flaskehalsen blir opptatt, ikke i ditt valg nå.
+        possible_start_times = np.maximum(arrival_times[k], bottleneck_busy_until)
+        chosen_bottleneck = np.argmin(possible_start_times + current_service_times)
+
+        # Men alpha teller ikke med på servicetiden skipet opplever
+        actual_service_time = current_service_times[chosen_bottleneck]
+        start_service = possible_start_times[chosen_bottleneck]
+
+        bottleneck_chosen[k] = chosen_bottleneck
+        service_start_times[k] = start_service
+        bottleneck_busy_until[chosen_bottleneck] = (
+            start_service
+            + actual_service_time
+            * alpha_correction[
+                chosen_bottleneck
+            ]  # Alpha teller med på hvor lenge neste er opptatt
+        )
+        last_ship_direction[chosen_bottleneck] = current_direction
+        completion_times[k] = start_service + actual_service_time
+        service_times[k] = actual_service_time
+
+    return bottleneck_chosen, service_start_times, service_times, completion_times
+
+
+def _queue_kernel_scalar(
+    arrival_times: np.ndarray,
+    arrival_directions: np.ndarray,
+    ship_idxs: np.ndarray,
+    gross_service_times: np.ndarray,
+    alpha: np.ndarray,
+    bottleneck_busy_until: Optional[np.ndarray] = None,
+    last_ship_direction: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Samme løkke som :meth:`_queue_kernel_numpy`, men skrevet med skalarer slik at den kan kompileres med numba
+
+    Flaskehalsene gjennomgås i stigende rekkefølge og byttes bare ved strengt kortere ferdigtid, slik at valget ved
+    likhet blir det samme som med `np.argmin`. Regneoperasjonene er de samme som i referansen, og svarene blir
+    dermed identiske. Se :meth:`_queue_kernel_numpy` for argumenter og returverdier.
+    """
+    num_arrivals = arrival_times.shape[0]
+    num_bottlenecks = gross_service_times.shape[1]
+
+    service_start_times = np.empty(num_arrivals)
+    service_times = np.empty(num_arrivals)
+    completion_times = np.empty(num_arrivals)
+    bottleneck_chosen = np.empty(num_arrivals, dtype=np.int64)
+    if bottleneck_busy_until is None:
+        bottleneck_busy_until = np.zeros(num_bottlenecks)
+    if last_ship_direction is None:
+        last_ship_direction = np.zeros(num_bottlenecks, dtype=np.int64)
+
+    for k in range(num_arrivals):
+        arrival = arrival_times[k]
+        current_ship_idx = ship_idxs[k]
+        current_direction = arrival_directions[k]
+
+        chosen_bottleneck = 0
+        start_service = 0.0
+        first_completion = np.inf
+        for bottleneck in range(num_bottlenecks):
+            possible_start = max(arrival, bottleneck_busy_until[bottleneck])
+            possible_completion = (
+                possible_start + gross_service_times[current_ship_idx, bottleneck]
+            )
+            if possible_completion < first_completion:
+                first_completion = possible_completion
+                chosen_bottleneck = bottleneck
+                start_service = possible_start
+
+        actual_service_time = gross_service_times[current_ship_idx, chosen_bottleneck]
+        if last_ship_direction[chosen_bottleneck] == current_direction:
+            alpha_correction = alpha[chosen_bottleneck]
+        else:
+            alpha_correction = 1.0
+
+        bottleneck_chosen[k] = chosen_bottleneck
+        service_start_times[k] = start_service
+        bottleneck_busy_until[chosen_bottleneck] = (
+            start_service + actual_service_time * alpha_correction
+        )
+        last_ship_direction[chosen_bottleneck] = current_direction
+        completion_times[k] = start_service + actual_service_time
+        service_times[k] = actual_service_time
+
+    return bottleneck_chosen, service_start_times, service_times, completion_times
+
+
+@functools.lru_cache(maxsize=1)
+def _compiled_queue_kernel() -> Callable:
+    """Kompilerer :meth:`_queue_kernel_scalar` med numba første gang den trengs"""
+    import numba
+
+    return numba.njit(cache=True)(_queue_kernel_scalar)
+
+
+def get_queue_kernel(kernel: str = "numpy") -> Callable:
+    """Henter implementasjonen av løkken over anløp som benyttes av :meth:`simulate_multiship_multiple_bottlenecks_two_directions`
+
+    Args:
+        kernel: "numpy" gir referanseimplementasjonen :meth:`_queue_kernel_numpy`. "numba" gir en kompilert
+            utgave av :meth:`_queue_kernel_scalar`, og krever at numba er installert. "auto" benytter numba hvis
+            det er installert, og ellers numpy. Alle gir identiske svar.
+    """
+    if kernel not in QUEUE_KERNELS:
+        raise ValueError(f"Ukjent kø-kjerne {kernel}. Gyldige verdier er {QUEUE_KERNELS}")
+    if kernel == "auto":
+        kernel = "numba" if NUMBA_INSTALLERT else "numpy"
+    if kernel == "numpy":
+        return _queue_kernel_numpy
+    if not NUMBA_INSTALLERT:
+        raise ImportError(
+            "Kø-kjernen 'numba' krever at pakken numba er installert. Installer den, eller bruk kernel='numpy'"
+        )
+    return _compiled_queue_kernel()
+
+
+def _queue_kernel_replications(
+    arrival_times: np.ndarray,
+    arrival_directions: np.ndarray,
+    ship_idxs: np.ndarray,
+    gross_service_times: np.ndarray,
+    alpha: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Løkken fra :meth:`_queue_kernel_numpy`, kjørt for mange uavhengige replikasjoner samtidig
+
+    Anløpene er gitt som matriser med dimensjoner (num_replications, num_arrivals), én rad per replikasjon. Hvert
+    steg i løkken behandler anløp nummer k i alle replikasjonene på én gang, slik at Python-løkken bare går over
+    den lengste replikasjonen og ikke over summen av dem. Replikasjoner med færre anløp fylles opp bakerst med
+    anløpstid `np.inf`; disse anløpene påvirker ikke de ekte anløpene foran, og resultatene for dem skal forkastes.
+    Hver rad gir de samme svarene som :meth:`_queue_kernel_numpy` gir for raden alene.
+
+    Returns:
+        `bottleneck_chosen`, `service_start_times`, `service_times` og `completion_times`, alle med samme
+        dimensjoner som `arrival_times`
+    """
+    num_replications, num_arrivals = arrival_times.shape
+    implicit_num_bottlenecks = gross_service_times.shape[1]
+    rows = np.arange(num_replications)
+
+    service_start_times = np.empty_like(arrival_times)
+    service_times = np.empty_like(arrival_times)
+    completion_times = np.empty_like(arrival_times)
+    bottleneck_chosen = np.empty(arrival_times.shape, dtype=np.int64)
+    bottleneck_busy_until = np.zeros((num_replications, implicit_num_bottlenecks))
+    last_ship_direction = np.zeros(
+        (num_replications, implicit_num_bottlenecks), dtype=np.int64
+    )
+
+    for k in range(num_arrivals):
+        current_direction = arrival_directions[:, k]
+        current_service_times = gross_service_times[ship_idxs[:, k], :]
+
+        possible_start_times = np.maximum(
+            arrival_times[:, k, np.newaxis], bottleneck_busy_until
+        )
+        chosen_bottleneck = np.argmin(
+            possible_start_times + current_service_times, axis=1
+        )
+
+        actual_service_time = current_service_times[rows, chosen_bottleneck]
+        start_service = possible_start_times[rows, chosen_bottleneck]
+        alpha_correction = np.where(
+            last_ship_direction[rows, chosen_bottleneck] == current_direction,
+            alpha[chosen_bottleneck],
+            1.0,
+        )
+
+        bottleneck_chosen[:, k] = chosen_bottleneck
+        service_start_times[:, k] = start_service
+        bottleneck_busy_until[rows, chosen_bottleneck] = (
+            start_service + actual_service_time * alpha_correction
+        )
+        last_ship_direction[rows, chosen_bottleneck] = current_direction
+        completion_times[:, k] = start_service + actual_service_time
+        service_times[:, k] = actual_service_time
+
+    return bottleneck_chosen, service_start_times, service_times, completion_times
 
 
 def simulate_single_ship_single_bottleneck(
-    lbda: float, mu: float, num_periods: int = 10_000, threshold: float = 0.0
+    lbda: float,
+    mu: float,
+    num_periods: int = 10_000,
+    threshold: float = 0.0,
+    seed: Optional[Union[int, np.random.SeedSequence, np.random.Generator]] = None,
+    stream_key: Sequence = (),
 ):
     """
     Simulerer en kø med én type skip og én flakehals
@@ -54,13 +344,17 @@ def simulate_single_ship_single_bottleneck(
         mu: Angir hvor mange skip som kan behandles av flaskehalsen per tidsenhet (seile gjennom hvis en trang farled, losses i havn hvis det er en kai, etc.)
         num_periods: Hvor mange perioder du ønsker å simulere. For at de store talls lov skal gjelde må du kjøre mer enn én periode. Anbefaler minst 10 000, som er default
         threshold: En terskel du kan angi, for å få rapportert kun de skipene som venter minst så lenge. Angis som andeler av tidsenheten du implisitt har antatt
+        seed: Seed til generatoren av tilfeldige tall, eller en ferdig `numpy.random.Generator`. Defaulter til en
+            tilfeldig seed. Se :meth:`generator`
+        stream_key: Hvor simuleringen ligger i treet av strømmer under `seed`, se :meth:`seed_sequence`
 
     """
+    rng = generator(seed, stream_key)
     lbda = float(lbda)
     mu = float(mu)
 
     # Trekker tid mellom anløp og seilingstid fra de rette fordelingene
-    interarrival_times = np.random.exponential(1 / lbda, int(num_periods * lbda * 1.5))
+    interarrival_times = rng.exponential(1 / lbda, int(num_periods * lbda * 1.5))
     # Faktiske anløpstider er da cumsum av tid mellom anløp
     arrival_times = np.cumsum(interarrival_times)
 
@@ -68,97 +362,30 @@ def simulate_single_ship_single_bottleneck(
     arrival_times = arrival_times[arrival_times < num_periods]
     num_arrivals = len(arrival_times)
 
-    service_times = np.random.exponential(1 / mu, num_arrivals)
+    service_times = rng.exponential(1 / mu, num_arrivals)
 
-    # Tomme vektorer for å lagre når skipene får seile gjennom, og når de er ferdige
-    service_start_times = np.empty_like(arrival_times)
-    completion_times = np.empty_like(arrival_times)
-
-    # Første skipet seiler direkte gjennom uten ventetid
-    service_start_times[0] = arrival_times[0]
-    completion_times[0] = arrival_times[0] + service_times[0]
-    # Øvrige skip seiler gjennom så fort de kommer, eller når forrige er ferdig hvis det er senere i dig
-    for k in range(1, num_arrivals):
-        service_start_times[k] = max(completion_times[k - 1], arrival_times[k])
-        completion_times[k] = service_start_times[k] + service_times[k]
+    # Skip seiler gjennom så fort de kommer, eller når forrige er ferdig hvis det er senere i tid
+    service_start_times = lindley_service_start_times(arrival_times, service_times)
+    completion_times = service_start_times + service_times
 
     # Regner ut de tallene vi ønsker oss
 
     total_times = completion_times - arrival_times
     wait_times = service_start_times - arrival_times
 
-    num_waiting_incidents = np.sum(wait_times > 0)
-
-    wait_times_just = np.where(wait_times > threshold, wait_times, 0)
-    num_waiting_incidents_just = np.sum(wait_times_just > 0)
-
     share_busy = service_times.sum() / completion_times.max()
 
-    # For å regne ut antall skip i kø på ethvert tidspunkt må vi trikse litt med anløps- og gjennomseilingstidspunktene
-    wait_time_start = pd.Series(
-        index=arrival_times[service_start_times > arrival_times],
-        data=1,
-        name="line_length",
-    )
-    wait_time_end = pd.Series(
-        index=service_start_times[service_start_times > arrival_times],
-        data=-1,
-        name="line_length",
+    return summarize_queue(
+        arrival_times=arrival_times,
+        service_start_times=service_start_times,
+        wait_times=wait_times,
+        total_times=total_times,
+        service_times=service_times,
+        server_occupation=share_busy,
+        num_periods=num_periods,
+        threshold=threshold,
     )
 
-    waits = (
-        pd.concat([wait_time_start, wait_time_end], axis=0)
-        .sort_index()
-        .to_frame()
-        .reset_index()
-        .rename(columns={"index": "time_stamp"})
-        .assign(num_in_line=lambda df: df.line_length.cumsum())
-        # Setter inn en første rad for å få med at det var null kø før det første skipet anløp
-        .pipe(
-            lambda df: pd.concat(
-                [
-                    pd.DataFrame(
-                        [{"time_stamp": 0, "line_length": 0, "num_in_line": 0}]
-                    ),
-                    df,
-                ],
-                ignore_index=True,
-                sort=True,
-            )
-        )
-        .assign(duration=lambda df: df.time_stamp.shift(-1) - df.time_stamp)
-    )
-
-    # Summerer all tid tilbrakt med hver kølengde
-    waits_agg = waits.groupby("num_in_line").duration.sum()
-    # Snittkølengden er vektet etter tid tilbrakt med hver kølengde
-    mean_line_length = np.average(waits_agg.index.values, weights=waits_agg.values)
-
-    max_line_length = waits_agg.index.max()
-
-    out = {
-        "mean_wait_time": robust_mean(wait_times),
-        "max_wait_time": max_or_nan(wait_times),
-        "mean_total_time": robust_mean(total_times),
-        "max_total_time": max_or_nan(total_times),
-        "mean_service_time": robust_mean(service_times),
-        "max_service_time": max_or_nan(service_times),
-        "mean_length_line": mean_line_length,
-        "max_length_line": max_line_length,
-        "mean_server_occupation": robust_mean(share_busy),
-        "waiting_incidents_per_period": num_waiting_incidents / arrival_times[-1],
-        "prob_cust_must_wait": num_waiting_incidents / num_arrivals,
-    }
-
-    if threshold > 0:
-        out["mean_wait_time_just"] = robust_mean(wait_times_just)
-        out["waiting_incidents_per_period_just"] = (
-            num_waiting_incidents_just / num_periods
-        )
-        out["prob_cust_must_wait_just"] = num_waiting_incidents_just / num_arrivals
-
-    return out
-
 
 def simulate_multiship_single_bottleneck(
     lbdas: List[float],
@@ -166,6 +393,8 @@ def simulate_multiship_single_bottleneck(
     ship_ids: Optional[List[str]] = None,
     num_periods: int = 10_000,
     threshold: float = 0,
+    seed: Optional[Union[int, np.random.SeedSequence, np.random.Generator]] = None,
+    stream_key: Sequence = (),
 ):
     """Simulerer en kø med flere ulike typer skip, men én flaskehals
 
@@ -186,9 +415,11 @@ def simulate_multiship_single_bottleneck(
             kjøre mer enn én periode. Anbefaler minst 10 000, som er default
         threshold: En terskel du kan angi, for å få rapportert kun de skipene som venter minst så lenge.
             Angis som andeler av tidsenheten du implisitt har antatt
-
+        seed: Seed til generatoren av tilfeldige tall, eller en ferdig `numpy.random.Generator`. Defaulter til en
+            tilfeldig seed. Se :meth:`generator`
+        stream_key: Hvor simuleringen ligger i treet av strømmer under `seed`, se :meth:`seed_sequence`
     """
-
+    rng = generator(seed, stream_key)
     lbdas = [float(lbda) for lbda in lbdas]
     mus = [float(mu) for mu in mus]
     if ship_ids is None:
@@ -198,16 +429,17 @@ def simulate_multiship_single_bottleneck(
         len(lbdas) == len(mus) == len(ship_ids)
     ), "lbdas, mus og ship_ids må ha samme lengde"
     dfs = []
-    for ship, lbda, mu in zip(ship_ids, lbdas, mus):
+    for (ship_idx, ship), lbda, mu in zip(enumerate(ship_ids), lbdas, mus):
         df = pd.DataFrame(
             {
-                "interarrival_times": np.random.exponential(
+                "interarrival_times": rng.exponential(
                     1 / lbda, int(num_periods * min(lbdas))
                 ),
-                "service_times": np.random.exponential(
+                "service_times": rng.exponential(
                     1 / mu, int(num_periods * min(lbdas))
                 ),
                 "ship_id": ship,
+                "ship_idx": ship_idx,
             }
         ).assign(arrival_times=lambda df: df.interarrival_times.cumsum())
         dfs.append(df)
@@ -218,107 +450,36 @@ def simulate_multiship_single_bottleneck(
         .reset_index(drop=True)
         .query("arrival_times < @num_periods")
     )
-    num_arrivals = len(df)
 
     # Henter ut anløpstallene og gjenbruker mye av algoritmen fra ettskipstilfellet
     arrival_times = df.arrival_times.values
     service_times = df.service_times.values
 
-    # Tomme vektorer for å lagre når skipene får seile gjennom, og når de er ferdige
-    service_start_times = np.empty_like(arrival_times)
-    completion_times = np.empty_like(arrival_times)
-
-    # Første skipet seiler direkte gjennom uten ventetid
-    service_start_times[0] = arrival_times[0]
-    completion_times[0] = arrival_times[0] + service_times[0]
-    # Øvrige skip seiler gjennom så fort de kommer, eller når forrige er ferdig hvis det er senere i dig
-    for k in range(1, num_arrivals):
-        service_start_times[k] = max(completion_times[k - 1], arrival_times[k])
-        completion_times[k] = service_start_times[k] + service_times[k]
+    # Skip seiler gjennom så fort de kommer, eller når forrige er ferdig hvis det er senere i tid
+    service_start_times = lindley_service_start_times(arrival_times, service_times)
+    completion_times = service_start_times + service_times
 
     # Regner ut de tallene vi ønsker oss
     total_times = completion_times - arrival_times
     wait_times = total_times - service_times
 
-    df = (
-        df.assign(service_start_times=service_start_times)
-        .assign(completion_times=completion_times)
-        .assign(total_times=total_times)
-        .assign(wait_times=wait_times)
-    )
-
-    num_waiting_incidents = np.sum(wait_times > 0)
-
-    wait_times_just = np.where(wait_times > threshold, wait_times, 0)
-    num_waiting_incidents_just = np.sum(wait_times_just > 0)
-
     share_busy = service_times.sum() / completion_times.max()
 
-    # For å regne ut antall skip i kø på ethvert tidspunkt må vi trikse litt med anløps- og gjennomseilingstidspunktene
-    wait_time_start = pd.Series(
-        index=arrival_times[service_start_times > arrival_times],
-        data=1,
-        name="line_length",
-    )
-    wait_time_end = pd.Series(
-        index=service_start_times[service_start_times > arrival_times],
-        data=-1,
-        name="line_length",
+    out = summarize_queue(
+        arrival_times=arrival_times,
+        service_start_times=service_start_times,
+        wait_times=wait_times,
+        total_times=total_times,
+        service_times=service_times,
+        server_occupation=share_busy,
+        num_periods=num_periods,
+        threshold=threshold,
     )
 
-    waits = (
-        pd.concat([wait_time_start, wait_time_end], axis=0)
-        .sort_index()
-        .to_frame()
-        .reset_index()
-        .rename(columns={"index": "time_stamp"})
-        .assign(num_in_line=lambda df: df.line_length.cumsum())
-        # Setter inn en første rad for å få med at det var null kø før det første skipet anløp
-        .pipe(
-            lambda df: pd.concat(
-                [
-                    pd.DataFrame(
-                        [{"time_stamp": 0, "line_length": 0, "num_in_line": 0}]
-                    ),
-                    df,
-                ],
-                ignore_index=True,
-                sort=True,
-            )
-        )
-        .assign(duration=lambda df: df.time_stamp.shift(-1) - df.time_stamp)
-    )
-
-    # Summerer all tid tilbrakt med hver kølengde
-    waits_agg = waits.groupby("num_in_line").duration.sum()
-    # Snittkølengden er vektet etter tid tilbrakt med hver kølengde
-    mean_line_length = np.average(waits_agg.index.values, weights=waits_agg.values)
-
-    max_line_length = waits_agg.index.max()
-
-    out = {
-        "mean_wait_time": robust_mean(wait_times),
-        "max_wait_time": max_or_nan(wait_times),
-        "mean_total_time": robust_mean(total_times),
-        "max_total_time": max_or_nan(total_times),
-        "mean_service_time": robust_mean(service_times),
-        "max_service_time": max_or_nan(service_times),
-        "mean_length_line": mean_line_length,
-        "max_length_line": max_line_length,
-        "mean_server_occupation": robust_mean(share_busy),
-        "waiting_incidents_per_period": num_waiting_incidents / arrival_times[-1],
-        "prob_cust_must_wait": num_waiting_incidents / num_arrivals,
-    }
-
     # Gjsn ventetid per skip av hver type
-    out["mean_wait_time_per_ship"] = df.groupby("ship_id").wait_times.mean().to_dict()
-
-    if threshold > 0:
-        out["mean_wait_time_just"] = robust_mean(wait_times_just)
-        out["waiting_incidents_per_period_just"] = (
-            num_waiting_incidents_just / num_periods
-        )
-        out["prob_cust_must_wait_just"] = num_waiting_incidents_just / len(wait_times)
+    out["mean_wait_time_per_ship"] = bincount_means(
+        df.ship_idx.values, wait_times, ship_ids
+    )
 
     return out
 
@@ -330,6 +491,8 @@ def simulate_multiship_multiple_bottlenecks(
     bottleneck_ids: Optional[List[str]] = None,
     num_periods: int = 10_000,
     threshold: float = 0,
+    seed: Optional[Union[int, np.random.SeedSequence, np.random.Generator]] = None,
+    stream_key: Sequence = (),
 ):
     """Simulerer en kø med flere ulike typer skip, og flere mulige flaskehalser å velge
 
@@ -355,7 +518,11 @@ def simulate_multiship_multiple_bottlenecks(
             kjøre mer enn én periode. Anbefaler minst 10 000, som er default
         threshold: En terskel du kan angi, for å få rapportert kun de skipene som venter minst så lenge.
             Angis som andeler av tidsenheten du implisitt har antatt
+        seed: Seed til generatoren av tilfeldige tall, eller en ferdig `numpy.random.Generator`. Defaulter til en
+            tilfeldig seed. Se :meth:`generator`
+        stream_key: Hvor simuleringen ligger i treet av strømmer under `seed`, se :meth:`seed_sequence`
     """
+    rng = generator(seed, stream_key)
     implicit_num_ships = len(lbdas)
     if len(mus.shape) > 1:
         implicit_num_bottlenecks = mus.shape[1]
@@ -394,7 +561,7 @@ def simulate_multiship_multiple_bottlenecks(
     for (ship_idx, ship_id), lbda in zip(enumerate(ship_ids), lbdas):
         df = pd.DataFrame(
             {
-                "interarrival_times": np.random.exponential(
+                "interarrival_times": rng.exponential(
                     1 / lbda, int(num_periods / min(lbdas))
                 ),
                 "ship_id": ship_id,
@@ -414,7 +581,7 @@ def simulate_multiship_multiple_bottlenecks(
     arrival_times = df.arrival_times.values
 
     # Trekker så en random matrise for hvert anløp, der hver matrise har størrelse (N_skip, N_flaskehalser)
-    gross_service_times = np.random.exponential(
+    gross_service_times = rng.exponential(
         1 / mus, (num_arrivals, implicit_num_ships, implicit_num_bottlenecks)
     )
     # Henter så ut en vektor for hvert anløp, for det skipet som har det anløpet. Matrisen har da størrelse (N_flaskehalser, num_arrivals)
@@ -449,96 +616,33 @@ def simulate_multiship_multiple_bottlenecks(
     total_times = completion_times - arrival_times
     wait_times = total_times - service_times
 
-    df = (
-        df.assign(service_start_times=service_start_times)
-        .assign(completion_times=completion_times)
-        .assign(total_times=total_times)
-        .assign(wait_times=wait_times)
-        .assign(service_times=service_times)
-        .assign(bottleneck_id=[bottleneck_ids[int(b)] for b in bottleneck_chosen])
-    )
-
-    num_waiting_incidents = np.sum(wait_times > 0)
-
-    wait_times_just = np.where(wait_times > threshold, wait_times, 0)
-    num_waiting_incidents_just = np.sum(wait_times_just > 0)
-
     share_busy = service_times.sum() / completion_times.max() / implicit_num_bottlenecks
 
-    # For å regne ut antall skip i kø på ethvert tidspunkt må vi trikse litt med anløps- og gjennomseilingstidspunktene
-    wait_time_start = pd.Series(
-        index=arrival_times[service_start_times > arrival_times],
-        data=1,
-        name="line_length",
-    )
-    wait_time_end = pd.Series(
-        index=service_start_times[service_start_times > arrival_times],
-        data=-1,
-        name="line_length",
-    )
-
-    waits = (
-        pd.concat([wait_time_start, wait_time_end], axis=0)
-        .sort_index()
-        .to_frame()
-        .reset_index()
-        .rename(columns={"index": "time_stamp"})
-        .assign(num_in_line=lambda df: df.line_length.cumsum())
-        # Setter inn en første rad for å få med at det var null kø før det første skipet anløp
-        .pipe(
-            lambda df: pd.concat(
-                [
-                    pd.DataFrame(
-                        [{"time_stamp": 0, "line_length": 0, "num_in_line": 0}]
-                    ),
-                    df,
-                ],
-                ignore_index=True,
-                sort=True,
-            )
-        )
-        .assign(duration=lambda df: df.time_stamp.shift(-1) - df.time_stamp)
+    out = summarize_queue(
+        arrival_times=arrival_times,
+        service_start_times=service_start_times,
+        wait_times=wait_times,
+        total_times=total_times,
+        service_times=gross_service_times,
+        server_occupation=share_busy,
+        num_periods=num_periods,
+        threshold=threshold,
     )
 
-    # Summerer all tid tilbrakt med hver kølengde
-    waits_agg = waits.groupby("num_in_line").duration.sum()
-    # Snittkølengden er vektet etter tid tilbrakt med hver kølengde
-    mean_line_length = np.average(waits_agg.index.values, weights=waits_agg.values)
-
-    max_line_length = waits_agg.index.max()
-
-    out = {
-        "mean_wait_time": robust_mean(wait_times),
-        "max_wait_time": max_or_nan(wait_times),
-        "mean_total_time": robust_mean(total_times),
-        "max_total_time": max_or_nan(total_times),
-        "mean_service_time": robust_mean(gross_service_times),
-        "max_service_time": max_or_nan(gross_service_times),
-        "mean_length_line": mean_line_length,
-        "max_length_line": max_line_length,
-        "mean_server_occupation": share_busy,
-        "waiting_incidents_per_period": num_waiting_incidents / arrival_times[-1],
-        "prob_cust_must_wait": num_waiting_incidents / num_arrivals,
-    }
-
     # Gjsn ventetid per skip av hver type
-    out["mean_wait_time_per_ship"] = df.groupby("ship_id").wait_times.mean().to_dict()
+    out["mean_wait_time_per_ship"] = bincount_means(
+        df.ship_idx.values, wait_times, ship_ids
+    )
 
     # Gjsn opptattid per flaskehals
-    out["mean_share_busy_per_bottleneck"] = (
-        df.groupby("bottleneck_id")
-        .service_times.sum()
-        .div(completion_times.max())
-        .to_dict()
+    bottleneck_chosen = bottleneck_chosen.astype(np.int64)
+    out["mean_share_busy_per_bottleneck"] = group_rates(
+        bottleneck_ids,
+        np.bincount(bottleneck_chosen, service_times, minlength=len(bottleneck_ids)),
+        np.bincount(bottleneck_chosen, minlength=len(bottleneck_ids)),
+        completion_times.max(),
     )
 
-    if threshold > 0:
-        out["mean_wait_time_just"] = robust_mean(wait_times_just)
-        out["waiting_incidents_per_period_just"] = (
-            num_waiting_incidents_just / num_periods
-        )
-        out["prob_cust_must_wait_just"] = num_waiting_incidents_just / len(wait_times)
-
     return out
 
 
@@ -550,6 +654,8 @@ def simulate_multiship_single_bottleneck_alternate_directions(
     alpha: float,
     num_periods: int,
     threshold: float = 0,
+    seed: Optional[Union[int, np.random.SeedSequence, np.random.Generator]] = None,
+    stream_key: Sequence = (),
 ):
     """Simulerer en kø med flere ulike typer skip, men én flaskehals. Skip kan komme i inntil to ulike retninger
 
@@ -581,24 +687,33 @@ def simulate_multiship_single_bottleneck_alternate_directions(
                 kjøre mer enn én periode. Anbefaler minst 10 000, som er default
             threshold: En terskel du kan angi, for å få rapportert kun de skipene som venter minst så lenge.
                 Angis som andeler av tidsenheten du implisitt har antatt (døgn)
+            seed: Seed til generatoren av tilfeldige tall, eller en ferdig `numpy.random.Generator`. Defaulter til en
+                tilfeldig seed. Se :meth:`generator`
+            stream_key: Hvor simuleringen ligger i treet av strømmer under `seed`, se :meth:`seed_sequence`
         """
 
+    rng = generator(seed, stream_key)
     assert (
         len(lbdas) == len(mus) == len(ship_ids) == len(directions)
     ), "lbdas, mus, ship_ids og directions må ha samme lengde"
+    direction_names = list(dict.fromkeys(directions))
     dfs = []
-    for ship, lbda, mu, direction in zip(ship_ids, lbdas, mus, directions):
+    for (ship_idx, ship), lbda, mu, direction in zip(
+        enumerate(ship_ids), lbdas, mus, directions
+    ):
         df = pd.DataFrame(
             {
-                "interarrival_times": np.random.exponential(
+                "interarrival_times": rng.exponential(
                     1 / lbda, int(num_periods * min(lbdas))
                 ),
                 "direction": direction,
+                "direction_idx": direction_names.index(direction),
                 "mu": mu,
-                "sailing_times": np.random.exponential(
+                "sailing_times": rng.exponential(
                     1 / mu, int(num_periods * min(lbdas))
                 ),
                 "ship_id": ship,
+                "ship_idx": ship_idx,
             }
         ).assign(arrival_times=lambda df: df.interarrival_times.cumsum())
         dfs.append(df)
@@ -614,120 +729,711 @@ def simulate_multiship_single_bottleneck_alternate_directions(
         .assign(alpha=lambda df: np.where(df.alternating_direction.values, 1, alpha))
         .eval("server_occupied_times = sailing_times * alpha")
     )
-    num_arrivals = len(df)
 
     # Henter ut anløpstallene og gjenbruker mye av algoritmen fra ettskipstilfellet
     arrival_times = df.arrival_times.values
     server_occupied_times = df.server_occupied_times.values
-    sailing_times = df.sailing_times
+    sailing_times = df.sailing_times.values
 
-    # Tomme vektorer for å lagre når skipene får seile gjennom, og når de er ferdige
-    service_start_times = np.empty_like(arrival_times)
-    completion_times = np.empty_like(arrival_times)
-    server_busy_intil = np.zeros_like(arrival_times)
-
-    # Skip seiler gjennom så fort de kommer, eller når forrige er ferdig hvis det er senere i dig
-    for k in range(num_arrivals):
-        service_start_times[k] = max(server_busy_intil[k - 1], arrival_times[k])
-        completion_times[k] = (
-            service_start_times[k] + sailing_times[k]
-        )  # Skipet er ferdig når det er ferdig
-        server_busy_intil[k] = (
-            service_start_times[k] + server_occupied_times[k]
-        )  # Flaskehalsen er ledig når alpha-korreksjonen sier at det er det
+    # Skip seiler gjennom så fort de kommer, eller når flaskehalsen er ledig hvis det er senere i tid.
+    # Flaskehalsen er ledig når alpha-korreksjonen sier at det er det, mens skipet er ferdig når det er ferdig
+    service_start_times = lindley_service_start_times(
+        arrival_times, server_occupied_times
+    )
+    completion_times = service_start_times + sailing_times
 
     # Regner ut de tallene vi ønsker oss
     total_times = completion_times - arrival_times
     wait_times = service_start_times - arrival_times
 
+    share_busy = server_occupied_times.sum() / completion_times.max()
+
+    out = summarize_queue(
+        arrival_times=arrival_times,
+        service_start_times=service_start_times,
+        wait_times=wait_times,
+        total_times=total_times,
+        service_times=sailing_times,
+        server_occupation=share_busy,
+        num_periods=num_periods,
+        threshold=threshold,
+    )
+
+    # Gjsn ventetid per skip av hver type
+    out["mean_wait_time_per_ship"] = bincount_means(
+        df.ship_idx.values, wait_times, ship_ids
+    )
+
+    # Gjsn ventetid per retning
+    out["mean_wait_time_per_direction"] = bincount_means(
+        df.direction_idx.values, wait_times, direction_names
+    )
+
+    return out
+
+
+def seed_sequence(
+    seed: Union[int, np.random.SeedSequence], *key
+) -> np.random.SeedSequence:
+    """Noden under `seed` i treet av uavhengige strømmer av tilfeldige tall, gitt ved nøkkelen `key`
+
+    Hvert ledd i `key` er ett nivå i treet, for eksempel situasjon, bane, følsomhetsanalyse, år, periode og replikasjon.
+    Ikke-negative heltall benyttes direkte, og alt annet med crc32 av teksten. Samme `seed` og `key` gir alltid samme
+    strøm, uavhengig av hvilke andre strømmer som trekkes, i hvilken rekkefølge og i hvilken prosess. Ulike nøkler gir
+    statistisk uavhengige strømmer, se `numpy.random.SeedSequence`. Er `seed` selv en node, legges `key` til under den.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    parts = tuple(
+        int(part)
+        if isinstance(part, (int, np.integer)) and part >= 0
+        else zlib.crc32(str(part).encode("utf-8"))
+        for part in key
+    )
+    return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + parts)
+
+
+def generator(
+    seed: Optional[Union[int, np.random.SeedSequence, np.random.Generator]] = None,
+    stream_key: Sequence = (),
+) -> np.random.Generator:
+    """Generatoren for noden `stream_key` under `seed`, se :meth:`seed_sequence`
+
+    Er `seed` allerede en `numpy.random.Generator`, benyttes den som den er. Uten `seed` får generatoren en tilfeldig
+    seed. Numpys globale random state verken benyttes eller endres.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed_sequence(seed, *stream_key))
+
+
+def common_exponentials(
+    seed: Union[int, np.random.SeedSequence],
+    key: str,
+    replication: int,
+    size: int,
+    antithetic: bool = False,
+) -> np.ndarray:
+    """Standard eksponensialfordelte trekninger fra en egen strøm for hver skipstype, til felles tilfeldige tall
+
+    Strømmen er noden under `seed` for skipstypen (`key`, navn og retning) og replikasjonen, se :meth:`seed_sequence`,
+    og er dermed den samme uansett hvilke andre skip som simuleres og hvor mange trekninger som trengs. Deles strømmene
+    mellom referanse- og tiltaksbanen, får anløp nummer k av en skipstype samme tilfeldige tall i begge baner, og
+    simuleringsstøyen i differansen mellom banene blir mye mindre (felles tilfeldige tall). Med `antithetic` benyttes
+    `1 - U` i stedet for de uniforme trekningene `U`, slik at et par med og uten `antithetic` blir negativt korrelert.
+
+    Trekningene deles på lambda for å gi tid mellom anløp.
+    """
+    rng = np.random.default_rng(seed_sequence(seed, key, replication))
+    uniforms = rng.random(size)
+    if antithetic:
+        # 1 - U kan bli nøyaktig 1, som ville gitt uendelig lang tid til neste anløp
+        uniforms = np.minimum(1 - uniforms, 1 - np.finfo(float).epsneg)
+    return -np.log1p(-uniforms)
+
+
+def _draw_arrivals_two_directions(
+    lbdas: List[float],
+    ship_ids: List[str],
+    directions: List[str],
+    direction_map: dict,
+    ship_directions: List[str],
+    num_periods: float,
+    stream: np.random.SeedSequence,
+    common_random_numbers: bool = False,
+    replication: int = 0,
+    antithetic: bool = False,
+) -> pd.DataFrame:
+    """Trekker anløpstider for alle skipstyper, punkt 1-5 i algoritmebeskrivelsen øverst i filen
+
+    Alle skipstypene trekkes etter hverandre fra strømmen til replikasjonen under `stream`, se :meth:`seed_sequence`.
+    Med `common_random_numbers` trekkes i stedet hver skipstype fra sin egen strøm, se :meth:`common_exponentials`.
+    Returnerer en dataframe med ett anløp per rad, sortert etter anløpstid.
+    """
+    rng = None
+    if not common_random_numbers:
+        rng = np.random.default_rng(seed_sequence(stream, replication))
+    # Trekker anløpstider og får rett rekkefølge på skipene
+    dfs = []
+    for ship_id, lbda, direction, (ship_idx, ship_direction) in zip(
+        ship_ids, lbdas, directions, enumerate(ship_directions)
+    ):
+        # Tar ikke med skip som ikke anløper
+        if lbda == 0:
+            raise ValueError(
+                f"Fikk en lambda som er null - det går ikke. Det gjelder skipet {ship_id} i retning {direction}"
+            )
+        direction_id = direction_map.get(direction)
+        num_draws = int(2 * num_periods * lbda)
+        if rng is not None:
+            interarrival_times = rng.exponential(1 / lbda, num_draws)
+        else:
+            interarrival_times = (
+                common_exponentials(
+                    stream, ship_direction, replication, num_draws, antithetic
+                )
+                / lbda
+            )
+        df = (
+            pd.DataFrame(
+                {
+                    "interarrival_times": interarrival_times,
+                    "ship_id": ship_id,
+                    "ship_idx": ship_idx,
+                    "direction": direction,
+                    "direction_id": direction_id,
+                    "ship_id_direction": ship_direction,
+                }
+            )
+            .assign(arrival_times=lambda df: df.interarrival_times.cumsum())
+            .query("arrival_times < @num_periods")
+        )
+        dfs.append(df)
     df = (
-        df.assign(service_start_times=service_start_times)
-        .assign(completion_times=completion_times)
-        .assign(total_times=total_times)
-        .assign(wait_times=wait_times)
+        pd.concat(dfs, ignore_index=True, sort=False)
+        .sort_values(by="arrival_times")
+        .reset_index(drop=True)
+        .assign(
+            alternating_direction=lambda df: df.direction != df.direction.shift(-1)
+        )  # Alternating hvis neste ikke er lik denne retningen
     )
+    return df
 
-    num_waiting_incidents = np.sum(wait_times > 0)
 
-    wait_times_just = np.where(wait_times > threshold, wait_times, 0)
-    num_waiting_incidents_just = np.sum(wait_times_just > 0)
+def _summarize_two_directions(
+    df: pd.DataFrame,
+    service_start_times: np.ndarray,
+    service_times: np.ndarray,
+    completion_times: np.ndarray,
+    bottleneck_chosen: np.ndarray,
+    gross_service_times: np.ndarray,
+    ship_ids: List[str],
+    direction_map: dict,
+    bottleneck_ids: List[str],
+    num_periods: float,
+    threshold: float,
+    distributions: bool = False,
+) -> dict:
+    """Regner ut nøkkeltallene fra én simulering i :meth:`simulate_multiship_multiple_bottlenecks_two_directions`
 
-    share_busy = server_occupied_times.sum() / completion_times.max()
+    Hele simuleringen legges til en :class:`QueueSummary` som én bit.
 
-    # For å regne ut antall skip i kø på ethvert tidspunkt må vi trikse litt med anløps- og gjennomseilingstidspunktene
-    wait_time_start = pd.Series(
-        index=arrival_times[service_start_times > arrival_times],
-        data=1,
-        name="line_length",
+    Args:
+        df: Anløpene fra :meth:`_draw_arrivals_two_directions`
+        service_start_times, service_times, completion_times, bottleneck_chosen: Resultatet av køsimuleringen,
+            ett element per anløp i `df`
+        gross_service_times: Seilingstid med dimensjoner (num_ship, num_bottlenecks)
+        ship_ids: Navnet på hver skipstype, indeksert med `ship_idx` i `df`
+        direction_map: Heltallsverdien til hver retning
+        bottleneck_ids: Navnet på hver flaskehals
+        num_periods: Hvor mange perioder som er simulert
+        threshold: Terskelen for å rapportere kun skip som venter minst så lenge
+        distributions: Hvorvidt fordelingene skal følges, se :class:`QueueSummary`
+    """
+    summary = QueueSummary(
+        ship_ids=ship_ids,
+        direction_names=list(direction_map),
+        bottleneck_ids=bottleneck_ids,
+        gross_service_times=gross_service_times,
+        num_periods=num_periods,
+        threshold=threshold,
+        distributions=distributions,
     )
-    wait_time_end = pd.Series(
-        index=service_start_times[service_start_times > arrival_times],
-        data=-1,
-        name="line_length",
+    summary.update(
+        df.arrival_times.values.astype(float),
+        df.direction_id.values,
+        df.ship_idx.values,
+        service_start_times,
+        service_times,
+        completion_times,
+        bottleneck_chosen,
     )
+    return summary.result()
 
-    waits = (
-        pd.concat([wait_time_start, wait_time_end], axis=0)
-        .sort_index()
-        .to_frame()
-        .reset_index()
-        .rename(columns={"index": "time_stamp"})
-        .assign(num_in_line=lambda df: df.line_length.cumsum())
-        # Setter inn en første rad for å få med at det var null kø før det første skipet anløp
-        .pipe(
-            lambda df: pd.concat(
-                [
-                    pd.DataFrame(
-                        [{"time_stamp": 0, "line_length": 0, "num_in_line": 0}]
-                    ),
-                    df,
-                ],
-                ignore_index=True,
-                sort=True,
+
+def _simulate_replications_two_directions(
+    lbdas: List[float],
+    ship_ids: List[str],
+    directions: List[str],
+    direction_map: dict,
+    ship_directions: List[str],
+    gross_service_times: np.ndarray,
+    alpha: np.ndarray,
+    bottleneck_ids: List[str],
+    replication_periods: float,
+    threshold: float,
+    num_replications: int,
+    vectorized: bool,
+    stream: np.random.SeedSequence,
+    common_random_numbers: bool = False,
+    antithetic: bool = False,
+    first_replication: int = 0,
+    distributions: bool = False,
+    num_batches: int = 1,
+) -> List[dict]:
+    """Simulerer uavhengige replikasjoner for :meth:`simulate_multiship_multiple_bottlenecks_two_directions`
+
+    Trekker anløp for `num_replications` uavhengige replikasjoner à `replication_periods` perioder, og simulerer dem
+    side om side med :meth:`_queue_kernel_replications` (eller Lindley-rekursjonen per rad hvis `vectorized`).
+    Returnerer nøkkeltallene for hver replikasjon, som slås sammen med :meth:`_combine_replications`.
+
+    Replikasjon nummer `first_replication + r` trekker fra strømmene for den replikasjonen under `stream`, se
+    :meth:`_draw_arrivals_two_directions`, slik at svaret er det samme uansett hvor mange replikasjoner som simuleres
+    samtidig. Med `antithetic` er hver replikasjon et par av to simuleringer,
+    den andre med antitetiske trekninger, som ligger etter hverandre i output. Med flere enn én i `num_batches` får
+    hver simulering i tillegg `batches`, snittene per batch fra :meth:`_batch_means`.
+    """
+    draws = [
+        (first_replication + replication, flip)
+        for replication in range(num_replications)
+        for flip in ((False, True) if antithetic else (False,))
+    ]
+    dfs = [
+        _draw_arrivals_two_directions(
+            lbdas,
+            ship_ids,
+            directions,
+            direction_map,
+            ship_directions,
+            replication_periods,
+            stream=stream,
+            common_random_numbers=common_random_numbers,
+            replication=replication,
+            antithetic=flip,
+        )
+        for replication, flip in draws
+    ]
+    lengths = [len(df) for df in dfs]
+
+    # Fyller opp kortere replikasjoner med anløp som aldri kommer
+    shape = (len(dfs), max(lengths))
+    arrival_times = np.full(shape, np.inf)
+    arrival_directions = np.zeros(shape, dtype=np.int64)
+    ship_idxs = np.zeros(shape, dtype=np.int64)
+    for row, (df, length) in enumerate(zip(dfs, lengths)):
+        arrival_times[row, :length] = df.arrival_times.values
+        arrival_directions[row, :length] = df.direction_id.values
+        ship_idxs[row, :length] = df.ship_idx.values
+
+    if vectorized:
+        service_times = gross_service_times[ship_idxs, 0]
+        service_start_times = np.full(shape, np.inf)
+        for row, length in enumerate(lengths):
+            service_start_times[row, :length] = lindley_service_start_times(
+                arrival_times[row, :length], service_times[row, :length]
             )
+        completion_times = service_start_times + service_times
+        bottleneck_chosen = np.zeros(shape, dtype=np.int64)
+    else:
+        (
+            bottleneck_chosen,
+            service_start_times,
+            service_times,
+            completion_times,
+        ) = _queue_kernel_replications(
+            arrival_times, arrival_directions, ship_idxs, gross_service_times, alpha
+        )
+
+    outs = [
+        _summarize_two_directions(
+            df,
+            service_start_times=service_start_times[row, :length],
+            service_times=service_times[row, :length],
+            completion_times=completion_times[row, :length],
+            bottleneck_chosen=bottleneck_chosen[row, :length],
+            gross_service_times=gross_service_times,
+            ship_ids=ship_ids,
+            direction_map=direction_map,
+            bottleneck_ids=bottleneck_ids,
+            num_periods=replication_periods,
+            threshold=threshold,
+            distributions=distributions,
         )
-        .assign(duration=lambda df: df.time_stamp.shift(-1) - df.time_stamp)
+        for row, (df, length) in enumerate(zip(dfs, lengths))
+    ]
+    if num_batches > 1:
+        for row, (out, length) in enumerate(zip(outs, lengths)):
+            out["batches"] = _batch_means(
+                arrival_times[row, :length],
+                service_start_times[row, :length] - arrival_times[row, :length],
+                ship_idxs[row, :length],
+                ship_ids,
+                replication_periods,
+                num_batches,
+            )
+    return outs
+
+
+def _batch_means(
+    arrival_times: np.ndarray,
+    wait_times: np.ndarray,
+    ship_idxs: np.ndarray,
+    ship_ids: List[str],
+    num_periods: float,
+    num_batches: int,
+) -> List[dict]:
+    """Gjennomsnittlig ventetid, totalt og per skip, i hver av `num_batches` like lange deler av én simulering
+
+    Anløpene fordeles på batchene etter anløpstid. Batchene i én lang simulering er ikke helt uavhengige, men med
+    lange nok batcher er korrelasjonen mellom batchsnittene liten (batch means), og køen starter bare tom én gang,
+    i motsetning til uavhengige replikasjoner, som hver starter med tom kø.
+    """
+    batch = np.minimum(
+        (arrival_times * num_batches / num_periods).astype(np.int64), num_batches - 1
     )
+    outs = []
+    for number in range(num_batches):
+        in_batch = batch == number
+        outs.append(
+            {
+                "mean_wait_time": wait_times[in_batch].mean()
+                if in_batch.any()
+                else np.nan,
+                "mean_wait_time_per_ship": bincount_means(
+                    ship_idxs[in_batch], wait_times[in_batch], ship_ids
+                ),
+            }
+        )
+    return outs
 
-    # Summerer all tid tilbrakt med hver kølengde
-    waits_agg = waits.groupby("num_in_line").duration.sum()
-    # Snittkølengden er vektet etter tid tilbrakt med hver kølengde
-    mean_line_length = np.average(waits_agg.index.values, weights=waits_agg.values)
-
-    max_line_length = waits_agg.index.max()
-
-    out = {
-        "mean_wait_time": robust_mean(wait_times),
-        "max_wait_time": max_or_nan(wait_times),
-        "mean_total_time": robust_mean(total_times),
-        "max_total_time": max_or_nan(total_times),
-        "mean_service_time": robust_mean(sailing_times),
-        "max_service_time": max_or_nan(sailing_times),
-        "mean_length_line": mean_line_length,
-        "max_length_line": max_line_length,
-        "mean_server_occupation": robust_mean(share_busy),
-        "waiting_incidents_per_period": num_waiting_incidents / arrival_times[-1],
-        "prob_cust_must_wait": num_waiting_incidents / num_arrivals,
-    }
 
-    # Gjsn ventetid per skip av hver type
-    out["mean_wait_time_per_ship"] = df.groupby("ship_id").wait_times.mean().to_dict()
+def _replication_means(
+    outs: List[dict], key: str, antithetic: bool = False
+) -> pd.DataFrame:
+    """Nøkkeltallet `key` med én rad per uavhengig observasjon, og én kolonne per skip hvis det er angitt per skip
 
-    # Gjsn ventetid per retning
-    out["mean_wait_time_per_direction"] = (
-        df.groupby("direction").wait_times.mean().to_dict()
+    Uten `antithetic` er hver replikasjon en observasjon. Med `antithetic` er hvert par av replikasjoner en
+    observasjon, og raden er snittet av paret.
+    """
+    values = pd.DataFrame(
+        [o[key] if isinstance(o[key], dict) else {key: o[key]} for o in outs]
+    )
+    if antithetic:
+        values = values.groupby(np.arange(len(values)) // 2).mean()
+    return values
+
+
+def _combine_replications(outs: List[dict], antithetic: bool = False) -> dict:
+    """Slår sammen nøkkeltallene fra flere uavhengige replikasjoner
+
+    Maksimumsverdier tas over alle replikasjonene og antall summeres, mens øvrige nøkkeltall er snittet over
+    replikasjonene. Nøkkeltall per skip, retning eller flaskehals snittes over de replikasjonene der de forekommer.
+    I tillegg legges halve bredden av konfidensintervallet mellom replikasjonene til for gjennomsnittlig ventetid,
+    totalt og per skip, se :meth:`confidence_halfwidth`. Med `antithetic` regnes hvert antitetiske par som én
+    observasjon i konfidensintervallet. Ventetiden per skip for hver enkelt replikasjon legges ved i
+    `mean_wait_time_per_ship_per_batch`, slik at variansreduksjonen kan måles, se :meth:`variance_reduction`.
+    Fordelingene i `distributions` flettes sammen.
+    """
+    out = {}
+    for key, value in outs[0].items():
+        values = [o[key] for o in outs]
+        if isinstance(value, QueueDistributions):
+            out[key] = QueueDistributions.merged(values)
+        elif isinstance(value, dict):
+            out[key] = pd.DataFrame(values).mean().to_dict()
+        elif key.startswith("max_"):
+            out[key] = np.nanmax(values)
+        elif key.startswith("num_"):
+            out[key] = np.sum(values)
+        else:
+            out[key] = np.mean(values)
+
+    out["num_replications"] = len(outs) // 2 if antithetic else len(outs)
+    out["mean_wait_time_ci_halfwidth"] = confidence_halfwidth(
+        _replication_means(outs, "mean_wait_time", antithetic)["mean_wait_time"]
+    )
+    out["mean_wait_time_per_ship_ci_halfwidth"] = (
+        _replication_means(outs, "mean_wait_time_per_ship", antithetic)
+        .apply(lambda replications: confidence_halfwidth(replications.dropna()))
+        .to_dict()
+    )
+    out["mean_wait_time_per_ship_per_batch"] = [
+        o["mean_wait_time_per_ship"] for o in outs
+    ]
+    out["antithetic"] = antithetic
+    return out
+
+
+def _combine_batches(outs: List[dict], antithetic: bool = False) -> dict:
+    """Slår sammen én simulering delt opp i batcher, eller ett antitetisk par av dem, se :meth:`_batch_means`
+
+    Nøkkeltallene er fra hele simuleringen, som i :meth:`_combine_replications`, mens konfidensintervallene og
+    `mean_wait_time_per_ship_per_batch` regnes fra batchsnittene. Med `antithetic` ligger batch nummer i i de to
+    simuleringene i paret etter hverandre, og regnes som én observasjon.
+    """
+    batches = [o.pop("batches") for o in outs]
+    out = _combine_replications(outs, antithetic)
+    per_batch = [batch for pair in zip(*batches) for batch in pair]
+    out["num_batches"] = len(batches[0])
+    out["mean_wait_time_ci_halfwidth"] = confidence_halfwidth(
+        _replication_means(per_batch, "mean_wait_time", antithetic)[
+            "mean_wait_time"
+        ].dropna()
     )
+    out["mean_wait_time_per_ship_ci_halfwidth"] = (
+        _replication_means(per_batch, "mean_wait_time_per_ship", antithetic)
+        .apply(lambda batches: confidence_halfwidth(batches.dropna()))
+        .to_dict()
+    )
+    out["mean_wait_time_per_ship_per_batch"] = [
+        batch["mean_wait_time_per_ship"] for batch in per_batch
+    ]
+    return out
 
-    if threshold > 0:
-        out["mean_wait_time_just"] = robust_mean(wait_times_just)
-        out["waiting_incidents_per_period_just"] = (
-            num_waiting_incidents_just / num_periods
+
+def _achieved_precision(
+    outs: List[dict], absolute_precision: float = 0.0, antithetic: bool = False
+) -> float:
+    """Den dårligste relative presisjonen på gjennomsnittlig ventetid per skipstype over replikasjonene i `outs`
+
+    Presisjonen er halve bredden av konfidensintervallet delt på gjennomsnittet. Skipstyper der halve bredden er
+    mindre eller lik `absolute_precision` regnes som presise, slik at skip som aldri venter ikke holder simuleringen
+    gående. Skipstyper som mangler i for mange replikasjoner til å gi et konfidensintervall, gir uendelig.
+    """
+    means = _replication_means(outs, "mean_wait_time_per_ship", antithetic)
+    halfwidths = means.apply(
+        lambda replications: confidence_halfwidth(replications.dropna())
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(
+            halfwidths.values <= absolute_precision,
+            0.0,
+            halfwidths.values / means.mean().values,
         )
-        out["prob_cust_must_wait_just"] = num_waiting_incidents_just / len(wait_times)
+    precision = np.where(np.isnan(precision), np.inf, precision)
+    return float(precision.max()) if len(precision) else 0.0
+
+
+def variance_reduction(
+    batches_ref: List[dict], batches_tiltak: List[dict], antithetic: bool = False
+) -> pd.DataFrame:
+    """Måler hvor mye felles tilfeldige tall (og antitetiske par) reduserer variansen i endringen i ventetid per skip
+
+    Tar ventetiden per skip for hver batch i referanse- og tiltaksbanen, slik den ligger i
+    `mean_wait_time_per_ship_per_batch`, simulert med de samme strømmene av tilfeldige tall. Batch nummer i i de to
+    banene hører da sammen. Variansen til endringen mellom banene sammenlignes med variansen endringen ville hatt med
+    uavhengige simuleringer av samme lengde, som er summen av variansene i hver bane. Med `antithetic` sammenlignes
+    hvert antitetiske par med snittet av to uavhengige batcher.
 
+    Returns:
+        En dataframe med én rad per skip som finnes i begge baner, og kolonnene `var_independent`, `var_common` og
+        `variance_reduction`. En variansreduksjon på 10 betyr at man trenger en tidel så mange perioder for å beregne
+        endringen i ventetid like presist som med uavhengige simuleringer.
+    """
+    num_batches = min(len(batches_ref), len(batches_tiltak))
+    if antithetic:
+        num_batches -= num_batches % 2
+    ref = pd.DataFrame(batches_ref[:num_batches])
+    tiltak = pd.DataFrame(batches_tiltak[:num_batches])
+    ships = [ship for ship in ref.columns if ship in tiltak.columns]
+    ref, tiltak = ref[ships], tiltak[ships]
+
+    var_independent = ref.var(ddof=1) + tiltak.var(ddof=1)
+    difference = tiltak - ref
+    if antithetic:
+        var_independent = var_independent / 2
+        difference = difference.groupby(np.arange(num_batches) // 2).mean()
+    var_common = difference.var(ddof=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pd.DataFrame(
+            {
+                "var_independent": var_independent,
+                "var_common": var_common,
+                "variance_reduction": var_independent / var_common,
+            }
+        ).rename_axis("ship_id")
+
+
+def _simulate_adaptive_two_directions(
+    replication_args: dict,
+    num_periods: float,
+    relative_precision: float,
+    absolute_precision: float = 0.0,
+    batch_periods: Optional[float] = None,
+) -> dict:
+    """Adaptiv simuleringslengde for :meth:`simulate_multiship_multiple_bottlenecks_two_directions`
+
+    Simulerer først ADAPTIVE_MIN_BATCHES uavhengige batcher à `batch_periods` perioder, og deretter én batch (ett
+    antitetisk par hvis `antithetic` i `replication_args`) av gangen, inntil :meth:`_achieved_precision` er høyst `relative_precision`, eller `num_periods` perioder er simulert.
+    Køer med lav utnyttelse blir da ferdige etter en brøkdel av perioden, mens køer nær metning får hele perioden.
+    Nøkkeltallene slås sammen med :meth:`_combine_replications`.
+
+    Args:
+        replication_args: Argumentene til :meth:`_simulate_replications_two_directions` utenom antall og lengde
+        num_periods: Maksimalt antall perioder som skal simuleres
+        relative_precision: Ønsket relativ presisjon, for eksempel 0.05 for et konfidensintervall på +/- 5 %
+        absolute_precision: Se :meth:`_achieved_precision`
+        batch_periods: Antall perioder per batch. Defaulter til `num_periods` delt på ADAPTIVE_MAX_BATCHES
+    """
+    if batch_periods is None:
+        batch_periods = num_periods / ADAPTIVE_MAX_BATCHES
+    antithetic = replication_args.get("antithetic", False)
+    batches_per_replication = 2 if antithetic else 1
+    max_batches = max(
+        int(num_periods // batch_periods),
+        ADAPTIVE_MIN_BATCHES * batches_per_replication,
+    )
+
+    outs = _simulate_replications_two_directions(
+        replication_periods=batch_periods,
+        num_replications=ADAPTIVE_MIN_BATCHES,
+        **replication_args,
+    )
+    precision = _achieved_precision(outs, absolute_precision, antithetic)
+    while (
+        precision > relative_precision
+        and len(outs) + batches_per_replication <= max_batches
+    ):
+        outs += _simulate_replications_two_directions(
+            replication_periods=batch_periods,
+            num_replications=1,
+            first_replication=len(outs) // batches_per_replication,
+            **replication_args,
+        )
+        precision = _achieved_precision(outs, absolute_precision, antithetic)
+
+    out = _combine_replications(outs, antithetic)
+    out["achieved_precision"] = precision
+    out["num_periods_simulated"] = len(outs) * batch_periods
     return out
 
 
+def _stream_arrival_chunks(
+    lbdas: List[float],
+    ship_directions: List[str],
+    direction_ids: List[int],
+    stream: np.random.SeedSequence,
+    num_periods: float,
+    chunk_periods: float,
+):
+    """Trekker anløpstider for alle skipstyper bit for bit, `chunk_periods` perioder av gangen
+
+    Hver skipstype trekker fra sin egen strøm under `stream`, som i :meth:`common_exponentials`, og bare så mange
+    trekninger som trengs for å dekke neste bit. Strømmen fortsetter fra bit til bit. Anløp som havner etter slutten
+    på biten, tas vare på til neste bit. Minnebruken er dermed proporsjonal med `chunk_periods` og ikke med
+    `num_periods`, og anløpene blir de samme som om alt var trukket på én gang med felles tilfeldige tall.
+
+    Yields:
+        `arrival_times`, `arrival_directions` og `ship_idxs` for anløpene i hver bit, sortert etter anløpstid
+    """
+    rngs = [
+        np.random.default_rng(seed_sequence(stream, key, 0)) for key in ship_directions
+    ]
+    last_arrival = [0.0] * len(lbdas)
+    pending = [np.empty(0) for _ in lbdas]
+
+    chunk_end = 0.0
+    while chunk_end < num_periods:
+        chunk_end = min(chunk_end + chunk_periods, num_periods)
+        times, idxs = [], []
+        for ship_idx, lbda in enumerate(lbdas):
+            while len(pending[ship_idx]) == 0 or pending[ship_idx][-1] < chunk_end:
+                uniforms = rngs[ship_idx].random(int(2 * chunk_periods * lbda) + 1)
+                interarrival_times = -np.log1p(-uniforms) / lbda
+                # Kumulerer videre fra forrige anløp, slik at anløpstidene blir de samme uansett størrelse på bitene
+                new_arrivals = np.cumsum(
+                    np.concatenate([[last_arrival[ship_idx]], interarrival_times])
+                )[1:]
+                last_arrival[ship_idx] = new_arrivals[-1]
+                pending[ship_idx] = np.concatenate([pending[ship_idx], new_arrivals])
+            in_chunk = pending[ship_idx] < chunk_end
+            times.append(pending[ship_idx][in_chunk])
+            idxs.append(np.full(in_chunk.sum(), ship_idx, dtype=np.int64))
+            pending[ship_idx] = pending[ship_idx][~in_chunk]
+
+        arrival_times = np.concatenate(times)
+        order = np.argsort(arrival_times, kind="mergesort")
+        ship_idxs = np.concatenate(idxs)[order]
+        yield arrival_times[order], np.asarray(direction_ids, dtype=np.int64)[
+            ship_idxs
+        ], ship_idxs
+
+
+def _simulate_streaming_two_directions(
+    lbdas: List[float],
+    ship_ids: List[str],
+    directions: List[str],
+    direction_map: dict,
+    ship_directions: List[str],
+    gross_service_times: np.ndarray,
+    alpha: np.ndarray,
+    bottleneck_ids: List[str],
+    num_periods: float,
+    threshold: float,
+    chunk_periods: float,
+    stream: np.random.SeedSequence,
+    vectorized: bool = False,
+    kernel: str = "numpy",
+    distributions: bool = False,
+) -> dict:
+    """Simulerer køen bit for bit, med minnebruk som er uavhengig av `num_periods`
+
+    Anløpene trekkes med :meth:`_stream_arrival_chunks`, og køen simuleres videre fra bit til bit ved at
+    `bottleneck_busy_until` og `last_ship_direction` tas med fra forrige bit. Nøkkeltallene bygges opp med
+    :class:`QueueSummary`. Svaret er det samme som en simulering av hele perioden på én gang med
+    `common_random_numbers=True`, opp til avrundingsfeil i summene.
+    """
+    num_bottlenecks = gross_service_times.shape[1]
+    bottleneck_busy_until = np.zeros(num_bottlenecks)
+    last_ship_direction = np.zeros(num_bottlenecks, dtype=np.int64)
+    queue_kernel = get_queue_kernel(kernel)
+    summary = QueueSummary(
+        ship_ids=ship_ids,
+        direction_names=list(direction_map),
+        bottleneck_ids=bottleneck_ids,
+        gross_service_times=gross_service_times,
+        num_periods=num_periods,
+        threshold=threshold,
+        distributions=distributions,
+    )
+
+    for arrival_times, arrival_directions, ship_idxs in _stream_arrival_chunks(
+        lbdas=lbdas,
+        ship_directions=ship_directions,
+        direction_ids=[direction_map[direction] for direction in directions],
+        stream=stream,
+        num_periods=num_periods,
+        chunk_periods=chunk_periods,
+    ):
+        if vectorized:
+            # Et tenkt anløp ved tid 0 som holder flaskehalsen opptatt til den blir ledig etter forrige bit
+            service_times = gross_service_times[ship_idxs, 0]
+            service_start_times = lindley_service_start_times(
+                np.concatenate([[0.0], arrival_times]),
+                np.concatenate([bottleneck_busy_until, service_times]),
+            )[1:]
+            completion_times = service_start_times + service_times
+            bottleneck_chosen = np.zeros(len(arrival_times), dtype=np.int64)
+            if len(arrival_times):
+                bottleneck_busy_until[0] = completion_times[-1]
+        else:
+            (
+                bottleneck_chosen,
+                service_start_times,
+                service_times,
+                completion_times,
+            ) = queue_kernel(
+                arrival_times,
+                arrival_directions,
+                ship_idxs,
+                gross_service_times,
+                alpha,
+                bottleneck_busy_until,
+                last_ship_direction,
+            )
+        summary.update(
+            arrival_times,
+            arrival_directions,
+            ship_idxs,
+            service_start_times,
+            service_times,
+            completion_times,
+            bottleneck_chosen,
+        )
+    return summary.result()
+
+
 def simulate_multiship_multiple_bottlenecks_two_directions(
     lbdas: List[float],
     mus: Union[np.array, List[float]],
@@ -738,6 +1444,18 @@ def simulate_multiship_multiple_bottlenecks_two_directions(
     num_periods: int = 10_000,
     threshold: float = 1 / 60,
     seed: int = 1,
+    vectorized: bool = False,
+    kernel: str = "numpy",
+    num_replications: int = 1,
+    relative_precision: Optional[float] = None,
+    absolute_precision: float = 0.0,
+    batch_periods: Optional[float] = None,
+    common_random_numbers: bool = False,
+    antithetic: bool = False,
+    chunk_periods: Optional[float] = None,
+    stream_key: Sequence = (),
+    distributions: bool = False,
+    num_batches: int = 1,
 ):
     """Simulerer en kø med flere ulike typer skip, og flere mulige flaskehalser å velge. Skip kan komme i inntil to ulike retninger
 
@@ -778,9 +1496,55 @@ def simulate_multiship_multiple_bottlenecks_two_directions(
             kjøre mer enn én periode. Anbefaler minst 10 000, som er default
         threshold: En terskel du kan angi, for å få rapportert kun de skipene som venter minst så lenge.
             Angis som andeler av tidsenheten du implisitt har antatt (døgn)
-        seed: Seed som setter random state for numpy. For å kunne gjenskape simuleringer.
+        seed: Roten i treet av strømmer av tilfeldige tall, se :meth:`seed_sequence`. For å kunne gjenskape
+            simuleringer. Numpys globale random state benyttes ikke
+        vectorized: Hvorvidt køen skal beregnes med den vektoriserte Lindley-rekursjonen
+            :meth:`lindley_service_start_times` i stedet for løkken over anløp. Gir samme svar, men på millisekunder.
+            Krever én flaskehals og ingen alpha-rabatt (`alpha=[1]`). Defaulter til False
+        kernel: Hvilken implementasjon av løkken over anløp som skal benyttes, se :meth:`get_queue_kernel`. Alle gir
+            identiske svar for samme seed. Defaulter til "numpy", referanseimplementasjonen
+        num_replications: Antall uavhengige replikasjoner simuleringsperioden skal deles opp i. Med flere enn én
+            simuleres `num_replications` kortere køer à `num_periods / num_replications` perioder side om side, se
+            :meth:`_queue_kernel_replications`. Nøkkeltallene er da snittet over replikasjonene, og output får i
+            tillegg halve bredden av 95 %-konfidensintervallet mellom replikasjonene for `mean_wait_time`
+            (`mean_wait_time_ci_halfwidth`) og for ventetiden per skip (`mean_wait_time_per_ship_ci_halfwidth`).
+            `kernel` benyttes ikke når det er flere replikasjoner. Defaulter til 1
+        relative_precision: Angis denne, simuleres det adaptivt i batcher à `batch_periods` perioder, inntil halve
+            bredden av konfidensintervallet for gjennomsnittlig ventetid er mindre enn `relative_precision` ganger
+            gjennomsnittet for alle skipstyper, eller `num_periods` perioder er simulert. Se
+            :meth:`_simulate_adaptive_two_directions`. Output får da i tillegg `achieved_precision` og
+            `num_periods_simulated`. Defaulter til None, som gir en fast simuleringslengde
+        absolute_precision: Skipstyper der halve bredden av konfidensintervallet er mindre enn dette, regnes som
+            presist nok beregnet uansett gjennomsnitt. Angis i tidsenheten. Benyttes bare med `relative_precision`.
+            Defaulter til 0
+        batch_periods: Antall perioder per batch ved adaptiv simulering. Defaulter til `num_periods` delt på
+            ADAPTIVE_MAX_BATCHES
+        common_random_numbers: Hvorvidt hver skipstype skal trekke anløp fra sin egen strøm av tilfeldige tall, gitt
+            ved `seed`, skipstypen og replikasjonen, se :meth:`common_exponentials`. Kjøres referanse- og tiltaksbanen
+            med samme seed, får de da de samme tilfeldige tallene, og endringen mellom banene får mye mindre
+            simuleringsstøy. Defaulter til False
+        antithetic: Hvorvidt hver replikasjon skal simuleres som et antitetisk par. Innebærer egne strømmer per
+            skipstype som med `common_random_numbers`, og dobbelt så mange simulerte perioder. Defaulter til False
+        chunk_periods: Angis denne, trekkes anløpene og simuleres køen bit for bit, `chunk_periods` perioder av
+            gangen, slik at minnebruken ikke vokser med `num_periods`. Se :meth:`_simulate_streaming_two_directions`.
+            Gir samme svar som `common_random_numbers=True` uten oppdeling, og kan ikke kombineres med replikasjoner,
+            adaptiv simuleringslengde eller antitetiske par. Defaulter til None, som simulerer alt på én gang
+        stream_key: Hvor simuleringen ligger i treet av strømmer under `seed`, for eksempel (situasjon, bane,
+            følsomhetsanalyse, år, periode). Replikasjoner, batcher og skipstyper trekker fra noder under denne, se
+            :meth:`seed_sequence`. Hver simulering trekker dermed fra sine egne, uavhengige strømmer, og svaret er
+            bitvis det samme uansett hvilke andre simuleringer som kjøres, i hvilken rekkefølge og i hvilken prosess.
+            Defaulter til (), roten selv
+        distributions: Hvorvidt fordelingen av ventetid og total tid, totalt og per skip, og av kølengden skal
+            følges. Output får da i tillegg `distributions`, en
+            :class:`~fram.virkninger.ventetid.queue_statistics.QueueDistributions` som er flettet over alle biter og
+            replikasjoner, og som persentiler kan hentes fra. Defaulter til False
+        num_batches: Antall like lange batcher én simulering av `num_periods` perioder deles opp i etterpå (batch
+            means), se :meth:`_batch_means`. Nøkkeltallene er fra hele simuleringen, som starter med tom kø bare én
+            gang, mens konfidensintervallene og `mean_wait_time_per_ship_per_batch` regnes fra batchsnittene, se
+            :meth:`variance_reduction`. Output får da i tillegg `num_batches`. Kan ikke kombineres med replikasjoner,
+            adaptiv simuleringslengde eller simulering bit for bit. Defaulter til 1, ingen oppdeling
     """
-    np.random.seed(seed)
+    stream = seed_sequence(seed, *stream_key)
     if isinstance(mus, list):
         mus = np.array(mus)
 
@@ -830,256 +1594,159 @@ def simulate_multiship_multiple_bottlenecks_two_directions(
     # at mu blir så liten at seilingstiden blir så lang at ingen velger den leden hvis de kan unngå det.
     mus = np.where(mus > 0, mus, MU_ZERO_REPLACEMENT)
 
-    # Trekker anløpstider og får rett rekkefølge på skipene
-    dfs = []
-    for ship_id, lbda, direction, (ship_idx, ship_direction) in zip(
-        ship_ids, lbdas, directions, enumerate(ship_directions)
-    ):
-        # Tar ikke med skip som ikke anløper
-        if lbda == 0:
-            raise ValueError(
-                f"Fikk en lambda som er null - det går ikke. Det gjelder skipet {ship_id} i retning {direction}"
-            )
-        direction_id = direction_map.get(direction)
-        df = (
-            pd.DataFrame(
-                {
-                    "interarrival_times": np.random.exponential(
-                        1 / lbda, int(2 * num_periods * lbda)
-                    ),
-                    "ship_id": ship_id,
-                    "ship_idx": ship_idx,
-                    "direction": direction,
-                    "direction_id": direction_id,
-                    "ship_id_direction": ship_direction,
-                }
-            )
-            .assign(arrival_times=lambda df: df.interarrival_times.cumsum())
-            .query("arrival_times < @num_periods")
-        )
-        dfs.append(df)
-    df = (
-        pd.concat(dfs, ignore_index=True, sort=False)
-        .sort_values(by="arrival_times")
-        .reset_index(drop=True)
-        .assign(
-            alternating_direction=lambda df: df.direction != df.direction.shift(-1)
-        )  # Alternating hvis neste ikke er lik denne retningen
-    )
-    num_arrivals = len(df)
-
-    # Henter ut anløpstallene og gjenbruker mye av algoritmen fra ettskipstilfellet
-    arrival_times = df.arrival_times.values
-    arrival_directions = df.direction_id.values
-    ship_idxs = df.ship_idx.values
-
-    # Setter opp alpha på en matriseform som er hensiktsmessig for simulering
-    applied_alpha = np.array(
-        [alpha, np.ones_like(alpha)]
-    ).T  # [[alpha0, 1], [alpha1, 1], [alpha2, 1]] etc
-    _alpha_row_idx = np.array(
-        list(range(len(alpha)))
-    )  # Bare en hjelpevektor for indeksering - har ingen betydning
-
     # Seilingstiden er gitt ved 1/mu. Ingen stokastikk eller simulering her
     gross_service_times = 1 / mus  # med dimensjoner (num_ship, num_bottlenecks)
     if len(gross_service_times.shape) == 1:
         gross_service_times = np.reshape(
             gross_service_times, (gross_service_times.size, 1)
         )
+    gross_service_times = np.ascontiguousarray(gross_service_times, dtype=float)
+    alpha = np.asarray(alpha, dtype=float)
 
-    # Tomme vektorer for å lagre når skipene får seile gjennom, når de er ferdige og hvilken flaskehals de brukte
-    service_start_times = np.empty_like(arrival_times)
-    service_times = np.empty_like(arrival_times)
-    completion_times = np.empty_like(arrival_times)  # d
-    bottleneck_chosen = np.empty_like(arrival_times)  # p
-    bottleneck_busy_until = np.zeros(implicit_num_bottlenecks)  # b
-    last_ship_direction = np.zeros(
-        implicit_num_bottlenecks, dtype=np.int8
-    )  # Antar at alle flaskehalser har et skip i retning 0 ved start - liten simuleringsfeil som ikke har noe å si
-
-    # Første skipet seiler direkte gjennom uten ventetid
-    # Øvrige skip seiler gjennom så fort de kommer, eller når forrige er ferdig hvis det er senere i dig
-    for k in range(num_arrivals):
-        current_direction = arrival_directions[k]
-        current_ship_idx = ship_idxs[k]
-        current_service_times = gross_service_times[current_ship_idx, :]
-        alpha_correction = applied_alpha[
-            _alpha_row_idx, (last_ship_direction - current_direction)
-        ]  # Sjekker om du skal få en alfa-korreksjon.
-        # Dette avhenger av om forrige skip seilte samme retning som deg, da er (last_ship_direction - current_direction) = 0, og den henter den første kolonnen i matrisen applied_alpha
-
-        # Alpha-korreksjonen kommer bare inn i hvor lenge flaskehalsen blir opptatt, ikke i ditt valg nå.
-        possible_start_times = np.maximum(arrival_times[k], bottleneck_busy_until)
-        chosen_bottleneck = np.argmin(possible_start_times + current_service_times)
-
-        # Men alpha teller ikke med på servicetiden skipet opplever
-        actual_service_time = current_service_times[chosen_bottleneck]
-        start_service = possible_start_times[chosen_bottleneck]
-
-        bottleneck_chosen[k] = chosen_bottleneck
-        service_start_times[k] = start_service
-        bottleneck_busy_until[chosen_bottleneck] = (
-            start_service
-            + actual_service_time
-            * alpha_correction[
-                chosen_bottleneck
-            ]  # Alpha teller med på hvor lenge neste er opptatt
+    # Med én flaskehals og ingen alpha-rabatt er køen en ren Lindley-rekursjon, som kan løses uten løkke
+    if vectorized and (implicit_num_bottlenecks != 1 or any(a != 1 for a in alpha)):
+        raise ValueError(
+            f"Den vektoriserte simuleringen krever én flaskehals og alpha=1. Fikk {implicit_num_bottlenecks} flaskehalser og alpha={list(alpha)}"
         )
-        last_ship_direction[chosen_bottleneck] = current_direction
-        completion_times[k] = start_service + actual_service_time
-        service_times[k] = actual_service_time
-
-    # Regner ut de tallene vi ønsker oss
-    total_times = completion_times - arrival_times
-    wait_times = total_times - service_times
-
-    df = (
-        df.assign(service_start_times=service_start_times)
-        .assign(completion_times=completion_times)
-        .assign(total_times=total_times)
-        .assign(wait_times=wait_times)
-        .assign(service_times=service_times)
-        .assign(bottleneck_id=[bottleneck_ids[int(b)] for b in bottleneck_chosen])
-    )
-
-    num_waiting_incidents = np.sum(wait_times > 0)
-
-    wait_times_just = np.where(wait_times > threshold, wait_times, 0)
-    num_waiting_incidents_just = np.sum(wait_times_just > 0)
-
-    share_busy = service_times.sum() / completion_times.max() / implicit_num_bottlenecks
 
-    # For å regne ut antall skip i kø på ethvert tidspunkt må vi trikse litt med anløps- og gjennomseilingstidspunktene
-    wait_time_start = pd.Series(
-        index=arrival_times[service_start_times > arrival_times],
-        data=1,
-        name="line_length",
-    )
-    wait_time_end = pd.Series(
-        index=service_start_times[service_start_times > arrival_times],
-        data=-1,
-        name="line_length",
-    )
+    if num_replications < 1:
+        raise ValueError(
+            f"Antall replikasjoner må være minst 1. Fikk num_replications={num_replications}"
+        )
+    if relative_precision is not None and num_replications > 1:
+        raise ValueError(
+            "Adaptiv simuleringslengde (`relative_precision`) og et fast antall replikasjoner kan ikke kombineres"
+        )
+    if num_batches < 1:
+        raise ValueError(
+            f"Antall batcher må være minst 1. Fikk num_batches={num_batches}"
+        )
+    if num_batches > 1 and (
+        num_replications > 1
+        or relative_precision is not None
+        or chunk_periods is not None
+    ):
+        raise ValueError(
+            "Batcher (`num_batches`) kan ikke kombineres med replikasjoner, adaptiv simuleringslengde eller simulering bit for bit"
+        )
 
-    waits = (
-        pd.concat([wait_time_start, wait_time_end], axis=0)
-        .sort_index()
-        .to_frame()
-        .reset_index()
-        .rename(columns={"index": "time_stamp"})
-        .assign(num_in_line=lambda df: df.line_length.cumsum())
-        # Setter inn en første rad for å få med at det var null kø før det første skipet anløp
-        .pipe(
-            lambda df: pd.concat(
-                [
-                    pd.DataFrame(
-                        [{"time_stamp": 0, "line_length": 0, "num_in_line": 0}]
-                    ),
-                    df,
-                ],
-                ignore_index=True,
-                sort=True,
+    if chunk_periods is not None:
+        if num_replications > 1 or relative_precision is not None or antithetic:
+            raise ValueError(
+                "Simulering bit for bit (`chunk_periods`) kan ikke kombineres med replikasjoner, adaptiv simuleringslengde eller antitetiske par"
             )
+        return _simulate_streaming_two_directions(
+            lbdas=lbdas,
+            ship_ids=ship_ids,
+            directions=directions,
+            direction_map=direction_map,
+            ship_directions=ship_directions,
+            gross_service_times=gross_service_times,
+            alpha=alpha,
+            bottleneck_ids=bottleneck_ids,
+            num_periods=num_periods,
+            threshold=threshold,
+            chunk_periods=chunk_periods,
+            stream=stream,
+            vectorized=vectorized,
+            kernel=kernel,
+            distributions=distributions,
         )
-        .assign(duration=lambda df: df.time_stamp.shift(-1) - df.time_stamp)
-    )
 
-    # Summerer all tid tilbrakt med hver kølengde
-    waits_agg = waits.groupby("num_in_line").duration.sum()
-    # Snittkølengden er vektet etter tid tilbrakt med hver kølengde
-    try:
-        mean_line_length = np.average(waits_agg.index.values, weights=waits_agg.values)
-    except ZeroDivisionError:
-        mean_line_length = 0
-
-    max_line_length = waits_agg.index.max()
-
-    out = {
-        "mean_wait_time": robust_mean(wait_times),
-        "max_wait_time": max_or_nan(wait_times),
-        "mean_total_time": robust_mean(total_times),
-        "max_total_time": max_or_nan(total_times),
-        "mean_service_time": robust_mean(gross_service_times[:]),
-        "max_service_time": max_or_nan(gross_service_times[:]),
-        "mean_length_line": mean_line_length,
-        "max_length_line": max_line_length,
-        "mean_server_occupation": robust_mean(share_busy),
-        "waiting_incidents_per_period": num_waiting_incidents / arrival_times[-1],
-        "prob_cust_must_wait": num_waiting_incidents / num_arrivals,
-        "num_arrivals": num_arrivals,
-        "last_arrival_time": arrival_times[-1],
-        "num_incidents": num_waiting_incidents,
-    }
-
-    # Gjsn ventetid per skip av hver type
-    out["mean_wait_time_per_ship"] = df.groupby("ship_id").wait_times.mean().to_dict()
-
-    # Gjsn totaltid per skip av hver type
-    out["mean_total_time_per_ship"] = df.groupby("ship_id").total_times.mean().to_dict()
-
-    # Gjsn servicetid per skip av hver type
-    out["mean_service_time_per_ship"] = (
-        df.groupby("ship_id").service_times.mean().to_dict()
-    )
-
-    out["mean_incidents_per_period_per_ship"] = (
-        df.groupby("ship_id")
-        .wait_times.agg(lambda wait_times: np.mean(wait_times > 0))
-        .to_dict()
-    )
-
-    # Gjsn ventetid per retning
-    out["mean_wait_time_per_direction"] = (
-        df.groupby("direction").wait_times.mean().to_dict()
-    )
-
-    # Gjsn opptattid per flaskehals
-    out["mean_share_busy_per_bottleneck"] = (
-        df.groupby("bottleneck_id")
-        .service_times.sum()
-        .div(completion_times.max())
-        .to_dict()
+    replication_args = dict(
+        stream=stream,
+        common_random_numbers=common_random_numbers or antithetic,
+        antithetic=antithetic,
+        lbdas=lbdas,
+        ship_ids=ship_ids,
+        directions=directions,
+        direction_map=direction_map,
+        ship_directions=ship_directions,
+        gross_service_times=gross_service_times,
+        alpha=alpha,
+        bottleneck_ids=bottleneck_ids,
+        threshold=threshold,
+        vectorized=vectorized,
+        distributions=distributions,
     )
-
-    out["passings_per_bottleneck_per_period"] = (
-        df.groupby("bottleneck_id")
-        .service_times.count()
-        .div(arrival_times[-1])
-        .to_dict()
-    )
-
-    out["passings_per_bottleneck_per_ship_per_period"] = (
-        df.assign(
-            ship_bottleneck=lambda df: df.ship_id
-            + SKIP_LENGDE_SPLITTER
-            + df.bottleneck_id
+    if relative_precision is not None:
+        return _simulate_adaptive_two_directions(
+            replication_args,
+            num_periods=num_periods,
+            relative_precision=relative_precision,
+            absolute_precision=absolute_precision,
+            batch_periods=batch_periods,
+        )
+    if num_batches > 1:
+        return _combine_batches(
+            _simulate_replications_two_directions(
+                replication_periods=num_periods,
+                num_replications=1,
+                num_batches=num_batches,
+                **replication_args,
+            ),
+            antithetic,
+        )
+    if num_replications > 1 or antithetic:
+        return _combine_replications(
+            _simulate_replications_two_directions(
+                replication_periods=num_periods / num_replications,
+                num_replications=num_replications,
+                **replication_args,
+            ),
+            antithetic,
         )
-        .groupby("ship_bottleneck")
-        .service_times.count()
-        .div(arrival_times[-1])
-        .to_dict()
-    )
 
-    # Andel alternerende retninger per flaskehals
-    out["mean_share_alternating_directions"] = (
-        df.groupby("bottleneck_id").alternating_direction.mean().to_dict()
+    # Trekker anløpstider og får rett rekkefølge på skipene
+    df = _draw_arrivals_two_directions(
+        lbdas,
+        ship_ids,
+        directions,
+        direction_map,
+        ship_directions,
+        num_periods,
+        stream=stream,
+        common_random_numbers=replication_args["common_random_numbers"],
     )
 
-    if threshold > 0:
-        out["mean_wait_time_just"] = robust_mean(wait_times_just)
-        out["waiting_incidents_per_period_just"] = (
-            num_waiting_incidents_just / num_periods
-        )
-        out["prob_cust_must_wait_just"] = num_waiting_incidents_just / len(wait_times)
-        out["num_incidents_just"] = num_waiting_incidents_just
-        out["mean_incidents_just_per_period_per_ship"] = (
-            df.groupby("ship_id")
-            .wait_times.agg(lambda wait_times: np.mean(wait_times > threshold))
-            .to_dict()
+    # Henter ut anløpstallene og gjenbruker mye av algoritmen fra ettskipstilfellet
+    arrival_times = df.arrival_times.values.astype(float)
+    arrival_directions = df.direction_id.values.astype(np.int64)
+    ship_idxs = df.ship_idx.values.astype(np.int64)
+
+    if vectorized:
+        service_times = gross_service_times[ship_idxs, 0]
+        service_start_times = lindley_service_start_times(arrival_times, service_times)
+        completion_times = service_start_times + service_times
+        bottleneck_chosen = np.zeros(len(df), dtype=np.int64)
+    else:
+        (
+            bottleneck_chosen,
+            service_start_times,
+            service_times,
+            completion_times,
+        ) = get_queue_kernel(kernel)(
+            arrival_times,
+            arrival_directions,
+            ship_idxs,
+            gross_service_times,
+            alpha,
         )
 
-    return out
+    return _summarize_two_directions(
+        df,
+        service_start_times=service_start_times,
+        service_times=service_times,
+        completion_times=completion_times,
+        bottleneck_chosen=bottleneck_chosen,
+        gross_service_times=gross_service_times,
+        ship_ids=ship_ids,
+        direction_map=direction_map,
+        bottleneck_ids=bottleneck_ids,
+        num_periods=num_periods,
+        threshold=threshold,
+        distributions=distributions,
+    )
 
 
 # if __name__ == "__main__":
@@ -1,12 +1,11 @@
-import shelve
-from multiprocessing import cpu_count
-from multiprocessing.pool import Pool
+import copy
 from pathlib import Path
-from typing import Union, List, Callable
+from typing import Union, List, Callable, Optional
 
 import numpy as np
 import pandas as pd
 
+from fram.generelle_hjelpemoduler.arbeiderpool import kjor_parallelt
 from fram.virkninger.ventetid.computation import (
     simulate_multiship_multiple_bottlenecks_two_directions,
 )
@@ -17,8 +16,27 @@ from fram.virkninger.ventetid.hjelpemoduler import (
     Output,
     SimuleringsInput,
 )
-from fram.generelle_hjelpemoduler.excel import vask_kolonnenavn_for_exceltull
+from fram.virkninger.ventetid.mellomlagring import input_nokkel, VentetidMellomlager
+from fram.virkninger.ventetid.interpolering import (
+    interpoler_nokkeltall,
+    velg_ankeraar,
+)
+from fram.virkninger.ventetid.queue_approximation import (
+    approximate_multiship_multiple_bottlenecks_two_directions,
+    utilization,
+)
+from fram.generelle_hjelpemoduler.excel import (
+    les_arkrutenett,
+    tabell_fra_rutenett,
+    vask_kolonnenavn_for_exceltull,
+)
 
+# Med felles tilfeldige tall og fast simuleringslengde deles den ene simuleringen etterpå opp i så mange batcher (batch
+# means), slik at variansreduksjonen kan måles uten at køen starter tom i hver batch
+VARIANSREDUKSJON_ANTALL_BATCHER = 10
+# Gyldige metoder for å beregne ventetiden: simulering av køen, simulering av utvalgte år og interpolering mellom dem,
+# eller en analytisk tilnærming for grove anslag
+VENTETIDSMETODER = ["simulering", "interpolert", "analytisk"]
 MAKS_ANTALL_LØP = 15
 SKIPROWS_FØR_MU_OG_LAMBDA = 18 + MAKS_ANTALL_LØP
 SKIPROWS_FØR_LØP_OG_ALPHA = 13
@@ -38,6 +56,8 @@ def les_ventetidsinput_fra_excel(
     Når arket er lest inn, kan output fra funksjonen mates inn i simuleringsfunksjonen
     :meth:`simulate_from_simuleringsinput` eller :meth:`cached_simulate_from_simuleringsinput`
 
+    Arket leses bare én gang, med :meth:`~fram.generelle_hjelpemoduler.excel.les_arkrutenett`, og hver tabell hentes ut av rutenettet i minnet.
+
     Args:
         filepath: Bane til filen der ventetidsarket ligger
         sheet_name: Arknavnet til ventetidsarket
@@ -46,9 +66,11 @@ def les_ventetidsinput_fra_excel(
         logger: Hvor du vil ha logget underveis. Defaulter til print
     """
 
+    rutenett = les_arkrutenett(filepath, sheet_name)
+
     # Leser inn overordnede definisjoner som en dict. Har keys 'Tiltakspakke', 'Problemområde_id' og 'Antall løp'
-    definisjoner = pd.read_excel(
-        filepath, sheet_name, usecols=[0, 1], skiprows=SKIPROWS_FØR_DEFINISJONER
+    definisjoner = tabell_fra_rutenett(
+        rutenett, usecols=[0, 1], skiprows=SKIPROWS_FØR_DEFINISJONER
     ).iloc[:3]
     definisjoner = dict(
         zip(definisjoner.iloc[:, 0].values, definisjoner.iloc[:, 1].values)
@@ -56,8 +78,8 @@ def les_ventetidsinput_fra_excel(
 
     # Leser inn de mulige løpene og deres alpha
     lopsnummer = (
-        pd.read_excel(
-            filepath, sheet_name, usecols=[0, 1], skiprows=SKIPROWS_FØR_LØP_OG_ALPHA
+        tabell_fra_rutenett(
+            rutenett, usecols=[0, 1], skiprows=SKIPROWS_FØR_LØP_OG_ALPHA
         )
         .pipe(cut_at_first_missing_obs, "Løpnummer")
         .sort_values(by="Løpnummer")
@@ -72,9 +94,8 @@ def les_ventetidsinput_fra_excel(
     ), f"Antall løp fra tabellen med løpnummer ({len(mulige_lop)}) matcher ikke angitt antall løp i celle B10 ({definisjoner['Antall løp']})"
 
     retninger = (
-        pd.read_excel(
-            filepath,
-            sheet_name,
+        tabell_fra_rutenett(
+            rutenett,
             usecols=[3],
             skiprows=SKIPROWS_FØR_LØP_OG_ALPHA,
             nrows=3,
@@ -88,9 +109,8 @@ def les_ventetidsinput_fra_excel(
     ), f"Kan ha maksimalt to retninger, fant {len(retninger)} i tabellen i cellene D14:D16"
 
     perioder = (
-        pd.read_excel(
-            filepath,
-            sheet_name,
+        tabell_fra_rutenett(
+            rutenett,
             usecols=[5, 6],
             skiprows=SKIPROWS_FØR_LØP_OG_ALPHA,
             nrows=6,
@@ -109,9 +129,8 @@ def les_ventetidsinput_fra_excel(
     # Leser inn mu fra tabellen og lager en matrise klar for simulering
     use_cols_mus = list(range(3 + definisjoner["Antall løp"]))
     mu_df = (
-            pd.read_excel(
-                filepath,
-                sheet_name=sheet_name,
+            tabell_fra_rutenett(
+                rutenett,
                 usecols=use_cols_mus,
                 skiprows=SKIPROWS_FØR_MU_OG_LAMBDA,
             )
@@ -139,9 +158,8 @@ def les_ventetidsinput_fra_excel(
 
     # Starter på lambda-innlesingen
 
-    lambda_df = (pd.read_excel(
-                    filepath,
-                    sheet_name=sheet_name,
+    lambda_df = (tabell_fra_rutenett(
+                    rutenett,
                     skiprows=SKIPROWS_FØR_MU_OG_LAMBDA)
                     .iloc[: , LAMBDA_DF_STARTKOLONNE:]
             .pipe(vask_kolonnenavn_for_exceltull)
@@ -175,13 +193,12 @@ def les_ventetidsinput_fra_excel(
     ), f"Det er ikke samsvar mellom mu og lambda i inputarket {filepath} {sheet_name}"
 
     tidsenhet = float(
-        pd.read_excel(filepath, sheet_name, usecols=[1], skiprows=10).values[0][0]
+        tabell_fra_rutenett(rutenett, usecols=[1], skiprows=10).values[0][0]
     )
 
     ovrig_kategori = (
-        pd.read_excel(
-            filepath,
-            sheet_name,
+        tabell_fra_rutenett(
+            rutenett,
             usecols=list(
                 range(OVRIG_TABELL_STARTKOLONNE, OVRIG_TABELL_STARTKOLONNE + 2)
             ),
@@ -225,8 +242,38 @@ def simulate_excel(
     return simulate_from_simuleringsinput(sim_input)
 
 
+def stromnokkel(
+    bane: Optional[str] = None, common_random_numbers: bool = False
+) -> tuple:
+    """Noden til en bane i treet av strømmer av tilfeldige tall, se :meth:`simulate_from_simuleringsinput`
+
+    Hvert år og hver periode trekker fra noden (bane, input), der input er en hash av den faktiske inputen til
+    simuleringen, se :meth:`_sim_unit_strom`. Med felles tilfeldige tall (eller antitetiske par) er banen tom, og noden
+    er (år, periode), slik at referanse- og tiltaksbanen trekker fra de samme strømmene per skipstype i hvert år, mens
+    årene er uavhengige av hverandre. Benyttes likt av
+    :class:`~fram.virkninger.ventetid.ventetidssituasjon.Ventetidssituasjon` og
+    :class:`~fram.virkninger.ventetid.virkning.Ventetid`.
+    """
+    if common_random_numbers or bane is None:
+        return ()
+    return (bane,)
+
+
 def simulate_from_simuleringsinput(
-    sim_input: SimuleringsInput, seed: int = 1
+    sim_input: SimuleringsInput,
+    seed: int = 1,
+    kernel: str = "numpy",
+    relative_precision: Optional[float] = None,
+    absolute_precision: float = 0.0,
+    common_random_numbers: bool = False,
+    antithetic: bool = False,
+    chunk_periods: Optional[float] = None,
+    mellomlager: Optional[VentetidMellomlager] = None,
+    logger: Callable = print,
+    num_workers: Optional[int] = None,
+    metode: str = "simulering",
+    stream_key: tuple = (),
+    distributions: bool = False,
 ) -> List[Output]:
     """Kjører en simulering av ventetidsberegning. I utgangspunktet kun ment å benyttes av :class:'~fram.virkninger.ventetid.ventetidssituasjon.Ventetidssituasjon'
 
@@ -234,72 +281,482 @@ def simulate_from_simuleringsinput(
     `Ventetidssituasjon` gir output på et lettere tolkbart format. Ved simulering, benyttes funksjonen
     :meth:`~fram.virkninger.ventetid.computation.simulate_multiship_multiple_bottlenecks_two_directions`
 
+    Hvert år og hver periode trekker fra sine egne strømmer av tilfeldige tall, under noden (`stream_key`, input) i
+    treet under `seed`, der input er en hash av den faktiske inputen til simuleringen, se :meth:`_sim_unit_strom` og
+    :meth:`~fram.virkninger.ventetid.computation.seed_sequence`. Svaret er dermed bitvis det samme uansett antall
+    arbeiderprosesser og i hvilken rekkefølge årene simuleres. År og perioder med nøyaktig samme input til
+    simuleringen (samme skip med positiv lambda, samme lambda, mu og alpha, og samme seed) og samme `stream_key`
+    simuleres bare én gang, og output kopieres til alle med den inputen. Det er typisk tilfellet for år før tiltaket
+    åpner, og for like år i ulike følsomhetsanalyser, se :meth:`stromnokkel`.
+
     Args:
         sim_input: En gyldig simuleringsinput.
         seed: Seed til generatoren av pseudotilfeldige tall
+        kernel: Hvilken kø-kjerne som skal benyttes, se :meth:`~fram.virkninger.ventetid.computation.get_queue_kernel`
+        relative_precision: Angis denne, simuleres hvert år og hver periode adaptivt, inntil gjennomsnittlig ventetid
+            per skipstype er beregnet med denne relative presisjonen, eller `sim_input.num_periods` perioder er simulert.
+            Se :meth:`~fram.virkninger.ventetid.computation.simulate_multiship_multiple_bottlenecks_two_directions`
+        absolute_precision: Skipstyper med så smalt konfidensintervall regnes som presise uansett gjennomsnitt. Angis i
+            tidsenheten. Benyttes bare sammen med `relative_precision`
+        common_random_numbers: Hvorvidt hver skipstype skal trekke anløp fra sin egen strøm av tilfeldige tall, slik at
+            referanse- og tiltaksbanen simuleres med felles tilfeldige tall. Uten adaptiv simuleringslengde deles
+            simuleringen da etterpå opp i VARIANSREDUKSJON_ANTALL_BATCHER batcher, slik at variansreduksjonen kan måles
+        antithetic: Hvorvidt simuleringen skal kjøres som et antitetisk par. Innebærer felles tilfeldige tall, og
+            dobler antall simulerte perioder
+        chunk_periods: Angis denne, simuleres hvert år og hver periode bit for bit, med minnebruk som ikke vokser med
+            antall perioder. For svært lange simuleringer. Kan ikke kombineres med adaptiv simuleringslengde
+        mellomlager: Angis dette, hentes hvert år og hver periode fra mellomlageret hvis den faktiske inputen er
+            simulert før, og bare de øvrige simuleres. Nye simuleringer skrives til mellomlageret
+        logger: Hvor du vil ha logget hvor mange år og perioder som var like
+        num_workers: Antall arbeiderprosesser i den felles prosesspoolen, se
+            :mod:`~fram.generelle_hjelpemoduler.arbeiderpool`. Defaulter til antall kjerner minus én
+        metode: "simulering" (default) simulerer køen. "analytisk" beregner den i stedet med lukkede formler, se
+            :mod:`~fram.virkninger.ventetid.queue_approximation`. Det tar mikrosekunder i stedet for minutter, men gir
+            bare grove anslag, og egner seg for tidlig siling av mange tiltakspakker. Output har samme form, men
+            verken mellomlagres eller simuleres i prosesspoolen, og valgene for simuleringsmetoden kan ikke benyttes.
+            Perioder der køen ikke er stabil, har ingen analytisk løsning, og simuleres i stedet.
+            "interpolert" simulerer bare noen ankerår og kontrollår per periode, spredt over belastningen på
+            flaskehalsene, og interpolerer de øvrige årene, se :mod:`~fram.virkninger.ventetid.interpolering`. Feilen
+            i kontrollårene logges
+        stream_key: Hvor simuleringsinputen ligger i treet av strømmer av tilfeldige tall under `seed`, se
+            :meth:`stromnokkel`. Defaulter til (), roten selv
+        distributions: Hvorvidt fordelingen av ventetid, total tid og kølengde skal følges i hver simulering, og legges
+            på `Output.distributions`, slik at persentiler kan hentes ut. Koster litt tid og minne, og defaulter til False
+    """
+    return simulate_from_simuleringsinputs(
+        [sim_input],
+        seed=seed,
+        kernel=kernel,
+        relative_precision=relative_precision,
+        absolute_precision=absolute_precision,
+        common_random_numbers=common_random_numbers,
+        antithetic=antithetic,
+        chunk_periods=chunk_periods,
+        mellomlager=mellomlager,
+        logger=logger,
+        num_workers=num_workers,
+        metode=metode,
+        stream_keys=[stream_key],
+        distributions=distributions,
+    )[0]
+
+
+def simulate_from_simuleringsinputs(
+    sim_inputs: List[SimuleringsInput],
+    seed: int = 1,
+    kernel: str = "numpy",
+    relative_precision: Optional[float] = None,
+    absolute_precision: float = 0.0,
+    common_random_numbers: bool = False,
+    antithetic: bool = False,
+    chunk_periods: Optional[float] = None,
+    mellomlager: Optional[VentetidMellomlager] = None,
+    logger: Callable = print,
+    num_workers: Optional[int] = None,
+    metode: str = "simulering",
+    stream_keys: Optional[List[tuple]] = None,
+    distributions: bool = False,
+) -> List[List[Output]]:
+    """Som :meth:`simulate_from_simuleringsinput`, men for flere simuleringsinputer i én felles jobb
+
+    Alle år og perioder i alle simuleringsinputene slås opp i mellomlageret og sendes til prosesspoolen samlet, slik at
+    for eksempel begge baner i alle følsomhetsanalysene simuleres samtidig på alle kjernene. Like input med samme
+    strøm av tilfeldige tall simuleres bare én gang, også på tvers av simuleringsinputene. `stream_keys` er
+    `stream_key` for hver simuleringsinput, og defaulter til () for alle. Returnerer én liste med output per
+    simuleringsinput, i samme rekkefølge som `sim_inputs`.
     """
+    if metode not in VENTETIDSMETODER:
+        raise ValueError(
+            f"Ukjent metode '{metode}' for ventetidsberegningen. Gyldige metoder er {VENTETIDSMETODER}"
+        )
+    if metode == "analytisk" and (
+        relative_precision is not None
+        or common_random_numbers
+        or antithetic
+        or chunk_periods is not None
+    ):
+        raise ValueError(
+            "Den analytiske ventetidsberegningen kan ikke kombineres med adaptiv simuleringslengde, felles tilfeldige tall, antitetiske par eller simulering bit for bit"
+        )
+
+    if stream_keys is None:
+        stream_keys = [()] * len(sim_inputs)
     keep_cols = ["ship_ids", "Skipstype", "Lengdegruppe", "direction", "periode"]
-    common_input_args = (
-        sim_input.lambda_df,
-        sim_input.mu_df,
-        sim_input.mulige_lop,
-        sim_input.alpha,
-        sim_input.num_periods,
-        keep_cols,
-        seed,
+    payloads = []
+    tilhorer = []
+    for nr, (sim_input, stream_key) in enumerate(zip(sim_inputs, stream_keys)):
+        common_input_args = (
+            sim_input.lambda_df,
+            sim_input.mu_df,
+            sim_input.mulige_lop,
+            sim_input.alpha,
+            sim_input.num_periods,
+            keep_cols,
+            seed,
+            kernel,
+            relative_precision,
+            absolute_precision,
+            common_random_numbers,
+            antithetic,
+            chunk_periods,
+        )
+        for year in sim_input.aar:
+            for periode in sim_input.perioder_for_sim:
+                payloads.append(
+                    _sim_unit_payload(
+                        year,
+                        periode,
+                        *common_input_args,
+                        stream_key=stream_key,
+                        distributions=distributions,
+                    )
+                )
+                tilhorer.append(nr)
+
+    if metode == "analytisk":
+        outputs = _approximate_payloads(
+            payloads, tilhorer, mellomlager, logger, num_workers, len(sim_inputs) > 1
+        )
+    elif metode == "interpolert":
+        outputs = _interpolate_payloads(
+            payloads, tilhorer, mellomlager, logger, num_workers, len(sim_inputs) > 1
+        )
+    else:
+        outputs = _simulate_payloads(
+            payloads, tilhorer, mellomlager, logger, num_workers, len(sim_inputs) > 1
+        )
+
+    per_input = [[] for _ in sim_inputs]
+    for nr, output in zip(tilhorer, outputs):
+        per_input[nr].append(output)
+    return per_input
+
+
+def _approximate_payloads(
+    payloads: List[dict],
+    tilhorer: List[int],
+    mellomlager: Optional[VentetidMellomlager],
+    logger: Callable,
+    num_workers: Optional[int],
+    flere_inputer: bool,
+) -> List[Output]:
+    """Beregner årene og periodene i `payloads` med den analytiske tilnærmingen, se :meth:`_approximate_unit`
+
+    Perioder der køen ikke er stabil, har ingen analytisk løsning, og simuleres i stedet med :meth:`_simulate_payloads`.
+    """
+    mettet = [
+        utilization(
+            payload["lbdas"], payload["mus"], payload["directions"], payload["alpha"]
+        )
+        >= 1
+        for payload in payloads
+    ]
+    # Tar mikrosekunder, og verken mellomlagres eller sendes til prosesspoolen
+    tilnaermet = iter(
+        [_approximate_unit(payload) for payload, m in zip(payloads, mettet) if not m]
     )
+    simulert = iter([])
+    if any(mettet):
+        logger(
+            f"{sum(mettet)} år og perioder har ikke stabil kø, og simuleres i stedet for å beregnes analytisk"
+        )
+        simulert = iter(
+            _simulate_payloads(
+                [payload for payload, m in zip(payloads, mettet) if m],
+                [nr for nr, m in zip(tilhorer, mettet) if m],
+                mellomlager,
+                logger,
+                num_workers,
+                flere_inputer,
+            )
+        )
+    return [next(simulert) if m else next(tilnaermet) for m in mettet]
+
+
+def _simulate_payloads(
+    payloads: List[dict],
+    tilhorer: List[int],
+    mellomlager: Optional[VentetidMellomlager],
+    logger: Callable,
+    num_workers: Optional[int],
+    flere_inputer: bool,
+) -> List[Output]:
+    """Henter eller simulerer hvert år og hver periode i `payloads`, se :meth:`simulate_from_simuleringsinputs`
+
+    `tilhorer` er hvilken simuleringsinput hvert år og hver periode hører til, og tas med i feilmeldinger hvis det er
+    `flere_inputer`.
+    """
+    # Slår opp hvert år og hver periode i mellomlageret, og simulerer bare de som mangler
+    input_nokler = [_sim_unit_input_key(payload) for payload in payloads]
+    outputs = [None] * len(payloads)
+    if mellomlager is not None:
+        nokler = [
+            VentetidMellomlager.nokkel(payload["year"], payload["periode"], nokkel)
+            for payload, nokkel in zip(payloads, input_nokler)
+        ]
+        outputs = [mellomlager.hent(nokkel) for nokkel in nokler]
+    missing = [i for i, output in enumerate(outputs) if output is None]
+
+    # Simulerer hver unike input bare én gang
+    unique = {}
+    for i in missing:
+        unique.setdefault(input_nokler[i], i)
+    if len(unique) < len(missing):
+        logger(
+            f"Av {len(missing)} år og perioder som skal simuleres, har {len(missing) - len(unique)} samme input som et annet år eller en annen periode. Simulerer {len(unique)} unike"
+        )
+
+    beskrivelser = []
+    for i in unique.values():
+        beskrivelse = f"Ventetidssimuleringen for {payloads[i]['year']} {payloads[i]['periode']}"
+        if flere_inputer:
+            beskrivelse += f" i simuleringsinput nr. {tilhorer[i] + 1}"
+        beskrivelser.append(beskrivelse)
+    simulated = kjor_parallelt(
+        _simulate_unit,
+        [payloads[i] for i in unique.values()],
+        beskrivelser=beskrivelser,
+        num_workers=num_workers,
+        logger=logger,
+    )
+    simulated = dict(zip(unique, simulated))
+
+    for i in missing:
+        outputs[i] = _with_year_and_period(
+            simulated[input_nokler[i]], payloads[i]["year"], payloads[i]["periode"]
+        )
+        if mellomlager is not None:
+            mellomlager.lagre(nokler[i], outputs[i])
+    return outputs
+
+
+def _interpolate_payloads(
+    payloads: List[dict],
+    tilhorer: List[int],
+    mellomlager: Optional[VentetidMellomlager],
+    logger: Callable,
+    num_workers: Optional[int],
+    flere_inputer: bool,
+) -> List[Output]:
+    """Simulerer ankerår og kontrollår, og interpolerer de øvrige årene i `payloads`, se :mod:`~fram.virkninger.ventetid.interpolering`
 
-    args = [
-        (year, periode,) + common_input_args
-        for year in sim_input.aar
-        for periode in sim_input.perioder_for_sim
+    Det interpoleres bare mellom år i samme simuleringsinput og periode, med de samme skipene. År med samme input som et
+    simulert år, får en kopi av simuleringen. Alle ankerår og kontrollår simuleres samlet med :meth:`_simulate_payloads`.
+    """
+    input_nokler = [_sim_unit_input_key(payload) for payload in payloads]
+    belastning = [
+        utilization(
+            payload["lbdas"], payload["mus"], payload["directions"], payload["alpha"]
+        )
+        for payload in payloads
     ]
-    # Prøver multiprosessering først
-    try:
-        with Pool(cpu_count() - 1) as p:
-            outputs = p.map(_sim_unit_unpack_args, args)
-    except:
-        outputs = [_sim_unit_unpack_args(arg) for arg in args]
+    grupper = {}
+    for i, payload in enumerate(payloads):
+        gruppe = (
+            tilhorer[i],
+            payload["periode"],
+            tuple(payload["ship_ids"]),
+            tuple(payload["directions"]),
+        )
+        grupper.setdefault(gruppe, []).append(i)
+
+    # Like input velges bare én gang
+    anker, kontroll = {}, {}
+    for gruppe, indekser in grupper.items():
+        unike = list({input_nokler[i]: i for i in indekser}.values())
+        anker_idx, kontroll_idx = velg_ankeraar([belastning[i] for i in unike])
+        anker[gruppe] = [unike[j] for j in anker_idx]
+        kontroll[gruppe] = [unike[j] for j in kontroll_idx]
+    simuleres = sorted(i for gruppe in grupper for i in anker[gruppe] + kontroll[gruppe])
+    simulert = _simulate_payloads(
+        [payloads[i] for i in simuleres],
+        [tilhorer[i] for i in simuleres],
+        mellomlager,
+        logger,
+        num_workers,
+        flere_inputer,
+    )
+    simulert = {input_nokler[i]: output for i, output in zip(simuleres, simulert)}
+
+    outputs = [None] * len(payloads)
+    avvik = []
+    antall_interpolert = 0
+    for gruppe, indekser in grupper.items():
+        if kontroll[gruppe]:
+            for i, interpolert in zip(
+                kontroll[gruppe],
+                interpoler_nokkeltall(
+                    [belastning[i] for i in anker[gruppe]],
+                    [simulert[input_nokler[i]].data for i in anker[gruppe]],
+                    [belastning[i] for i in kontroll[gruppe]],
+                ),
+            ):
+                fasit = simulert[input_nokler[i]].data["mean_wait_time"]
+                if fasit > 0:
+                    avvik.append(abs(interpolert["mean_wait_time"] - fasit) / fasit)
+
+        kilder = anker[gruppe] + kontroll[gruppe]
+        mangler = [i for i in indekser if input_nokler[i] not in simulert]
+        interpolert = interpoler_nokkeltall(
+            [belastning[i] for i in kilder],
+            [simulert[input_nokler[i]].data for i in kilder],
+            [belastning[i] for i in mangler],
+        )
+        antall_interpolert += len(mangler)
+        for i, data in zip(mangler, interpolert):
+            outputs[i] = Output(
+                payloads[i]["year"], payloads[i]["periode"], data, num_periods=0
+            )
+        for i in indekser:
+            if input_nokler[i] in simulert:
+                outputs[i] = _with_year_and_period(
+                    simulert[input_nokler[i]],
+                    payloads[i]["year"],
+                    payloads[i]["periode"],
+                )
+
+    if antall_interpolert == 0:
+        logger("For få år per periode til å interpolere. Simulerte alle år og perioder")
+    elif avvik:
+        logger(
+            f"Simulerte {len(simuleres)} og interpolerte {antall_interpolert} av {len(payloads)} år og perioder. Interpolert gjennomsnittlig ventetid avviker fra simulert ventetid i {len(avvik)} kontrollår med median {np.median(avvik):.1%} og maksimalt {np.max(avvik):.1%}"
+        )
+    else:
+        logger(
+            f"Simulerte {len(simuleres)} og interpolerte {antall_interpolert} av {len(payloads)} år og perioder. Ingen kontrollår hadde ventetid, så feilen ved interpoleringen kunne ikke måles"
+        )
     return outputs
 
 
 def cached_simulate_from_simuleringsinput(
-    sim_input: SimuleringsInput, seed: int = None, logger: Callable = print
+    sim_input: SimuleringsInput,
+    seed: int = None,
+    logger: Callable = print,
+    kernel: str = "numpy",
+    relative_precision: Optional[float] = None,
+    absolute_precision: float = 0.0,
+    common_random_numbers: bool = False,
+    antithetic: bool = False,
+    chunk_periods: Optional[float] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+    num_workers: Optional[int] = None,
+    metode: str = "simulering",
+    stream_key: tuple = (),
+    distributions: bool = False,
 ) -> List[Output]:
-    """En wrapper rundt simulate_from_simuleringsinput som sjekker om input er likt som forrige gang. I så fall henter den bare ferdiglagret output i stedet for å kjøre simuleringene på nytt"""
-    # Lager først en hash - altså en unik streng - for all input. Hvis input er lik, er hashen lik
-    current_path = Path(__file__).parent
-    shelve_path = current_path / "mellomlagret_ventetid"
-    lookup_string = f"{sim_input._hash_string}-{str(seed)}-{str(sim_input.num_periods)}"
-
-    # Sjekker så om dette inputarket allerede har en mellomlagret ventetidsberegning. Bruker i så fall den
-    with shelve.open(str(shelve_path)) as db:
-        try:
-            output = db[lookup_string]
-            logger(
-                f"Simuleringsinputen er lik som en tidligere input. Benytter mellomlagret ventetidsberegning i {shelve_path}"
-            )
-        except:
-            logger(
-                f"Fant ikke mellomlagret ventetidsberegning som kunne benyttes. Beregner på nytt. Skal simulere over {len(sim_input.aar)} år og {len(sim_input.perioder_for_sim)} perioder hvert år"
-            )
-            # Beregner da manuelt
-            output = simulate_from_simuleringsinput(sim_input, seed=seed)
-            # Skriver til mellomlagringen
-            db[lookup_string] = output
+    """En wrapper rundt simulate_from_simuleringsinput som henter ferdiglagret output for hvert år og hver periode som er simulert med lik input tidligere, og bare simulerer resten
 
-    return output
+    Oppslagsnøkkelen for hvert år og hver periode er den faktiske inputen til simuleringen, se
+    :class:`~fram.virkninger.ventetid.mellomlagring.VentetidMellomlager`. Endres inputen for ett år, simuleres bare det
+    året på nytt. Kø-kjernen inngår ikke i oppslagsnøkkelen, siden alle kjerner gir identiske svar. Presisjonskravene
+    ved adaptiv simuleringslengde inngår derimot, det samme gjør valg av felles tilfeldige tall og antitetiske par, og
+    om det simuleres bit for bit og om fordelingene følges. Størrelsen på bitene inngår ikke, siden den ikke påvirker svaret.
 
+    Args:
+        cache_dir: Katalogen for mellomlageret. Defaulter til miljøvariabelen `FRAM_VENTETID_MELLOMLAGER`, eller
+            `~/.cache/fram/ventetid`. Mellomlageret ryddes etter hver kjøring
+        num_workers: Antall arbeiderprosesser, se :meth:`simulate_from_simuleringsinput`
+        metode: "simulering" eller "analytisk", se :meth:`simulate_from_simuleringsinput`. Den analytiske
+            tilnærmingen mellomlagres ikke
+        stream_key: Hvor simuleringsinputen ligger i treet av strømmer av tilfeldige tall, se :meth:`stromnokkel`.
+            Inngår i oppslagsnøkkelen
+        distributions: Hvorvidt fordelingene skal følges, se :meth:`simulate_from_simuleringsinput`. Inngår i
+            oppslagsnøkkelen, slik at output uten fordelinger ikke treffes når de etterspørres
+    """
+    return cached_simulate_from_simuleringsinputs(
+        [sim_input],
+        seed=seed,
+        logger=logger,
+        kernel=kernel,
+        relative_precision=relative_precision,
+        absolute_precision=absolute_precision,
+        common_random_numbers=common_random_numbers,
+        antithetic=antithetic,
+        chunk_periods=chunk_periods,
+        cache_dir=cache_dir,
+        num_workers=num_workers,
+        metode=metode,
+        stream_keys=[stream_key],
+        distributions=distributions,
+    )[0]
+
+
+def cached_simulate_from_simuleringsinputs(
+    sim_inputs: List[SimuleringsInput],
+    seed: int = None,
+    logger: Callable = print,
+    kernel: str = "numpy",
+    relative_precision: Optional[float] = None,
+    absolute_precision: float = 0.0,
+    common_random_numbers: bool = False,
+    antithetic: bool = False,
+    chunk_periods: Optional[float] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+    num_workers: Optional[int] = None,
+    metode: str = "simulering",
+    stream_keys: Optional[List[tuple]] = None,
+    distributions: bool = False,
+) -> List[List[Output]]:
+    """Som :meth:`cached_simulate_from_simuleringsinput`, men for flere simuleringsinputer i én felles jobb, se :meth:`simulate_from_simuleringsinputs`"""
+    mellomlager = None if metode == "analytisk" else VentetidMellomlager(cache_dir)
+    outputs = simulate_from_simuleringsinputs(
+        sim_inputs,
+        seed=seed,
+        kernel=kernel,
+        relative_precision=relative_precision,
+        absolute_precision=absolute_precision,
+        common_random_numbers=common_random_numbers,
+        antithetic=antithetic,
+        chunk_periods=chunk_periods,
+        mellomlager=mellomlager,
+        logger=logger,
+        num_workers=num_workers,
+        metode=metode,
+        stream_keys=stream_keys,
+        distributions=distributions,
+    )
+    if mellomlager is None:
+        logger("Beregnet ventetiden med den analytiske tilnærmingen")
+        return outputs
+    antall = mellomlager.antall_treff + mellomlager.antall_bom
+    if mellomlager.antall_bom == 0:
+        logger(
+            f"Simuleringsinputen er lik som en tidligere input. Benytter mellomlagret ventetidsberegning i {mellomlager.katalog}"
+        )
+    else:
+        logger(
+            f"Hentet {mellomlager.antall_treff} av {antall} år og perioder fra mellomlagret ventetidsberegning i {mellomlager.katalog}. Simulerte {mellomlager.antall_bom} på nytt"
+        )
+    mellomlager.rydd()
 
-def _sim_unit_unpack_args(args):
-    """Hjelpefunksjon for hjelpefunksjonen for simulering. Eneste funksjon er å pakke ut argumentene fra en tuple"""
-    return _sim_unit(*args)
+    return outputs
 
 
-def _sim_unit(
-    year, periode, lambda_df, mu_df, mulige_lop, alpha, periods, keep_cols, seed
-):
-    """Hjelpefunksjon som kjører simuleringen for ett år og en periode. Skilt ut for å kunne parallelliseres"""
+def _sim_unit_payload(
+    year,
+    periode,
+    lambda_df,
+    mu_df,
+    mulige_lop,
+    alpha,
+    periods,
+    keep_cols,
+    seed,
+    kernel,
+    relative_precision=None,
+    absolute_precision=0.0,
+    common_random_numbers=False,
+    antithetic=False,
+    chunk_periods=None,
+    stream_key=(),
+    distributions=False,
+) -> dict:
+    """Den faktiske inputen til simuleringen av ett år og en periode
+
+    Tar bare med skipene som har positiv lambda i perioden, som små arrays og lister. Det er dette som sendes til
+    arbeiderprosessene, i stedet for hele `lambda_df` og `mu_df`. `stream_key` er noden til banen i treet
+    av strømmer av tilfeldige tall, se :meth:`_sim_unit_strom`.
+    """
     # Tar bare med de skipene som har positiv lambda
     sim_df = (
         lambda_df.loc[
@@ -312,18 +769,169 @@ def _sim_unit(
             how="left",
         )
     )
-    mus = sim_df[mulige_lop].values
+    return {
+        "year": year,
+        "periode": periode,
+        "lbdas": sim_df[year].values.astype(float),
+        "mus": sim_df[mulige_lop].values.astype(float),
+        "ship_ids": list(sim_df["ship_ids"].values),
+        "directions": list(sim_df["direction"].values),
+        "alpha": list(alpha),
+        "bottleneck_ids": list(mulige_lop),
+        "periods": periods,
+        "seed": seed,
+        "kernel": kernel,
+        "relative_precision": relative_precision,
+        "absolute_precision": absolute_precision,
+        "common_random_numbers": common_random_numbers,
+        "antithetic": antithetic,
+        "chunk_periods": chunk_periods,
+        "stream_key": tuple(stream_key),
+        "distributions": distributions,
+    }
+
+
+def _with_year_and_period(output: Output, year, periode) -> Output:
+    """Kopi av output fra en simulering, for et annet år eller en annen periode med samme input"""
+    if (output.year, output.period) == (year, periode):
+        return output
+    output = copy.deepcopy(output)
+    output.year = year
+    output.period = periode
+    return output
+
+
+def _sim_unit_input_key(payload: dict, strom: Optional[tuple] = None) -> str:
+    """Nøkkel for den faktiske inputen i `payload` fra :meth:`_sim_unit_payload`
+
+    Bygger bare på skipene med positiv lambda og deres lambda og mu, og `stream_key`, slik at år og perioder med lik
+    input i samme bane får lik nøkkel, og endringer i andre år eller perioder ikke påvirker nøkkelen. Kø-kjernen og
+    størrelsen på bitene påvirker ikke svaret, og inngår ikke. Hvorvidt fordelingene følges, inngår derimot, siden
+    output da inneholder mer. Med `strom` brukes den i stedet for `stream_key`. Med felles tilfeldige tall inngår året
+    og perioden, siden de da bestemmer strømmen, se :meth:`_sim_unit_strom`.
+    """
+    metode = ()
+    if payload["relative_precision"] is not None:
+        metode += (
+            "adaptiv",
+            payload["relative_precision"],
+            payload["absolute_precision"],
+        )
+    if _felles_tilfeldige_tall(payload):
+        metode += ("crn", payload["antithetic"])
+    if payload["chunk_periods"] is not None:
+        metode += ("bitvis",)
+    if payload["distributions"]:
+        metode += ("fordelinger",)
+    if strom is None:
+        strom = _sim_unit_strom(payload) if _felles_tilfeldige_tall(payload) else payload["stream_key"]
+    return input_nokkel(
+        lbdas=payload["lbdas"],
+        mus=payload["mus"],
+        alpha=payload["alpha"],
+        ship_ids=payload["ship_ids"],
+        directions=payload["directions"],
+        bottleneck_ids=payload["bottleneck_ids"],
+        seed=payload["seed"],
+        num_periods=payload["periods"],
+        metode=metode,
+        strom=strom,
+    )
+
+
+def _felles_tilfeldige_tall(payload: dict) -> bool:
+    """Hvorvidt banene skal trekke fra de samme strømmene, med felles tilfeldige tall eller antitetiske par"""
+    return payload["common_random_numbers"] or payload["antithetic"]
+
+
+def _sim_unit_strom(payload: dict) -> tuple:
+    """Noden i treet av strømmer av tilfeldige tall som ett år og en periode trekker fra, under `seed`
+
+    Noden er (`stream_key`, input), der input er hash-en av den faktiske inputen til simuleringen fra
+    :meth:`_sim_unit_input_key`. Like år og perioder i samme bane trekker dermed fra samme strøm, og simuleres bare én
+    gang, mens ulik input gir uavhengige strømmer. Med felles tilfeldige tall eller antitetiske par må begge banene
+    trekke fra de samme strømmene, også når inputen er ulik. Noden er da (`stream_key`, år, periode), der `stream_key`
+    er den samme for begge banene, se :meth:`stromnokkel`. Referanse- og tiltaksbanen er dermed parvis like, mens hvert
+    år og hver periode er uavhengig av de andre.
+    """
+    if _felles_tilfeldige_tall(payload):
+        return payload["stream_key"] + (payload["year"], payload["periode"])
+    # Fordelingene påvirker ikke trekningene, og skal ikke endre strømmen
+    innhold = _sim_unit_input_key(dict(payload, distributions=False), strom=())
+    return payload["stream_key"] + (int(innhold[:16], 16),)
+
+
+def _sim_unit(*args, **kwargs) -> Output:
+    """Kjører simuleringen for ett år og en periode, med de samme argumentene som :meth:`_sim_unit_payload`"""
+    return _simulate_unit(_sim_unit_payload(*args, **kwargs))
+
+
+def _simulate_unit(payload: dict) -> Output:
+    """Hjelpefunksjon som kjører simuleringen for ett år og en periode. Skilt ut for å kunne parallelliseres
+
+    Med ett løp og ingen alpha-rabatt benyttes den vektoriserte Lindley-rekursjonen, som gir samme svar som løkken.
+    Ved adaptiv simuleringslengde er `periods` det maksimale antallet perioder. Med felles tilfeldige tall og fast
+    simuleringslengde simuleres alle `periods` perioder i ett, og deles etterpå opp i VARIANSREDUKSJON_ANTALL_BATCHER
+    batcher, se :meth:`~fram.virkninger.ventetid.computation._batch_means`. Er `distributions` satt, følges
+    fordelingen av ventetid, total tid og kølengde, og legges på `Output.distributions`.
+    """
+    alpha = payload["alpha"]
+    bottleneck_ids = payload["bottleneck_ids"]
+    periods = payload["periods"]
+    relative_precision = payload["relative_precision"]
+    common_random_numbers = payload["common_random_numbers"]
+    chunk_periods = payload["chunk_periods"]
 
     data = simulate_multiship_multiple_bottlenecks_two_directions(
-        lbdas=sim_df[year].values,
-        ship_ids=sim_df["ship_ids"].values,
-        directions=sim_df["direction"].values,
+        lbdas=payload["lbdas"],
+        ship_ids=payload["ship_ids"],
+        directions=payload["directions"],
         alpha=alpha,
-        mus=mus,
-        bottleneck_ids=mulige_lop,
+        mus=payload["mus"],
+        bottleneck_ids=bottleneck_ids,
         num_periods=periods,
-        seed=seed,
+        seed=payload["seed"],
+        vectorized=len(bottleneck_ids) == 1 and all(a == 1 for a in alpha),
+        kernel=payload["kernel"],
+        relative_precision=relative_precision,
+        absolute_precision=payload["absolute_precision"],
+        common_random_numbers=common_random_numbers,
+        antithetic=payload["antithetic"],
+        num_batches=VARIANSREDUKSJON_ANTALL_BATCHER
+        if common_random_numbers
+        and relative_precision is None
+        and chunk_periods is None
+        else 1,
+        chunk_periods=chunk_periods,
+        stream_key=_sim_unit_strom(payload),
+        distributions=payload["distributions"],
+    )
+    # Ventetiden per batch og fordelingene er ikke tall, og hører ikke hjemme blant nøkkeltallene
+    batches = data.pop("mean_wait_time_per_ship_per_batch", None)
+    distributions = data.pop("distributions", None)
+    output = Output(
+        payload["year"],
+        payload["periode"],
+        data,
+        num_periods=data.get("num_periods_simulated", periods),
+        achieved_precision=data.get("achieved_precision"),
+        batches=batches,
+        antithetic=data.pop("antithetic", False),
+        distributions=distributions,
     )
-    output = Output(year, periode, data)
 
     return output
+
+
+def _approximate_unit(payload: dict) -> Output:
+    """Beregner ett år og en periode med den analytiske tilnærmingen, med samme input som :meth:`_simulate_unit`"""
+    data = approximate_multiship_multiple_bottlenecks_two_directions(
+        lbdas=payload["lbdas"],
+        mus=payload["mus"],
+        directions=payload["directions"],
+        alpha=payload["alpha"],
+        ship_ids=payload["ship_ids"],
+        bottleneck_ids=payload["bottleneck_ids"],
+        num_periods=payload["periods"],
+    )
+    return Output(payload["year"], payload["periode"], data, num_periods=0)
@@ -88,6 +88,31 @@ def robust_mean(array):
     return out
 
 
+# 97,5 %-kvantiler i t-fordelingen, for tosidige 95 %-intervaller. Indeksert med antall frihetsgrader
+T_QUANTILES_975 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571,
+    6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228,
+    11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131,
+    16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086,
+    21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060,
+    26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042,
+}
+
+
+def confidence_halfwidth(values):
+    """Halve bredden av et 95 %-konfidensintervall for gjennomsnittet av uavhengige observasjoner
+
+    Benytter t-fordelingen. Over 30 frihetsgrader tilnærmes kvantilen med 1.96 + 2.46 / frihetsgrader, som treffer
+    tabellverdiene på tredje desimal. Gir NaN hvis det er færre enn to observasjoner.
+    """
+    values = np.asarray(values, dtype=float)
+    dof = len(values) - 1
+    if dof < 1:
+        return np.NaN
+    quantile = T_QUANTILES_975.get(dof, 1.96 + 2.46 / dof)
+    return quantile * values.std(ddof=1) / np.sqrt(len(values))
+
+
 def set_columns(df, kolonner):
     """ Setter kolonner som de nye kolonnene i df """
     df = df.copy()
@@ -339,10 +364,32 @@ def _verdsett_ventetid(
 
 
 class Output:
-    def __init__(self, year, period, data):
+    # Klasseattributter, slik at også mellomlagret output fra tidligere versjoner har dem
+    num_periods = None
+    achieved_precision = None
+    batches = None
+    antithetic = False
+    distributions = None
+
+    def __init__(
+        self,
+        year,
+        period,
+        data,
+        num_periods=None,
+        achieved_precision=None,
+        batches=None,
+        antithetic=False,
+        distributions=None,
+    ):
         self.year = year
         self.period = period
         self.data = data
+        self.num_periods = num_periods
+        self.achieved_precision = achieved_precision
+        self.batches = batches
+        self.antithetic = antithetic
+        self.distributions = distributions
 
 
 class SimuleringsInput:
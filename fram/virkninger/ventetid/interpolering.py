@@ -0,0 +1,152 @@
+"""
+Interpolering av ventetidssimuleringer mellom år
+
+Gjennom analyseperioden endres trafikken jevnt med prognosene, og ventetiden i et år er i hovedsak bestemt av hvor hardt
+flaskehalsene er belastet. I stedet for å simulere hvert år, kan det simuleres et lite utvalg ankerår, spredt over
+belastningen, og de øvrige årene interpoleres med en monoton kurve for hvert nøkkeltall mot belastningen. Belastningen
+er utnyttelsen av flaskehalsene, se :meth:`~fram.virkninger.ventetid.queue_approximation.utilization`.
+
+I tillegg simuleres noen kontrollår, som interpoleres fra ankerårene og sammenlignes med simuleringen, slik at feilen
+ved interpoleringen kan rapporteres. Kontrollårene brukes deretter som ankerår på lik linje med de andre.
+"""
+from numbers import Number
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+ANTALL_ANKERAAR = 6
+ANTALL_KONTROLLAAR = 2
+
+
+def velg_ankeraar(
+    belastning: Sequence[float],
+    antall_anker: int = ANTALL_ANKERAAR,
+    antall_kontroll: int = ANTALL_KONTROLLAAR,
+) -> Tuple[List[int], List[int]]:
+    """Indeksene til ankerårene og kontrollårene, gitt belastningen i hvert år
+
+    Ankerårene er årene nærmest jevnt fordelte belastninger fra den laveste til den høyeste, slik at det aldri må
+    ekstrapoleres. Kontrollårene er årene nærmest midten av de største hullene mellom ankerårene. Er det for få år til
+    at interpolering lønner seg, er alle årene ankerår, og det er ingen kontrollår.
+    """
+    belastning = np.asarray(belastning, dtype=float)
+    if len(belastning) <= antall_anker + antall_kontroll:
+        return list(range(len(belastning))), []
+
+    anker = []
+    for maal in np.linspace(belastning.min(), belastning.max(), antall_anker):
+        avstand = np.abs(belastning - maal)
+        avstand[anker] = np.inf
+        anker.append(int(np.argmin(avstand)))
+    anker = sorted(anker, key=lambda i: belastning[i])
+
+    kontroll = []
+    hull = sorted(
+        zip(anker[:-1], anker[1:]),
+        key=lambda par: belastning[par[1]] - belastning[par[0]],
+        reverse=True,
+    )
+    for nedre, ovre in hull:
+        if len(kontroll) == antall_kontroll:
+            break
+        inni = (belastning > belastning[nedre]) & (belastning < belastning[ovre])
+        inni[anker + kontroll] = False
+        if not inni.any():
+            continue
+        midten = (belastning[nedre] + belastning[ovre]) / 2
+        avstand = np.where(inni, np.abs(belastning - midten), np.inf)
+        kontroll.append(int(np.argmin(avstand)))
+    return anker, kontroll
+
+
+def _isoton(y: np.ndarray) -> np.ndarray:
+    """Nærmeste ikke-synkende følge i minste kvadraters forstand (pool adjacent violators)"""
+    blokker = []
+    for verdi in y:
+        blokker.append([verdi, 1])
+        while len(blokker) > 1 and (
+            blokker[-2][0] / blokker[-2][1] > blokker[-1][0] / blokker[-1][1]
+        ):
+            summen, antall = blokker.pop()
+            blokker[-1][0] += summen
+            blokker[-1][1] += antall
+    return np.concatenate([np.full(antall, summen / antall) for summen, antall in blokker])
+
+
+def _monoton_kubisk(x: np.ndarray, y: np.ndarray, x_ny: np.ndarray) -> np.ndarray:
+    """Monoton kubisk Hermite-interpolasjon (Fritsch–Carlson) av monotone punkter. Utenfor punktene holdes endepunktene"""
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    d = np.empty_like(y)
+    d[0], d[-1] = delta[0], delta[-1]
+    if len(x) > 2:
+        w1 = 2 * h[1:] + h[:-1]
+        w2 = h[1:] + 2 * h[:-1]
+        samme_fortegn = delta[:-1] * delta[1:] > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            harmonisk = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+        d[1:-1] = np.where(samme_fortegn, harmonisk, 0.0)
+
+    x_ny = np.clip(x_ny, x[0], x[-1])
+    k = np.clip(np.searchsorted(x, x_ny, side="right") - 1, 0, len(x) - 2)
+    t = (x_ny - x[k]) / h[k]
+    return (
+        (2 * t ** 3 - 3 * t ** 2 + 1) * y[k]
+        + (t ** 3 - 2 * t ** 2 + t) * h[k] * d[k]
+        + (-2 * t ** 3 + 3 * t ** 2) * y[k + 1]
+        + (t ** 3 - t ** 2) * h[k] * d[k + 1]
+    )
+
+
+def monoton_kurve(x: Sequence[float], y: Sequence[float], x_ny: Sequence[float]) -> np.ndarray:
+    """Verdien i `x_ny` av en monoton kurve gjennom punktene (`x`, `y`)
+
+    Punktene glattes først til å være monotone med isoton regresjon, i retningen fra punktet med lavest til punktet med
+    høyest `x`, slik at simuleringsstøy ikke gir en kurve som svinger. Punkter med lik `x` slås sammen, og punkter
+    uten verdi hoppes over.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x_ny = np.asarray(x_ny, dtype=float)
+    har_verdi = ~np.isnan(y)
+    if not har_verdi.any():
+        return np.full(x_ny.shape, np.nan)
+    x, indekser = np.unique(x[har_verdi], return_inverse=True)
+    y = np.bincount(indekser, y[har_verdi]) / np.bincount(indekser)
+    if len(x) == 1:
+        return np.full(x_ny.shape, y[0])
+    fortegn = 1 if y[-1] >= y[0] else -1
+    return _monoton_kubisk(x, fortegn * _isoton(fortegn * y), x_ny)
+
+
+def interpoler_nokkeltall(
+    belastning: Sequence[float], data: List[dict], belastning_ny: Sequence[float]
+) -> List[dict]:
+    """Nøkkeltallene fra simuleringene i `data`, interpolert til hver belastning i `belastning_ny`
+
+    Hvert tall, og hvert tall per skip, retning eller flaskehals, interpoleres for seg med :meth:`monoton_kurve`, fra
+    simuleringene der det finnes. Nøkkeltall som ikke er tall, er ikke med.
+    """
+    ut = [{} for _ in belastning_ny]
+    nokler = list(dict.fromkeys(nokkel for d in data for nokkel in d))
+    for nokkel in nokler:
+        verdier = [d.get(nokkel) for d in data]
+        if all(isinstance(v, dict) for v in verdier if v is not None):
+            grupper = sorted({gruppe for v in verdier if v is not None for gruppe in v})
+            for u in ut:
+                u[nokkel] = {}
+            for gruppe in grupper:
+                punkter = [
+                    (b, v[gruppe])
+                    for b, v in zip(belastning, verdier)
+                    if v is not None and gruppe in v
+                ]
+                kurve = monoton_kurve(*zip(*punkter), belastning_ny)
+                for u, verdi in zip(ut, kurve):
+                    u[nokkel][gruppe] = float(verdi)
+        elif all(isinstance(v, Number) for v in verdier if v is not None):
+            punkter = [(b, v) for b, v in zip(belastning, verdier) if v is not None]
+            kurve = monoton_kurve(*zip(*punkter), belastning_ny)
+            for u, verdi in zip(ut, kurve):
+                u[nokkel] = float(verdi)
+    return ut
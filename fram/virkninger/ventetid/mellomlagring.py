@@ -0,0 +1,116 @@
+"""
+Mellomlagring av ventetidssimuleringer per år og periode
+
+Hver simulering av ett år og én periode lagres i en egen fil, med en nøkkel som er en hash av den faktiske inputen til
+simuleringen: lambda, mu og alpha for skipene som simuleres, seed og strømmen av tilfeldige tall, antall perioder og
+valgene for simuleringsmetoden. Endres inputen for ett år, beregnes bare det året på nytt.
+
+Mellomlageret ligger i katalogen angitt med miljøvariabelen `FRAM_VENTETID_MELLOMLAGER`, eller under
+`~/.cache/fram/ventetid` hvis den ikke er satt. Skriving og opprydding er felles med de andre mellomlagrene, se
+:mod:`~fram.generelle_hjelpemoduler.mellomlagring`.
+"""
+import hashlib
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+from fram.generelle_hjelpemoduler.mellomlagring import (
+    MAKS_ALDER_DAGER,
+    Mellomlager,
+    mellomlagerkatalog,
+)
+from fram.virkninger.ventetid.hjelpemoduler import Output
+
+MELLOMLAGER_MILJOVARIABEL = "FRAM_VENTETID_MELLOMLAGER"
+MAKS_STORRELSE_BYTES = 500_000_000
+# Økes når formatet på output eller trekningen av tilfeldige tall endres, slik at gamle filer ikke lenger treffes
+MELLOMLAGER_VERSJON = 5
+
+
+def standard_mellomlagerkatalog() -> Path:
+    """Katalogen fra miljøvariabelen `FRAM_VENTETID_MELLOMLAGER`, ellers `~/.cache/fram/ventetid`"""
+    return mellomlagerkatalog(MELLOMLAGER_MILJOVARIABEL, "ventetid")
+
+
+def input_nokkel(
+    lbdas: np.ndarray,
+    mus: np.ndarray,
+    alpha: List[float],
+    ship_ids: List[str],
+    directions: List[str],
+    bottleneck_ids: List[str],
+    seed: int,
+    num_periods: int,
+    metode: tuple = (),
+    strom: tuple = (),
+) -> str:
+    """Hash av den faktiske inputen til simuleringen av ett år og én periode
+
+    Tallene hashes som float64 i fast rekkefølge, slik at samme input alltid gir samme nøkkel, uavhengig av hvilke
+    dataframes, år eller perioder den er hentet fra. Rekkefølgen på skipene inngår, siden den påvirker trekningene.
+    `metode` er de øvrige valgene som påvirker svaret, som presisjonskrav og felles tilfeldige tall, og `strom` er
+    noden til banen i treet av strømmer av tilfeldige tall under `seed`, se
+    :meth:`~fram.virkninger.ventetid.excel.stromnokkel`.
+    """
+    hasher = hashlib.sha256()
+
+    def legg_til(*deler):
+        for del_ in deler:
+            hasher.update(str(del_).encode("utf-8"))
+            hasher.update(b"\x1f")
+
+    def legg_til_tall(tall):
+        tall = np.ascontiguousarray(tall, dtype=np.float64)
+        legg_til(tall.shape)
+        hasher.update(tall.tobytes())
+
+    legg_til(seed, num_periods)
+    legg_til_tall(lbdas)
+    legg_til_tall(mus)
+    legg_til_tall(alpha)
+    legg_til(*ship_ids)
+    legg_til(*directions)
+    legg_til(*bottleneck_ids)
+    legg_til(*metode)
+    legg_til("strom", *strom)
+    return hasher.hexdigest()
+
+
+class VentetidMellomlager(Mellomlager):
+    """Mellomlager med én fil per simulering av ett år og én periode, se :class:`~fram.generelle_hjelpemoduler.mellomlagring.Mellomlager`
+
+    Objektet holder bare på katalogen og grensene, og kan derfor sendes til andre prosesser. Antall treff og antall
+    simuleringer som ikke fantes, telles i `antall_treff` og `antall_bom`.
+
+    Args:
+        katalog: Hvor filene skal ligge. Defaulter til :meth:`standard_mellomlagerkatalog`
+        maks_storrelse_bytes: Samlet størrelse mellomlageret ryddes ned til
+        maks_alder_dager: Filer som ikke er brukt på så mange dager, slettes ved opprydding
+    """
+
+    def __init__(
+        self,
+        katalog: Optional[Union[str, Path]] = None,
+        maks_storrelse_bytes: int = MAKS_STORRELSE_BYTES,
+        maks_alder_dager: float = MAKS_ALDER_DAGER,
+    ):
+        if katalog is None:
+            katalog = standard_mellomlagerkatalog()
+        super().__init__(katalog, maks_storrelse_bytes, maks_alder_dager)
+
+    @staticmethod
+    def nokkel(year: int, periode: str, input_nokkel: str) -> str:
+        """Oppslagsnøkkelen for ett år og én periode, gitt nøkkelen fra :meth:`input_nokkel` for den faktiske inputen"""
+        deler = [MELLOMLAGER_VERSJON, year, periode, input_nokkel]
+        return hashlib.sha256(
+            "\x1f".join(str(del_) for del_ in deler).encode("utf-8")
+        ).hexdigest()
+
+    def hent(self, nokkel: str) -> Optional[Output]:
+        """Henter mellomlagret output, eller None hvis den ikke finnes eller ikke kan leses"""
+        return super().hent(nokkel)
+
+    def lagre(self, nokkel: str, output: Output):
+        """Skriver output til en midlertidig fil, og flytter den på plass når den er ferdig skrevet"""
+        super().lagre(nokkel, output)
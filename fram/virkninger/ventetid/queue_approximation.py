@@ -0,0 +1,233 @@
+"""
+Analytisk tilnærming til køsimuleringene i :mod:`fram.virkninger.ventetid.computation`
+
+For grove anslag, der bare størrelsesordenen på ventetiden betyr noe, kan køen beregnes med lukkede formler i stedet
+for å simuleres. Anløpene er Poisson-fordelte og seilingstidene faste (1/mu), så hver flaskehals er en M/G/c-kø, der
+seilingstiden er en blanding av skipstypenes faste seilingstider. Ventetiden beregnes med Allen–Cunneen-tilnærmingen
+
+    Wq = C(c, a) * E[O] / (c * (1 - rho)) * (1 + cs2) / 2
+
+der C(c, a) er Erlang C-sannsynligheten for å måtte vente, `a` er tilbudt trafikk, `E[O]` er forventet tid en
+flaskehals er opptatt per skip, `rho` er utnyttelsen og `cs2` er kvadrert variasjonskoeffisient for tiden
+flaskehalsen er opptatt. Med én flaskehals er dette nøyaktig Pollaczek–Khinchine-formelen for M/G/1-køen.
+
+Flere flaskehalser slås sammen til `c` like flaskehalser med samme samlede kapasitet for hver skipstype, og skipene
+fordeles på flaskehalsene i forhold til kapasiteten. Rabatten `alpha` for å seile i samme retning som forrige skip
+regnes inn i tiden flaskehalsen er opptatt, med sannsynligheten for at to etterfølgende skip kommer i samme retning.
+
+Ventetiden er den samme for alle skipstyper og retninger, siden skipene betjenes etter førstemann til mølla. Maksimal
+ventetid og kølengde finnes ikke i lukket form, og settes til NaN. Antall anløp og ventesituasjoner er forventede
+verdier over `num_periods` perioder. Seilingstiden for hver skipstype er snittet over flaskehalsene, vektet med
+fordelingen av skipene på flaskehalsene.
+"""
+import warnings
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from fram.virkninger.ventetid.hjelpemoduler import SKIP_LENGDE_SPLITTER
+from fram.virkninger.ventetid.queue_statistics import group_means, group_rates
+
+
+def erlang_c(num_servers: int, offered_load: float) -> float:
+    """Sannsynligheten for å måtte vente i en M/M/c-kø med `num_servers` flaskehalser og tilbudt trafikk `offered_load`
+
+    Regnes ut via den numerisk stabile rekursjonen for Erlang B.
+    """
+    if offered_load <= 0:
+        return 0.0
+    erlang_b = 1.0
+    for k in range(1, num_servers + 1):
+        erlang_b = offered_load * erlang_b / (k + offered_load * erlang_b)
+    utilization = offered_load / num_servers
+    return erlang_b / (1 - utilization * (1 - erlang_b))
+
+
+def _as_matrix(lbdas: np.ndarray, mus: Union[np.array, List[float]]) -> np.ndarray:
+    """`mus` som en matrise med dimensjoner (num_ship, num_bottlenecks), der null-muer er 0"""
+    mus = np.asarray(mus, dtype=float)
+    if mus.ndim == 1:
+        mus = mus.reshape(len(lbdas), -1)
+    return np.where(mus > 0, mus, 0.0)
+
+
+def _occupation(
+    lbdas: np.ndarray,
+    mus: np.ndarray,
+    directions: Optional[List[str]],
+    alpha: Optional[List[float]],
+) -> Tuple[int, np.ndarray, float, np.ndarray]:
+    """Antall flaskehalser, fordelingen av skipene på flaskehalsene, sannsynligheten for at to etterfølgende skip
+    kommer i samme retning, og tiden en flaskehals er opptatt per skip i den sammenslåtte køen"""
+    if alpha is None:
+        alpha = [1] * mus.shape[1]
+    if directions is None:
+        directions = ["Ingen retning"] * len(lbdas)
+    alpha = np.asarray(alpha, dtype=float)
+
+    # Bare flaskehalser som minst én skipstype kan bruke, teller med
+    num_servers = int((mus.sum(axis=0) > 0).sum())
+    # Skipene fordeles i forhold til kapasiteten
+    capacity = mus.sum(axis=1)
+    routing = mus / capacity[:, None]
+
+    # Sannsynligheten for at forrige skip gjennom flaskehalsen kom i samme retning, og tiden flaskehalsen er opptatt
+    direction_share = group_rates(directions, lbdas, lbdas, lbdas.sum())
+    prob_same_direction = sum(share ** 2 for share in direction_share.values())
+    alpha_correction = routing @ (prob_same_direction * alpha + 1 - prob_same_direction)
+    occupation_times = num_servers / capacity * alpha_correction
+    return num_servers, routing, prob_same_direction, occupation_times
+
+
+def utilization(
+    lbdas: List[float],
+    mus: Union[np.array, List[float]],
+    directions: Optional[List[str]] = None,
+    alpha: Optional[List[float]] = None,
+) -> float:
+    """Utnyttelsen av flaskehalsene i den sammenslåtte køen, som i
+    :meth:`approximate_multiship_multiple_bottlenecks_two_directions`. Køen er stabil hvis denne er under 1"""
+    lbdas = np.asarray(lbdas, dtype=float)
+    if len(lbdas) == 0:
+        return 0.0
+    mus = _as_matrix(lbdas, mus)
+    num_servers, _, _, occupation_times = _occupation(lbdas, mus, directions, alpha)
+    return lbdas @ occupation_times / num_servers
+
+
+def approximate_multiship_multiple_bottlenecks_two_directions(
+    lbdas: List[float],
+    mus: Union[np.array, List[float]],
+    directions: Optional[List[str]] = None,
+    alpha: Optional[List[float]] = None,
+    ship_ids: Optional[List[str]] = None,
+    bottleneck_ids: Optional[List[str]] = None,
+    num_periods: int = 10_000,
+    threshold: float = 1 / 60,
+) -> dict:
+    """Analytisk tilnærming til :meth:`~fram.virkninger.ventetid.computation.simulate_multiship_multiple_bottlenecks_two_directions`
+
+    Tar de samme argumentene som simuleringen, og gir output med de samme nøklene, se beskrivelsen øverst i filen.
+    Sannsynligheten for å vente lenger enn `threshold` tilnærmes ved å anta at ventetiden for skip som må vente, er
+    eksponentialfordelt.
+
+    Er køen ikke stabil, det vil si at skipene i snitt kommer oftere enn flaskehalsene kan håndtere dem, vokser køen
+    uten grense, og svaret avhenger av hvor lenge det simuleres. Da gis en RuntimeWarning, og ventetiden og kølengden
+    er uendelige. Ved beregning av ventetid med `metode="analytisk"` simuleres slike perioder i stedet, se
+    :meth:`~fram.virkninger.ventetid.excel.simulate_from_simuleringsinputs`.
+    """
+    lbdas = np.asarray(lbdas, dtype=float)
+    mus = _as_matrix(lbdas, mus)
+    num_ships, num_bottlenecks = mus.shape
+    if ship_ids is None:
+        ship_ids = [str(num) for num in range(num_ships)]
+    if bottleneck_ids is None:
+        bottleneck_ids = [str(num) for num in range(num_bottlenecks)]
+    if directions is None:
+        directions = ["Ingen retning"] * num_ships
+    total_arrival_rate = lbdas.sum()
+
+    num_servers, routing, prob_same_direction, occupation_times = _occupation(
+        lbdas, mus, directions, alpha
+    )
+    # Seilingstiden hver skipstype opplever, med skipene fordelt på flaskehalsene som i ventetiden
+    service_times = (routing / np.where(mus > 0, mus, np.inf)).sum(axis=1)
+
+    mean_occupation = lbdas @ occupation_times / total_arrival_rate
+    second_moment = lbdas @ occupation_times ** 2 / total_arrival_rate
+    offered_load = total_arrival_rate * mean_occupation
+    server_utilization = offered_load / num_servers
+    if server_utilization >= 1:
+        warnings.warn(
+            f"Køen er ikke stabil, skipene kommer oftere enn flaskehalsene kan håndtere dem (utnyttelse {server_utilization:.2f}). Ventetiden kan ikke tilnærmes analytisk, og settes til uendelig",
+            RuntimeWarning,
+        )
+        prob_wait = 1.0
+        mean_wait = np.inf
+        prob_wait_just = 1.0
+        mean_wait_just = np.inf
+    else:
+        scv_occupation = second_moment / mean_occupation ** 2 - 1
+        prob_wait = erlang_c(num_servers, offered_load)
+        mean_wait = (
+            prob_wait
+            * mean_occupation
+            / (num_servers * (1 - server_utilization))
+            * (1 + scv_occupation)
+            / 2
+        )
+        # Ventetiden for de som må vente, antas eksponentialfordelt
+        if prob_wait > 0 and mean_wait > 0:
+            mean_wait_if_waiting = mean_wait / prob_wait
+            prob_wait_just = prob_wait * np.exp(-threshold / mean_wait_if_waiting)
+            mean_wait_just = prob_wait_just * (threshold + mean_wait_if_waiting)
+        else:
+            prob_wait_just = 0.0
+            mean_wait_just = 0.0
+
+    num_arrivals = total_arrival_rate * num_periods
+    ship_passings = lbdas[:, None] * routing
+    ship_bottleneck_ids = [
+        ship_id + SKIP_LENGDE_SPLITTER + bottleneck_id
+        for ship_id in ship_ids
+        for bottleneck_id in bottleneck_ids
+    ]
+    bottleneck_passings = ship_passings.sum(axis=0)
+    gross_service_times = 1 / np.where(mus > 0, mus, np.nan)
+
+    out = {
+        "mean_wait_time": mean_wait,
+        "max_wait_time": np.nan,
+        "mean_total_time": mean_wait + lbdas @ service_times / total_arrival_rate,
+        "max_total_time": np.nan,
+        "mean_service_time": np.nanmean(gross_service_times),
+        "max_service_time": np.nanmax(gross_service_times),
+        "mean_length_line": total_arrival_rate * mean_wait,
+        "max_length_line": np.nan,
+        "mean_server_occupation": lbdas @ service_times / num_servers,
+        "waiting_incidents_per_period": total_arrival_rate * prob_wait,
+        "prob_cust_must_wait": prob_wait,
+        "num_arrivals": num_arrivals,
+        "last_arrival_time": num_periods,
+        "num_incidents": num_arrivals * prob_wait,
+        "mean_wait_time_per_ship": group_means(ship_ids, lbdas * mean_wait, lbdas),
+        "mean_total_time_per_ship": group_means(
+            ship_ids, lbdas * (mean_wait + service_times), lbdas
+        ),
+        "mean_service_time_per_ship": group_means(
+            ship_ids, lbdas * service_times, lbdas
+        ),
+        "mean_incidents_per_period_per_ship": group_means(
+            ship_ids, lbdas * prob_wait, lbdas
+        ),
+        "mean_wait_time_per_direction": group_means(
+            directions, lbdas * mean_wait, lbdas
+        ),
+        "mean_share_busy_per_bottleneck": group_rates(
+            bottleneck_ids,
+            (ship_passings / np.where(mus > 0, mus, np.inf)).sum(axis=0),
+            bottleneck_passings,
+            1,
+        ),
+        "passings_per_bottleneck_per_period": group_rates(
+            bottleneck_ids, bottleneck_passings, bottleneck_passings, 1
+        ),
+        "passings_per_bottleneck_per_ship_per_period": group_rates(
+            ship_bottleneck_ids, ship_passings, ship_passings, 1
+        ),
+        "mean_share_alternating_directions": group_rates(
+            bottleneck_ids,
+            np.full(num_bottlenecks, 1 - prob_same_direction),
+            bottleneck_passings,
+            1,
+        ),
+    }
+    if threshold > 0:
+        out["mean_wait_time_just"] = mean_wait_just
+        out["waiting_incidents_per_period_just"] = total_arrival_rate * prob_wait_just
+        out["prob_cust_must_wait_just"] = prob_wait_just
+        out["num_incidents_just"] = num_arrivals * prob_wait_just
+        out["mean_incidents_just_per_period_per_ship"] = group_means(
+            ship_ids, lbdas * prob_wait_just, lbdas
+        )
+    return out
@@ -0,0 +1,674 @@
+"""
+Felles beregning av nøkkeltallene fra køsimuleringene i :mod:`fram.virkninger.ventetid.computation`
+
+Alle simuleringsfunksjonene ender opp med de samme vektorene, med ett element per anløp: når skipet anløp, når det
+begynte å seile og når det var ferdig, samt hvilken skipstype, retning og flaskehals anløpet hører til. Skipstype,
+retning og flaskehals er kodet som heltall (indeksen i listen over navn), slik at summer og antall per gruppe kan
+regnes ut med `np.bincount`. Kølengden følges ved å sortere hendelsene (et skip begynner eller slutter å vente) i
+tidsrekkefølge. Grupper med samme navn slås sammen, og rapporteres som dictionaries sortert etter navn, på samme måte
+som en `groupby` i pandas.
+
+I tillegg til snitt og maksimum kan fordelingen av ventetid og total tid, og av kølengden, følges med
+:class:`QueueDistributions`. Fordelingene holdes i skisser med begrenset minnebruk, se :class:`QuantileSketch`, som
+kan flettes sammen på tvers av biter, replikasjoner og arbeiderprosesser.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from fram.virkninger.ventetid.hjelpemoduler import (
+    max_or_nan,
+    robust_mean,
+    SKIP_LENGDE_SPLITTER,
+)
+
+
+# Relativ nøyaktighet på kvantilene fra skissene, og maksimalt antall bøtter per skisse
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_MAX_BUCKETS = 2048
+# Verdier til og med denne regnes som null, slik at avrundingsfeil ikke gir egne bøtter
+SKETCH_MIN_VALUE = 1e-9
+# Kølengder fra og med denne samles i den siste søylen i histogrammet
+LINE_HISTOGRAM_MAX_LENGTH = 1000
+
+
+def _group_totals(labels: List[str], values: np.ndarray) -> Tuple[List[str], np.ndarray]:
+    """Summerer `values`, med ett element per indeks i `labels`, for hvert unike navn. Navnene sorteres"""
+    names = sorted(set(labels))
+    lookup = {name: code for code, name in enumerate(names)}
+    codes = np.array([lookup[label] for label in labels], dtype=np.int64)
+    return names, np.bincount(codes, np.ravel(values), minlength=len(names))
+
+
+def group_means(labels: List[str], sums: np.ndarray, counts: np.ndarray) -> dict:
+    """Gjennomsnitt per navn, gitt summen og antallet for hver indeks i `labels`
+
+    Indekser med samme navn slås sammen. Navn uten observasjoner er ikke med.
+    """
+    names, sums = _group_totals(labels, sums)
+    _, counts = _group_totals(labels, counts)
+    return {name: s / n for name, s, n in zip(names, sums, counts) if n > 0}
+
+
+def group_rates(
+    labels: List[str], sums: np.ndarray, counts: np.ndarray, denominator: float
+) -> dict:
+    """Summen per navn delt på `denominator`, for navnene som har observasjoner
+
+    Indekser med samme navn slås sammen, som i :meth:`group_means`.
+    """
+    names, sums = _group_totals(labels, sums)
+    _, counts = _group_totals(labels, counts)
+    return {name: s / denominator for name, s, n in zip(names, sums, counts) if n > 0}
+
+
+def bincount_means(codes: np.ndarray, values: np.ndarray, labels: List[str]) -> dict:
+    """Gjennomsnittet av `values` per gruppe, der `codes` angir indeksen i `labels` for hvert element"""
+    codes = np.asarray(codes, dtype=np.int64)
+    return group_means(
+        labels,
+        np.bincount(codes, values, minlength=len(labels)),
+        np.bincount(codes, minlength=len(labels)),
+    )
+
+
+def sweep_line_lengths(
+    event_times: np.ndarray, event_changes: np.ndarray, line_length: int = 0
+) -> np.ndarray:
+    """Kølengden etter hver hendelse, i tidsrekkefølge
+
+    Args:
+        event_times: Tidspunktet for hver hendelse
+        event_changes: +1 når et skip begynner å vente, -1 når det får seile
+        line_length: Kølengden før den første hendelsen
+
+    Skjer to hendelser samtidig, får skipet som skal seile gå ut av køen før det neste kommer inn.
+    """
+    order = np.lexsort((event_changes, event_times))
+    return line_length + np.cumsum(event_changes[order])
+
+
+def line_length_statistics(
+    arrival_times: np.ndarray, service_start_times: np.ndarray
+) -> Tuple[float, int]:
+    """Tidsvektet snitt og maksimum for antall skip som står i kø
+
+    Et skip står i kø fra det anløper til det begynner å seile, hvis det må vente. Integralet av kølengden over tid
+    er da summen av ventetidene, og snittet er dette delt på tidspunktet for den siste hendelsen. Uten kø er begge 0.
+    """
+    in_line = service_start_times > arrival_times
+    if not in_line.any():
+        return 0, 0
+    starts = arrival_times[in_line]
+    ends = service_start_times[in_line]
+    num_in_line = len(starts)
+    line_lengths = sweep_line_lengths(
+        np.concatenate([starts, ends]),
+        np.concatenate(
+            [np.ones(num_in_line, dtype=np.int64), -np.ones(num_in_line, dtype=np.int64)]
+        ),
+    )
+    return (ends - starts).sum() / ends.max(), int(line_lengths.max())
+
+
+def summarize_queue(
+    arrival_times: np.ndarray,
+    service_start_times: np.ndarray,
+    wait_times: np.ndarray,
+    total_times: np.ndarray,
+    service_times: np.ndarray,
+    server_occupation: float,
+    num_periods: float,
+    threshold: float,
+) -> dict:
+    """Nøkkeltallene som er felles for alle køsimuleringene
+
+    Args:
+        arrival_times, service_start_times, wait_times, total_times: Ett element per anløp, sortert etter anløpstid
+        service_times: Seilingstidene som skal rapporteres
+        server_occupation: Andelen av tiden flaskehalsene er opptatt
+        num_periods: Hvor mange perioder som er simulert
+        threshold: Terskelen for å rapportere kun skip som venter minst så lenge. Nøkkeltallene for terskelen
+            regnes bare ut hvis den er positiv
+    """
+    num_arrivals = len(arrival_times)
+    num_waiting_incidents = np.sum(wait_times > 0)
+    mean_line_length, max_line_length = line_length_statistics(
+        arrival_times, service_start_times
+    )
+
+    out = {
+        "mean_wait_time": robust_mean(wait_times),
+        "max_wait_time": max_or_nan(wait_times),
+        "mean_total_time": robust_mean(total_times),
+        "max_total_time": max_or_nan(total_times),
+        "mean_service_time": robust_mean(service_times),
+        "max_service_time": max_or_nan(service_times),
+        "mean_length_line": mean_line_length,
+        "max_length_line": max_line_length,
+        "mean_server_occupation": server_occupation,
+        "waiting_incidents_per_period": num_waiting_incidents / arrival_times[-1],
+        "prob_cust_must_wait": num_waiting_incidents / num_arrivals,
+    }
+
+    if threshold > 0:
+        wait_times_just = np.where(wait_times > threshold, wait_times, 0)
+        num_waiting_incidents_just = np.sum(wait_times_just > 0)
+        out["mean_wait_time_just"] = robust_mean(wait_times_just)
+        out["waiting_incidents_per_period_just"] = (
+            num_waiting_incidents_just / num_periods
+        )
+        out["prob_cust_must_wait_just"] = num_waiting_incidents_just / num_arrivals
+
+    return out
+
+
+class QuantileSketch:
+    """Skisse av fordelingen til ikke-negative verdier, med kvantiler innenfor en relativ feil (DDSketch)
+
+    Positive verdier telles i bøtter med logaritmisk økende bredde, slik at hver bøtte dekker verdier der
+    representanten avviker med høyst `relative_accuracy` relativt. Null og verdier under SKETCH_MIN_VALUE telles for
+    seg. Skisser med samme nøyaktighet flettes ved å legge sammen antallene, slik at skissen av to biter er den samme
+    som skissen av alle verdiene på én gang. Blir det flere enn `max_buckets` bøtter, slås de laveste sammen, slik at
+    minnebruken er begrenset og bare de laveste kvantilene mister nøyaktighet.
+
+    Antallene kan være vektet, se :meth:`merge`.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = SKETCH_RELATIVE_ACCURACY,
+        max_buckets: int = SKETCH_MAX_BUCKETS,
+    ):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.offset = 0
+        self.counts = np.zeros(0)
+        self.zero_count = 0.0
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        """Antall verdier i skissen"""
+        return self.zero_count + self.counts.sum()
+
+    def bucket_indices(self, values: np.ndarray) -> np.ndarray:
+        """Bøtten til hver verdi, som må være større enn SKETCH_MIN_VALUE"""
+        return np.ceil(np.log(values) / np.log(self.gamma)).astype(np.int64)
+
+    def add_bucket_counts(self, offset: int, counts: np.ndarray, zero_count: float = 0):
+        """Legger til `counts` i bøttene fra og med `offset`, og `zero_count` null-verdier"""
+        self.zero_count += zero_count
+        if len(counts) == 0:
+            return
+        start = min(self.offset, offset) if len(self.counts) else offset
+        end = max(self.offset + len(self.counts), offset + len(counts))
+        merged = np.zeros(end - start)
+        merged[self.offset - start : self.offset - start + len(self.counts)] += self.counts
+        merged[offset - start : offset - start + len(counts)] += counts
+        if len(merged) > self.max_buckets:
+            # Slår sammen de laveste bøttene med den laveste som beholdes
+            num_collapsed = len(merged) - self.max_buckets
+            merged[num_collapsed] += merged[:num_collapsed].sum()
+            merged = merged[num_collapsed:]
+            start += num_collapsed
+        self.offset = start
+        self.counts = merged
+
+    def update(self, values: np.ndarray, weight: float = 1):
+        """Legger til verdiene i `values`"""
+        values = np.ravel(values)
+        if len(values) == 0:
+            return
+        self.max = max(self.max, values.max())
+        positive = values[values > SKETCH_MIN_VALUE]
+        zero_count = (len(values) - len(positive)) * weight
+        if len(positive) == 0:
+            self.zero_count += zero_count
+            return
+        buckets = self.bucket_indices(positive)
+        offset = buckets.min()
+        self.add_bucket_counts(
+            offset, np.bincount(buckets - offset) * float(weight), zero_count
+        )
+
+    def merge(self, other: "QuantileSketch", weight: float = 1):
+        """Fletter inn `other`, med antallene vektet med `weight`"""
+        if other.gamma != self.gamma:
+            raise ValueError(
+                "Kan bare flette skisser med samme relative nøyaktighet, fikk "
+                f"{self.relative_accuracy} og {other.relative_accuracy}"
+            )
+        self.max = max(self.max, other.max)
+        self.add_bucket_counts(
+            other.offset, other.counts * weight, other.zero_count * weight
+        )
+
+    def quantile(self, q: float) -> float:
+        """Kvantilen `q` mellom 0 og 1. NaN hvis skissen er tom"""
+        count = self.count
+        if count == 0:
+            return np.nan
+        rank = q * count
+        if rank <= self.zero_count:
+            return 0.0
+        cumulative = self.zero_count + np.cumsum(self.counts)
+        bucket = min(int(np.searchsorted(cumulative, rank)), len(self.counts) - 1)
+        value = 2 * self.gamma ** (self.offset + bucket) / (self.gamma + 1)
+        return float(min(value, self.max))
+
+    def quantiles(self, qs: Iterable[float]) -> Dict[float, float]:
+        """Kvantilene for hver `q` i `qs`"""
+        return {q: self.quantile(q) for q in qs}
+
+
+def grouped_sketches(
+    labels: List[str], codes: np.ndarray, values: np.ndarray, sketches: dict
+):
+    """Oppdaterer skissen for hvert navn i `sketches` med verdiene i `values`, der `codes` er indeksen i `labels`
+
+    Bøttene regnes ut for alle verdiene på én gang, og telles per gruppe med `np.bincount`. Grupper med samme navn
+    slås sammen.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    names, name_codes = np.unique(labels, return_inverse=True)
+    codes = name_codes[codes]
+    positive = values > SKETCH_MIN_VALUE
+    zero_counts = np.bincount(codes[~positive], minlength=len(names))
+    prototype = QuantileSketch()
+    buckets = prototype.bucket_indices(values[positive])
+    offset = buckets.min() if len(buckets) else 0
+    width = buckets.max() - offset + 1 if len(buckets) else 0
+    counts = np.bincount(
+        codes[positive] * width + buckets - offset, minlength=len(names) * width
+    ).reshape(len(names), width)
+    maxima = np.full(len(names), -np.inf)
+    np.maximum.at(maxima, codes, values)
+    for code, name in enumerate(names):
+        if zero_counts[code] == 0 and counts[code].sum() == 0:
+            continue
+        sketch = sketches.setdefault(name, QuantileSketch())
+        sketch.max = max(sketch.max, maxima[code])
+        sketch.add_bucket_counts(
+            offset, counts[code].astype(float), float(zero_counts[code])
+        )
+
+
+class QueueDistributions:
+    """Fordelingen av ventetid og total tid, totalt og per skipstype, og av kølengden, fra én eller flere simuleringer
+
+    Ventetid og total tid holdes i :class:`QuantileSketch`. Kølengden er et histogram over hvor lang tid det har stått
+    0, 1, 2, ... skip i kø, der kølengder fra og med LINE_HISTOGRAM_MAX_LENGTH samles i den siste søylen. Alt kan
+    flettes med :meth:`merge`, på tvers av biter, replikasjoner og arbeiderprosesser.
+    """
+
+    def __init__(self):
+        self.wait_time = QuantileSketch()
+        self.total_time = QuantileSketch()
+        self.wait_time_per_ship: Dict[str, QuantileSketch] = {}
+        self.total_time_per_ship: Dict[str, QuantileSketch] = {}
+        self.line_length_time = np.zeros(0)
+
+    def update(
+        self,
+        ship_ids: List[str],
+        ship_idxs: np.ndarray,
+        wait_times: np.ndarray,
+        total_times: np.ndarray,
+    ):
+        """Legger til ventetiden og den totale tiden for hvert anløp"""
+        self.wait_time.update(wait_times)
+        self.total_time.update(total_times)
+        grouped_sketches(ship_ids, ship_idxs, wait_times, self.wait_time_per_ship)
+        grouped_sketches(ship_ids, ship_idxs, total_times, self.total_time_per_ship)
+
+    def add_line_time(self, line_lengths: np.ndarray, durations: np.ndarray):
+        """Legger til at det har stått `line_lengths` skip i kø i `durations` tid"""
+        if len(line_lengths) == 0:
+            return
+        line_lengths = np.minimum(line_lengths, LINE_HISTOGRAM_MAX_LENGTH)
+        time = np.bincount(line_lengths, durations)
+        if len(time) > len(self.line_length_time):
+            time[: len(self.line_length_time)] += self.line_length_time
+            self.line_length_time = time
+        else:
+            self.line_length_time[: len(time)] += time
+
+    def merge(self, other: "QueueDistributions", weight: float = 1):
+        """Fletter inn `other`, med antall og tid vektet med `weight`"""
+        self.wait_time.merge(other.wait_time, weight)
+        self.total_time.merge(other.total_time, weight)
+        for mine, others in [
+            (self.wait_time_per_ship, other.wait_time_per_ship),
+            (self.total_time_per_ship, other.total_time_per_ship),
+        ]:
+            for name, sketch in others.items():
+                mine.setdefault(name, QuantileSketch()).merge(sketch, weight)
+        self.add_line_time(
+            np.arange(len(other.line_length_time)), other.line_length_time * weight
+        )
+
+    @classmethod
+    def merged(
+        cls,
+        distributions: List["QueueDistributions"],
+        weights: Optional[List[float]] = None,
+    ) -> "QueueDistributions":
+        """Alle fordelingene i `distributions` flettet sammen, eventuelt vektet med `weights`"""
+        if weights is None:
+            weights = [1] * len(distributions)
+        out = cls()
+        for distribution, weight in zip(distributions, weights):
+            out.merge(distribution, weight)
+        return out
+
+    def line_length_shares(self) -> Dict[int, float]:
+        """Andelen av tiden det står hvert antall skip i kø"""
+        total = self.line_length_time.sum()
+        if total == 0:
+            return {}
+        return {
+            length: time / total
+            for length, time in enumerate(self.line_length_time)
+            if time > 0
+        }
+
+
+class QueueSummary:
+    """Bygger opp nøkkeltallene fra en simulering med flere skip, flaskehalser og to retninger bit for bit
+
+    Alle nøkkeltall er summer, antall eller maksimum, som kan oppdateres for hver bit. En simulering som gjøres på én
+    gang, er én bit. Kølengden følges ved å gå gjennom hendelsene (et skip begynner og slutter å vente) i
+    tidsrekkefølge. Hendelser som ligger etter det siste anløpet i en bit, kan fortsatt få hendelser fra neste bit
+    foran seg, og tas vare på til neste bit. Tidsvektet snittkølengde er summen av ventetidene delt på tidspunktet for
+    siste hendelse.
+
+    Args:
+        ship_ids: Navnet på hver skipstype, indeksert som `ship_idxs` i :meth:`update`. Samme navn kan gå igjen,
+            for eksempel for samme skipstype i hver retning, og rapporteres da samlet
+        direction_names: Navnet på hver retning, indeksert som `arrival_directions` i :meth:`update`
+        bottleneck_ids: Navnet på hver flaskehals, indeksert som `bottleneck_chosen` i :meth:`update`
+        gross_service_times: Seilingstid med dimensjoner (num_ship, num_bottlenecks)
+        num_periods: Hvor mange perioder som simuleres til sammen
+        threshold: Terskelen for å rapportere kun skip som venter minst så lenge
+        distributions: Hvorvidt fordelingen av ventetid, total tid og kølengde skal følges med
+            :class:`QueueDistributions`. Den legges da til i output som `distributions`
+    """
+
+    def __init__(
+        self,
+        ship_ids: List[str],
+        direction_names: List[str],
+        bottleneck_ids: List[str],
+        gross_service_times: np.ndarray,
+        num_periods: float,
+        threshold: float,
+        distributions: bool = False,
+    ):
+        self.ship_ids = list(ship_ids)
+        self.direction_names = list(direction_names)
+        self.bottleneck_ids = list(bottleneck_ids)
+        self.gross_service_times = gross_service_times
+        self.num_periods = num_periods
+        self.threshold = threshold
+
+        num_ships = len(ship_ids)
+        num_bottlenecks = len(bottleneck_ids)
+        self.num_arrivals = 0
+        self.num_incidents = 0
+        self.num_incidents_just = 0
+        self.sum_wait = 0.0
+        self.sum_line_wait = 0.0
+        self.sum_wait_just = 0.0
+        self.sum_total = 0.0
+        self.sum_service = 0.0
+        self.max_wait = -np.inf
+        self.max_total = -np.inf
+        self.max_completion = -np.inf
+        self.last_arrival_time = np.nan
+
+        self.ship_count = np.zeros(num_ships)
+        self.ship_wait = np.zeros(num_ships)
+        self.ship_total = np.zeros(num_ships)
+        self.ship_service = np.zeros(num_ships)
+        self.ship_incidents = np.zeros(num_ships)
+        self.ship_incidents_just = np.zeros(num_ships)
+        self.direction_count = np.zeros(len(direction_names))
+        self.direction_wait = np.zeros(len(direction_names))
+        self.bottleneck_service = np.zeros(num_bottlenecks)
+        self.bottleneck_alternating = np.zeros(num_bottlenecks)
+        self.ship_bottleneck_count = np.zeros((num_ships, num_bottlenecks))
+
+        # Siste anløp i forrige bit, som ikke vet om neste anløp kommer i motsatt retning
+        self.previous_direction = None
+        self.previous_bottleneck = None
+        # Kølengden ved siste ferdigbehandlede hendelse, og hendelser som ikke er ferdigbehandlet
+        self.line_length = 0
+        self.max_line_length = 0
+        self.pending_line_events = np.empty(0)
+        self.last_line_event = 0.0
+        # Tidspunktet for siste ferdigbehandlede hendelse, som kølengden har gjeldt fra
+        self.line_clock = 0.0
+        self.distributions = QueueDistributions() if distributions else None
+
+    def update(
+        self,
+        arrival_times: np.ndarray,
+        arrival_directions: np.ndarray,
+        ship_idxs: np.ndarray,
+        service_start_times: np.ndarray,
+        service_times: np.ndarray,
+        completion_times: np.ndarray,
+        bottleneck_chosen: np.ndarray,
+    ):
+        """Legger til én bit med simulerte anløp"""
+        if len(arrival_times) == 0:
+            return
+        arrival_directions = np.asarray(arrival_directions, dtype=np.int64)
+        ship_idxs = np.asarray(ship_idxs, dtype=np.int64)
+        bottleneck_chosen = np.asarray(bottleneck_chosen, dtype=np.int64)
+        total_times = completion_times - arrival_times
+        wait_times = total_times - service_times
+        waiting = wait_times > 0
+        in_line = service_start_times > arrival_times
+        waiting_just = wait_times > self.threshold
+        num_ships, num_bottlenecks = self.ship_bottleneck_count.shape
+
+        self.num_arrivals += len(arrival_times)
+        self.num_incidents += waiting.sum()
+        self.num_incidents_just += waiting_just.sum()
+        self.sum_wait += wait_times.sum()
+        self.sum_wait_just += wait_times[waiting_just].sum()
+        self.sum_total += total_times.sum()
+        self.sum_service += service_times.sum()
+        self.max_wait = max(self.max_wait, wait_times.max())
+        self.max_total = max(self.max_total, total_times.max())
+        self.max_completion = max(self.max_completion, completion_times.max())
+        self.last_arrival_time = arrival_times[-1]
+
+        self.ship_count += np.bincount(ship_idxs, minlength=num_ships)
+        self.ship_wait += np.bincount(ship_idxs, wait_times, minlength=num_ships)
+        self.ship_total += np.bincount(ship_idxs, total_times, minlength=num_ships)
+        self.ship_service += np.bincount(ship_idxs, service_times, minlength=num_ships)
+        self.ship_incidents += np.bincount(ship_idxs, waiting, minlength=num_ships)
+        self.ship_incidents_just += np.bincount(
+            ship_idxs, waiting_just, minlength=num_ships
+        )
+        num_directions = len(self.direction_names)
+        self.direction_count += np.bincount(
+            arrival_directions, minlength=num_directions
+        )
+        self.direction_wait += np.bincount(
+            arrival_directions, wait_times, minlength=num_directions
+        )
+        self.bottleneck_service += np.bincount(
+            bottleneck_chosen, service_times, minlength=num_bottlenecks
+        )
+        self.ship_bottleneck_count += np.bincount(
+            ship_idxs * num_bottlenecks + bottleneck_chosen,
+            minlength=num_ships * num_bottlenecks,
+        ).reshape(num_ships, num_bottlenecks)
+
+        # Retningen til neste anløp avgjør om et anløp er alternerende. Det siste anløpet venter på neste bit
+        directions = arrival_directions
+        bottlenecks = bottleneck_chosen
+        if self.previous_direction is not None:
+            directions = np.concatenate([[self.previous_direction], directions])
+            bottlenecks = np.concatenate([[self.previous_bottleneck], bottlenecks])
+        self.bottleneck_alternating += np.bincount(
+            bottlenecks[:-1],
+            directions[:-1] != directions[1:],
+            minlength=num_bottlenecks,
+        )
+        self.previous_direction = directions[-1]
+        self.previous_bottleneck = bottlenecks[-1]
+
+        # Kølengden: +1 når et skip begynner å vente, -1 når det får seile. Hendelser etter siste anløp i biten
+        # kan få hendelser fra neste bit foran seg, og behandles først da
+        num_in_line = in_line.sum()
+        event_times = np.concatenate(
+            [
+                self.pending_line_events,
+                arrival_times[in_line],
+                service_start_times[in_line],
+            ]
+        )
+        event_changes = np.concatenate(
+            [
+                -np.ones(len(self.pending_line_events), dtype=np.int64),
+                np.ones(num_in_line, dtype=np.int64),
+                -np.ones(num_in_line, dtype=np.int64),
+            ]
+        )
+        if num_in_line:
+            self.sum_line_wait += (service_start_times - arrival_times)[in_line].sum()
+            self.last_line_event = max(
+                self.last_line_event, service_start_times[in_line].max()
+            )
+        ready = event_times <= arrival_times[-1]
+        line_lengths = sweep_line_lengths(
+            event_times[ready], event_changes[ready], self.line_length
+        )
+        if self.distributions is not None:
+            self.distributions.update(self.ship_ids, ship_idxs, wait_times, total_times)
+            ready_times = np.sort(event_times[ready])
+            if len(ready_times):
+                self.distributions.add_line_time(
+                    *self._line_segments(ready_times, line_lengths)
+                )
+                self.line_clock = ready_times[-1]
+        if len(line_lengths):
+            self.max_line_length = max(self.max_line_length, int(line_lengths.max()))
+            self.line_length = int(line_lengths[-1])
+        self.pending_line_events = event_times[~ready]
+
+    def _line_segments(
+        self, event_times: np.ndarray, line_lengths: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Kølengden fra `line_clock` og frem til hver hendelse, og hvor lenge den varte
+
+        `event_times` er sortert, og `line_lengths` er kølengden etter hver hendelse.
+        """
+        return (
+            np.concatenate([[self.line_length], line_lengths[:-1]]),
+            np.diff(np.concatenate([[self.line_clock], event_times])),
+        )
+
+    def result(self) -> dict:
+        """Nøkkeltallene fra alle bitene som er lagt til
+
+        Hendelser som fortsatt venter er skip som får seile, så kølengden kan bare synke herfra. Det aller siste
+        anløpet har ingen etter seg, og regnes som alternerende.
+        """
+        bottleneck_alternating = self.bottleneck_alternating.copy()
+        if self.previous_bottleneck is not None:
+            bottleneck_alternating[self.previous_bottleneck] += 1
+
+        num_bottlenecks = len(self.bottleneck_ids)
+        bottleneck_count = self.ship_bottleneck_count.sum(axis=0)
+        ship_bottleneck_ids = [
+            ship_id + SKIP_LENGDE_SPLITTER + bottleneck_id
+            for ship_id in self.ship_ids
+            for bottleneck_id in self.bottleneck_ids
+        ]
+
+        out = {
+            "mean_wait_time": self.sum_wait / self.num_arrivals,
+            "max_wait_time": self.max_wait,
+            "mean_total_time": self.sum_total / self.num_arrivals,
+            "max_total_time": self.max_total,
+            "mean_service_time": robust_mean(self.gross_service_times[:]),
+            "max_service_time": max_or_nan(self.gross_service_times[:]),
+            "mean_length_line": self.sum_line_wait / self.last_line_event
+            if self.last_line_event > 0
+            else 0,
+            "max_length_line": self.max_line_length,
+            "mean_server_occupation": self.sum_service
+            / self.max_completion
+            / num_bottlenecks,
+            "waiting_incidents_per_period": self.num_incidents / self.last_arrival_time,
+            "prob_cust_must_wait": self.num_incidents / self.num_arrivals,
+            "num_arrivals": self.num_arrivals,
+            "last_arrival_time": self.last_arrival_time,
+            "num_incidents": self.num_incidents,
+            "mean_wait_time_per_ship": group_means(
+                self.ship_ids, self.ship_wait, self.ship_count
+            ),
+            "mean_total_time_per_ship": group_means(
+                self.ship_ids, self.ship_total, self.ship_count
+            ),
+            "mean_service_time_per_ship": group_means(
+                self.ship_ids, self.ship_service, self.ship_count
+            ),
+            "mean_incidents_per_period_per_ship": group_means(
+                self.ship_ids, self.ship_incidents, self.ship_count
+            ),
+            "mean_wait_time_per_direction": group_means(
+                self.direction_names, self.direction_wait, self.direction_count
+            ),
+            "mean_share_busy_per_bottleneck": group_rates(
+                self.bottleneck_ids,
+                self.bottleneck_service,
+                bottleneck_count,
+                self.max_completion,
+            ),
+            "passings_per_bottleneck_per_period": group_rates(
+                self.bottleneck_ids,
+                bottleneck_count,
+                bottleneck_count,
+                self.last_arrival_time,
+            ),
+            "passings_per_bottleneck_per_ship_per_period": group_rates(
+                ship_bottleneck_ids,
+                self.ship_bottleneck_count,
+                self.ship_bottleneck_count,
+                self.last_arrival_time,
+            ),
+            "mean_share_alternating_directions": group_means(
+                self.bottleneck_ids, bottleneck_alternating, bottleneck_count
+            ),
+        }
+        if self.threshold > 0:
+            out["mean_wait_time_just"] = self.sum_wait_just / self.num_arrivals
+            out["waiting_incidents_per_period_just"] = (
+                self.num_incidents_just / self.num_periods
+            )
+            out["prob_cust_must_wait_just"] = self.num_incidents_just / self.num_arrivals
+            out["num_incidents_just"] = self.num_incidents_just
+            out["mean_incidents_just_per_period_per_ship"] = group_means(
+                self.ship_ids, self.ship_incidents_just, self.ship_count
+            )
+        if self.distributions is not None:
+            out["distributions"] = self._final_distributions()
+        return out
+
+    def _final_distributions(self) -> QueueDistributions:
+        """Fordelingene, med tiden frem til hendelsene som fortsatt venter. Endrer ikke tilstanden"""
+        out = QueueDistributions.merged([self.distributions])
+        pending = np.sort(self.pending_line_events)
+        if len(pending):
+            line_lengths = self.line_length - np.arange(1, len(pending) + 1)
+            out.add_line_time(*self._line_segments(pending, line_lengths))
+        return out
+
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+
+from fram.generelle_hjelpemoduler import arbeiderpool
+from fram.virkninger.ventetid.excel import (
+    les_ventetidsinput_fra_excel,
+    simulate_from_simuleringsinput,
+    simulate_from_simuleringsinputs,
+    stromnokkel,
+)
+
+EXCEL_INPUT_FILE = Path(__file__).parent / "ventetidseksempel.xlsx"
+
+
+@pytest.fixture
+def ny_pool():
+    arbeiderpool.avslutt_arbeiderpool()
+    yield
+    arbeiderpool.avslutt_arbeiderpool()
+
+
+def test_poolen_gjenbrukes(ny_pool):
+    pool = arbeiderpool.hent_arbeiderpool(2)
+    assert arbeiderpool.hent_arbeiderpool(2) is pool
+    svar = arbeiderpool.kjor_parallelt(abs, [-1, -2, -3], ["a", "b", "c"], 2)
+    assert svar == [1, 2, 3]
+    assert arbeiderpool.hent_arbeiderpool(2) is pool
+    # Et annet antall arbeidere starter poolen på nytt
+    assert arbeiderpool.hent_arbeiderpool(3) is not pool
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_feil_rapporteres_med_oppgaven(ny_pool, num_workers):
+    with pytest.raises(RuntimeError, match="oppgave b feilet") as feil:
+        arbeiderpool.kjor_parallelt(
+            int, ["1", "x", "3"], ["oppgave a", "oppgave b", "oppgave c"], num_workers
+        )
+    assert isinstance(feil.value.__cause__, ValueError)
+
+
+def test_simuleringsfeil_rapporteres_med_aar_og_periode(ny_pool):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=1_000
+    )
+    feilmelding = f"Ventetidssimuleringen for {sim_input.aar[0]}"
+    with pytest.raises(RuntimeError, match=feilmelding):
+        simulate_from_simuleringsinput(sim_input, kernel="finnes_ikke", num_workers=2)
+
+
+def test_samme_svar_med_og_uten_pool(ny_pool):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=5_000
+    )
+    serielt = simulate_from_simuleringsinput(sim_input, num_workers=1)
+    parallelt = simulate_from_simuleringsinput(sim_input, num_workers=2)
+    for s, p in zip(serielt, parallelt):
+        assert (s.year, s.period) == (p.year, p.period)
+        assert s.data["mean_wait_time_per_ship"] == p.data["mean_wait_time_per_ship"]
+
+
+def test_samme_svar_uansett_antall_arbeidere_og_rekkefolge(ny_pool):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=5_000
+    )
+    nokler = [stromnokkel(bane) for bane in ["ref", "tiltak"]]
+    serielt = simulate_from_simuleringsinputs(
+        [sim_input, sim_input], stream_keys=nokler, num_workers=1
+    )
+    baklengs = simulate_from_simuleringsinputs(
+        [sim_input, sim_input], stream_keys=nokler[::-1], num_workers=2
+    )[::-1]
+
+    for s, p in zip(serielt, baklengs):
+        for o, f in zip(s, p):
+            assert (o.year, o.period) == (f.year, f.period)
+            assert o.data == f.data
+    # Banene trekker fra uavhengige strømmer
+    assert serielt[0][0].data != serielt[1][0].data
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from fram.virkninger.ventetid.excel import (
+    les_ventetidsinput_fra_excel,
+    simulate_from_simuleringsinput,
+)
+from fram.virkninger.ventetid.interpolering import (
+    interpoler_nokkeltall,
+    monoton_kurve,
+    velg_ankeraar,
+)
+
+EXCEL_INPUT_FILE = Path(__file__).parent / "ventetidseksempel.xlsx"
+
+
+def test_ankeraar_spenner_belastningen():
+    belastning = np.linspace(0.2, 0.8, 40)[::-1]
+    anker, kontroll = velg_ankeraar(belastning, antall_anker=5, antall_kontroll=2)
+
+    assert len(anker) == 5 and len(kontroll) == 2
+    assert {belastning[anker].min(), belastning[anker].max()} == {0.2, 0.8}
+    assert not set(anker) & set(kontroll)
+    assert all(0.2 < belastning[i] < 0.8 for i in kontroll)
+    # Med for få år simuleres alle
+    assert velg_ankeraar([0.1, 0.2, 0.3], antall_anker=5) == ([0, 1, 2], [])
+
+
+def test_monoton_kurve():
+    x = np.array([0.1, 0.3, 0.5, 0.7])
+    # Simuleringsstøy glattes bort, slik at kurven blir monoton
+    y = np.array([1.0, 3.0, 2.5, 6.0])
+    x_ny = np.linspace(0, 1, 101)
+    kurve = monoton_kurve(x, y, x_ny)
+    assert (np.diff(kurve) >= -1e-12).all()
+    assert kurve[0] == 1.0 and kurve[-1] == 6.0
+
+    # Monotone punkter gjenskapes eksakt, også synkende
+    assert monoton_kurve(x, -x ** 2, x) == pytest.approx(-x ** 2)
+    assert monoton_kurve([0.5], [2.0], [0.1, 0.9]) == pytest.approx([2.0, 2.0])
+
+
+def test_interpolerer_tall_og_tall_per_gruppe():
+    data = [
+        {"mean_wait_time": 1.0, "per_ship": {"a": 1.0}, "ikke_tall": "x"},
+        {"mean_wait_time": 3.0, "per_ship": {"a": 3.0, "b": 5.0}, "ikke_tall": "y"},
+    ]
+    (ut,) = interpoler_nokkeltall([0.2, 0.4], data, [0.3])
+    assert ut["mean_wait_time"] == pytest.approx(2.0)
+    assert ut["per_ship"] == {"a": pytest.approx(2.0), "b": 5.0}
+    assert "ikke_tall" not in ut
+
+
+def test_interpolert_ventetid_naer_simulert():
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=10_000
+    )
+    sim_input.aar = [str(aar) for aar in range(2018, 2043)]
+    for k, aar in enumerate(sim_input.aar):
+        sim_input.lambda_df[aar] = sim_input.lambda_df["2018"] * (1 + 0.06 * k)
+    meldinger = []
+
+    simulert = simulate_from_simuleringsinput(sim_input, num_workers=1)
+    interpolert = simulate_from_simuleringsinput(
+        sim_input, num_workers=1, metode="interpolert", logger=meldinger.append
+    )
+
+    assert any("kontrollår med median" in m for m in meldinger)
+    antall_interpolert = sum(o.num_periods == 0 for o in interpolert)
+    assert antall_interpolert > len(interpolert) / 2
+    for i, s in zip(interpolert, simulert):
+        assert (i.year, i.period) == (s.year, s.period)
+        assert i.data.keys() == s.data.keys()
+    avvik = [
+        abs(i.data["mean_wait_time"] / s.data["mean_wait_time"] - 1)
+        for i, s in zip(interpolert, simulert)
+    ]
+    assert np.median(avvik) < 0.1
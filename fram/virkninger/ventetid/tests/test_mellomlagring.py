@@ -0,0 +1,206 @@
+import os
+from copy import copy
+import time
+from pathlib import Path
+
+import numpy as np
+
+from fram.virkninger.ventetid.excel import (
+    les_ventetidsinput_fra_excel,
+    simulate_from_simuleringsinput,
+    simulate_from_simuleringsinputs,
+    stromnokkel,
+)
+from fram.virkninger.ventetid.hjelpemoduler import Output
+from fram.virkninger.ventetid.mellomlagring import input_nokkel, VentetidMellomlager
+
+EXCEL_INPUT_FILE = Path(__file__).parent / "ventetidseksempel.xlsx"
+
+
+def test_mellomlager_simulerer_bare_endret_input(tmp_path):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=5_000
+    )
+    antall = len(sim_input.aar) * len(sim_input.perioder_for_sim)
+
+    forste = VentetidMellomlager(tmp_path)
+    fasit = simulate_from_simuleringsinput(sim_input, mellomlager=forste)
+    assert (forste.antall_treff, forste.antall_bom) == (0, antall)
+
+    andre = VentetidMellomlager(tmp_path)
+    mellomlagret = simulate_from_simuleringsinput(sim_input, mellomlager=andre)
+    assert (andre.antall_treff, andre.antall_bom) == (antall, 0)
+    for o, f in zip(mellomlagret, fasit):
+        assert (o.year, o.period) == (f.year, f.period)
+        assert o.data["mean_wait_time"] == f.data["mean_wait_time"]
+
+    # Endres trafikken i ett år, simuleres bare periodene i det året på nytt
+    sim_input.lambda_df[sim_input.aar[-1]] *= 1.1
+    tredje = VentetidMellomlager(tmp_path)
+    simulate_from_simuleringsinput(sim_input, mellomlager=tredje)
+    assert tredje.antall_bom == len(sim_input.perioder_for_sim)
+    assert tredje.antall_treff == antall - len(sim_input.perioder_for_sim)
+
+    # Andre valg for simuleringsmetoden gir andre nøkler
+    fjerde = VentetidMellomlager(tmp_path)
+    simulate_from_simuleringsinput(
+        sim_input, mellomlager=fjerde, common_random_numbers=True
+    )
+    assert fjerde.antall_treff == 0
+
+
+def test_like_aar_simuleres_bare_en_gang(tmp_path):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=5_000
+    )
+    forste_aar, siste_aar = sim_input.aar[0], sim_input.aar[-1]
+    sim_input.lambda_df[siste_aar] = sim_input.lambda_df[forste_aar]
+    meldinger = []
+    mellomlager = VentetidMellomlager(tmp_path)
+
+    outputs = simulate_from_simuleringsinput(
+        sim_input, mellomlager=mellomlager, logger=meldinger.append
+    )
+
+    antall_perioder = len(sim_input.perioder_for_sim)
+    assert len(outputs) == len(sim_input.aar) * antall_perioder
+    assert any(f"har {antall_perioder} samme input" in m for m in meldinger)
+    per_aar = {(o.year, o.period): o for o in outputs}
+    for periode in sim_input.perioder_for_sim:
+        forste, siste = per_aar[(forste_aar, periode)], per_aar[(siste_aar, periode)]
+        assert siste.data == forste.data
+        assert siste.data is not forste.data
+    # Alle år og perioder skrives til mellomlageret, også de som ble kopiert
+    assert len(list(tmp_path.glob("*/*.pkl"))) == len(outputs)
+
+
+def test_ulike_baner_trekker_fra_egne_strommer():
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=5_000
+    )
+    meldinger = []
+
+    ref, tiltak = simulate_from_simuleringsinputs(
+        [sim_input, sim_input],
+        logger=meldinger.append,
+        stream_keys=[stromnokkel(bane) for bane in ["ref", "tiltak"]],
+    )
+
+    # Uten felles tilfeldige tall er banene uavhengige trekninger, selv med lik input
+    assert not any("samme input" in m for m in meldinger)
+    for r, t in zip(ref, tiltak):
+        assert t.data["mean_wait_time"] != r.data["mean_wait_time"]
+
+
+def test_like_baner_med_felles_tilfeldige_tall_simuleres_bare_en_gang(tmp_path):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=5_000
+    )
+    meldinger = []
+    mellomlager = VentetidMellomlager(tmp_path)
+
+    ref, tiltak = simulate_from_simuleringsinputs(
+        [sim_input, sim_input],
+        common_random_numbers=True,
+        mellomlager=mellomlager,
+        logger=meldinger.append,
+        stream_keys=[
+            stromnokkel(bane=bane, common_random_numbers=True)
+            for bane in ["ref", "tiltak"]
+        ],
+    )
+
+    antall = len(sim_input.aar) * len(sim_input.perioder_for_sim)
+    assert any(f"har {antall} samme input" in m for m in meldinger)
+    for r, t in zip(ref, tiltak):
+        assert t.data == r.data
+    # Banene har samme input og strøm, og deler dermed filene i mellomlageret
+    assert len(list(tmp_path.glob("*/*.pkl"))) == antall
+
+
+def test_flere_simuleringsinputer_simuleres_i_en_jobb(tmp_path):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=5_000
+    )
+    endret = copy(sim_input)
+    endret.lambda_df = sim_input.lambda_df.copy()
+    endret.lambda_df[sim_input.aar] *= 1.1
+    meldinger = []
+    mellomlager = VentetidMellomlager(tmp_path)
+
+    samlet = simulate_from_simuleringsinputs(
+        [sim_input, endret, sim_input],
+        mellomlager=mellomlager,
+        logger=meldinger.append,
+    )
+
+    antall = len(sim_input.aar) * len(sim_input.perioder_for_sim)
+    assert [len(outputs) for outputs in samlet] == [antall] * 3
+    # Den siste er lik den første, og simuleres ikke på nytt
+    assert any(f"har {antall} samme input" in m for m in meldinger)
+    for enkeltvis, fasit in zip([sim_input, endret], samlet):
+        for o, f in zip(simulate_from_simuleringsinput(enkeltvis), fasit):
+            assert (o.year, o.period) == (f.year, f.period)
+            assert o.data["mean_wait_time"] == f.data["mean_wait_time"]
+    for o, f in zip(samlet[2], samlet[0]):
+        assert o.data == f.data
+
+
+def test_mellomlager_rydder_gamle_og_store_filer(tmp_path):
+    mellomlager = VentetidMellomlager(tmp_path, maks_alder_dager=1)
+    nokler = [
+        VentetidMellomlager.nokkel(
+            2020,
+            "sommer",
+            input_nokkel(
+                lbdas=np.array([lbda]),
+                mus=np.ones((1, 1)),
+                alpha=[1],
+                ship_ids=["a"],
+                directions=["nord"],
+                bottleneck_ids=["x"],
+                seed=1,
+                num_periods=10,
+            ),
+        )
+        for lbda in [0.1, 0.2, 0.3]
+    ]
+    assert len(set(nokler)) == 3
+    for i, nokkel in enumerate(nokler):
+        mellomlager.lagre(nokkel, Output(2020, "sommer", {"mean_wait_time": i}))
+        # Den første er ubrukt i to dager, de andre i henholdsvis 2 og 1 timer
+        alder = [2 * 24, 2, 1][i] * 60 * 60
+        fil = mellomlager._fil(nokkel)
+        os.utime(fil, (time.time() - alder, time.time() - alder))
+
+    assert mellomlager.rydd() == 1
+    assert mellomlager.hent(nokler[0]) is None
+    assert mellomlager.hent(nokler[2]).data["mean_wait_time"] == 2
+
+    # Den som nettopp ble hentet, er sist brukt, og beholdes når mellomlageret er for stort
+    mellomlager.maks_storrelse_bytes = mellomlager._fil(nokler[2]).stat().st_size
+    assert mellomlager.rydd() == 1
+    assert mellomlager.hent(nokler[1]) is None
+    assert mellomlager.hent(nokler[2]) is not None
+
+
+def test_fordelinger_foelges_bare_paa_forespoersel(tmp_path):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=5_000
+    )
+    sim_input.aar = sim_input.aar[:2]
+    antall = len(sim_input.aar) * len(sim_input.perioder_for_sim)
+
+    uten = VentetidMellomlager(tmp_path)
+    uten_fordelinger = simulate_from_simuleringsinput(sim_input, mellomlager=uten)
+    assert all(o.distributions is None for o in uten_fordelinger)
+
+    # Output uten fordelinger treffes ikke når de etterspørres
+    med = VentetidMellomlager(tmp_path)
+    med_fordelinger = simulate_from_simuleringsinput(
+        sim_input, mellomlager=med, distributions=True
+    )
+    assert (med.antall_treff, med.antall_bom) == (0, antall)
+    for o, u in zip(med_fordelinger, uten_fordelinger):
+        assert o.distributions is not None
+        assert o.data["mean_wait_time"] == u.data["mean_wait_time"]
@@ -0,0 +1,137 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fram.virkninger.ventetid.computation import (
+    simulate_multiship_multiple_bottlenecks_two_directions,
+)
+from fram.virkninger.ventetid.excel import (
+    les_ventetidsinput_fra_excel,
+    simulate_from_simuleringsinput,
+)
+from fram.virkninger.ventetid.queue_approximation import (
+    approximate_multiship_multiple_bottlenecks_two_directions,
+    erlang_c,
+)
+from fram.virkninger.ventetid.ventetidssituasjon import Ventetidssituasjon
+
+EXCEL_INPUT_FILE = Path(__file__).parent / "ventetidseksempel.xlsx"
+
+
+def test_erlang_c():
+    assert erlang_c(1, 0.5) == pytest.approx(0.5)
+    assert erlang_c(2, 1.0) == pytest.approx(1 / 3)
+    assert erlang_c(3, 0.0) == 0
+
+
+def test_en_flaskehals_er_pollaczek_khinchine():
+    args = dict(
+        lbdas=[0.6, 0.3],
+        mus=np.array([[2.0], [1.0]]),
+        directions=["nord", "sor"],
+        alpha=[1],
+        ship_ids=["a", "b"],
+    )
+    tilnaermet = approximate_multiship_multiple_bottlenecks_two_directions(**args)
+    simulert = simulate_multiship_multiple_bottlenecks_two_directions(
+        **args, num_periods=100_000
+    )
+
+    # E[S^2] = (0.6 * 0.5^2 + 0.3 * 1^2) / 0.9, og Wq = lambda * E[S^2] / (2 * (1 - rho))
+    assert tilnaermet["mean_wait_time"] == pytest.approx(0.45 / (2 * 0.4))
+    assert tilnaermet.keys() == simulert.keys()
+    for key in ["mean_wait_time", "prob_cust_must_wait", "mean_length_line"]:
+        assert tilnaermet[key] == pytest.approx(simulert[key], rel=0.05)
+    for ship in ["a", "b"]:
+        assert tilnaermet["mean_wait_time_per_ship"][ship] == pytest.approx(
+            simulert["mean_wait_time_per_ship"][ship], rel=0.05
+        )
+
+
+def test_ustabil_ko_gir_uendelig_ventetid():
+    with pytest.warns(RuntimeWarning, match="ikke stabil"):
+        out = approximate_multiship_multiple_bottlenecks_two_directions(
+            lbdas=[1.0, 1.5], mus=np.array([[2.0], [2.0]])
+        )
+    assert out["mean_wait_time"] == np.inf
+    assert out["prob_cust_must_wait"] == 1
+    assert all(np.isinf(list(out["mean_wait_time_per_ship"].values())))
+
+
+def test_ustabile_perioder_simuleres_i_stedet():
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=2_000
+    )
+    mettet_aar = sim_input.aar[-1]
+    sim_input.lambda_df[mettet_aar] *= 100
+    meldinger = []
+
+    outputs = simulate_from_simuleringsinput(
+        sim_input, metode="analytisk", num_workers=1, logger=meldinger.append
+    )
+
+    antall_perioder = len(sim_input.perioder_for_sim)
+    assert any(
+        f"{antall_perioder} år og perioder har ikke stabil kø" in m for m in meldinger
+    )
+    for output in outputs:
+        # Bare simuleringene har simulerte perioder
+        assert (output.num_periods > 0) == (output.year == mettet_aar)
+        assert np.isfinite(output.data["mean_wait_time"])
+
+
+def test_serverbelastning_foelger_fordelingen_paa_flaskehalsene():
+    out = approximate_multiship_multiple_bottlenecks_two_directions(
+        lbdas=[0.4], mus=np.array([[2.0, 1.0]]), bottleneck_ids=["a", "b"]
+    )
+    # To tredeler av skipene går gjennom a på 0.5, en tredel gjennom b på 1
+    assert out["mean_service_time_per_ship"]["0"] == pytest.approx(2 / 3)
+    assert out["mean_server_occupation"] == pytest.approx(
+        sum(out["mean_share_busy_per_bottleneck"].values()) / 2
+    )
+
+
+def test_analytisk_ventetidssituasjon_har_samme_form():
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=20_000
+    )
+    simulert = Ventetidssituasjon(
+        sim_input, sim_input, num_workers=1, persentiler=True
+    )
+    analytisk = Ventetidssituasjon(sim_input, sim_input, metode="analytisk")
+
+    for a, s in zip(analytisk._output_ref, simulert._output_ref):
+        assert (a.year, a.period) == (s.year, s.period)
+        assert a.data.keys() == s.data.keys()
+    pd.testing.assert_index_equal(
+        analytisk.total_ventetid_ref.index, simulert.total_ventetid_ref.index
+    )
+    # Samme størrelsesorden
+    forhold = (
+        analytisk.total_ventetid_ref.sum().sum()
+        / simulert.total_ventetid_ref.sum().sum()
+    )
+    assert 0.5 < forhold < 2
+
+    # Bare simuleringene har fordelinger
+    assert analytisk.ventetid_persentiler_ref is None
+    persentiler = simulert.ventetid_persentiler_ref
+    assert list(persentiler.columns) == list(sim_input.aar)
+    assert (persentiler.xs(0.99, level="persentil") >= 0).all().all()
+    assert (
+        simulert.kolengde_andel_ref.groupby("periode").sum().round(9).eq(1).all().all()
+    )
+
+
+def test_analytisk_kan_ikke_kombineres_med_simuleringsvalg():
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=1_000
+    )
+    with pytest.raises(ValueError, match="analytiske"):
+        simulate_from_simuleringsinput(
+            sim_input, metode="analytisk", common_random_numbers=True
+        )
+    with pytest.raises(ValueError, match="Ukjent metode"):
+        simulate_from_simuleringsinput(sim_input, metode="finnes_ikke")
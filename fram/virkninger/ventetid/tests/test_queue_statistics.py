@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fram.virkninger.ventetid import computation
+from fram.virkninger.ventetid.queue_statistics import (
+    bincount_means,
+    group_means,
+    line_length_statistics,
+    QuantileSketch,
+    QueueDistributions,
+    SKETCH_RELATIVE_ACCURACY,
+)
+
+
+def _pandas_line_length(arrival_times, service_start_times):
+    """Den opprinnelige pandas-beregningen av kølengden, som hendelsesgjennomgangen skal gjenskape"""
+    in_line = service_start_times > arrival_times
+    events = pd.concat(
+        [
+            pd.Series(index=arrival_times[in_line], data=1),
+            pd.Series(index=service_start_times[in_line], data=-1),
+        ]
+    ).sort_index()
+    time_stamps = np.concatenate([[0], events.index.values])
+    num_in_line = np.concatenate([[0], events.cumsum().values])
+    durations = pd.Series(np.diff(time_stamps, append=np.nan))
+    waits_agg = durations.groupby(num_in_line).sum()
+    return (
+        np.average(waits_agg.index.values, weights=waits_agg.values),
+        waits_agg.index.max(),
+    )
+
+
+@pytest.mark.parametrize("lbda", [0.5, 1.5, 1.95])
+def test_kolengde_lik_pandas(lbda):
+    np.random.seed(2)
+    arrival_times = np.cumsum(np.random.exponential(1 / lbda, 5_000))
+    service_start_times = computation.lindley_service_start_times(
+        arrival_times, np.random.exponential(1 / 2, 5_000)
+    )
+
+    mean_line, max_line = line_length_statistics(arrival_times, service_start_times)
+    fasit_mean, fasit_max = _pandas_line_length(arrival_times, service_start_times)
+
+    assert mean_line == pytest.approx(fasit_mean, rel=1e-9)
+    assert max_line == fasit_max
+
+
+def test_kolengde_uten_ko_er_null():
+    arrival_times = np.array([1.0, 2.0, 3.0])
+    assert line_length_statistics(arrival_times, arrival_times) == (0, 0)
+
+
+def test_gruppesnitt_slaar_sammen_like_navn_og_sorterer():
+    codes = np.array([2, 0, 1, 2, 0])
+    values = np.array([1.0, 2.0, 3.0, 5.0, 4.0])
+
+    assert bincount_means(codes, values, ["b", "c", "a"]) == {"a": 3.0, "b": 3.0, "c": 3.0}
+    assert list(bincount_means(codes, values, ["b", "b", "a"])) == ["a", "b"]
+    assert bincount_means(codes, values, ["b", "b", "a"])["b"] == pytest.approx(3.0)
+    # Grupper uten observasjoner er ikke med
+    assert group_means(["a", "b"], np.array([1.0, 0.0]), np.array([2, 0])) == {"a": 0.5}
+
+
+def test_samme_skip_i_begge_retninger_rapporteres_samlet():
+    args = dict(
+        lbdas=[1.0, 2.0, 0.7],
+        mus=np.array([[3.0, 2.0], [4.0, 1.0], [5.0, 5.0]]),
+        directions=["nord", "sor", "nord"],
+        alpha=[0.5, 0.5],
+        ship_ids=["a", "a", "b"],
+        bottleneck_ids=["x", "y"],
+        num_periods=2_000,
+        threshold=0.05,
+        seed=4,
+    )
+    samlet = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        **args, common_random_numbers=True
+    )
+    bitvis = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        **args, chunk_periods=300
+    )
+
+    for key in [
+        "mean_wait_time_per_ship",
+        "mean_incidents_just_per_period_per_ship",
+        "passings_per_bottleneck_per_ship_per_period",
+    ]:
+        assert list(samlet[key]) == list(bitvis[key])
+        for ship in samlet[key]:
+            assert bitvis[key][ship] == pytest.approx(samlet[key][ship], rel=1e-9)
+    assert set(samlet["mean_wait_time_per_ship"]) == {"a", "b"}
+
+
+def test_kvantiler_fra_skissen_innenfor_relativ_feil():
+    rng = np.random.default_rng(1)
+    verdier = np.concatenate([np.zeros(3_000), rng.lognormal(-2, 1.5, 7_000)])
+    rng.shuffle(verdier)
+    skisse = QuantileSketch()
+    halvdeler = [QuantileSketch(), QuantileSketch()]
+    skisse.update(verdier)
+    halvdeler[0].update(verdier[:4_000])
+    halvdeler[1].update(verdier[4_000:])
+    halvdeler[0].merge(halvdeler[1])
+
+    assert skisse.count == len(verdier)
+    assert np.array_equal(skisse.counts, halvdeler[0].counts)
+    for q in [0.1, 0.5, 0.9, 0.99, 1.0]:
+        fasit = np.quantile(verdier, q, method="inverted_cdf")
+        assert skisse.quantile(q) == pytest.approx(fasit, rel=SKETCH_RELATIVE_ACCURACY)
+    assert skisse.quantile(0.2) == 0
+    assert np.isnan(QuantileSketch().quantile(0.5))
+
+    # Med begrenset antall bøtter slås de laveste sammen, og de høye kvantilene er like nøyaktige
+    liten = QuantileSketch(max_buckets=300)
+    liten.update(verdier)
+    assert len(liten.counts) == 300
+    assert liten.quantile(0.99) == pytest.approx(skisse.quantile(0.99))
+
+
+def test_fordelingene_er_like_bitvis_og_samlet():
+    args = dict(
+        lbdas=[1.0, 2.0, 0.7],
+        mus=np.array([[3.0, 2.0], [4.0, 1.0], [5.0, 5.0]]),
+        directions=["nord", "sor", "nord"],
+        alpha=[0.5, 0.5],
+        ship_ids=["a", "a", "b"],
+        num_periods=2_000,
+        seed=4,
+        distributions=True,
+    )
+    samlet = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        **args, common_random_numbers=True
+    )["distributions"]
+    bitvis = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        **args, chunk_periods=300
+    )["distributions"]
+
+    assert set(samlet.wait_time_per_ship) == {"a", "b"}
+    for ship in ["a", "b"]:
+        assert np.array_equal(
+            samlet.wait_time_per_ship[ship].counts,
+            bitvis.wait_time_per_ship[ship].counts,
+        )
+    assert samlet.total_time.quantile(0.9) == bitvis.total_time.quantile(0.9)
+    np.testing.assert_allclose(samlet.line_length_time, bitvis.line_length_time)
+
+
+def test_kolengdefordelingen_gir_snittkolengden():
+    out = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        lbdas=[1.5], mus=[2], num_periods=5_000, distributions=True
+    )
+    andeler = out["distributions"].line_length_shares()
+    assert sum(andeler.values()) == pytest.approx(1)
+    assert max(andeler) == out["max_length_line"]
+    assert sum(lengde * andel for lengde, andel in andeler.items()) == pytest.approx(
+        out["mean_length_line"]
+    )
+
+    # Replikasjoner flettes, og vektes med simulert tid
+    replikasjoner = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        lbdas=[1.5], mus=[2], num_periods=5_000, distributions=True, num_replications=4
+    )
+    fordeling = replikasjoner["distributions"]
+    assert isinstance(fordeling, QueueDistributions)
+    assert fordeling.wait_time.count == replikasjoner["num_arrivals"]
@@ -1,6 +1,5 @@
 import numpy as np
 import pytest
-from numpy.random import exponential
 
 from fram.virkninger.ventetid import computation
 
@@ -14,7 +13,7 @@ from fram.virkninger.ventetid import computation
 )
 def test_ett_skip_en_flaskehals(lbda, mu, average_wait, server_occupancy):
     model_output = computation.simulate_multiship_multiple_bottlenecks(
-        lbdas=[lbda], mus=np.array([mu]), num_periods=1_000_000,
+        lbdas=[lbda], mus=np.array([mu]), num_periods=1_000_000, seed=1,
     )
     assert np.isclose(model_output["mean_wait_time"], average_wait, atol=0.01)
     assert np.isclose(
@@ -30,7 +29,7 @@ def test_to_skip_en_flaskehals_i_ettskipsmodellen(
     lbdas, mu, average_wait, server_occupancy
 ):
     model_output = computation.simulate_single_ship_single_bottleneck(
-        sum(lbdas), mu, num_periods=1_000_000
+        sum(lbdas), mu, num_periods=1_000_000, seed=1
     )
     assert np.isclose(model_output["mean_wait_time"], average_wait, atol=0.01)
     assert np.isclose(
@@ -44,7 +43,7 @@ def test_to_skip_en_flaskehals_i_ettskipsmodellen(
 )
 def test_to_skip_en_flaskehals(lbdas, mu, average_wait, server_occupancy):
     model_output = computation.simulate_multiship_multiple_bottlenecks(
-        lbdas=lbdas, mus=np.array([mu]), num_periods=1_000_000,
+        lbdas=lbdas, mus=np.array([mu]), num_periods=1_000_000, seed=1,
     )
     assert np.isclose(model_output["mean_wait_time"], average_wait, atol=0.01)
     assert np.isclose(
@@ -54,12 +53,17 @@ def test_to_skip_en_flaskehals(lbdas, mu, average_wait, server_occupancy):
 
 # Det finnes ikke analytisk løsning for modell med ulike mu. For å teste, hacker vi da den funksjonen som trekker
 # seilingstid, slik at den blir lik for alle flaskehalser for hvert skip.
-@pytest.fixture
-def mock_exponential(monkeypatch):
-    """np.random.exponential() mocked to return matrices with identical columns"""
+class _LikeKolonner:
+    """Generator der exponential() gir matriser med identiske kolonner"""
+
+    def __init__(self, rng):
+        self._rng = rng
+
+    def __getattr__(self, navn):
+        return getattr(self._rng, navn)
 
-    def custom_random_exponential(par, shape):
-        matrix = exponential(par, shape)
+    def exponential(self, par, shape):
+        matrix = self._rng.exponential(par, shape)
         if isinstance(shape, tuple):
             if len(shape) == 2:
                 for col in range(1, shape[1]):
@@ -69,7 +73,14 @@ def mock_exponential(monkeypatch):
                     matrix[:, :, col] = matrix[:, :, 0]
         return matrix
 
-    monkeypatch.setattr(np.random, "exponential", custom_random_exponential)
+
+@pytest.fixture
+def mock_exponential(monkeypatch):
+    """np.random.default_rng() mocked to return generators whose exponential() gives matrices with identical columns"""
+    default_rng = np.random.default_rng
+    monkeypatch.setattr(
+        np.random, "default_rng", lambda *args: _LikeKolonner(default_rng(*args))
+    )
 
 
 @pytest.mark.parametrize(
@@ -83,9 +94,8 @@ def mock_exponential(monkeypatch):
 def test_ett_skip_to_flaskehalser(
     mock_exponential, lbda, mus, average_wait, server_occupancy
 ):
-    np.random.seed(1)
     model_output = computation.simulate_multiship_multiple_bottlenecks(
-        lbdas=[lbda], mus=np.array(mus), num_periods=1_000_000,
+        lbdas=[lbda], mus=np.array(mus), num_periods=1_000_000, seed=1,
     )
     assert np.isclose(model_output["mean_wait_time"], average_wait, atol=0.01)
     assert np.isclose(
@@ -123,6 +133,7 @@ def test_to_skip_en_flaskehals_to_retninger(
         directions=directions,
         alpha=alpha,
         num_periods=1_000_000,
+        seed=1,
     )
     assert np.isclose(output["mean_wait_time"], average_wait, atol=0.01)
 
@@ -149,6 +160,7 @@ def test_to_skip_en_flaskehals_to_retninger_mellomlosninger(
         directions=directions,
         alpha=alpha,
         num_periods=100_000,
+        seed=1,
     )
     assert output["mean_wait_time"] < np.mean(average_wait)
 
@@ -210,7 +222,6 @@ def test_to_skip_en_flaskehals_to_retninger_mellomlosninger(
 def test_to_skip_to_flaskehalser_to_retninger(
     mock_exponential, lbdas, mus, directions, alpha, average_wait
 ):
-    np.random.seed(1)
     model_output = computation.simulate_multiship_multiple_bottlenecks_two_directions(
         lbdas=lbdas, mus=mus, directions=directions, alpha=alpha, num_periods=300_000,
     )
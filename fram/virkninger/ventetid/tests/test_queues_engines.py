@@ -0,0 +1,414 @@
+import numpy as np
+import pytest
+
+from fram.virkninger.ventetid import computation
+
+
+def _loop_service_start_times(arrival_times, occupied_times):
+    """Referanseløkken som den vektoriserte Lindley-rekursjonen skal gjenskape"""
+    service_start_times = np.empty_like(arrival_times)
+    busy_until = 0.0
+    for k in range(len(arrival_times)):
+        service_start_times[k] = max(busy_until, arrival_times[k])
+        busy_until = service_start_times[k] + occupied_times[k]
+    return service_start_times
+
+
+@pytest.mark.parametrize("lbda, mu", [(0.3, 2), (1, 2), (1.9, 2)])
+def test_lindley_lik_loekken(lbda, mu):
+    np.random.seed(1)
+    arrival_times = np.cumsum(np.random.exponential(1 / lbda, 20_000))
+    occupied_times = np.random.exponential(1 / mu, 20_000)
+
+    fasit = _loop_service_start_times(arrival_times, occupied_times)
+    vektorisert = computation.lindley_service_start_times(arrival_times, occupied_times)
+
+    assert np.allclose(vektorisert, fasit, rtol=0, atol=1e-8)
+    # Skip som ikke venter i løkken skal heller ikke vente i den vektoriserte varianten
+    assert np.array_equal(vektorisert == arrival_times, fasit == arrival_times)
+
+
+def test_lindley_tom_og_ett_anlop():
+    assert len(computation.lindley_service_start_times(np.array([]), np.array([]))) == 0
+    assert computation.lindley_service_start_times(np.array([3.0]), np.array([1.0]))[0] == 3.0
+
+
+@pytest.mark.parametrize(
+    "lbdas, mus, directions",
+    [
+        ([0.5, 0.3], np.array([[2], [3]]), ["nord", "sor"]),
+        ([1.2], [2], None),
+    ],
+)
+def test_vektorisert_gir_samme_output_som_loekken(lbdas, mus, directions):
+    kwargs = dict(lbdas=lbdas, mus=mus, directions=directions, num_periods=20_000, seed=3)
+    loop = computation.simulate_multiship_multiple_bottlenecks_two_directions(**kwargs)
+    vektorisert = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        vectorized=True, **kwargs
+    )
+
+    assert loop.keys() == vektorisert.keys()
+    for key in ["num_arrivals", "num_incidents", "num_incidents_just", "max_length_line"]:
+        assert loop[key] == vektorisert[key]
+    for key in ["mean_wait_time", "mean_total_time", "mean_length_line", "mean_server_occupation"]:
+        assert np.isclose(loop[key], vektorisert[key], rtol=1e-9)
+    for ship, value in loop["mean_wait_time_per_ship"].items():
+        assert np.isclose(value, vektorisert["mean_wait_time_per_ship"][ship], rtol=1e-9)
+
+
+def test_vektorisert_krever_en_flaskehals_og_ingen_rabatt():
+    with pytest.raises(ValueError):
+        computation.simulate_multiship_multiple_bottlenecks_two_directions(
+            lbdas=[1, 1],
+            mus=np.array([[2, 2], [2, 2]]),
+            num_periods=1_000,
+            vectorized=True,
+        )
+    with pytest.raises(ValueError):
+        computation.simulate_multiship_multiple_bottlenecks_two_directions(
+            lbdas=[1, 1],
+            mus=np.array([[2], [2]]),
+            directions=["n", "s"],
+            alpha=[0.5],
+            num_periods=1_000,
+            vectorized=True,
+        )
+
+
+@pytest.fixture
+def kernel_input():
+    """Tilfeldige anløp for tre skipstyper, to retninger og tre flaskehalser med ulik alpha"""
+    rng = np.random.RandomState(7)
+    num_arrivals = 5_000
+    arrival_times = np.cumsum(rng.exponential(0.4, num_arrivals))
+    arrival_directions = rng.randint(0, 2, num_arrivals).astype(np.int64)
+    ship_idxs = rng.randint(0, 3, num_arrivals).astype(np.int64)
+    gross_service_times = 1 / np.array([[2.0, 1.5, 1e-8], [3.0, 2.5, 1.0], [1.0, 1.0, 4.0]])
+    alpha = np.array([0.5, 1.0, 0.2])
+    return arrival_times, arrival_directions, ship_idxs, gross_service_times, alpha
+
+
+def test_skalarkjernen_identisk_med_referansen(kernel_input):
+    referanse = computation._queue_kernel_numpy(*kernel_input)
+    skalar = computation._queue_kernel_scalar(*kernel_input)
+    for fasit, svar in zip(referanse, skalar):
+        assert np.array_equal(fasit, svar)
+
+
+def test_numbakjernen_identisk_med_referansen(kernel_input):
+    pytest.importorskip("numba")
+    referanse = computation._queue_kernel_numpy(*kernel_input)
+    kompilert = computation.get_queue_kernel("numba")(*kernel_input)
+    for fasit, svar in zip(referanse, kompilert):
+        assert np.array_equal(fasit, svar)
+
+
+@pytest.mark.parametrize("kernel", ["numba", "auto"])
+def test_simulering_lik_for_alle_kjerner(kernel):
+    if kernel == "numba":
+        pytest.importorskip("numba")
+    kwargs = dict(
+        lbdas=[0.5, 0.5, 0.5, 0.5],
+        mus=np.array([[2, 2], [2, 2], [2, 2], [2, 2]]),
+        directions=["nord", "sor", "nord", "sor"],
+        alpha=[0.5, 1],
+        num_periods=20_000,
+        seed=5,
+    )
+    referanse = computation.simulate_multiship_multiple_bottlenecks_two_directions(**kwargs)
+    svar = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        kernel=kernel, **kwargs
+    )
+    assert referanse.keys() == svar.keys()
+    for key, value in referanse.items():
+        if isinstance(value, dict):
+            assert value == svar[key]
+        else:
+            assert value == svar[key] or (np.isnan(value) and np.isnan(svar[key]))
+
+
+def test_ukjent_kjerne_feiler():
+    with pytest.raises(ValueError):
+        computation.get_queue_kernel("fortran")
+
+
+def test_replikasjonskjernen_identisk_med_referansen_per_rad(kernel_input):
+    arrival_times, arrival_directions, ship_idxs, gross_service_times, alpha = kernel_input
+    # To replikasjoner, der den andre er kortere og fylles opp med anløp som aldri kommer
+    lengde = 3_000
+    matriser = (
+        np.vstack([arrival_times, np.append(arrival_times[:lengde], [np.inf] * 2_000)]),
+        np.vstack([arrival_directions, arrival_directions]),
+        np.vstack([ship_idxs, ship_idxs]),
+    )
+    replikert = computation._queue_kernel_replications(*matriser, gross_service_times, alpha)
+    hel = computation._queue_kernel_numpy(*kernel_input)
+    kort = computation._queue_kernel_numpy(
+        arrival_times[:lengde],
+        arrival_directions[:lengde],
+        ship_idxs[:lengde],
+        gross_service_times,
+        alpha,
+    )
+    for fasit_hel, fasit_kort, svar in zip(hel, kort, replikert):
+        assert np.array_equal(fasit_hel, svar[0])
+        assert np.array_equal(fasit_kort, svar[1, :lengde])
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_replikasjoner_gir_konfidensintervall(vectorized):
+    kwargs = dict(
+        lbdas=[0.6, 0.4],
+        mus=np.array([[2], [2]]),
+        directions=["nord", "sor"],
+        ship_ids=["a", "b"],
+        num_periods=40_000,
+        seed=2,
+        vectorized=vectorized,
+    )
+    en = computation.simulate_multiship_multiple_bottlenecks_two_directions(**kwargs)
+    mange = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        num_replications=8, **kwargs
+    )
+
+    assert set(en.keys()) < set(mange.keys())
+    assert mange["num_replications"] == 8
+    halvbredde = mange["mean_wait_time_ci_halfwidth"]
+    assert 0 < halvbredde < mange["mean_wait_time"]
+    # M/D/1 med rho=0.5 og mu=2 gir forventet ventetid rho / (2 * mu * (1 - rho)) = 0.25
+    assert abs(mange["mean_wait_time"] - 0.25) < 3 * halvbredde
+    assert abs(en["mean_wait_time"] - mange["mean_wait_time"]) < 3 * halvbredde
+    assert set(mange["mean_wait_time_per_ship_ci_halfwidth"]) == {"a", "b"}
+    assert mange["num_arrivals"] > 0.9 * en["num_arrivals"]
+
+
+def test_replikasjoner_maa_vaere_minst_en():
+    with pytest.raises(ValueError):
+        computation.simulate_multiship_multiple_bottlenecks_two_directions(
+            lbdas=[1], mus=[2], num_periods=1_000, num_replications=0
+        )
+
+
+def test_konfidenshalvbredde():
+    from fram.virkninger.ventetid.hjelpemoduler import confidence_halfwidth
+
+    assert np.isnan(confidence_halfwidth([1.0]))
+    assert np.isclose(confidence_halfwidth([1.0, 3.0]), 12.706)
+    verdier = np.arange(100.0)
+    assert np.isclose(
+        confidence_halfwidth(verdier), 1.984 * verdier.std(ddof=1) / 10, rtol=1e-3
+    )
+
+
+@pytest.mark.parametrize("lbda", [0.5, 0.9])
+def test_adaptiv_stopper_ved_oensket_presisjon(lbda):
+    kwargs = dict(
+        lbdas=[lbda / 2, lbda / 2],
+        mus=np.array([[2], [2]]),
+        directions=["nord", "sor"],
+        ship_ids=["a", "b"],
+        num_periods=100_000,
+        seed=4,
+    )
+    out = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        relative_precision=0.05, **kwargs
+    )
+    assert out["achieved_precision"] <= 0.05
+    assert out["num_periods_simulated"] < 100_000
+    assert out["num_replications"] * 5_000 == out["num_periods_simulated"]
+    assert max(out["mean_wait_time_per_ship_ci_halfwidth"].values()) <= 0.05 * max(
+        out["mean_wait_time_per_ship"].values()
+    )
+
+
+def test_adaptiv_stopper_ved_taket():
+    out = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        lbdas=[1.8],
+        mus=[2],
+        num_periods=20_000,
+        relative_precision=1e-4,
+    )
+    assert out["num_periods_simulated"] == 20_000
+    assert out["achieved_precision"] > 1e-4
+
+
+def test_adaptiv_stopper_tidlig_ved_lav_utnyttelse_og_absolutt_presisjon():
+    kwargs = dict(lbdas=[0.05], mus=[2], num_periods=100_000, relative_precision=0.05)
+    uten = computation.simulate_multiship_multiple_bottlenecks_two_directions(**kwargs)
+    med = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        absolute_precision=0.005, **kwargs
+    )
+    assert uten["num_periods_simulated"] == 100_000
+    assert med["num_periods_simulated"] <= 30_000
+
+
+def test_adaptiv_og_replikasjoner_kan_ikke_kombineres():
+    with pytest.raises(ValueError):
+        computation.simulate_multiship_multiple_bottlenecks_two_directions(
+            lbdas=[1], mus=[2], num_replications=4, relative_precision=0.05
+        )
+
+
+def test_egne_strommer_per_node_uten_global_random_state():
+    kwargs = dict(lbdas=[0.8, 0.5], mus=[[2], [3]], num_periods=5_000, seed=1)
+    np.random.seed(123)
+    tilstand = np.random.get_state()[1].copy()
+    fasit = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        stream_key=("ref", "2020", "sommer"), **kwargs
+    )
+    # Numpys globale random state verken benyttes eller endres
+    assert np.array_equal(np.random.get_state()[1], tilstand)
+    np.random.seed(456)
+    igjen = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        stream_key=("ref", "2020", "sommer"), **kwargs
+    )
+    annet_aar = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        stream_key=("ref", "2021", "sommer"), **kwargs
+    )
+    assert igjen == fasit
+    assert annet_aar["mean_wait_time"] != fasit["mean_wait_time"]
+
+    node = computation.seed_sequence(1, "ref", "2020")
+    assert computation.seed_sequence(node, "sommer").spawn_key == (
+        computation.seed_sequence(1, "ref", "2020", "sommer").spawn_key
+    )
+
+
+def test_felles_tilfeldige_tall_uavhengig_av_antall_trekninger():
+    kort = computation.common_exponentials(1, "Oljetankskip--0-30nord", 0, 100)
+    lang = computation.common_exponentials(1, "Oljetankskip--0-30nord", 0, 1_000)
+    annet_skip = computation.common_exponentials(1, "Oljetankskip--0-30sor", 0, 100)
+    antitetisk = computation.common_exponentials(
+        1, "Oljetankskip--0-30nord", 0, 1_000, antithetic=True
+    )
+
+    assert np.array_equal(kort, lang[:100])
+    assert not np.array_equal(kort, annet_skip)
+    assert np.all(np.isfinite(antitetisk)) and np.all(antitetisk >= 0)
+    assert np.corrcoef(lang, antitetisk)[0, 1] < -0.5
+
+
+@pytest.mark.parametrize("antithetic", [False, True])
+def test_felles_tilfeldige_tall_reduserer_variansen_i_differansen(antithetic):
+    # Tiltaket gir raskere gjennomseiling, med uendret trafikk
+    kwargs = dict(
+        lbdas=[0.4, 0.4],
+        directions=["nord", "sor"],
+        ship_ids=["a", "b"],
+        num_periods=100_000,
+        num_replications=10,
+        seed=3,
+        common_random_numbers=True,
+        antithetic=antithetic,
+    )
+    ref = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        mus=np.array([[2], [2]]), **kwargs
+    )
+    tiltak = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        mus=np.array([[2.5], [2.5]]), **kwargs
+    )
+
+    assert ref["num_replications"] == 10
+    assert len(ref["mean_wait_time_per_ship_per_batch"]) == (20 if antithetic else 10)
+    reduksjon = computation.variance_reduction(
+        ref["mean_wait_time_per_ship_per_batch"],
+        tiltak["mean_wait_time_per_ship_per_batch"],
+        antithetic,
+    )
+    assert list(reduksjon.index) == ["a", "b"]
+    assert (reduksjon.variance_reduction > 3).all()
+
+
+@pytest.mark.parametrize("antithetic", [False, True])
+def test_batcher_deler_en_simulering_uten_ny_tom_ko(antithetic):
+    kwargs = dict(
+        lbdas=[0.8, 0.7],
+        mus=np.array([[2], [2]]),
+        directions=["nord", "sor"],
+        ship_ids=["a", "b"],
+        num_periods=50_000,
+        seed=3,
+        common_random_numbers=True,
+        antithetic=antithetic,
+    )
+    hel = computation.simulate_multiship_multiple_bottlenecks_two_directions(**kwargs)
+    batcher = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        num_batches=10, **kwargs
+    )
+
+    # Batchene er den samme simuleringen, delt opp etterpå
+    assert batcher["mean_wait_time"] == pytest.approx(hel["mean_wait_time"], rel=1e-9)
+    assert batcher["num_batches"] == 10
+    assert len(batcher["mean_wait_time_per_ship_per_batch"]) == (
+        20 if antithetic else 10
+    )
+    assert 0 < batcher["mean_wait_time_ci_halfwidth"] < batcher["mean_wait_time"]
+    assert batcher["mean_wait_time_per_ship_ci_halfwidth"].keys() == {"a", "b"}
+    with pytest.raises(ValueError):
+        computation.simulate_multiship_multiple_bottlenecks_two_directions(
+            num_batches=10, num_replications=2, **kwargs
+        )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(
+            lbdas=[0.5, 0.3, 0.4, 0.2],
+            mus=np.array([[2, 1.5], [3, 2.5], [1, 1], [2, 2]]),
+            directions=["nord", "sor", "nord", "sor"],
+            alpha=[0.5, 1],
+        ),
+        dict(
+            lbdas=[0.6, 0.3],
+            mus=np.array([[2], [2]]),
+            directions=["nord", "sor"],
+            vectorized=True,
+        ),
+    ],
+)
+def test_bitvis_simulering_lik_simulering_i_ett(kwargs):
+    kwargs = dict(num_periods=50_000, seed=2, **kwargs)
+    fasit = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        common_random_numbers=True, **kwargs
+    )
+    bitvis = computation.simulate_multiship_multiple_bottlenecks_two_directions(
+        chunk_periods=3_000, **kwargs
+    )
+
+    assert fasit.keys() == bitvis.keys()
+    for key, value in fasit.items():
+        if isinstance(value, dict):
+            assert value.keys() == bitvis[key].keys()
+            for subkey, subvalue in value.items():
+                assert np.isclose(subvalue, bitvis[key][subkey], rtol=1e-9)
+        else:
+            assert np.isclose(value, bitvis[key], rtol=1e-9)
+
+
+def test_bitvis_simulering_har_minnebruk_uavhengig_av_antall_perioder():
+    import tracemalloc
+
+    kwargs = dict(
+        lbdas=[0.5, 0.3],
+        mus=np.array([[2, 1.5], [3, 2.5]]),
+        directions=["nord", "sor"],
+        chunk_periods=5_000,
+        kernel="auto",
+    )
+    topp = []
+    for num_periods in [20_000, 200_000]:
+        tracemalloc.start()
+        computation.simulate_multiship_multiple_bottlenecks_two_directions(
+            num_periods=num_periods, **kwargs
+        )
+        topp.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert topp[1] < 1.5 * topp[0]
+
+
+def test_bitvis_simulering_kan_ikke_kombineres_med_replikasjoner():
+    with pytest.raises(ValueError):
+        computation.simulate_multiship_multiple_bottlenecks_two_directions(
+            lbdas=[1], mus=[2], num_replications=4, chunk_periods=100
+        )
@@ -5,7 +5,18 @@ import pandas as pd
 import pytest
 
 import fram.virkninger.ventetid.hjelpemoduler
-from fram.virkninger.ventetid.excel import simulate_excel
+from fram.virkninger.ventetid import computation, excel
+from fram.virkninger.ventetid.excel import (
+    les_arkrutenett,
+    les_ventetidsinput_fra_excel,
+    simulate_excel,
+    simulate_from_simuleringsinput,
+    simulate_from_simuleringsinputs,
+    stromnokkel,
+    tabell_fra_rutenett,
+    SKIPROWS_FØR_LØP_OG_ALPHA,
+    SKIPROWS_FØR_MU_OG_LAMBDA,
+)
 from fram.virkninger.ventetid.hjelpemoduler import split_ship_id
 
 EXCEL_INPUT_FILE = Path(__file__).parent / "ventetidseksempel.xlsx"
@@ -61,6 +72,25 @@ def test_at_excel_kan_lese():
     assert results
 
 
+@pytest.mark.parametrize(
+    "tabell",
+    [
+        dict(usecols=[0, 1], skiprows=7),
+        dict(usecols=[5, 6], skiprows=SKIPROWS_FØR_LØP_OG_ALPHA, nrows=6),
+        dict(usecols=[1], skiprows=10),
+        dict(skiprows=SKIPROWS_FØR_MU_OG_LAMBDA),
+    ],
+)
+def test_tabell_fra_rutenett_som_read_excel(tabell):
+    rutenett = les_arkrutenett(EXCEL_INPUT_FILE, "eksempel 1")
+    pd.testing.assert_frame_equal(
+        tabell_fra_rutenett(rutenett, **tabell),
+        pd.read_excel(EXCEL_INPUT_FILE, "eksempel 1", **tabell),
+    )
+    # Rutenettet gjenbrukes, og skal ikke endres
+    assert rutenett == les_arkrutenett(EXCEL_INPUT_FILE, "eksempel 1")
+
+
 def test_read_excel_sheet():
     supposed_df = pd.read_json(
         '{"Skipstype":{"0":"Oljetankskip","8":"Oljetankskip","1":"Oljetankskip","9":"Oljetankskip","4":"Oljetankskip","12":"Oljetankskip","5":"Oljetankskip","13":"Oljetankskip","6":"Oljetankskip","14":"Oljetankskip","2":"Oljetankskip","10":"Oljetankskip","7":"Oljetankskip","15":"Oljetankskip","3":"Oljetankskip","11":"Oljetankskip"},"Lengdegruppe":{"0":"0-30","8":"0-30","1":"100-150","9":"100-150","4":"150-200","12":"150-200","5":"200-250","13":"200-250","6":"250-300","14":"250-300","2":"30-70","10":"30-70","7":"300-","15":"300-","3":"70-100","11":"70-100"},"ventetid":{"0":0.0031705962,"8":0.0066781726,"1":0.0032601196,"9":0.0069654662,"4":0.0031705962,"12":0.0065404762,"5":0.0032601196,"13":0.0068683761,"6":0.0032460109,"14":0.0069013253,"2":0.0032460109,"10":0.0067348103,"7":0.0031041557,"15":0.0069146056,"3":0.0031041557,"11":0.0067120939},"aar":{"0":"2018","8":"2019","1":"2018","9":"2019","4":"2018","12":"2019","5":"2018","13":"2019","6":"2018","14":"2019","2":"2018","10":"2019","7":"2018","15":"2019","3":"2018","11":"2019"},"periode":{"0":"morgensommer","8":"morgensommer","1":"morgensommer","9":"morgensommer","4":"morgenvinter","12":"morgenvinter","5":"morgenvinter","13":"morgenvinter","6":"morgenvinter","14":"morgenvinter","2":"morgensommer","10":"morgensommer","7":"morgenvinter","15":"morgenvinter","3":"morgensommer","11":"morgensommer"}}'
@@ -91,3 +121,73 @@ def test_read_excel_sheet():
         assert all(results[col].values == supposed_df[col].values)
     for col in ["ventetid"]:
         assert np.allclose(supposed_df[col].values, results[col].values, atol=0.1)
+
+
+def test_adaptiv_simuleringslengde_lagres_paa_output():
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=100_000
+    )
+    fast = simulate_from_simuleringsinput(sim_input)
+    adaptiv = simulate_from_simuleringsinput(
+        sim_input, relative_precision=0.1, absolute_precision=1e-4
+    )
+
+    assert all(o.num_periods == 100_000 for o in fast)
+    assert all(o.achieved_precision is None for o in fast)
+    for o in adaptiv:
+        assert o.num_periods <= 100_000
+        assert o.num_periods == o.data["num_periods_simulated"]
+        assert o.achieved_precision <= 0.1 or o.num_periods == 100_000
+
+
+def test_ventetidssituasjon_rapporterer_variansreduksjon():
+    from fram.virkninger.ventetid.ventetidssituasjon import Ventetidssituasjon
+
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=20_000
+    )
+    meldinger = []
+    situasjon = Ventetidssituasjon(
+        sim_input, sim_input, logger=meldinger.append, common_random_numbers=True
+    )
+
+    # Like baner med felles tilfeldige tall gir ingen simuleringsstøy i differansen
+    assert (situasjon.variansreduksjon.var_common == 0).all()
+    assert any("variansreduksjon" in melding for melding in meldinger)
+    pd.testing.assert_frame_equal(
+        situasjon.mean_wait_time_ref, situasjon.mean_wait_time_tiltak
+    )
+
+
+def test_felles_tilfeldige_tall_gir_uavhengige_aar(monkeypatch):
+    sim_input = les_ventetidsinput_fra_excel(
+        EXCEL_INPUT_FILE, "eksempel 1", num_periods=1_000
+    )
+    forste, andre = sim_input.aar[:2]
+    assert (sim_input.lambda_df[forste] != sim_input.lambda_df[andre]).any()
+
+    strommer = []
+
+    def registrer_strom(**kwargs):
+        strommer.append((kwargs["stream_key"], kwargs["lbdas"][0]))
+        return simuler(**kwargs)
+
+    simuler = excel.simulate_multiship_multiple_bottlenecks_two_directions
+    monkeypatch.setattr(excel, "simulate_multiship_multiple_bottlenecks_two_directions", registrer_strom)
+    simulate_from_simuleringsinputs(
+        [sim_input, sim_input],
+        common_random_numbers=True,
+        num_workers=1,
+        stream_keys=[stromnokkel(bane, common_random_numbers=True) for bane in ["ref", "tiltak"]],
+    )
+
+    def anlopstider(aar):
+        nokkel, lbda = next((nokkel, lbda) for nokkel, lbda in strommer if nokkel[0] == aar)
+        trekninger = computation.common_exponentials(computation.seed_sequence(1, *nokkel), "skip", 0, 1_000)
+        return np.cumsum(trekninger / lbda)
+
+    # Begge banene trekker fra strømmen til året og perioden, mens ulike år trekker fra ulike strømmer
+    assert {nokkel for nokkel, _ in strommer} == {
+        (aar, periode) for aar in sim_input.aar for periode in sim_input.perioder_for_sim
+    }
+    assert not np.allclose(anlopstider(forste) / anlopstider(forste)[-1], anlopstider(andre) / anlopstider(andre)[-1])
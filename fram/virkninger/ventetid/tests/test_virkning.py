@@ -176,3 +176,18 @@ def test_virkning_bare_ref(
         metadatakolonner=metadata,
     )
     gyldig_virkning.verdsatt_brutto_ref
+
+
+def test_virkning_mellomlagrer_i_cache_dir(
+    gyldig_virkning, gyldig_simuleringsinput, gyldig_trafikkgrunnlag, tmp_path
+):
+    metadata = gyldig_trafikkgrunnlag.reset_index()[
+        ["Strekning", "Tiltaksomraade", "Tiltakspakke", "Analyseomraade", "Rute"]
+    ]
+    gyldig_simuleringsinput.num_periods = 5_000
+    gyldig_virkning.beregn(
+        simuleringsinput_ref=gyldig_simuleringsinput,
+        metadatakolonner=metadata,
+        cache_dir=tmp_path,
+    )
+    assert list(tmp_path.glob("*/*.pkl"))
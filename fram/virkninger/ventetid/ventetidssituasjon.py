@@ -2,8 +2,10 @@ from typing import Optional, List
 
 import pandas as pd
 
+from fram.virkninger.ventetid.computation import variance_reduction
 from fram.virkninger.ventetid.excel import (
     cached_simulate_from_simuleringsinput,
+    stromnokkel,
 )
 from fram.virkninger.ventetid.hjelpemoduler import (
     drop_multilevel_column,
@@ -11,10 +13,13 @@ from fram.virkninger.ventetid.hjelpemoduler import (
     _beregn_tot_ventetid,
     Output,
     SimuleringsInput,
+    SKIP_LENGDE_SPLITTER,
 )
 
 NUM_PERIODS = 100_000
 SEED = 1
+# Persentilene av ventetiden og den totale tiden som sammenstilles
+PERSENTILER = [0.5, 0.9, 0.99]
 
 
 class Ventetidssituasjon:
@@ -24,6 +29,18 @@ class Ventetidssituasjon:
         simuleringsinput_tiltak: Optional[SimuleringsInput] = None,
         seed: int = 1,
         logger=print,
+        kernel: str = "numpy",
+        relative_precision: Optional[float] = None,
+        absolute_precision: float = 0.0,
+        common_random_numbers: bool = False,
+        antithetic: bool = False,
+        chunk_periods: Optional[float] = None,
+        cache_dir: Optional[str] = None,
+        num_workers: Optional[int] = None,
+        metode: str = "simulering",
+        persentiler: bool = False,
+        output_ref: Optional[List[Output]] = None,
+        output_tiltak: Optional[List[Output]] = None,
     ):
         """
         Beholder for ventetidsberegninger og wrapper rundt de underliggende kø-algoritmene. Output sammenstilles
@@ -39,14 +56,50 @@ class Ventetidssituasjon:
 
         Det foretas ingen verdsetting i denne modellen, det gjennomføres i virkningen.
 
-        Modellen mellomlagrer alle beregninger basert på innholdet inputen den gis, hvilken seed som settes og antall perioder som simuleres. Det vil si at så lenge disse tre beholdes uendret, vil modellen bare slå opp i en katalog over ferdigberegnede kjøringer og returnere denne.
+        Hvert år og hver periode mellomlagres etter den faktiske inputen til simuleringen, seed og antall perioder, slik
+        at bare år med endret input simuleres på nytt. Mellomlageret ligger i `cache_dir`, eller i katalogen angitt med
+        miljøvariabelen `FRAM_VENTETID_MELLOMLAGER`, se
+        :class:`~fram.virkninger.ventetid.mellomlagring.VentetidMellomlager`.
+
+        Valgene for simuleringen, `kernel`, `relative_precision`, `common_random_numbers`, `antithetic`,
+        `chunk_periods`, `num_workers` og `metode`, er beskrevet i
+        :meth:`~fram.virkninger.ventetid.virkning.Ventetid.beregn` og
+        :meth:`~fram.virkninger.ventetid.excel.simulate_from_simuleringsinput`. Oppnådd presisjon ligger i
+        `presisjon_ref` og `presisjon_tiltak`, og variansreduksjonen med felles tilfeldige tall i `variansreduksjon`.
+
+        Med `persentiler` følges også fordelingen av ventetid, total tid og kølengde. Persentilene ligger i
+        `ventetid_persentiler_ref`, `ventetid_persentiler_per_skip_ref`, `total_tid_persentiler_ref` og
+        `kolengde_andel_ref`, med tilsvarende for tiltaksbanen, og er ellers None. Se
+        :class:`~fram.virkninger.ventetid.queue_statistics.QueueDistributions`.
+
+        Er banene allerede simulert, for eksempel i én felles jobb med
+        :meth:`~fram.virkninger.ventetid.excel.cached_simulate_from_simuleringsinputs`, kan outputen gis med
+        `output_ref` og `output_tiltak`, og simuleres da ikke på nytt.
         """
         self.logger = logger
         self.periode_andel = simuleringsinput_ref.perioder_andel
 
-        self._output_ref = cached_simulate_from_simuleringsinput(
-            sim_input=simuleringsinput_ref, seed=seed, logger=self.logger
-        )
+        if output_ref is None:
+            output_ref = cached_simulate_from_simuleringsinput(
+                sim_input=simuleringsinput_ref,
+                seed=seed,
+                logger=self.logger,
+                kernel=kernel,
+                relative_precision=relative_precision,
+                absolute_precision=absolute_precision,
+                common_random_numbers=common_random_numbers,
+                antithetic=antithetic,
+                chunk_periods=chunk_periods,
+                cache_dir=cache_dir,
+                num_workers=num_workers,
+                metode=metode,
+                stream_key=stromnokkel(
+                    "ref", common_random_numbers or antithetic
+                ),
+                distributions=persentiler,
+            )
+        self._output_ref = output_ref
+        self.presisjon_ref = self._get_presisjon(self._output_ref)
         self.tidsenhet_ref = simuleringsinput_ref.tidsenhet
         self._common_df_ref = self._build_common_df(self._output_ref)
         self.mean_wait_time_ref = self._get_df_ship("ref", "mean_wait_time_per_ship")
@@ -62,11 +115,41 @@ class Ventetidssituasjon:
         self.ventesit_over_ett_minutt_varighet_ref = self._get_yearly_common_df(
             "ref", "mean_wait_time_just"
         )
+        self.ventetid_persentiler_ref = self._get_persentiler("ref", "wait_time")
+        self.ventetid_persentiler_per_skip_ref = self._get_persentiler(
+            "ref", "wait_time", per_skip=True
+        )
+        self.total_tid_persentiler_ref = self._get_persentiler("ref", "total_time")
+        self.kolengde_andel_ref = self._get_kolengde_andel("ref")
 
         if simuleringsinput_tiltak is not None:
-            self._output_tiltak = cached_simulate_from_simuleringsinput(
-                sim_input=simuleringsinput_tiltak, seed=seed, logger=self.logger
-            )
+            if output_tiltak is None:
+                output_tiltak = cached_simulate_from_simuleringsinput(
+                    sim_input=simuleringsinput_tiltak,
+                    seed=seed,
+                    logger=self.logger,
+                    kernel=kernel,
+                    relative_precision=relative_precision,
+                    absolute_precision=absolute_precision,
+                    common_random_numbers=common_random_numbers,
+                    antithetic=antithetic,
+                    chunk_periods=chunk_periods,
+                    cache_dir=cache_dir,
+                    num_workers=num_workers,
+                    metode=metode,
+                    stream_key=stromnokkel(
+                        "tiltak", common_random_numbers or antithetic
+                    ),
+                    distributions=persentiler,
+                )
+            self._output_tiltak = output_tiltak
+            self.presisjon_tiltak = self._get_presisjon(self._output_tiltak)
+            if common_random_numbers or antithetic:
+                self.variansreduksjon = self._get_variansreduksjon()
+                if self.variansreduksjon is not None:
+                    self.logger(
+                        f"Felles tilfeldige tall ga en median variansreduksjon i endringen i ventetid på {self.variansreduksjon.variance_reduction.median():.1f}"
+                    )
             self.tidsenhet_tiltak = simuleringsinput_tiltak.tidsenhet
             self._common_df_tiltak = self._build_common_df(self._output_tiltak)
             self.mean_wait_time_tiltak = self._get_df_ship(
@@ -86,6 +169,51 @@ class Ventetidssituasjon:
             self.ventesit_over_ett_minutt_varighet_tiltak = self._get_yearly_common_df(
                 "tiltak", "mean_wait_time_just"
             )
+            self.ventetid_persentiler_tiltak = self._get_persentiler(
+                "tiltak", "wait_time"
+            )
+            self.ventetid_persentiler_per_skip_tiltak = self._get_persentiler(
+                "tiltak", "wait_time", per_skip=True
+            )
+            self.total_tid_persentiler_tiltak = self._get_persentiler(
+                "tiltak", "total_time"
+            )
+            self.kolengde_andel_tiltak = self._get_kolengde_andel("tiltak")
+
+    @staticmethod
+    def _get_presisjon(output: List[Output]):
+        """Oppnådd presisjon og antall simulerte perioder for hvert år og hver periode"""
+        return pd.DataFrame(
+            [
+                {
+                    "aar": o.year,
+                    "periode": o.period,
+                    "num_periods": o.num_periods,
+                    "achieved_precision": o.achieved_precision,
+                }
+                for o in output
+            ]
+        ).set_index(["aar", "periode"])
+
+    def _get_variansreduksjon(self):
+        """Variansreduksjonen i endringen i ventetid per skip, år og periode, se :meth:`~fram.virkninger.ventetid.computation.variance_reduction`
+
+        Bare år og perioder som er simulert i begge baner, er med. Er ingen det, for eksempel fordi de er interpolert,
+        returneres None.
+        """
+        tiltak = {(o.year, o.period): o for o in self._output_tiltak}
+        reduksjoner = [
+            variance_reduction(
+                ref.batches, tiltak[(ref.year, ref.period)].batches, ref.antithetic
+            ).assign(aar=ref.year, periode=ref.period)
+            for ref in self._output_ref
+            if ref.batches is not None
+            and (ref.year, ref.period) in tiltak
+            and tiltak[(ref.year, ref.period)].batches is not None
+        ]
+        if not reduksjoner:
+            return None
+        return pd.concat(reduksjoner)
 
     def _build_common_df(self, output: List[Output]):
         df = [
@@ -161,3 +289,57 @@ class Ventetidssituasjon:
         )
 
         return df
+
+    def _get_persentiler(self, tiltak, fordeling, per_skip=False):
+        """Persentilene i PERSENTILER av `fordeling` ("wait_time" eller "total_time") per periode og år, eventuelt per skip
+
+        Bare år og perioder som er simulert med fordelinger, er med. Er ingen det, for eksempel fordi alle er
+        interpolert eller beregnet analytisk, returneres None.
+        """
+        rader = []
+        for o in getattr(self, f"_output_{tiltak}"):
+            if o.distributions is None:
+                continue
+            if per_skip:
+                skisser = getattr(o.distributions, f"{fordeling}_per_ship").items()
+            else:
+                skisser = [(None, getattr(o.distributions, fordeling))]
+            for ship_id, skisse in skisser:
+                for persentil, verdi in skisse.quantiles(PERSENTILER).items():
+                    rader.append(
+                        {
+                            "ship_id": ship_id,
+                            "periode": o.period,
+                            "persentil": persentil,
+                            "aar": o.year,
+                            "verdi": verdi,
+                        }
+                    )
+        if not rader:
+            return None
+        df = pd.DataFrame(rader)
+        if not per_skip:
+            return df.set_index(["periode", "persentil", "aar"])["verdi"].unstack()
+        return (
+            df.loc[lambda df: df.ship_id.str.contains(SKIP_LENGDE_SPLITTER)]
+            .set_index(["ship_id", "periode", "persentil", "aar"])["verdi"]
+            .unstack()
+            .pipe(split_ship_id)
+        )
+
+    def _get_kolengde_andel(self, tiltak):
+        """Andelen av tiden det står hvert antall skip i kø, per periode og år. None hvis ingen fordelinger, som over"""
+        rader = [
+            {"periode": o.period, "kolengde": kolengde, "aar": o.year, "andel": andel}
+            for o in getattr(self, f"_output_{tiltak}")
+            if o.distributions is not None
+            for kolengde, andel in o.distributions.line_length_shares().items()
+        ]
+        if not rader:
+            return None
+        return (
+            pd.DataFrame(rader)
+            .set_index(["periode", "kolengde", "aar"])["andel"]
+            .unstack()
+            .fillna(0)
+        )
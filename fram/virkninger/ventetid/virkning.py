@@ -30,7 +30,8 @@ Virkningsklassen Ventetid
 
 """
 from copy import copy
-from typing import List, Callable, Dict, Optional
+from pathlib import Path
+from typing import List, Callable, Dict, Optional, Union
 
 import pandas as pd
 from pandera.typing import DataFrame
@@ -44,6 +45,10 @@ from fram.generelle_hjelpemoduler.schemas import (
 )
 from fram.virkninger.felles_hjelpemoduler.schemas import verbose_schema_error
 from fram.virkninger.tid.schemas import KalkprisTidSchema
+from fram.virkninger.ventetid.excel import (
+    cached_simulate_from_simuleringsinputs,
+    stromnokkel,
+)
 from fram.virkninger.ventetid.hjelpemoduler import (
     _verdsett_ventetid,
     _fordel_og_prep_ventetid,
@@ -106,6 +111,16 @@ class Ventetid(Virkning):
         metadatakolonner,
         simuleringsinput_tiltak: Optional[SimuleringsInput] = None,
         seed: int = 1,
+        kernel: str = "numpy",
+        relative_precision: Optional[float] = None,
+        absolute_precision: float = 0.0,
+        common_random_numbers: bool = False,
+        antithetic: bool = False,
+        chunk_periods: Optional[float] = None,
+        num_workers: Optional[int] = None,
+        metode: str = "simulering",
+        cache_dir: Optional[Union[str, Path]] = None,
+        persentiler: bool = False,
     ):
         """
         Metode for å kjøre selve ventetidsberegninger.
@@ -127,6 +142,13 @@ class Ventetid(Virkning):
         fremskrevet trafikk. Følgende tre modellkall er derfor nok til at ventetidsberegningene er unnagjort, inkludert verdsetting:
         Først `FRAM()`, så `FRAM.fremskriv_trafikk()` og til sist `FRAM.beregn_ventetid()`.
 
+        Alle år og perioder i begge baner og alle følsomhetsanalyser samles i én felles simuleringsjobb, slik at hele
+        settet med følsomhetsanalyser simuleres på alle kjernene samtidig. Hvert år og hver periode trekker fra sine egne
+        strømmer av tilfeldige tall, gitt ved `seed`, banen og inputen til simuleringen, se
+        :meth:`~fram.virkninger.ventetid.excel.stromnokkel`. Svaret er derfor bitvis det samme uansett antall
+        arbeiderprosesser, og like år og perioder i samme bane simuleres bare én gang, også på tvers av
+        følsomhetsanalysene. Outputen fordeles deretter tilbake på hver følsomhetsanalyse.
+
         Algoritmen er basert på Queue departure computation (Ebert & al., 2017), som finnes her: https://arxiv.org/abs/1703.02151
 
         1. Det trekkes en lang vektor med tilfeldig tid mellom hvert anløp, `interarrival_times`, simulert for hver skipstype, basert på deres lambda (som angir forventet antall anløp per tidsenhet for den enkelte skipstype)
@@ -150,21 +172,79 @@ class Ventetid(Virkning):
         simuleringsinput_tiltak: gyldig simuleringsinput
         metadatakolonner: Verdier til kolonnene Strekning, Tiltaksomraade, Tiltakspakke, Analyseomraade og Rute
         seed: Seed til psedutilfeldig tallgenerator for å sikre gjenskapbare simuleringer
+        kernel: Hvilken kø-kjerne som skal benyttes i simuleringen, se :meth:`~fram.virkninger.ventetid.computation.get_queue_kernel`
+        relative_precision: Ønsket relativ presisjon på gjennomsnittlig ventetid per skipstype ved adaptiv simuleringslengde. Defaulter til None, som gir fast simuleringslengde. Se :class:`~fram.virkninger.ventetid.ventetidssituasjon.Ventetidssituasjon`
+        absolute_precision: Skipstyper med så smalt konfidensintervall (i tidsenheten) regnes som presise uansett gjennomsnitt. Benyttes bare sammen med `relative_precision`
+        common_random_numbers: Hvorvidt referanse- og tiltaksbanen skal simuleres med felles tilfeldige tall, som gir mye mindre simuleringsstøy i endringen i ventetid. Se :class:`~fram.virkninger.ventetid.ventetidssituasjon.Ventetidssituasjon`
+        antithetic: Hvorvidt simuleringene i tillegg skal kjøres som antitetiske par. Dobler antall simulerte perioder
+        chunk_periods: Angis denne, simuleres køen bit for bit med så mange perioder av gangen, slik at minnebruken ikke vokser med antall perioder
+        num_workers: Antall arbeiderprosesser i prosesspoolen som deles av alle simuleringene. Defaulter til antall kjerner minus én, se :mod:`~fram.generelle_hjelpemoduler.arbeiderpool`
+        metode: "simulering" (default), "interpolert", som bare simulerer noen ankerår og interpolerer resten (se :mod:`~fram.virkninger.ventetid.interpolering`), eller "analytisk", som beregner ventetiden med lukkede formler i stedet for å simulere. Se :mod:`~fram.virkninger.ventetid.queue_approximation`
+        cache_dir: Katalogen for mellomlageret av ventetidsberegninger. Defaulter til None, som gir miljøvariabelen `FRAM_VENTETID_MELLOMLAGER`, eller `~/.cache/fram/ventetid`. Se :class:`~fram.virkninger.ventetid.mellomlagring.VentetidMellomlager`
+        persentiler: Hvorvidt fordelingen av ventetid og kølengde skal følges, slik at persentilene ligger på hver ventetidssituasjon. Defaulter til False, se :class:`~fram.virkninger.ventetid.ventetidssituasjon.Ventetidssituasjon`
         """
+        kjoringer = []
         for kjoring in simuleringsinput_ref.lambda_df.reset_index()[FOLSOMHET_KOLONNE].unique():
             s_ref = copy(simuleringsinput_ref)
             s_ref.lambda_df = s_ref.lambda_df.reset_index().loc[lambda df: df[FOLSOMHET_KOLONNE] == kjoring]
             s_tiltak = copy(simuleringsinput_tiltak)
             if simuleringsinput_tiltak is not None:
                 s_tiltak.lambda_df = s_tiltak.lambda_df.reset_index().loc[lambda df: df[FOLSOMHET_KOLONNE] == kjoring]
+            kjoringer.append((kjoring, s_ref, s_tiltak))
+
+        # Simulerer begge baner i alle følsomhetsanalysene i én felles jobb, slik at alle kjernene er i bruk samtidig.
+        # Strømmen av tilfeldige tall gis av banen og inputen, som i Ventetidssituasjon, slik at svaret ikke avhenger av
+        # hvordan simuleringene fordeles på kjernene, og like år og perioder i samme bane simuleres bare én gang på
+        # tvers av analysene
+        rute = metadatakolonner.Rute.values[0]
+        sim_inputs, stream_keys = [], []
+        for _, s_ref, s_tiltak in kjoringer:
+            for bane, s in [("ref", s_ref), ("tiltak", s_tiltak)]:
+                if s is not None:
+                    sim_inputs.append(s)
+                    stream_keys.append(
+                        stromnokkel(bane, common_random_numbers or antithetic)
+                    )
+        outputs = iter(
+            cached_simulate_from_simuleringsinputs(
+                sim_inputs,
+                seed=seed,
+                logger=self.logger,
+                kernel=kernel,
+                relative_precision=relative_precision,
+                absolute_precision=absolute_precision,
+                common_random_numbers=common_random_numbers,
+                antithetic=antithetic,
+                chunk_periods=chunk_periods,
+                num_workers=num_workers,
+                metode=metode,
+                stream_keys=stream_keys,
+                cache_dir=cache_dir,
+                distributions=persentiler,
+            )
+        )
 
+        for kjoring, s_ref, s_tiltak in kjoringer:
+            output_ref = next(outputs)
+            output_tiltak = next(outputs) if s_tiltak is not None else None
             ventetidssit = Ventetidssituasjon(
                 simuleringsinput_ref=s_ref,
                 simuleringsinput_tiltak=s_tiltak,
                 logger=self.logger,
                 seed=seed,
+                kernel=kernel,
+                relative_precision=relative_precision,
+                absolute_precision=absolute_precision,
+                common_random_numbers=common_random_numbers,
+                antithetic=antithetic,
+                chunk_periods=chunk_periods,
+                num_workers=num_workers,
+                metode=metode,
+                persentiler=persentiler,
+                output_ref=output_ref,
+                output_tiltak=output_tiltak,
             )
-            self._ventetidssituasjoner[metadatakolonner.Rute.values[0]] = ventetidssit
+            self._ventetidssituasjoner[rute] = ventetidssit
 
             # Fordeler ventetid i øvrig-kategorien ut på skipsmatrisen i henhold til det relevante trafikkgrunnlaget
             tot_ventetid_tiltakspakke_ref = _fordel_og_prep_ventetid(